@@ -27,6 +27,11 @@ LOG = logging.getLogger(__name__)
 ROOT_HELPER_OPTS = [
     cfg.StrOpt('root_helper', default='sudo',
                help=_('Root helper application.')),
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Root helper daemon application to use when '
+                      'possible. Privileged commands are then sent to a '
+                      'single long-lived rootwrap process instead of '
+                      'spawning the root helper for each of them.')),
 ]
 
 AGENT_STATE_OPTS = [
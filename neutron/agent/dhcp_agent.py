@@ -13,8 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
 import os
 import sys
+import time
 
 import eventlet
 eventlet.monkey_patch()
@@ -43,6 +45,9 @@ from neutron import service as neutron_service
 
 LOG = logging.getLogger(__name__)
 
+# Number of networks configured between two progress reports during sync
+SYNC_PROGRESS_INTERVAL = 100
+
 
 class DhcpAgent(manager.Manager):
     OPTS = [
@@ -59,6 +64,9 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('dhcp_port_batch_size', default=100,
+                   help=_('Maximum number of DHCP ports created or updated '
+                          'by a single call to the server during sync.')),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -150,13 +158,20 @@ class DhcpAgent(manager.Manager):
 
     @utils.synchronized('dhcp-agent')
     def sync_state(self):
-        """Sync the local DHCP state with Neutron."""
+        """Sync the local DHCP state with Neutron.
+
+        The DHCP ports of all the networks are first created or updated in
+        batches, then the networks are configured concurrently by up to
+        num_sync_threads workers.
+        """
         LOG.info(_('Synchronizing state'))
-        pool = eventlet.GreenPool(cfg.CONF.num_sync_threads)
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
+            active_networks = [
+                self.cache.apply_delta(network) for network in
+                self.plugin_rpc.get_active_networks_info(
+                    revisions=self.cache.get_revisions())]
             active_network_ids = set(network.id for network in active_networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
@@ -166,15 +181,91 @@ class DhcpAgent(manager.Manager):
                     LOG.exception(_('Unable to sync network state on deleted '
                                     'network %s'), deleted_id)
 
-            for network in active_networks:
-                pool.spawn(self.safe_configure_dhcp_for_network, network)
-            pool.waitall()
+            start = time.time()
+            try:
+                self.setup_dhcp_ports(active_networks)
+            except Exception:
+                LOG.exception(_('Unable to set up the DHCP ports in batches, '
+                                'they will be set up one by one.'))
+            LOG.info(_('Synchronizing state: DHCP ports of %(count)d '
+                       'networks set up in %(time).2fs'),
+                     {'count': len(active_networks),
+                      'time': time.time() - start})
+
+            start = time.time()
+            self._configure_networks(active_networks)
+            LOG.info(_('Synchronizing state: %(count)d networks configured '
+                       'in %(time).2fs'),
+                     {'count': len(active_networks),
+                      'time': time.time() - start})
             LOG.info(_('Synchronizing state complete'))
 
         except Exception as e:
             self.schedule_resync(e)
             LOG.exception(_('Unable to sync network state.'))
 
+    def _configure_networks(self, networks):
+        pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        total = len(networks)
+        progress = itertools.count(1)
+
+        def report_progress(thread):
+            count = next(progress)
+            if count % SYNC_PROGRESS_INTERVAL == 0:
+                LOG.info(_('Synchronizing state: %(count)d of %(total)d '
+                           'networks configured'),
+                         {'count': count, 'total': total})
+
+        for network in networks:
+            thread = pool.spawn(self.safe_configure_dhcp_for_network, network)
+            thread.link(report_progress)
+        pool.waitall()
+
+    def setup_dhcp_ports(self, networks):
+        """Create or update the DHCP ports of the networks in batches.
+
+        The returned ports are added to the networks, so that the DHCP driver
+        finds them up to date and makes no call for them. Ports which could
+        not be set up here are handled by the driver as usual.
+        """
+        creates = []
+        updates = []
+        for network in networks:
+            if not network.admin_state_up:
+                continue
+            if not any(subnet.enable_dhcp for subnet in network.subnets):
+                continue
+            device_id = utils.get_dhcp_agent_device_id(network.id,
+                                                       self.conf.host)
+            request = dhcp.get_dhcp_port_request(network, device_id)
+            if request is None:
+                continue
+            port_id, port = request
+            if port_id is None:
+                creates.append((network, port))
+            else:
+                updates.append((network, {'port_id': port_id, 'port': port}))
+
+        batch_size = max(self.conf.dhcp_port_batch_size, 1)
+        for requests, rpc_method in (
+                (creates, self.plugin_rpc.create_dhcp_ports),
+                (updates, self.plugin_rpc.update_dhcp_ports)):
+            for i in range(0, len(requests), batch_size):
+                batch = requests[i:i + batch_size]
+                try:
+                    ports = rpc_method([port for _net, port in batch])
+                except Exception:
+                    LOG.exception(_('Unable to set up a batch of DHCP '
+                                    'ports, they will be set up one by '
+                                    'one.'))
+                    continue
+                for (network, _port), port in zip(batch, ports):
+                    if port:
+                        _put_network_port(network, port)
+        LOG.debug(_('Created %(created)d and updated %(updated)d DHCP '
+                    'ports'), {'created': len(creates),
+                               'updated': len(updates)})
+
     @utils.exception_logger()
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
@@ -196,10 +287,12 @@ class DhcpAgent(manager.Manager):
 
     def safe_get_network_info(self, network_id):
         try:
-            network = self.plugin_rpc.get_network_info(network_id)
+            network = self.plugin_rpc.get_network_info(
+                network_id, revisions=self.cache.get_revisions(network_id))
             if not network:
                 LOG.warn(_('Network %s has been deleted.'), network_id)
-            return network
+                return
+            return self.cache.apply_delta(network)
         except Exception as e:
             self.schedule_resync(e)
             LOG.exception(_('Network %s info call failed.'), network_id)
@@ -396,6 +489,9 @@ class DhcpPluginApi(n_rpc.RpcProxy):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.2 - Added revisions argument to get_active_networks_info and
+              get_network_info.
+        1.3 - Added create_dhcp_ports and update_dhcp_ports methods.
 
     """
 
@@ -408,19 +504,27 @@ class DhcpPluginApi(n_rpc.RpcProxy):
         self.host = cfg.CONF.host
         self.use_namespaces = use_namespaces
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
+    def get_active_networks_info(self, revisions=None):
+        """Make a remote process call to retrieve all network info.
+
+        If revisions is given, the networks only hold the changes since
+        these revisions, see NetworkCache.apply_delta.
+        """
         networks = self.call(self.context,
                              self.make_msg('get_active_networks_info',
-                                           host=self.host))
+                                           host=self.host,
+                                           revisions=revisions),
+                             version='1.2')
         return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
 
-    def get_network_info(self, network_id):
+    def get_network_info(self, network_id, revisions=None):
         """Make a remote process call to retrieve network info."""
         network = self.call(self.context,
                             self.make_msg('get_network_info',
                                           network_id=network_id,
-                                          host=self.host))
+                                          host=self.host,
+                                          revisions=revisions),
+                            version='1.2')
         if network:
             return dhcp.NetModel(self.use_namespaces, network)
 
@@ -453,6 +557,24 @@ class DhcpPluginApi(n_rpc.RpcProxy):
         if port:
             return dhcp.DictModel(port)
 
+    def create_dhcp_ports(self, ports):
+        """Make a remote process call to create several dhcp ports."""
+        ports = self.call(self.context,
+                          self.make_msg('create_dhcp_ports',
+                                        ports=ports,
+                                        host=self.host),
+                          version='1.3')
+        return [port and dhcp.DictModel(port) for port in ports]
+
+    def update_dhcp_ports(self, ports):
+        """Make a remote process call to update several dhcp ports."""
+        ports = self.call(self.context,
+                          self.make_msg('update_dhcp_ports',
+                                        ports=ports,
+                                        host=self.host),
+                          version='1.3')
+        return [port and dhcp.DictModel(port) for port in ports]
+
     def release_dhcp_port(self, network_id, device_id):
         """Make a remote process call to release the dhcp port."""
         return self.call(self.context,
@@ -471,6 +593,20 @@ class DhcpPluginApi(n_rpc.RpcProxy):
                                        host=self.host))
 
 
+def _forget_port_revision(network, port_id):
+    """Forget the revision of a port changed outside of a delta sync."""
+    revisions = network.get('revisions')
+    if revisions:
+        revisions.pop('revision', None)
+        revisions['ports'].pop(port_id, None)
+
+
+def _put_network_port(network, port):
+    """Add or replace a port of a network which is not cached yet."""
+    _forget_port_revision(network, port.id)
+    network.ports = [p for p in network.ports if p.id != port.id] + [port]
+
+
 class NetworkCache(object):
     """Agent cache of the current network state."""
     def __init__(self):
@@ -511,8 +647,71 @@ class NetworkCache(object):
         for port in network.ports:
             del self.port_lookup[port.id]
 
+    def get_revisions(self, network_id=None):
+        """Return the revisions of the subnets and ports of the networks.
+
+        If network_id is given, the revisions of that network are returned,
+        otherwise a dict of the revisions of each network.
+        """
+        if network_id:
+            network = self.get_network_by_id(network_id)
+            return (network and network.get('revisions')) or {}
+        return dict((network_id, self.get_revisions(network_id))
+                    for network_id in self.cache)
+
+    def _merge_resources(self, cached, revisions, changed, deleted):
+        changed_ids = set(resource.id for resource in changed)
+        deleted = set(deleted)
+        # Only keep the cached resources whose revision was sent, the server
+        # returned all the others if they still exist
+        merged = [resource for resource in cached
+                  if (resource.id in revisions and
+                      resource.id not in changed_ids and
+                      resource.id not in deleted)]
+        return merged + list(changed)
+
+    def apply_delta(self, network):
+        """Complete a network delta with the cached subnets and ports.
+
+        A delta holds the subnets and ports which changed since the
+        revisions of get_revisions, along with the ids of the deleted ones.
+        The returned network holds all its subnets and ports, and their
+        revisions. Networks which are not deltas are returned as is.
+        """
+        if 'revision' not in network:
+            return network
+        cached = self.get_network_by_id(network.id)
+        revisions = (cached and cached.get('revisions')) or {}
+        subnet_revisions = revisions.get('subnets') or {}
+        port_revisions = revisions.get('ports') or {}
+        deleted_subnets = network.pop('deleted_subnets')
+        deleted_ports = network.pop('deleted_ports')
+
+        network.subnets = self._merge_resources(
+            cached.subnets if cached else [], subnet_revisions,
+            network.subnets, deleted_subnets)
+        network.ports = self._merge_resources(
+            cached.ports if cached else [], port_revisions,
+            network.ports, deleted_ports)
+
+        subnet_revisions = dict(
+            (subnet_id, revision)
+            for subnet_id, revision in subnet_revisions.iteritems()
+            if subnet_id not in deleted_subnets)
+        subnet_revisions.update(network.pop('subnet_revisions'))
+        port_revisions = dict(
+            (port_id, revision)
+            for port_id, revision in port_revisions.iteritems()
+            if port_id not in deleted_ports)
+        port_revisions.update(network.pop('port_revisions'))
+        network.revisions = {'revision': network.pop('revision'),
+                             'subnets': subnet_revisions,
+                             'ports': port_revisions}
+        return network
+
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
+        _forget_port_revision(network, port.id)
         for index in range(len(network.ports)):
             if network.ports[index].id == port.id:
                 network.ports[index] = port
@@ -524,6 +723,7 @@ class NetworkCache(object):
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
+        _forget_port_revision(network, port.id)
 
         for index in range(len(network.ports)):
             if network.ports[index] == port:
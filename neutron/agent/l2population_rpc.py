@@ -24,6 +24,114 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+# Number of networks whose fdb entries are fetched by call
+FDB_SYNC_PAGE_SIZE = 100
+
+
+class L2populationServerRpcApiMixin(object):
+    '''Agent-side RPC (stub) for agent-to-plugin interaction.'''
+
+    L2POP_RPC_VERSION = '1.0'
+
+    @log.log
+    def get_fdb_entries(self, context, host, network_ids=None, marker=None,
+                        limit=None):
+        return self.call(context,
+                         self.make_msg('get_fdb_entries', host=host,
+                                       network_ids=network_ids,
+                                       marker=marker, limit=limit),
+                         version=self.L2POP_RPC_VERSION)
+
+
+class FdbCache(object):
+    '''Fdb entries and generations of the networks known by an agent.
+
+    The server tags the entries added to or removed from the fdb of a
+    network with the generation of the network fdb before and after the
+    change. Entries which do not apply to the known generation mean that
+    changes were missed, the network is then out of sync until its fdb
+    entries are fetched again.
+    '''
+
+    def __init__(self):
+        self.generations = {}
+        self.ports = {}
+        self.out_of_sync = set()
+
+    def _in_sync(self, network_id, values):
+        if network_id in self.out_of_sync:
+            return False
+        prev_generation = values.get('prev_generation')
+        generation = self.generations.get(network_id)
+        if (prev_generation is not None and generation is not None and
+                prev_generation != generation):
+            LOG.info(_("Fdb of network %(network_id)s out of sync, "
+                       "generation %(generation)s while the entries apply "
+                       "to %(prev_generation)s"),
+                     {'network_id': network_id, 'generation': generation,
+                      'prev_generation': prev_generation})
+            self.out_of_sync.add(network_id)
+            return False
+        if 'generation' in values:
+            self.generations[network_id] = values['generation']
+        return True
+
+    def add(self, fdb_entries):
+        '''Record added entries and return the ones of networks in sync.'''
+        entries = {}
+        for network_id, values in fdb_entries.items():
+            if not self._in_sync(network_id, values):
+                continue
+            ports = self.ports.setdefault(network_id, {})
+            for agent_ip, agent_ports in values.get('ports', {}).items():
+                ports.setdefault(agent_ip, set()).update(
+                    tuple(port) for port in agent_ports)
+            entries[network_id] = values
+        return entries
+
+    def remove(self, fdb_entries):
+        '''Record removed entries and return the ones of networks in sync.'''
+        entries = {}
+        for network_id, values in fdb_entries.items():
+            if not self._in_sync(network_id, values):
+                continue
+            ports = self.ports.get(network_id, {})
+            for agent_ip, agent_ports in values.get('ports', {}).items():
+                known = ports.get(agent_ip, set())
+                known.difference_update(tuple(port) for port in agent_ports)
+                if not known:
+                    ports.pop(agent_ip, None)
+            entries[network_id] = values
+        return entries
+
+    def sync(self, network_id, values):
+        '''Replace the entries of a network by the ones of the server.
+
+        Returns the entries to add and the stale entries to remove.
+        '''
+        known = self.ports.get(network_id, {})
+        ports = dict((agent_ip, set(tuple(port) for port in agent_ports))
+                     for agent_ip, agent_ports in values['ports'].items())
+        self.ports[network_id] = ports
+        self.generations[network_id] = values.get('generation')
+        self.out_of_sync.discard(network_id)
+
+        stale = {}
+        for agent_ip, agent_ports in known.items():
+            agent_ports = agent_ports - ports.get(agent_ip, set())
+            if agent_ports:
+                stale[agent_ip] = [list(port) for port in agent_ports]
+        to_add = dict(values, ports=dict(
+            (agent_ip, [list(port) for port in agent_ports])
+            for agent_ip, agent_ports in ports.items()))
+        to_remove = dict(values, ports=stale)
+        return to_add, to_remove
+
+    def forget(self, network_id):
+        self.generations.pop(network_id, None)
+        self.ports.pop(network_id, None)
+        self.out_of_sync.discard(network_id)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class L2populationRpcCallBackMixin(object):
@@ -35,14 +143,23 @@ class L2populationRpcCallBackMixin(object):
         fdb_add(), fdb_remove(), fdb_update()
     '''
 
+    # Set to a FdbCache by the agents which fetch the fdb entries of their
+    # networks with sync_fdb_entries() instead of waiting for the server
+    # to send them.
+    fdb_cache = None
+
     @log.log
     def add_fdb_entries(self, context, fdb_entries, host=None):
         if not host or host == cfg.CONF.host:
+            if self.fdb_cache is not None:
+                fdb_entries = self.fdb_cache.add(fdb_entries)
             self.fdb_add(context, fdb_entries)
 
     @log.log
     def remove_fdb_entries(self, context, fdb_entries, host=None):
         if not host or host == cfg.CONF.host:
+            if self.fdb_cache is not None:
+                fdb_entries = self.fdb_cache.remove(fdb_entries)
             self.fdb_remove(context, fdb_entries)
 
     @log.log
@@ -50,6 +167,36 @@ class L2populationRpcCallBackMixin(object):
         if not host or host == cfg.CONF.host:
             self.fdb_update(context, fdb_entries)
 
+    def sync_fdb_entries(self, context, plugin_rpc, network_ids=None):
+        '''Fetch the fdb entries of the networks of the host.
+
+        The networks are fetched FDB_SYNC_PAGE_SIZE at a time, all of them
+        or only the ones of network_ids. The fdb entries which are not
+        known yet are added and the stale ones are removed.
+        '''
+        marker = None
+        synced = set()
+        while True:
+            result = plugin_rpc.get_fdb_entries(
+                context, cfg.CONF.host, network_ids=network_ids,
+                marker=marker, limit=FDB_SYNC_PAGE_SIZE)
+            to_add = {}
+            to_remove = {}
+            for network_id, values in result['fdb_entries'].items():
+                to_add[network_id], to_remove[network_id] = (
+                    self.fdb_cache.sync(network_id, values))
+                synced.add(network_id)
+            self.fdb_remove(context, to_remove)
+            self.fdb_add(context, to_add)
+            marker = result['next_marker']
+            if not marker:
+                break
+        # The host has no more ports on the networks which were not returned
+        if network_ids is None:
+            network_ids = self.fdb_cache.generations.keys()
+        for network_id in set(network_ids) - synced:
+            self.fdb_cache.forget(network_id)
+
     @abc.abstractmethod
     def fdb_add(self, context, fdb_entries):
         pass
@@ -32,6 +32,7 @@ from neutron.agent.linux import interface
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import iptables_manager
 from neutron.agent.linux import ra
+from neutron.agent.linux import utils
 from neutron.agent import rpc as agent_rpc
 from neutron.common import config as common_config
 from neutron.common import constants as l3_constants
@@ -88,6 +89,7 @@ class L3PluginApi(n_rpc.RpcProxy):
               - get_agent_gateway_port
               Needed by the agent when operating in DVR/DVR_SNAT mode
         1.3 - Get the list of activated services
+        1.5 - Get the ids of the routers to sync, to sync them by chunks
 
     """
 
@@ -104,6 +106,12 @@ class L3PluginApi(n_rpc.RpcProxy):
                          self.make_msg('sync_routers', host=self.host,
                                        router_ids=router_ids))
 
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the ids of the routers."""
+        return self.call(context,
+                         self.make_msg('get_router_ids', host=self.host),
+                         version='1.5')
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -312,6 +320,8 @@ class RouterUpdate(object):
         self.id = router_id
         self.action = action
         self.router = router
+        # Unlike timestamp, not reset when the router data is fetched
+        self.created_at = timeutils.utcnow()
 
     def __lt__(self, other):
         """Implements priority among updates
@@ -497,6 +507,21 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers processed concurrently. "
+                          "Updates are processed by order of priority, "
+                          "RPC notifications before periodic syncs.")),
+        cfg.IntOpt('max_concurrent_commands', default=0,
+                   help=_("Maximum number of commands, such as ip or "
+                          "iptables-restore, run at the same time by the "
+                          "agent. Router processing waits when the limit "
+                          "is reached. 0 means no limit.")),
+        cfg.IntOpt('sync_routers_chunk_size', default=0,
+                   help=_("Number of routers fetched at a time from the "
+                          "server by the full synchronization of the "
+                          "routers, so that hosting many routers does not "
+                          "make a single synchronization call time out. 0 "
+                          "fetches all the routers at once.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -567,6 +592,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         self.fip_priorities = set(range(FIP_PR_START, FIP_PR_END))
 
         self._queue = RouterProcessingQueue()
+        self.device_inventory = ip_lib.DeviceInventory(self.root_helper)
+        # Seconds the last update of each router waited in the queue and
+        # took to be processed, since the last state report
+        self.router_latencies = {}
+        utils.set_max_concurrent_commands(self.conf.max_concurrent_commands)
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -675,6 +705,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         LOG.debug('DVR: destroy snat ns: %s', ns)
         if self.conf.router_delete_namespaces:
             self._delete_namespace(ns_ip, ns)
+        self.device_inventory.invalidate(ns)
 
     def _destroy_fip_namespace(self, ns):
         ns_ip = ip_lib.IPWrapper(self.root_helper, namespace=ns)
@@ -694,6 +725,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         # TODO(mrsmith): add LOG warn if fip count != 0
         if self.conf.router_delete_namespaces:
             self._delete_namespace(ns_ip, ns)
+        self.device_inventory.invalidate(ns)
         self.agent_gateway_port = None
 
     def _destroy_router_namespace(self, ns):
@@ -713,10 +745,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         if self.conf.router_delete_namespaces:
             self._delete_namespace(ns_ip, ns)
+        self.device_inventory.invalidate(ns)
 
     def _create_namespace(self, name):
         ip_wrapper_root = ip_lib.IPWrapper(self.root_helper)
         ip_wrapper = ip_wrapper_root.ensure_namespace(name)
+        self.device_inventory.invalidate(name)
         ip_wrapper.netns.execute(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
         if self.use_ipv6:
             ip_wrapper.netns.execute(['sysctl', '-w',
@@ -798,6 +832,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         if self.conf.enable_metadata_proxy:
             self._destroy_metadata_proxy(ri.router_id, ri.ns_name)
         del self.router_info[router_id]
+        self.router_latencies.pop(router_id, None)
         self._destroy_router_namespace(ri.ns_name)
 
     def _get_metadata_proxy_callback(self, router_id):
@@ -862,13 +897,21 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         port['ip_cidr'] = "%s/%s" % (ips[0]['ip_address'], prefixlen)
 
     def _get_existing_devices(self, ri):
-        ip_wrapper = ip_lib.IPWrapper(root_helper=self.root_helper,
-                                      namespace=ri.ns_name)
-        ip_devs = ip_wrapper.get_devices(exclude_loopback=True)
-        return [ip_dev.name for ip_dev in ip_devs]
+        return self.device_inventory.get_devices(ri.ns_name)
 
     @common_utils.exception_logger()
     def process_router(self, ri):
+        try:
+            self._process_router(ri)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # The devices of the router may differ from the inventory
+                self.device_inventory.invalidate(ri.ns_name)
+                if ri.router.get('distributed'):
+                    self.device_inventory.invalidate(
+                        self.get_snat_ns_name(ri.router_id))
+
+    def _process_router(self, ri):
         # TODO(mrsmith) - we shouldn't need to check here
         if 'distributed' not in ri.router:
             ri.router['distributed'] = False
@@ -922,6 +965,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.driver.unplug(stale_dev,
                                namespace=ri.ns_name,
                                prefix=INTERNAL_DEV_PREFIX)
+            self.device_inventory.device_removed(stale_dev, ri.ns_name)
 
         # TODO(salv-orlando): RouterInfo would be a better place for
         # this logic too
@@ -960,6 +1004,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                                bridge=self.conf.external_network_bridge,
                                namespace=ri.ns_name,
                                prefix=EXTERNAL_DEV_PREFIX)
+            self.device_inventory.device_removed(stale_dev, ri.ns_name)
 
         # Process static routes for router
         self.routes_updated(ri)
@@ -1127,6 +1172,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 LOG.warn(_("Unable to configure IP address for "
                            "floating IP: %s"), fip['id'])
                 return l3_constants.FLOATINGIP_STATUS_ERROR
+            self.device_inventory.address_added(interface_name, ip_cidr,
+                                                ri.ns_name)
             if ri.router['distributed']:
                 # Special Handling for DVR - update FIP namespace
                 # and ri.namespace to handle DVR based FIP
@@ -1144,6 +1191,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         else:
             net = netaddr.IPNetwork(ip_cidr)
             device.addr.delete(net.version, ip_cidr)
+            self.device_inventory.address_removed(device.name, ip_cidr,
+                                                  ri.ns_name)
             self.driver.delete_conntrack_state(root_helper=self.root_helper,
                                                namespace=ri.ns_name,
                                                ip=ip_cidr)
@@ -1154,7 +1203,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         if ri.is_ha:
             return set(self._ha_get_existing_cidrs(ri, device.name))
         else:
-            return set([addr['cidr'] for addr in device.addr.list()])
+            return set(self.device_inventory.get_addresses(device.name,
+                                                           ri.ns_name))
 
     def process_router_floating_ip_addresses(self, ri, ex_gw_port):
         """Configure IP addresses on router's external gateway interface.
@@ -1368,15 +1418,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
     def _external_gateway_added(self, ri, ex_gw_port, interface_name,
                                 ns_name, preserve_ips):
-        if not ip_lib.device_exists(interface_name,
-                                    root_helper=self.root_helper,
-                                    namespace=ns_name):
+        if not self.device_inventory.device_exists(interface_name, ns_name,
+                                                   verify=True):
             self.driver.plug(ex_gw_port['network_id'],
                              ex_gw_port['id'], interface_name,
                              ex_gw_port['mac_address'],
                              bridge=self.conf.external_network_bridge,
                              namespace=ns_name,
                              prefix=EXTERNAL_DEV_PREFIX)
+        self.device_inventory.device_changed(interface_name, ns_name)
 
         if not ri.is_ha:
             self.driver.init_l3(
@@ -1391,15 +1441,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def agent_gateway_added(self, ns_name, ex_gw_port,
                             interface_name):
         """Add Floating IP gateway port to FIP namespace."""
-        if not ip_lib.device_exists(interface_name,
-                                    root_helper=self.root_helper,
-                                    namespace=ns_name):
+        if not self.device_inventory.device_exists(interface_name, ns_name,
+                                                   verify=True):
             self.driver.plug(ex_gw_port['network_id'],
                              ex_gw_port['id'], interface_name,
                              ex_gw_port['mac_address'],
                              bridge=self.conf.external_network_bridge,
                              namespace=ns_name,
                              prefix=FIP_EXT_DEV_PREFIX)
+        self.device_inventory.device_changed(interface_name, ns_name)
 
         self.driver.init_l3(interface_name, [ex_gw_port['ip_cidr']],
                             namespace=ns_name)
@@ -1447,6 +1497,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                            bridge=self.conf.external_network_bridge,
                            namespace=ns_name,
                            prefix=EXTERNAL_DEV_PREFIX)
+        self.device_inventory.device_removed(interface_name, ns_name)
         if ri.router['distributed']:
             self._destroy_snat_namespace(ns_name)
 
@@ -1505,12 +1556,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def _internal_network_added(self, ns_name, network_id, port_id,
                                 internal_cidr, mac_address,
                                 interface_name, prefix, is_ha=False):
-        if not ip_lib.device_exists(interface_name,
-                                    root_helper=self.root_helper,
-                                    namespace=ns_name):
+        if not self.device_inventory.device_exists(interface_name, ns_name,
+                                                   verify=True):
             self.driver.plug(network_id, port_id, interface_name, mac_address,
                              namespace=ns_name,
                              prefix=prefix)
+        self.device_inventory.device_changed(interface_name, ns_name)
 
         if not is_ha:
             self.driver.init_l3(interface_name, [internal_cidr],
@@ -1572,19 +1623,19 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                     )
                     ns_name = self.get_snat_ns_name(ri.router['id'])
                     prefix = SNAT_INT_DEV_PREFIX
-                    if ip_lib.device_exists(snat_interface,
-                                            root_helper=self.root_helper,
-                                            namespace=ns_name):
+                    if self.device_inventory.device_exists(snat_interface,
+                                                           ns_name):
                         self.driver.unplug(snat_interface, namespace=ns_name,
                                            prefix=prefix)
+                        self.device_inventory.device_removed(snat_interface,
+                                                             ns_name)
 
-        if ip_lib.device_exists(interface_name,
-                                root_helper=self.root_helper,
-                                namespace=ri.ns_name):
+        if self.device_inventory.device_exists(interface_name, ri.ns_name):
             if ri.is_ha:
                 self._clear_vips(ri, interface_name)
             self.driver.unplug(interface_name, namespace=ri.ns_name,
                                prefix=INTERNAL_DEV_PREFIX)
+            self.device_inventory.device_removed(interface_name, ri.ns_name)
 
     def internal_network_nat_rules(self, ex_gw_ip, internal_cidr):
         rules = [('snat', '-s %s -j SNAT --to-source %s' %
@@ -1641,6 +1692,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                                          fip_2_rtr_name, fip_ns_name)
         int_dev[0].link.set_up()
         int_dev[1].link.set_up()
+        self.device_inventory.device_changed(rtr_2_fip_name, ri.ns_name)
         # add default route for the link local interface
         device = ip_lib.IPDevice(rtr_2_fip_name, self.root_helper,
                                  namespace=ri.ns_name)
@@ -1706,6 +1758,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.local_subnets.release(ri.router_id)
             ri.rtr_fip_subnet = None
             ns_ip.del_veth(fip_2_rtr_name)
+            self.device_inventory.device_removed(rtr_2_fip_name, ri.ns_name)
             is_last = self._fip_ns_unsubscribe(ri.router_id)
             # clean up fip-namespace if this is the last FIP
             if is_last:
@@ -1834,9 +1887,20 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             pool.spawn_n(self._router_removed, router_id)
         pool.waitall()
 
+    def _record_router_latency(self, update, started_at):
+        finished_at = timeutils.utcnow()
+        latency = {
+            'queued': timeutils.delta_seconds(update.created_at, started_at),
+            'processing': timeutils.delta_seconds(started_at, finished_at)}
+        self.router_latencies[update.id] = latency
+        LOG.debug("Finished a router update for %(router_id)s, queued for "
+                  "%(queued).3f and processed in %(processing).3f seconds",
+                  dict(latency, router_id=update.id))
+
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
             LOG.debug("Starting router update for %s", update.id)
+            started_at = timeutils.utcnow()
             router = update.router
             if update.action != DELETE_ROUTER and not router:
                 try:
@@ -1857,12 +1921,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 continue
 
             self._process_routers([router])
-            LOG.debug("Finished a router update for %s", update.id)
+            self._record_router_latency(update, started_at)
             rp.fetched_and_processed(update.timestamp)
 
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
             pool.spawn_n(self._process_router_update)
 
@@ -1870,6 +1934,41 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
+    def _fetch_routers(self, context, router_ids):
+        """Fetch the routers, by chunks when all of them are synced."""
+        chunk_size = self.conf.sync_routers_chunk_size
+        if router_ids or chunk_size <= 0:
+            return self.plugin_rpc.get_routers(context, router_ids)
+        try:
+            router_ids = self.plugin_rpc.get_router_ids(context)
+        except messaging.UnsupportedVersion:
+            LOG.debug("The server does not support get_router_ids, "
+                      "fetching all the routers at once.")
+            return self.plugin_rpc.get_routers(context)
+        routers = []
+        for i in range(0, len(router_ids), chunk_size):
+            routers.extend(self.plugin_rpc.get_routers(
+                context, router_ids[i:i + chunk_size]))
+        return routers
+
+    def _invalidate_router_devices(self, router):
+        """Forget the cached devices of a router that is being resynced.
+
+        Its devices may have been changed or deleted by other processes
+        while the agent was out of sync.
+        """
+        if not self.conf.use_namespaces:
+            self.device_inventory.invalidate()
+            return
+        self.device_inventory.invalidate(NS_PREFIX + router['id'])
+        if router.get('distributed'):
+            self.device_inventory.invalidate(
+                self.get_snat_ns_name(router['id']))
+            gw_port = router.get('gw_port')
+            if gw_port:
+                self.device_inventory.invalidate(
+                    self.get_fip_ns_name(gw_port['network_id']))
+
     @periodic_task.periodic_task
     def periodic_sync_routers_task(self, context):
         self._sync_routers_task(context)
@@ -1892,11 +1991,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         try:
             router_ids = self._router_ids()
             timestamp = timeutils.utcnow()
-            routers = self.plugin_rpc.get_routers(
-                context, router_ids)
+            routers = self._fetch_routers(context, router_ids)
 
             LOG.debug(_('Processing :%r'), routers)
             for r in routers:
+                self._invalidate_router_devices(r)
                 update = RouterUpdate(r['id'],
                                       PRIORITY_SYNC_ROUTERS_TASK,
                                       router=r,
@@ -1993,6 +2092,23 @@ class L3NATAgentWithStateReport(L3NATAgent):
                 self._report_state)
             self.heartbeat.start(interval=report_interval)
 
+    def _log_router_latencies(self):
+        """Log the latencies of the router updates since the last report.
+
+        They are not reported in the agent configurations, which would then
+        change on every report.
+        """
+        router_latencies, self.router_latencies = self.router_latencies, {}
+        latencies = [latency['queued'] + latency['processing']
+                     for latency in router_latencies.values()]
+        if latencies:
+            LOG.info(_("Updated %(routers)d routers since the last report, "
+                       "in %(average).3f seconds on average and "
+                       "%(max).3f seconds at most"),
+                     {'routers': len(latencies),
+                      'average': sum(latencies) / len(latencies),
+                      'max': max(latencies)})
+
     def _report_state(self):
         LOG.debug(_("Report state task started"))
         num_ex_gw_ports = 0
@@ -2013,6 +2129,7 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        self._log_router_latencies()
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -199,12 +199,21 @@ class DhcpLocalProcess(DhcpBase):
     def enable(self):
         """Enables DHCP for this network by spawning a local process."""
         if self.active:
+            if self._enable_dhcp() and self._reuse_process():
+                return
             self.restart()
         elif self._enable_dhcp():
             interface_name = self.device_manager.setup(self.network)
             self.interface_name = interface_name
             self.spawn_process()
 
+    def _reuse_process(self):
+        """Reconfigure the running process instead of restarting it.
+
+        Returns False if the process must be restarted.
+        """
+        return False
+
     def disable(self, retain_port=False):
         """Disable DHCP for this network by killing the local process."""
         pid = self.pid
@@ -315,6 +324,10 @@ class Dnsmasq(DhcpLocalProcess):
     MINIMUM_VERSION = 2.63
     MINIMUM_IPV6_VERSION = 2.67
 
+    # What was last written in the configuration files of each network, so
+    # that reload_allocations only rewrites them when their content changes.
+    _config_cache = {}
+
     @classmethod
     def check_version(cls):
         ver = 0
@@ -360,6 +373,40 @@ class Dnsmasq(DhcpLocalProcess):
             self.NEUTRON_NETWORK_ID_KEY: self.network.id,
         }
 
+        self.get_conf_file_name('pid', ensure_conf_dir=True)
+        self._output_config_files(force=True)
+        cmd = self._build_cmdline()
+
+        ip_wrapper = ip_lib.IPWrapper(self.root_helper,
+                                      self.network.namespace)
+        ip_wrapper.netns.execute(cmd, addl_env=env)
+
+    def _reuse_process(self):
+        """Keep the running dnsmasq if it was spawned with the same options.
+
+        The DHCP port and device are set up as usual. If the running process
+        serves the same interface with the same options, only its
+        configuration files are updated, and it is only reloaded if they
+        changed.
+        """
+        interface_name = self.device_manager.setup(self.network)
+        if interface_name != self.interface_name:
+            return False
+        try:
+            with open('/proc/%s/cmdline' % self.pid, 'r') as f:
+                cmdline = [arg for arg in f.read().split('\0') if arg]
+        except IOError:
+            return False
+        if cmdline != self._build_cmdline():
+            return False
+
+        LOG.debug(_('Reusing running dnsmasq for network %s'),
+                  self.network.id)
+        self.reload_allocations()
+        return True
+
+    def _build_cmdline(self):
+        """Return the dnsmasq command line for the network."""
         cmd = [
             'dnsmasq',
             '--no-hosts',
@@ -368,11 +415,10 @@ class Dnsmasq(DhcpLocalProcess):
             '--bind-interfaces',
             '--interface=%s' % self.interface_name,
             '--except-interface=lo',
-            '--pid-file=%s' % self.get_conf_file_name(
-                'pid', ensure_conf_dir=True),
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
-            '--addn-hosts=%s' % self._output_addn_hosts_file(),
-            '--dhcp-optsfile=%s' % self._output_opts_file(),
+            '--pid-file=%s' % self.get_conf_file_name('pid'),
+            '--dhcp-hostsfile=%s' % self.get_conf_file_name('host'),
+            '--addn-hosts=%s' % self.get_conf_file_name('addn_hosts'),
+            '--dhcp-optsfile=%s' % self.get_conf_file_name('opts'),
             '--leasefile-ro',
         ]
 
@@ -427,10 +473,7 @@ class Dnsmasq(DhcpLocalProcess):
 
         if self.conf.dhcp_domain:
             cmd.append('--domain=%s' % self.conf.dhcp_domain)
-
-        ip_wrapper = ip_lib.IPWrapper(self.root_helper,
-                                      self.network.namespace)
-        ip_wrapper.netns.execute(cmd, addl_env=env)
+        return cmd
 
     def _release_lease(self, mac_address, ip):
         """Release a DHCP lease."""
@@ -450,14 +493,15 @@ class Dnsmasq(DhcpLocalProcess):
             return
 
         self._release_unused_leases()
-        self._output_hosts_file()
-        self._output_addn_hosts_file()
-        self._output_opts_file()
-        if self.active:
+        changed = self._output_config_files()
+        if not self.active:
+            LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
+        elif changed:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
         else:
-            LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
+            LOG.debug(_('DHCP configuration of network %s is unchanged, '
+                        'not reloading dnsmasq'), self.network.id)
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
         self.device_manager.update(self.network, self.interface_name)
 
@@ -490,7 +534,117 @@ class Dnsmasq(DhcpLocalProcess):
                     fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
                 yield (port, alloc, hostname, fqdn)
 
-    def _output_hosts_file(self):
+    def _remove_config_files(self):
+        super(Dnsmasq, self)._remove_config_files()
+        self._config_cache.pop(self.network.id, None)
+
+    def _output_config_files(self, force=False):
+        """Write the configuration files whose content changed.
+
+        The hosts entries of each port and what the opts file is built from
+        are compared to what was last written for the network, regardless of
+        the order of the ports, subnets and addresses. Returns True if any
+        file was written, in which case dnsmasq must be reloaded.
+        """
+        cache = self._config_cache.setdefault(self.network.id, {})
+        changed = False
+
+        entries = self._get_host_entries()
+        host_lines = dict((port_id, (sorted(hosts), sorted(addn_hosts)))
+                          for port_id, (hosts, addn_hosts)
+                          in entries.iteritems())
+        old_host_lines = cache.get('hosts')
+        if (force or old_host_lines is None or
+                host_lines != old_host_lines or
+                not os.path.exists(self.get_conf_file_name('host'))):
+            if old_host_lines is not None:
+                added = set(host_lines) - set(old_host_lines)
+                removed = set(old_host_lines) - set(host_lines)
+                updated = [port_id for port_id in host_lines
+                           if port_id in old_host_lines and
+                           host_lines[port_id] != old_host_lines[port_id]]
+                LOG.debug(_('Host entries of network %(net)s: %(added)d '
+                            'ports added, %(removed)d removed, %(updated)d '
+                            'updated'),
+                          {'net': self.network.id, 'added': len(added),
+                           'removed': len(removed), 'updated': len(updated)})
+            self._output_hosts_file(entries)
+            self._output_addn_hosts_file(entries)
+            cache['hosts'] = host_lines
+            changed = True
+
+        opts_sources = self._get_opts_sources()
+        if (force or opts_sources != cache.get('opts') or
+                not os.path.exists(self.get_conf_file_name('opts'))):
+            self._output_opts_file()
+            cache['opts'] = opts_sources
+            changed = True
+        return changed
+
+    def _get_host_entries(self):
+        """Return the hosts and addn_hosts file lines of each port.
+
+        The result is an ordered dict of port id to a tuple of the list of
+        lines of the hosts file and the list of lines of the addn_hosts file.
+        """
+        entries = collections.OrderedDict()
+        for (port, alloc, hostname, fqdn) in self._iter_hosts():
+            hosts, addn_hosts = entries.setdefault(port.id, ([], []))
+            # (dzyu) Check if it is legal ipv6 address, if so, need wrap
+            # it with '[]' to let dnsmasq to distinguish MAC address from
+            # IPv6 address.
+            ip_address = alloc.ip_address
+            if netaddr.valid_ipv6(ip_address):
+                ip_address = '[%s]' % ip_address
+
+            if getattr(port, 'extra_dhcp_opts', False):
+                hosts.append('%s,%s,%s,%s%s\n' %
+                             (port.mac_address, fqdn, ip_address,
+                              'set:', port.id))
+            else:
+                hosts.append('%s,%s,%s\n' %
+                             (port.mac_address, fqdn, ip_address))
+            # It is compulsory to write the `fqdn` before the `hostname` in
+            # order to obtain it in PTR responses.
+            addn_hosts.append('%s\t%s %s\n' %
+                              (alloc.ip_address, fqdn, hostname))
+        return entries
+
+    def _get_opts_sources(self):
+        """Return the attributes the opts file is generated from.
+
+        These are the subnets, the extra DHCP options of the ports and the
+        addresses of the DHCP and router ports. They are sorted, except for
+        the DNS servers whose order is meaningful, so that a different order
+        of the same items does not cause a rewrite.
+        """
+        subnets = sorted(
+            (subnet.id, subnet.cidr, subnet.ip_version, subnet.enable_dhcp,
+             subnet.gateway_ip,
+             tuple(getattr(subnet, 'dns_nameservers', None) or []),
+             tuple(sorted((hr.destination, hr.nexthop)
+                          for hr in getattr(subnet, 'host_routes',
+                                            None) or [])),
+             getattr(subnet, 'ipv6_address_mode', None),
+             getattr(subnet, 'ipv6_ra_mode', None))
+            for subnet in self.network.subnets)
+        ports = []
+        for port in self.network.ports:
+            extra_dhcp_opts = getattr(port, 'extra_dhcp_opts', None) or []
+            if (not extra_dhcp_opts and port.device_owner not in (
+                    constants.DEVICE_OWNER_DHCP,
+                    constants.DEVICE_OWNER_ROUTER_INTF,
+                    constants.DEVICE_OWNER_DVR_INTERFACE)):
+                continue
+            ports.append(
+                (port.id, port.device_owner,
+                 tuple(sorted((ip.subnet_id, ip.ip_address)
+                              for ip in port.fixed_ips)),
+                 tuple(sorted((opt.opt_name, opt.opt_value)
+                              for opt in extra_dhcp_opts))))
+        return subnets, sorted(ports)
+
+    def _output_hosts_file(self, entries=None):
         """Writes a dnsmasq compatible dhcp hosts file.
 
         The generated file is sent to the --dhcp-hostsfile option of dnsmasq,
@@ -506,29 +660,14 @@ class Dnsmasq(DhcpLocalProcess):
         should receive a dhcp lease, the hosts resolution in itself is
         defined by the `_output_addn_hosts_file` method.
         """
+        if entries is None:
+            entries = self._get_host_entries()
         buf = six.StringIO()
         filename = self.get_conf_file_name('host')
 
         LOG.debug(_('Building host file: %s'), filename)
-        for (port, alloc, hostname, name) in self._iter_hosts():
-            # (dzyu) Check if it is legal ipv6 address, if so, need wrap
-            # it with '[]' to let dnsmasq to distinguish MAC address from
-            # IPv6 address.
-            ip_address = alloc.ip_address
-            if netaddr.valid_ipv6(ip_address):
-                ip_address = '[%s]' % ip_address
-
-            LOG.debug(_('Adding %(mac)s : %(name)s : %(ip)s'),
-                      {"mac": port.mac_address, "name": name,
-                       "ip": ip_address})
-
-            if getattr(port, 'extra_dhcp_opts', False):
-                buf.write('%s,%s,%s,%s%s\n' %
-                          (port.mac_address, name, ip_address,
-                           'set:', port.id))
-            else:
-                buf.write('%s,%s,%s\n' %
-                          (port.mac_address, name, ip_address))
+        for hosts, _addn_hosts in entries.itervalues():
+            buf.writelines(hosts)
 
         utils.replace_file(filename, buf.getvalue())
         LOG.debug(_('Done building host file %s'), filename)
@@ -555,7 +694,7 @@ class Dnsmasq(DhcpLocalProcess):
         for ip, mac in old_leases - new_leases:
             self._release_lease(mac, ip)
 
-    def _output_addn_hosts_file(self):
+    def _output_addn_hosts_file(self, entries=None):
         """Writes a dnsmasq compatible additional hosts file.
 
         The generated file is sent to the --addn-hosts option of dnsmasq,
@@ -565,11 +704,11 @@ class Dnsmasq(DhcpLocalProcess):
         Each line in this file is in the same form as a standard /etc/hosts
         file.
         """
+        if entries is None:
+            entries = self._get_host_entries()
         buf = six.StringIO()
-        for (port, alloc, hostname, fqdn) in self._iter_hosts():
-            # It is compulsory to write the `fqdn` before the `hostname` in
-            # order to obtain it in PTR responses.
-            buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+        for _hosts, addn_hosts in entries.itervalues():
+            buf.writelines(addn_hosts)
         addn_hosts = self.get_conf_file_name('addn_hosts')
         utils.replace_file(addn_hosts, buf.getvalue())
         return addn_hosts
@@ -807,6 +946,65 @@ class Dnsmasq(DhcpLocalProcess):
             sock.close()
 
 
+def _get_dhcp_port_requests(network, device_id):
+    """Return the DHCP port of a network and the requests to set it up.
+
+    Returns a tuple of the port with device_id, or None, and of the list of
+    (port id, port body) requests to try in turn until one of them returns a
+    port. The port id is None if a port must be created. The list is empty
+    if the port already has an address on all the DHCP enabled subnets.
+    """
+    dhcp_enabled_subnet_ids = [subnet.id for subnet in network.subnets
+                               if subnet.enable_dhcp]
+    reserved_ports = []
+    for port in network.ports:
+        port_device_id = getattr(port, 'device_id', None)
+        if port_device_id == device_id:
+            port_fixed_ips = [{'subnet_id': fixed_ip.subnet_id,
+                               'ip_address': fixed_ip.ip_address}
+                              for fixed_ip in port.fixed_ips]
+            port_subnet_ids = set(fixed_ip.subnet_id
+                                  for fixed_ip in port.fixed_ips)
+            missing_subnet_ids = [subnet_id
+                                  for subnet_id in dhcp_enabled_subnet_ids
+                                  if subnet_id not in port_subnet_ids]
+            if not missing_subnet_ids:
+                return port, []
+            port_fixed_ips.extend(dict(subnet_id=subnet_id)
+                                  for subnet_id in missing_subnet_ids)
+            return port, [(port.id, {'port': {'network_id': network.id,
+                                              'fixed_ips': port_fixed_ips}})]
+        if port_device_id == constants.DEVICE_ID_RESERVED_DHCP_PORT:
+            reserved_ports.append(port)
+
+    requests = [(port.id, {'port': {'network_id': network.id,
+                                    'device_id': device_id}})
+                for port in reserved_ports]
+    requests.append((None, {'port': dict(
+        name='',
+        admin_state_up=True,
+        device_id=device_id,
+        network_id=network.id,
+        tenant_id=network.tenant_id,
+        fixed_ips=[dict(subnet_id=subnet_id)
+                   for subnet_id in dhcp_enabled_subnet_ids])}))
+    return None, requests
+
+
+def get_dhcp_port_request(network, device_id):
+    """Return the change needed to the DHCP port of a network.
+
+    Returns None if the port with device_id is up to date. Otherwise returns
+    the first request DeviceManager.setup_dhcp_port would send, as a tuple
+    of the id of the port to update, or None if a port must be created, and
+    of the port body, so that the changes of several networks can be sent
+    at once.
+    """
+    _port, requests = _get_dhcp_port_requests(network, device_id)
+    if requests:
+        return requests[0]
+
+
 class DeviceManager(object):
 
     def __init__(self, conf, root_helper, plugin):
@@ -880,66 +1078,21 @@ class DeviceManager(object):
         """Create/update DHCP port for the host if needed and return port."""
 
         device_id = self.get_device_id(network)
-        subnets = {}
-        dhcp_enabled_subnet_ids = []
-        for subnet in network.subnets:
-            if subnet.enable_dhcp:
-                dhcp_enabled_subnet_ids.append(subnet.id)
-                subnets[subnet.id] = subnet
-
-        dhcp_port = None
-        for port in network.ports:
-            port_device_id = getattr(port, 'device_id', None)
-            if port_device_id == device_id:
-                port_fixed_ips = []
-                for fixed_ip in port.fixed_ips:
-                    port_fixed_ips.append({'subnet_id': fixed_ip.subnet_id,
-                                           'ip_address': fixed_ip.ip_address})
-                    if fixed_ip.subnet_id in dhcp_enabled_subnet_ids:
-                        dhcp_enabled_subnet_ids.remove(fixed_ip.subnet_id)
-
-                # If there are dhcp_enabled_subnet_ids here that means that
-                # we need to add those to the port and call update.
-                if dhcp_enabled_subnet_ids:
-                    port_fixed_ips.extend(
-                        [dict(subnet_id=s) for s in dhcp_enabled_subnet_ids])
-                    dhcp_port = self.plugin.update_dhcp_port(
-                        port.id, {'port': {'network_id': network.id,
-                                           'fixed_ips': port_fixed_ips}})
-                    if not dhcp_port:
-                        raise exceptions.Conflict()
-                else:
-                    dhcp_port = port
-                # break since we found port that matches device_id
-                break
+        subnets = dict((subnet.id, subnet) for subnet in network.subnets
+                       if subnet.enable_dhcp)
 
-        # check for a reserved DHCP port
-        if dhcp_port is None:
-            LOG.debug(_('DHCP port %(device_id)s on network %(network_id)s'
-                        ' does not yet exist. Checking for a reserved port.'),
-                      {'device_id': device_id, 'network_id': network.id})
-            for port in network.ports:
-                port_device_id = getattr(port, 'device_id', None)
-                if port_device_id == constants.DEVICE_ID_RESERVED_DHCP_PORT:
-                    dhcp_port = self.plugin.update_dhcp_port(
-                        port.id, {'port': {'network_id': network.id,
-                                           'device_id': device_id}})
-                    if dhcp_port:
-                        break
-
-        # DHCP port has not yet been created.
+        dhcp_port, requests = _get_dhcp_port_requests(network, device_id)
         if dhcp_port is None:
             LOG.debug(_('DHCP port %(device_id)s on network %(network_id)s'
                         ' does not yet exist.'), {'device_id': device_id,
                                                   'network_id': network.id})
-            port_dict = dict(
-                name='',
-                admin_state_up=True,
-                device_id=device_id,
-                network_id=network.id,
-                tenant_id=network.tenant_id,
-                fixed_ips=[dict(subnet_id=s) for s in dhcp_enabled_subnet_ids])
-            dhcp_port = self.plugin.create_dhcp_port({'port': port_dict})
+        for port_id, port_body in requests:
+            if port_id is None:
+                dhcp_port = self.plugin.create_dhcp_port(port_body)
+            else:
+                dhcp_port = self.plugin.update_dhcp_port(port_id, port_body)
+            if dhcp_port:
+                break
 
         if not dhcp_port:
             raise exceptions.Conflict()
@@ -121,6 +121,31 @@ class IPWrapper(SubProcessBase):
                                        self.namespace))
         return retval
 
+    def get_devices_addresses(self, exclude_loopback=False):
+        """Return a dict of device names to the list of their CIDRs.
+
+        All the devices of the namespace are listed by a single command.
+        """
+        retval = {}
+        addresses = None
+        output = self._execute([], 'addr', ('show',),
+                               self.root_helper, self.namespace)
+        for line in output.split('\n'):
+            if line[:1].isdigit():
+                tokens = line.split()
+                if len(tokens) < 2:
+                    continue
+                name = tokens[1].rstrip(':').partition('@')[0]
+                if exclude_loopback and name == LOOPBACK_DEVNAME:
+                    addresses = None
+                    continue
+                addresses = retval.setdefault(name, [])
+            elif addresses is not None:
+                parts = line.split()
+                if parts and parts[0] in ('inet', 'inet6'):
+                    addresses.append(parts[1])
+        return retval
+
     def add_tuntap(self, name, mode='tap'):
         self._as_root('', 'tuntap', ('add', name, 'mode', mode))
         return IPDevice(name, self.root_helper, self.namespace)
@@ -196,6 +221,89 @@ class IPWrapper(SubProcessBase):
         return [l.strip() for l in output.split('\n')]
 
 
+class DeviceInventory(object):
+    """Devices and addresses of namespaces, kept in memory.
+
+    The content of a namespace is listed with a single command the first
+    time it is needed. Callers then report the changes they make, so that
+    later lookups are answered without running any command. A device whose
+    addresses were changed in ways not reported is marked as changed; its
+    namespace is listed again the next time its addresses are needed. Devices
+    deleted by other processes are not reported, so callers about to skip
+    plugging a device ask for it to be verified, and forget the inventory
+    periodically.
+    """
+
+    def __init__(self, root_helper=None):
+        self.root_helper = root_helper
+        # namespace -> {device name -> list of CIDRs, or None if unknown}
+        self._namespaces = {}
+
+    def _get_namespace(self, namespace, reload=False):
+        devices = self._namespaces.get(namespace)
+        if devices is None or reload:
+            ip_wrapper = IPWrapper(self.root_helper, namespace)
+            try:
+                devices = ip_wrapper.get_devices_addresses(
+                    exclude_loopback=True)
+            except RuntimeError:
+                # The namespace does not exist (yet)
+                return {}
+            self._namespaces[namespace] = devices
+        return devices
+
+    def get_devices(self, namespace=None):
+        return list(self._get_namespace(namespace))
+
+    def device_exists(self, device_name, namespace=None, verify=False):
+        """Return True if the device is in the namespace.
+
+        With verify, a device found in the inventory is also looked up on the
+        system, since it may have been deleted by another process.
+        """
+        if device_name not in self._get_namespace(namespace):
+            return False
+        if verify and not device_exists(device_name, self.root_helper,
+                                        namespace):
+            self.device_removed(device_name, namespace)
+            return False
+        return True
+
+    def get_addresses(self, device_name, namespace=None):
+        devices = self._get_namespace(namespace)
+        if device_name in devices and devices[device_name] is None:
+            devices = self._get_namespace(namespace, reload=True)
+        return list(devices.get(device_name) or [])
+
+    def device_changed(self, device_name, namespace=None):
+        """Record that a device was added or its addresses changed."""
+        devices = self._namespaces.get(namespace)
+        if devices is not None:
+            devices[device_name] = None
+
+    def device_removed(self, device_name, namespace=None):
+        devices = self._namespaces.get(namespace)
+        if devices is not None:
+            devices.pop(device_name, None)
+
+    def address_added(self, device_name, cidr, namespace=None):
+        addresses = self._namespaces.get(namespace, {}).get(device_name)
+        if addresses is not None and cidr not in addresses:
+            addresses.append(cidr)
+
+    def address_removed(self, device_name, cidr, namespace=None):
+        addresses = self._namespaces.get(namespace, {}).get(device_name)
+        if addresses is not None and cidr in addresses:
+            addresses.remove(cidr)
+
+    def invalidate(self, namespace=None):
+        """Forget a namespace, so it is listed again when needed."""
+        self._namespaces.pop(namespace, None)
+
+    def invalidate_all(self):
+        self._namespaces.clear()
+
+
 class IpRule(IPWrapper):
     def add_rule_from(self, ip, table, rule_pr):
         args = ['add', 'from', ip, 'lookup', table, 'priority', rule_pr]
@@ -18,10 +18,13 @@
 
 """Implements iptables rules using linux utilities."""
 
+import difflib
 import inspect
 import os
 import re
 
+from oslo.config import cfg
+
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
 from neutron.openstack.common import excutils
@@ -30,6 +33,17 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+OPTS = [
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_('Keep the last applied iptables state in memory and '
+                       'only push the chains that changed with '
+                       'iptables-restore --noflush, instead of doing a full '
+                       'iptables-save/iptables-restore on every apply. A '
+                       'full resync is done whenever an incremental update '
+                       'fails, e.g. because of out-of-band changes.')),
+]
+cfg.CONF.register_opts(OPTS)
+
 
 # NOTE(vish): Iptables supports chain names of up to 28 characters,  and we
 #             add up to 12 characters to binary_name which is used as a prefix,
@@ -58,6 +72,59 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _strip_rule_counters(line):
+    """Strip the [packet:byte] counts from an iptables-save rule line."""
+    if line.startswith('['):
+        # for example, "[0:0] -A neutron-billing..."
+        line = line.split('] ', 1)[1]
+    return line.strip()
+
+
+def _parse_table(lines):
+    """Split the lines of one iptables-save table into chains and rules.
+
+    Returns a list of chain declarations in order and a dict mapping each
+    chain name to the list of its rules, counters and '-A <chain>' stripped.
+    """
+    chains = []
+    rules = {}
+    for line in lines:
+        line = line.strip()
+        if line.startswith(':'):
+            name = line[1:].split(' ', 1)[0]
+            chains.append(name)
+            rules.setdefault(name, [])
+        elif line.startswith('[') or line.startswith('-A '):
+            parts = _strip_rule_counters(line).split(' ', 2)
+            rules.setdefault(parts[1], []).append(
+                parts[2] if len(parts) > 2 else '')
+    return chains, rules
+
+
+def _generate_chain_diff_iptables_commands(chain, old_rules, new_rules):
+    """Generate iptables commands to turn old_rules into new_rules.
+
+    Rules are deleted by specification rather than by position so that a
+    chain modified behind our back makes iptables-restore fail instead of
+    deleting the wrong rule.
+    """
+    statements = []
+    position = 1
+    matcher = difflib.SequenceMatcher(None, old_rules, new_rules,
+                                      autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            position += i2 - i1
+            continue
+        for rule in old_rules[i1:i2]:
+            statements.append(('-D %s %s' % (chain, rule)).strip())
+        for rule in new_rules[j1:j2]:
+            statements.append(
+                ('-I %s %d %s' % (chain, position, rule)).strip())
+            position += 1
+    return statements
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -293,6 +360,10 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        self.incremental_apply = cfg.CONF.iptables_incremental_apply
+        # Last set of lines pushed by iptables-restore, per command. Only
+        # used when incremental_apply is enabled.
+        self._applied_lines = {}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -403,46 +474,119 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
+            if self.incremental_apply and cmd in self._applied_lines:
+                try:
+                    self._apply_incremental(cmd, tables)
+                    continue
+                except RuntimeError:
+                    LOG.warn(_('Incremental %s update failed, doing a full '
+                               'resync'), cmd)
+                    del self._applied_lines[cmd]
+            self._apply_full(cmd, tables)
+        LOG.debug(_("IPTablesManager.apply completed with success"))
+
+    def _apply_full(self, cmd, tables):
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        args = ['%s-restore' % (cmd,), '-c']
+        self._restore(args, all_lines)
+        if self.incremental_apply:
+            self._applied_lines[cmd] = all_lines
+
+    def _apply_incremental(self, cmd, tables):
+        """Push only the chains changed since the last apply.
+
+        The new state is computed from the lines we last restored rather
+        than from a fresh iptables-save, and only the difference between the
+        two is fed to iptables-restore --noflush.
+        """
+        # _modify_rules consumes the pending removals, keep them around in
+        # case we have to fall back to a full resync.
+        removals = dict((name, (set(table.remove_chains),
+                                list(table.remove_rules)))
+                        for name, table in tables.items())
+        old_lines = self._applied_lines[cmd]
+        new_lines = list(old_lines)
+        for table_name in sorted(tables):
+            start, end = self._find_table(new_lines, table_name)
+            new_lines[start:end] = self._modify_rules(
+                new_lines[start:end], tables[table_name], table_name)
+
+        commands = []
+        for table_name in sorted(tables):
+            commands += self._generate_table_diff_iptables_commands(
+                table_name, old_lines, new_lines)
+        if commands:
             try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             root_helper=self.root_helper)
-            except RuntimeError as r_error:
+                self._restore(['%s-restore' % (cmd,), '-n'], commands)
+            except RuntimeError:
                 with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_("IPTablesManager.apply failed to apply the "
-                                "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+                    for name, (chains, rules) in removals.items():
+                        tables[name].remove_chains.update(chains)
+                        tables[name].remove_rules[:] = rules
+        self._applied_lines[cmd] = new_lines
+
+    def _generate_table_diff_iptables_commands(self, table_name,
+                                               old_lines, new_lines):
+        start, end = self._find_table(old_lines, table_name)
+        old_chains, old_rules = _parse_table(old_lines[start:end])
+        start, end = self._find_table(new_lines, table_name)
+        new_chains, new_rules = _parse_table(new_lines[start:end])
+        if old_rules == new_rules:
+            return []
+
+        # With --noflush, declaring a chain that already exists flushes it,
+        # so only new chains are declared.
+        statements = [':%s - [0:0]' % chain for chain in new_chains
+                      if chain not in old_rules]
+        for chain in new_chains:
+            statements += _generate_chain_diff_iptables_commands(
+                chain, old_rules.get(chain, []), new_rules[chain])
+        # Jumps to removed chains are gone by now, so they can be deleted.
+        for chain in old_chains:
+            if chain not in new_rules:
+                statements += ['-F %s' % chain, '-X %s' % chain]
+        if not statements:
+            return []
+        return ['*%s' % table_name] + statements + ['COMMIT']
+
+    def _restore(self, args, all_lines):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         root_helper=self.root_helper)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_("IPTablesManager.apply failed to apply the "
+                            "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
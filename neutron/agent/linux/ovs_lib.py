@@ -16,9 +16,11 @@
 import itertools
 import operator
 
+import eventlet
 from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ovsdb_native
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 from neutron.openstack.common import excutils
@@ -32,10 +34,27 @@ DEFAULT_OVS_VSCTL_TIMEOUT = 10
 # Special return value for an invalid OVS ofport
 INVALID_OFPORT = '-1'
 
+# Seconds between two lookups of the ofport of a port added natively
+OFPORT_POLL_INTERVAL = 0.1
+
+# Flow mod commands of an 'ovs-ofctl add-flows' file, as used by bundles
+BUNDLE_FLOW_COMMANDS = {'add': 'add', 'mod': 'modify', 'del': 'delete'}
+
 OPTS = [
     cfg.IntOpt('ovs_vsctl_timeout',
                default=DEFAULT_OVS_VSCTL_TIMEOUT,
                help=_('Timeout in seconds for ovs-vsctl commands')),
+    cfg.StrOpt('ovsdb_interface', default='vsctl',
+               choices=['vsctl', 'native'],
+               help=_('The interface for interacting with the OVSDB. '
+                      '"native" keeps an in-process replica of the Bridge, '
+                      'Port and Interface tables instead of running '
+                      'ovs-vsctl for every query.')),
+    cfg.StrOpt('ovsdb_connection', default='tcp:127.0.0.1:6640',
+               help=_('The connection string for the native OVSDB '
+                      'interface, either tcp:IP:PORT or unix:PATH. The '
+                      'agent must be allowed to connect to it, e.g. with '
+                      '"ovs-vsctl set-manager ptcp:6640:127.0.0.1".')),
 ]
 cfg.CONF.register_opts(OPTS)
 
@@ -62,6 +81,20 @@ class BaseOVS(object):
     def __init__(self, root_helper):
         self.root_helper = root_helper
         self.vsctl_timeout = cfg.CONF.ovs_vsctl_timeout
+        self.ovsdb = None
+        if cfg.CONF.ovsdb_interface == 'native':
+            self.ovsdb = ovsdb_native.get_connection(
+                cfg.CONF.ovsdb_connection)
+
+    def _native(self, table=None, column=None):
+        """Whether a query can be answered by the native OVSDB replica.
+
+        Until the replica is loaded, and whenever the connection is lost,
+        ovs-vsctl is used instead.
+        """
+        if not (self.ovsdb and self.ovsdb.connected):
+            return False
+        return table is None or self.ovsdb.is_monitored(table, column)
 
     def run_vsctl(self, args, check_error=False):
         full_args = ["ovs-vsctl", "--timeout=%d" % self.vsctl_timeout] + args
@@ -108,6 +141,8 @@ class OVSBridge(BaseOVS):
     def __init__(self, br_name, root_helper):
         super(OVSBridge, self).__init__(root_helper)
         self.br_name = br_name
+        self._deferred_flows = None
+        self._use_bundle = False
 
     def set_controller(self, controller_names):
         vsctl_command = ['--', 'set-controller', self.br_name]
@@ -145,22 +180,62 @@ class OVSBridge(BaseOVS):
         self.create()
 
     def add_port(self, port_name):
+        if self._native_updates():
+            return self._add_port_native(port_name)
         self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
                         port_name])
         return self.get_port_ofport(port_name)
 
+    def _native_updates(self, table='Interface'):
+        """Whether table can be updated through a native transaction."""
+        return self._native() and table in self.ovsdb.schema
+
+    def _add_port_native(self, port_name, iface_type=None, options=None):
+        """Add a port and set its interface in a single transaction."""
+        if not self._transact_db(lambda txn: txn.add_port(
+                self.br_name, port_name, iface_type, options)):
+            return INVALID_OFPORT
+        # Unlike ovs-vsctl, the transaction does not wait for ovs-vswitchd
+        # to assign the ofport, which then shows up in the replica.
+        for _i in range(int(self.vsctl_timeout / OFPORT_POLL_INTERVAL)):
+            iface = self.ovsdb.find_row('Interface', port_name)
+            if iface and iface.get('ofport') != []:
+                break
+            eventlet.sleep(OFPORT_POLL_INTERVAL)
+        return self.get_port_ofport(port_name)
+
     def delete_port(self, port_name):
         self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
                         port_name])
 
     def set_db_attribute(self, table_name, record, column, value):
+        if self._native_updates(table_name):
+            self._transact_db(lambda txn: txn.db_set(table_name, record,
+                                                     column, value))
+            return
         args = ["set", table_name, record, "%s=%s" % (column, value)]
         self.run_vsctl(args)
 
     def clear_db_attribute(self, table_name, record, column):
+        if self._native_updates(table_name):
+            self._transact_db(lambda txn: txn.db_clear(table_name, record,
+                                                       column))
+            return
         args = ["clear", table_name, record, column]
         self.run_vsctl(args)
 
+    def _transact_db(self, add_operations):
+        """Commit the operations added by add_operations, return success."""
+        try:
+            with self.ovsdb.transaction() as txn:
+                add_operations(txn)
+        except Exception as e:
+            LOG.error(_("Unable to execute OVSDB transaction %(ops)s. "
+                        "Exception: %(exception)s"),
+                      {'ops': txn.operations, 'exception': e})
+            return False
+        return True
+
     def run_ofctl(self, cmd, args, process_input=None):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
         try:
@@ -175,6 +250,9 @@ class OVSBridge(BaseOVS):
         return len(flow_list) - 1
 
     def remove_all_flows(self):
+        if self._deferred_flows:
+            # Flows queued so far would be removed anyway
+            self._deferred_flows = []
         self.run_ofctl("del-flows", [])
 
     def get_port_ofport(self, port_name):
@@ -193,8 +271,60 @@ class OVSBridge(BaseOVS):
 
     def do_action_flows(self, action, kwargs_list):
         flow_strs = [_build_flow_expr_str(kw, action) for kw in kwargs_list]
+        if self._deferred_flows is not None:
+            self._deferred_flows.extend((action, flow_str)
+                                        for flow_str in flow_strs)
+            return
         self.run_ofctl('%s-flows' % action, ['-'], '\n'.join(flow_strs))
 
+    def defer_apply_on(self, use_bundle=False):
+        """Queue flow changes until apply_deferred_flows is called.
+
+        Flow changes are applied in the order they were requested, whatever
+        the caller, so a DeferredOVSBridge can still be used meanwhile.
+
+        :param use_bundle: apply the queued flows with a single atomic
+                           'ovs-ofctl --bundle' call, which requires
+                           OpenFlow 1.4 to be enabled on the bridge.
+        """
+        if self._deferred_flows is None:
+            self._deferred_flows = []
+        self._use_bundle = use_bundle
+
+    def defer_apply_off(self):
+        self.apply_deferred_flows()
+        self._deferred_flows = None
+
+    def apply_deferred_flows(self):
+        action_flow_strs = self._deferred_flows
+        if not action_flow_strs:
+            return
+        self._deferred_flows = []
+        if self._use_bundle and self._run_ofctl_bundle(action_flow_strs):
+            return
+        for action, group in itertools.groupby(action_flow_strs,
+                                               key=operator.itemgetter(0)):
+            self.run_ofctl('%s-flows' % action, ['-'],
+                           '\n'.join(flow_str for _action, flow_str in group))
+
+    def _run_ofctl_bundle(self, action_flow_strs):
+        flows = '\n'.join('%s %s' % (BUNDLE_FLOW_COMMANDS[action], flow_str)
+                          for action, flow_str in action_flow_strs)
+        full_args = ['ovs-ofctl', '-O', 'OpenFlow14', '--bundle', 'add-flows',
+                     self.br_name, '-']
+        try:
+            utils.execute(full_args, root_helper=self.root_helper,
+                          process_input=flows)
+            return True
+        except Exception as e:
+            # Nothing has been applied since bundles are atomic
+            LOG.warn(_("Unable to apply %(count)d flows to bridge %(br)s in "
+                       "a bundle, applying them without it. Exception: "
+                       "%(exception)s"),
+                     {'count': len(action_flow_strs), 'br': self.br_name,
+                      'exception': e})
+            return False
+
     def add_flow(self, **kwargs):
         self.do_action_flows('add', [kwargs])
 
@@ -220,6 +350,29 @@ class OVSBridge(BaseOVS):
                         tunnel_type=constants.TYPE_GRE,
                         vxlan_udp_port=constants.VXLAN_UDP_PORT,
                         dont_fragment=True):
+        if self._native_updates():
+            options = {'df_default': str(bool(dont_fragment)).lower(),
+                       'remote_ip': remote_ip,
+                       'local_ip': local_ip,
+                       'in_key': 'flow',
+                       'out_key': 'flow'}
+            if (tunnel_type == constants.TYPE_VXLAN and
+                    vxlan_udp_port != constants.VXLAN_UDP_PORT):
+                options['dst_port'] = vxlan_udp_port
+            ofport = self._add_port_native(port_name, tunnel_type, options)
+        else:
+            ofport = self._add_tunnel_port_vsctl(
+                port_name, remote_ip, local_ip, tunnel_type,
+                vxlan_udp_port, dont_fragment)
+        if (tunnel_type == constants.TYPE_VXLAN and
+                ofport == INVALID_OFPORT):
+            LOG.error(_('Unable to create VXLAN tunnel port. Please ensure '
+                        'that an openvswitch version that supports VXLAN is '
+                        'installed.'))
+        return ofport
+
+    def _add_tunnel_port_vsctl(self, port_name, remote_ip, local_ip,
+                               tunnel_type, vxlan_udp_port, dont_fragment):
         vsctl_command = ["--", "--may-exist", "add-port", self.br_name,
                          port_name]
         vsctl_command.extend(["--", "set", "Interface", port_name,
@@ -235,21 +388,22 @@ class OVSBridge(BaseOVS):
                               "options:in_key=flow",
                               "options:out_key=flow"])
         self.run_vsctl(vsctl_command)
-        ofport = self.get_port_ofport(port_name)
-        if (tunnel_type == constants.TYPE_VXLAN and
-                ofport == INVALID_OFPORT):
-            LOG.error(_('Unable to create VXLAN tunnel port. Please ensure '
-                        'that an openvswitch version that supports VXLAN is '
-                        'installed.'))
-        return ofport
+        return self.get_port_ofport(port_name)
 
     def add_patch_port(self, local_name, remote_name):
+        if self._native_updates():
+            return self._add_port_native(local_name, 'patch',
+                                         {'peer': remote_name})
         self.run_vsctl(["add-port", self.br_name, local_name,
                         "--", "set", "Interface", local_name,
                         "type=patch", "options:peer=%s" % remote_name])
         return self.get_port_ofport(local_name)
 
     def db_get_map(self, table, record, column, check_error=False):
+        if self._native(table, column):
+            row = self.ovsdb.find_row(table, record)
+            if row:
+                return dict(row[column])
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             output_str = output.rstrip("\n\r")
@@ -257,6 +411,10 @@ class OVSBridge(BaseOVS):
         return {}
 
     def db_get_val(self, table, record, column, check_error=False):
+        if self._native(table, column):
+            row = self.ovsdb.find_row(table, record)
+            if row:
+                return ovsdb_native.format_vsctl_value(row[column])
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             return output.rstrip("\n\r")
@@ -272,6 +430,8 @@ class OVSBridge(BaseOVS):
         return ret
 
     def get_port_name_list(self):
+        if self._native():
+            return self.ovsdb.get_bridge_port_names(self.br_name)
         res = self.run_vsctl(["list-ports", self.br_name], check_error=True)
         if res:
             return res.strip().split("\n")
@@ -294,12 +454,20 @@ class OVSBridge(BaseOVS):
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
         edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids",
-                                           check_error=True)
-            ofport = self.db_get_val("Interface", name, "ofport",
-                                     check_error=True)
+        if self._native():
+            interfaces = [
+                (iface['name'], iface['external_ids'],
+                 ovsdb_native.format_vsctl_value(iface['ofport']))
+                for iface in self.ovsdb.get_bridge_interfaces(self.br_name)]
+        else:
+            interfaces = [
+                (name,
+                 self.db_get_map("Interface", name, "external_ids",
+                                 check_error=True),
+                 self.db_get_val("Interface", name, "ofport",
+                                 check_error=True))
+                for name in self.get_port_name_list()]
+        for name, external_ids, ofport in interfaces:
             if "iface-id" in external_ids and "attached-mac" in external_ids:
                 p = VifPort(name, ofport, external_ids["iface-id"],
                             external_ids["attached-mac"], self)
@@ -315,23 +483,29 @@ class OVSBridge(BaseOVS):
 
         return edge_ports
 
-    def get_vif_port_set(self):
+    def _get_interface_rows(self):
+        """Return (name, external_ids, ofport, row) for the bridge ports."""
+        if self._native():
+            return [(iface['name'], iface['external_ids'], iface['ofport'],
+                     iface)
+                    for iface in self.ovsdb.get_bridge_interfaces(
+                        self.br_name)]
         port_names = self.get_port_name_list()
-        edge_ports = set()
         args = ['--format=json', '--', '--columns=name,external_ids,ofport',
                 'list', 'Interface']
         result = self.run_vsctl(args, check_error=True)
         if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
-            name = row[0]
-            if name not in port_names:
-                continue
-            external_ids = dict(row[1][1])
+            return []
+        return [(row[0], dict(row[1][1]), row[2], row)
+                for row in jsonutils.loads(result)['data']
+                if row[0] in port_names]
+
+    def get_vif_port_set(self):
+        edge_ports = set()
+        for name, external_ids, ofport, row in self._get_interface_rows():
             # Do not consider VIFs which aren't yet ready
             # This can happen when ofport values are either [] or ["set", []]
             # We will therefore consider only integer values for ofport
-            ofport = row[2]
             try:
                 int_ofport = int(ofport)
             except (ValueError, TypeError):
@@ -369,6 +543,10 @@ class OVSBridge(BaseOVS):
 
         """
         port_names = self.get_port_name_list()
+        if self._native():
+            return dict((port['name'], port['tag'])
+                        for port in self.ovsdb.find_rows('Port')
+                        if port['name'] in port_names)
         args = ['--format=json', '--', '--columns=name,tag', 'list', 'Port']
         result = self.run_vsctl(args, check_error=True)
         port_tag_dict = {}
@@ -383,7 +561,35 @@ class OVSBridge(BaseOVS):
             port_tag_dict[name] = tag
         return port_tag_dict
 
+    def _get_vif_port_by_id_native(self, port_id):
+        for iface in self.ovsdb.find_rows('Interface'):
+            if iface['external_ids'].get('iface-id') != port_id:
+                continue
+            port_name = iface['name']
+            switch = self.ovsdb.get_bridge_for_iface(port_name)
+            if switch != self.br_name:
+                LOG.info(_("Port: %(port_name)s is on %(switch)s,"
+                           " not on %(br_name)s"), {'port_name': port_name,
+                                                    'switch': switch,
+                                                    'br_name': self.br_name})
+                return
+            ofport = iface['ofport']
+            if not isinstance(ofport, int) or ofport == -1:
+                LOG.warn(_("ofport: %(ofport)s for VIF: %(vif)s is not a "
+                           "positive integer"), {'ofport': ofport,
+                                                 'vif': port_id})
+                return
+            try:
+                vif_mac = iface['external_ids']['attached-mac']
+            except KeyError as e:
+                LOG.warn(_("Unable to parse interface details. "
+                           "Exception: %s"), e)
+                return
+            return VifPort(port_name, ofport, port_id, vif_mac, self)
+
     def get_vif_port_by_id(self, port_id):
+        if self._native():
+            return self._get_vif_port_by_id_native(port_id)
         args = ['--format=json', '--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
                 'external_ids:iface-id="%s"' % port_id]
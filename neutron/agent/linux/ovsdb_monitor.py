@@ -15,11 +15,18 @@
 import eventlet
 
 from neutron.agent.linux import async_process
+from neutron.agent.linux import ovsdb_native
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
 
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
@@ -58,17 +65,24 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
     since the previous access.
+
+    The rows received are also parsed into added and removed devices,
+    returned by get_events(). Events are only complete since the last time
+    the monitor was (re)started, which resync_required tells.
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self.resync_required = True
+        self.new_events = {'added': [], 'removed': []}
+        self._updates_received = False
 
     @property
     def is_active(self):
@@ -85,7 +99,43 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        self.process_events()
+        updates_received = self._updates_received
+        self._updates_received = False
+        return updates_received or not self.is_active
+
+    def process_events(self):
+        """Parse the rows received so far into device events.
+
+        Each device is a dict with the name, ofport and external_ids of
+        the interface. Rows for a modified interface come as an 'old' row
+        with the previous values followed by a 'new' row, only the latter
+        is reported, as added.
+        """
+        for line in self.iter_stdout():
+            self._updates_received = True
+            try:
+                data = jsonutils.loads(line)['data']
+            except (ValueError, KeyError, TypeError):
+                LOG.warn(_('Unable to parse ovsdb monitor output: %s'), line)
+                continue
+            for _uuid, action, name, ofport, external_ids in data:
+                device = {'name': name,
+                          'ofport': ovsdb_native.decode_value(ofport),
+                          'external_ids': ovsdb_native.decode_value(
+                              external_ids)}
+                if action in (OVSDB_ACTION_INITIAL, OVSDB_ACTION_INSERT,
+                              OVSDB_ACTION_NEW):
+                    self.new_events['added'].append(device)
+                elif action == OVSDB_ACTION_DELETE:
+                    self.new_events['removed'].append(device)
+
+    def get_events(self):
+        """Return and forget the device events received so far."""
+        self.process_events()
+        events = self.new_events
+        self.new_events = {'added': [], 'removed': []}
+        return events
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -96,6 +146,8 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        # Changes happening until the monitor is respawned will be missed
+        self.resync_required = True
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
@@ -0,0 +1,471 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process OVSDB client.
+
+Implements the subset of the OVSDB management protocol (RFC 7047) used by
+ovs_lib: the Bridge, Port and Interface tables are monitored over a single
+JSON-RPC connection and kept in a local replica, so that queries are
+answered from memory instead of spawning ovs-vsctl, and updates are sent as
+transactions on the same connection.
+"""
+
+import itertools
+import json
+import re
+import socket
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+OVS_DB = 'Open_vSwitch'
+
+MONITORED_COLUMNS = {
+    'Bridge': ['name', 'ports', 'datapath_id', 'external_ids'],
+    'Port': ['name', 'interfaces', 'tag', 'external_ids'],
+    'Interface': ['name', 'ofport', 'type', 'external_ids', 'options'],
+}
+
+# Seconds to wait between two connection attempts
+RECONNECT_INTERVAL = 1
+RECV_SIZE = 65536
+
+# Strings printed by ovs-vsctl without quotes
+_BARE_STRING_RE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_.:-]*$')
+# Characters delimiting JSON values, outside and inside of strings
+_JSON_DELIMITER_RE = re.compile(r'[{}\[\]"]')
+_JSON_STRING_DELIMITER_RE = re.compile(r'["\\]')
+
+_connections = {}
+
+
+class OvsdbError(Exception):
+    pass
+
+
+def get_connection(connection):
+    """Return the shared, started OvsdbConnection for a connection string."""
+    if connection not in _connections:
+        conn = OvsdbConnection(connection)
+        conn.start()
+        _connections[connection] = conn
+    return _connections[connection]
+
+
+def decode_value(value):
+    """Convert an OVSDB JSON value to a python value.
+
+    Sets become lists, maps become dicts and uuids become strings. Note that
+    OVSDB sends sets of one element as a bare atom.
+    """
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind == 'set':
+            return [decode_value(v) for v in data]
+        if kind == 'map':
+            return dict((decode_value(k), decode_value(v)) for k, v in data)
+        if kind in ('uuid', 'named-uuid'):
+            return data
+    return value
+
+
+def as_list(value):
+    """Return the elements of a decoded set column."""
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _format_atom(atom):
+    if isinstance(atom, bool):
+        return str(atom).lower()
+    if isinstance(atom, (int, long, float)):
+        return str(atom)
+    if _BARE_STRING_RE.match(atom) and atom not in ('true', 'false'):
+        return atom
+    return jsonutils.dumps(atom)
+
+
+def format_vsctl_value(value):
+    """Format a decoded value the way 'ovs-vsctl get' prints it."""
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%s=%s' % (_format_atom(k), _format_atom(v))
+                                  for k, v in sorted(value.items()))
+    if isinstance(value, list):
+        return '[%s]' % ', '.join(_format_atom(v) for v in value)
+    return _format_atom(value)
+
+
+class OvsdbConnection(object):
+    """A monitored connection to the local ovsdb-server.
+
+    The replica is a dict of table name to a dict of row uuid to row, where
+    each row is a dict of the decoded monitored columns.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tables = dict((table, {}) for table in MONITORED_COLUMNS)
+        self.schema = {}
+        self.connected = False
+        self._sock = None
+        self._reset_reader()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._reader = None
+
+    def start(self):
+        self._reader = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._reader:
+            self._reader.kill()
+            self._reader = None
+        self._close()
+
+    def _open_socket(self):
+        proto, _sep, address = self.connection.partition(':')
+        if proto == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(address)
+        elif proto == 'tcp':
+            host, _sep, port = address.rpartition(':')
+            sock = socket.create_connection((host, int(port)))
+        else:
+            raise OvsdbError(_('Unsupported OVSDB connection %s') %
+                             self.connection)
+        return sock
+
+    def _close(self):
+        self.connected = False
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        self._reset_reader()
+        for waiter in self._pending.values():
+            waiter.send_exception(OvsdbError(_('OVSDB connection lost')))
+        self._pending.clear()
+
+    def _run(self):
+        while True:
+            try:
+                self._sock = self._open_socket()
+                self._initialize()
+                while True:
+                    self._dispatch(self._read_message())
+            except (socket.error, OvsdbError) as e:
+                LOG.warn(_('OVSDB connection to %(conn)s failed: %(err)s'),
+                         {'conn': self.connection, 'err': e})
+            self._close()
+            eventlet.sleep(RECONNECT_INTERVAL)
+
+    def _initialize(self):
+        """Fetch the schema and load the replica from a new monitor."""
+        self._send('get_schema', [OVS_DB], 'schema')
+        self.schema = self._read_reply('schema')['tables']
+        requests = dict((table, {'columns': columns})
+                        for table, columns in MONITORED_COLUMNS.items())
+        self._send('monitor', [OVS_DB, None, requests], 'monitor')
+        initial = self._read_reply('monitor')
+        self.tables = dict((table, {}) for table in MONITORED_COLUMNS)
+        self.apply_update(initial)
+        self.connected = True
+        LOG.debug(_('OVSDB replica loaded from %s'), self.connection)
+
+    def _read_reply(self, msg_id):
+        while True:
+            msg = self._read_message()
+            if msg.get('id') == msg_id and 'result' in msg:
+                if msg.get('error'):
+                    raise OvsdbError(msg['error'])
+                return msg['result']
+            self._dispatch(msg)
+
+    def _reset_reader(self):
+        # Data received and not scanned yet
+        self._buffer = ''
+        # Scanned parts of the message being received
+        self._chunks = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def _read_message(self):
+        """Return the next message received on the connection.
+
+        Received data is scanned once for the end of the message, and the
+        message is decoded once complete, so that reading a large reply
+        costs time linear in its size.
+        """
+        while True:
+            data = self._buffer
+            end = self._scan(data)
+            if end is not None:
+                self._chunks.append(data[:end])
+                self._buffer = data[end:]
+                message = ''.join(self._chunks)
+                self._chunks = []
+                try:
+                    return json.loads(message)
+                except ValueError as e:
+                    raise OvsdbError(_('Invalid OVSDB message: %s') % e)
+            self._chunks.append(data)
+            self._buffer = self._sock.recv(RECV_SIZE)
+            if not self._buffer:
+                raise OvsdbError(_('OVSDB connection closed'))
+
+    def _scan(self, data):
+        """Return the end of the message completed in data, or None."""
+        pos = 0
+        if self._escaped:
+            # The previous data ended with a backslash in a string
+            self._escaped = False
+            pos = 1
+        while True:
+            if self._in_string:
+                match = _JSON_STRING_DELIMITER_RE.search(data, pos)
+            else:
+                match = _JSON_DELIMITER_RE.search(data, pos)
+            if match is None:
+                return None
+            char = match.group()
+            pos = match.end()
+            if char == '\\':
+                if pos == len(data):
+                    self._escaped = True
+                    return None
+                pos += 1
+            elif char == '"':
+                self._in_string = not self._in_string
+            elif char in '{[':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if not self._depth:
+                    return pos
+
+    def _send(self, method, params, msg_id):
+        self._sock.sendall(jsonutils.dumps(
+            {'method': method, 'params': params, 'id': msg_id}))
+
+    def _dispatch(self, msg):
+        method = msg.get('method')
+        if method == 'update':
+            self.apply_update(msg['params'][1])
+        elif method == 'echo':
+            self._sock.sendall(jsonutils.dumps(
+                {'result': msg['params'], 'error': None, 'id': msg['id']}))
+        elif msg.get('id') in self._pending:
+            waiter = self._pending.pop(msg['id'])
+            if msg.get('error'):
+                waiter.send_exception(OvsdbError(msg['error']))
+            else:
+                waiter.send(msg['result'])
+
+    def apply_update(self, table_updates):
+        for table, rows in table_updates.iteritems():
+            replica = self.tables.setdefault(table, {})
+            for uuid, row_update in rows.iteritems():
+                new = row_update.get('new')
+                if new is None:
+                    replica.pop(uuid, None)
+                else:
+                    replica[uuid] = dict((column, decode_value(value))
+                                         for column, value in new.iteritems())
+
+    def transact(self, operations):
+        """Run operations as one transaction and return their results."""
+        if not self.connected:
+            raise OvsdbError(_('Not connected to OVSDB'))
+        msg_id = 'transact-%d' % next(self._ids)
+        waiter = event.Event()
+        self._pending[msg_id] = waiter
+        self._send('transact', [OVS_DB] + operations, msg_id)
+        # ovs_vsctl_timeout is registered by ovs_lib, which uses this module
+        timeout = cfg.CONF.ovs_vsctl_timeout
+        try:
+            with eventlet.Timeout(timeout, OvsdbError(
+                    _('No reply to OVSDB transaction after %d seconds') %
+                    timeout)):
+                results = waiter.wait()
+        finally:
+            # The reply of a transaction which timed out is ignored
+            self._pending.pop(msg_id, None)
+        for result in results:
+            if result and 'error' in result:
+                raise OvsdbError('%s: %s' % (result['error'],
+                                             result.get('details')))
+        return results
+
+    def transaction(self):
+        return Transaction(self)
+
+    # Queries on the replica
+
+    def find_rows(self, table, **conditions):
+        return [row for row in self.tables[table].itervalues()
+                if all(row.get(column) == value
+                       for column, value in conditions.iteritems())]
+
+    def find_row(self, table, name):
+        rows = self.find_rows(table, name=name)
+        if rows:
+            return rows[0]
+
+    def get_bridge_port_names(self, br_name):
+        bridge = self.find_row('Bridge', br_name)
+        if not bridge:
+            return []
+        ports = self.tables['Port']
+        return [ports[uuid]['name'] for uuid in as_list(bridge['ports'])
+                if uuid in ports and ports[uuid]['name'] != br_name]
+
+    def get_bridge_interfaces(self, br_name):
+        """Return the Interface rows of the ports of a bridge."""
+        bridge = self.find_row('Bridge', br_name)
+        if not bridge:
+            return []
+        ports = self.tables['Port']
+        interfaces = self.tables['Interface']
+        rows = []
+        for port_uuid in as_list(bridge['ports']):
+            port = ports.get(port_uuid)
+            if not port or port['name'] == br_name:
+                continue
+            rows.extend(interfaces[uuid]
+                        for uuid in as_list(port['interfaces'])
+                        if uuid in interfaces)
+        return rows
+
+    def get_bridge_for_iface(self, iface_name):
+        for port_uuid, port in self.tables['Port'].iteritems():
+            for uuid in as_list(port['interfaces']):
+                iface = self.tables['Interface'].get(uuid)
+                if iface and iface['name'] == iface_name:
+                    for bridge in self.tables['Bridge'].itervalues():
+                        if port_uuid in as_list(bridge['ports']):
+                            return bridge['name']
+
+    def is_monitored(self, table, column):
+        return column in MONITORED_COLUMNS.get(table, [])
+
+    def column_type(self, table, column):
+        """Return the atomic key type and whether the column is a map."""
+        col_type = self.schema[table]['columns'][column]['type']
+        if not isinstance(col_type, dict):
+            return col_type, False
+        key = col_type['key']
+        if isinstance(key, dict):
+            key = key['type']
+        return key, 'value' in col_type
+
+
+class Transaction(object):
+    """Updates to named records, committed as a single OVSDB transaction."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.operations = []
+
+    def _convert(self, atom_type, value):
+        value = str(value).strip('"')
+        if atom_type == 'integer':
+            return int(value)
+        if atom_type == 'boolean':
+            return value == 'true'
+        return value
+
+    def db_set(self, table, record, column, value):
+        """Same as 'ovs-vsctl set table record column=value'.
+
+        column can be 'column:key' to set a single key of a map column.
+        """
+        column, _sep, key = column.partition(':')
+        where = [['name', '==', record]]
+        atom_type, is_map = self.conn.column_type(table, column)
+        if is_map and key:
+            value = self._convert('string', value)
+            self.operations.append({
+                'op': 'mutate', 'table': table, 'where': where,
+                'mutations': [[column, 'delete', ['set', [key]]],
+                              [column, 'insert',
+                               ['map', [[key, value]]]]]})
+        else:
+            self.operations.append({
+                'op': 'update', 'table': table, 'where': where,
+                'row': {column: self._convert(atom_type, value)}})
+
+    def add_port(self, bridge, port_name, iface_type=None, options=None):
+        """Same as 'ovs-vsctl --may-exist add-port bridge port_name'.
+
+        iface_type and options are then set on the interface of the port,
+        as 'ovs-vsctl set Interface port_name type=... options:key=...'.
+        Like ovs-vsctl, fails if the port exists on another bridge.
+        """
+        port_uuids = [uuid for uuid, row in self.conn.tables['Port'].iteritems()
+                      if row['name'] == port_name]
+        if port_uuids:
+            bridge_row = self.conn.find_row('Bridge', bridge)
+            if (not bridge_row or
+                    port_uuids[0] not in as_list(bridge_row['ports'])):
+                raise OvsdbError(_('Port %(port)s already exists on a '
+                                   'bridge other than %(bridge)s') %
+                                 {'port': port_name, 'bridge': bridge})
+        else:
+            iface_uuid = 'iface%d' % len(self.operations)
+            port_uuid = 'port%d' % len(self.operations)
+            self.operations.extend([
+                {'op': 'insert', 'table': 'Interface',
+                 'row': {'name': port_name}, 'uuid-name': iface_uuid},
+                {'op': 'insert', 'table': 'Port',
+                 'row': {'name': port_name,
+                         'interfaces': ['named-uuid', iface_uuid]},
+                 'uuid-name': port_uuid},
+                {'op': 'mutate', 'table': 'Bridge',
+                 'where': [['name', '==', bridge]],
+                 'mutations': [['ports', 'insert',
+                                ['set', [['named-uuid', port_uuid]]]]]}])
+        if iface_type:
+            self.db_set('Interface', port_name, 'type', iface_type)
+        for key, value in sorted((options or {}).items()):
+            self.db_set('Interface', port_name, 'options:%s' % key, value)
+
+    def db_clear(self, table, record, column):
+        _atom_type, is_map = self.conn.column_type(table, column)
+        self.operations.append({
+            'op': 'update', 'table': table,
+            'where': [['name', '==', record]],
+            'row': {column: ['map' if is_map else 'set', []]}})
+
+    def commit(self):
+        """Run the operations, which are kept if the transaction fails."""
+        if not self.operations:
+            return
+        results = self.conn.transact(self.operations)
+        self.operations = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
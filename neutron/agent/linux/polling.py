@@ -44,9 +44,11 @@ class BasePollingManager(object):
     def __init__(self):
         self._force_polling = False
         self._polling_completed = True
+        self._full_scan_required = True
 
     def force_polling(self):
         self._force_polling = True
+        self._full_scan_required = True
 
     def polling_completed(self):
         self._polling_completed = True
@@ -79,6 +81,14 @@ class BasePollingManager(object):
 
         return polling_required
 
+    def get_events(self):
+        """Return the device changes detected since the previous call.
+
+        None is returned when the changes are not known precisely, in which
+        case the caller has to scan all devices.
+        """
+        return None
+
 
 class AlwaysPoll(BasePollingManager):
 
@@ -110,3 +120,15 @@ class InterfacePollingMinimizer(BasePollingManager):
         # collect output.
         eventlet.sleep()
         return self._monitor.has_updates
+
+    def get_events(self):
+        events = self._monitor.get_events()
+        if not self._monitor.is_active:
+            return None
+        if self._full_scan_required or self._monitor.resync_required:
+            # The monitor is running again, so a full scan now covers
+            # whatever happened since it was (re)started.
+            self._full_scan_required = False
+            self._monitor.resync_required = False
+            return None
+        return events
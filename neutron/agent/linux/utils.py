@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import fcntl
 import glob
 import os
@@ -20,10 +21,15 @@ import shlex
 import socket
 import struct
 import tempfile
+import threading
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from eventlet import semaphore
+from oslo.config import cfg
+from oslo.rootwrap import client
 
+from neutron.agent.common import config
 from neutron.common import constants
 from neutron.common import utils
 from neutron.openstack.common import excutils
@@ -31,6 +37,28 @@ from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+config.register_root_helper(cfg.CONF)
+
+# Bounds the number of commands run at the same time by execute(), see
+# set_max_concurrent_commands()
+_command_semaphore = None
+
+
+class RootwrapDaemonHelper(object):
+    __client = None
+    __lock = threading.Lock()
+
+    def __new__(cls):
+        """There is no reason to instantiate this class."""
+        raise NotImplementedError()
+
+    @classmethod
+    def get_client(cls):
+        with cls.__lock:
+            if cls.__client is None:
+                cls.__client = client.Client(
+                    shlex.split(cfg.CONF.AGENT.root_helper_daemon))
+            return cls.__client
 
 
 def create_process(cmd, root_helper=None, addl_env=None):
@@ -57,30 +85,72 @@ def create_process(cmd, root_helper=None, addl_env=None):
     return obj, cmd
 
 
+def set_max_concurrent_commands(max_commands):
+    """Limit the number of commands that execute() runs at the same time.
+
+    Callers over the limit wait for a running command to complete, so that
+    a burst of work does not spawn an unbounded number of processes. A
+    limit of 0 or less disables the limit.
+    """
+    global _command_semaphore
+    if max_commands > 0:
+        _command_semaphore = semaphore.Semaphore(max_commands)
+    else:
+        _command_semaphore = None
+
+
+@contextlib.contextmanager
+def _command_slot():
+    command_semaphore = _command_semaphore
+    if command_semaphore is None:
+        yield
+    else:
+        with command_semaphore:
+            yield
+
+
+def execute_rootwrap_daemon(cmd, process_input, addl_env):
+    """Run a privileged command through the rootwrap daemon.
+
+    The daemon applies the same filters as the root helper, but is only
+    spawned once, so a command costs a round trip on its socket.
+    """
+    cmd = map(str, cmd)
+    LOG.debug(_("Running command (rootwrap daemon): %s"), cmd)
+    return RootwrapDaemonHelper.get_client().execute(cmd, addl_env,
+                                                     process_input)
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False, log_fail_as_error=True,
             extra_ok_codes=None):
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = (process_input and
-                            obj.communicate(process_input) or
-                            obj.communicate())
-        obj.stdin.close()
+        with _command_slot():
+            if root_helper and cfg.CONF.AGENT.root_helper_daemon:
+                returncode, _stdout, _stderr = (
+                    execute_rootwrap_daemon(cmd, process_input, addl_env))
+            else:
+                obj, cmd = create_process(cmd, root_helper=root_helper,
+                                          addl_env=addl_env)
+                _stdout, _stderr = (process_input and
+                                    obj.communicate(process_input) or
+                                    obj.communicate())
+                obj.stdin.close()
+                returncode = obj.returncode
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
 
         extra_ok_codes = extra_ok_codes or []
-        if obj.returncode and obj.returncode in extra_ok_codes:
-            obj.returncode = None
+        if returncode and returncode in extra_ok_codes:
+            returncode = None
 
-        if obj.returncode and log_fail_as_error:
+        if returncode and log_fail_as_error:
             LOG.error(m)
         else:
             LOG.debug(m)
 
-        if obj.returncode and check_exit_code:
+        if returncode and check_exit_code:
             raise RuntimeError(m)
     finally:
         # NOTE(termie): this appears to be necessary to let the subprocess
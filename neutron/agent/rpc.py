@@ -82,6 +82,7 @@ class PluginApi(n_rpc.RpcProxy):
         1.3 - get_device_details rpc signature upgrade to obtain 'host' and
               return value to include fixed_ips and device_owner for
               the device port
+        1.4 - update_devices_up and update_devices_down
     '''
 
     BASE_RPC_API_VERSION = '1.1'
@@ -128,6 +129,32 @@ class PluginApi(n_rpc.RpcProxy):
                          self.make_msg('update_device_up', device=device,
                                        agent_id=agent_id, host=host))
 
+    def update_devices_down(self, context, devices, agent_id, host=None):
+        try:
+            return self.call(context,
+                             self.make_msg('update_devices_down',
+                                           devices=devices,
+                                           agent_id=agent_id,
+                                           host=host),
+                             version='1.4')
+        except messaging.UnsupportedVersion:
+            LOG.debug("The server does not support update_devices_down, "
+                      "updating the devices one by one.")
+            return [self.update_device_down(context, device, agent_id, host)
+                    for device in devices]
+
+    def update_devices_up(self, context, devices, agent_id, host=None):
+        try:
+            self.call(context,
+                      self.make_msg('update_devices_up', devices=devices,
+                                    agent_id=agent_id, host=host),
+                      version='1.4')
+        except messaging.UnsupportedVersion:
+            LOG.debug("The server does not support update_devices_up, "
+                      "updating the devices one by one.")
+            for device in devices:
+                self.update_device_up(context, device, agent_id, host)
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
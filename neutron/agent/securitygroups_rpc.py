@@ -94,13 +94,20 @@ class SecurityGroupServerRpcApiMixin(object):
                                        devices=devices),
                          version='1.1')
 
-    def security_group_info_for_devices(self, context, devices):
+    def security_group_info_for_devices(self, context, devices,
+                                        revisions=None):
         LOG.debug("Get security group information for devices via rpc %r",
                   devices)
+        if revisions is None:
+            return self.call(context,
+                             self.make_msg('security_group_info_for_devices',
+                                           devices=devices),
+                             version='1.2')
         return self.call(context,
                          self.make_msg('security_group_info_for_devices',
-                                       devices=devices),
-                         version='1.2')
+                                       devices=devices,
+                                       revisions=revisions),
+                         version='1.3')
 
 
 class SecurityGroupAgentRpcCallbackMixin(object):
@@ -170,6 +177,11 @@ class SecurityGroupAgentRpcMixin(object):
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
         self._use_enhanced_rpc = None
+        self._use_sg_revisions = None
+        # Security group information received from the server, with its
+        # revision: {'security_groups': {sg_id: (revision, rules)},
+        #            'sg_member_ips': {sg_id: (revision, member_ips)}}
+        self.sg_info_cache = {'security_groups': {}, 'sg_member_ips': {}}
 
     @property
     def use_enhanced_rpc(self):
@@ -178,6 +190,13 @@ class SecurityGroupAgentRpcMixin(object):
                 self._check_enhanced_rpc_is_supported_by_server())
         return self._use_enhanced_rpc
 
+    @property
+    def use_sg_revisions(self):
+        if self._use_sg_revisions is None:
+            self._use_sg_revisions = (
+                self._check_sg_revisions_are_supported_by_server())
+        return self._use_sg_revisions
+
     def _check_enhanced_rpc_is_supported_by_server(self):
         try:
             self.plugin_rpc.security_group_info_for_devices(
@@ -190,6 +209,54 @@ class SecurityGroupAgentRpcMixin(object):
             return False
         return True
 
+    def _check_sg_revisions_are_supported_by_server(self):
+        try:
+            self.plugin_rpc.security_group_info_for_devices(
+                self.context, devices=[], revisions={})
+        except messaging.UnsupportedVersion:
+            LOG.warning(_LW('security_group_info_for_devices rpc call does '
+                            'not support revisions on the server, all the '
+                            'security groups of the devices will be '
+                            'fetched.'))
+            return False
+        return True
+
+    def _security_group_info_for_devices(self, device_ids):
+        if not self.use_sg_revisions:
+            return self.plugin_rpc.security_group_info_for_devices(
+                self.context, list(device_ids))
+        revisions = dict(
+            (key, dict((sg_id, entry[0]) for sg_id, entry in cache.items()))
+            for key, cache in self.sg_info_cache.items())
+        devices_info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(device_ids), revisions=revisions)
+        if 'revisions' not in devices_info:
+            return devices_info
+        for key, cache in self.sg_info_cache.items():
+            for sg_id, revision in devices_info['revisions'][key].items():
+                if sg_id in devices_info[key]:
+                    cache[sg_id] = (revision, devices_info[key][sg_id])
+                elif sg_id in cache and cache[sg_id][0] == revision:
+                    # Unchanged since it was last received
+                    devices_info[key][sg_id] = cache[sg_id][1]
+                else:
+                    # Dropped or replaced meanwhile, get everything again
+                    LOG.debug("Security group %s changed during the rpc "
+                              "call, fetching all the information", sg_id)
+                    self.sg_info_cache[key].clear()
+                    return self._security_group_info_for_devices(device_ids)
+        return devices_info
+
+    def _prune_sg_info_cache(self):
+        security_groups = set()
+        for device in self.firewall.ports.values():
+            security_groups.update(device.get('security_groups', []))
+            security_groups.update(
+                device.get('security_group_source_groups', []))
+        for cache in self.sg_info_cache.values():
+            for sg_id in set(cache) - security_groups:
+                del cache[sg_id]
+
     def skip_if_noopfirewall_or_firewall_disabled(func):
         @functools.wraps(func)
         def decorated_function(self, *args, **kwargs):
@@ -208,8 +275,7 @@ class SecurityGroupAgentRpcMixin(object):
             return
         LOG.info(_LI("Preparing filters for devices %s"), device_ids)
         if self.use_enhanced_rpc:
-            devices_info = self.plugin_rpc.security_group_info_for_devices(
-                self.context, list(device_ids))
+            devices_info = self._security_group_info_for_devices(device_ids)
             devices = devices_info['devices']
             security_groups = devices_info['security_groups']
             security_group_member_ips = devices_info['sg_member_ips']
@@ -284,6 +350,7 @@ class SecurityGroupAgentRpcMixin(object):
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
+        self._prune_sg_info_cache()
 
     @skip_if_noopfirewall_or_firewall_disabled
     def refresh_firewall(self, device_ids=None):
@@ -294,8 +361,7 @@ class SecurityGroupAgentRpcMixin(object):
                 LOG.info(_LI("No ports here to refresh firewall"))
                 return
         if self.use_enhanced_rpc:
-            devices_info = self.plugin_rpc.security_group_info_for_devices(
-                self.context, device_ids)
+            devices_info = self._security_group_info_for_devices(device_ids)
             devices = devices_info['devices']
             security_groups = devices_info['security_groups']
             security_group_member_ips = devices_info['sg_member_ips']
@@ -13,19 +13,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import random
 
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import constants
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.common import utils
+from neutron import context as n_context
 from neutron import manager
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
 from neutron.plugins.common import constants as service_constants
 
 
 LOG = logging.getLogger(__name__)
 
+L3_NOTIFIER_OPTS = [
+    cfg.FloatOpt('l3_notification_batch_interval', default=0,
+                 help=_("Seconds during which the routers_updated "
+                        "notifications to the L3 agents are merged. Each "
+                        "agent is then sent a single message with all its "
+                        "routers updated meanwhile. 0 notifies the routers "
+                        "as soon as they are updated.")),
+    cfg.IntOpt('l3_notification_max_retries', default=3,
+               help=_("Number of following batches in which the routers "
+                      "whose update could not be notified are retried "
+                      "before they are dropped.")),
+]
+cfg.CONF.register_opts(L3_NOTIFIER_OPTS)
+
 
 class L3AgentNotifyAPI(n_rpc.RpcProxy):
     """API for plugin to notify L3 agent."""
@@ -34,6 +54,20 @@ class L3AgentNotifyAPI(n_rpc.RpcProxy):
     def __init__(self, topic=topics.L3_AGENT):
         super(L3AgentNotifyAPI, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        # router id => time at which its first pending update was queued
+        self.pending_routers = {}
+        # router id => number of batches that failed to notify it
+        self._failed_batches = {}
+        self._pending_shuffle_agents = False
+        self._waiting_to_send = False
+        # Counters of the merged notifications, to be monitored
+        self.stats = {'notifications': 0,
+                      'batches': 0,
+                      'routers': 0,
+                      'casts': 0,
+                      'dropped': 0,
+                      'last_delay': 0.0,
+                      'max_delay': 0.0}
 
     def _notification_host(self, context, method, payload, host):
         """Notify the agent that is hosting the router."""
@@ -47,28 +81,37 @@ class L3AgentNotifyAPI(n_rpc.RpcProxy):
 
     def _agent_notification(self, context, method, router_ids, operation,
                             shuffle_agents):
-        """Notify changed routers to hosting l3 agents."""
+        """Notify changed routers to hosting l3 agents.
+
+        Each agent is sent a single message with all its changed routers.
+        Returns the number of messages sent.
+        """
         adminContext = context.is_admin and context or context.elevated()
         plugin = manager.NeutronManager.get_service_plugins().get(
             service_constants.L3_ROUTER_NAT)
-        for router_id in router_ids:
-            l3_agents = plugin.get_l3_agents_hosting_routers(
-                adminContext, [router_id],
-                admin_state_up=True,
-                active=True)
-            if shuffle_agents:
-                random.shuffle(l3_agents)
-            for l3_agent in l3_agents:
-                LOG.debug(_('Notify agent at %(topic)s.%(host)s the message '
-                            '%(method)s'),
-                          {'topic': l3_agent.topic,
-                           'host': l3_agent.host,
-                           'method': method})
-                self.cast(
-                    context, self.make_msg(method,
-                                           routers=[router_id]),
-                    topic='%s.%s' % (l3_agent.topic, l3_agent.host),
-                    version='1.1')
+        bindings = plugin.get_l3_agent_bindings_hosting_routers(
+            adminContext, router_ids,
+            admin_state_up=True,
+            active=True)
+        if shuffle_agents:
+            random.shuffle(bindings)
+        # agent topic => router ids
+        agent_router_ids = collections.OrderedDict()
+        for binding in bindings:
+            l3_agent = binding.l3_agent
+            topic = '%s.%s' % (l3_agent.topic, l3_agent.host)
+            agent_router_ids.setdefault(topic, []).append(binding.router_id)
+        for topic, agent_routers in agent_router_ids.iteritems():
+            LOG.debug(_('Notify agent at %(topic)s the message '
+                        '%(method)s'),
+                      {'topic': topic,
+                       'method': method})
+            self.cast(
+                context, self.make_msg(method,
+                                       routers=agent_routers),
+                topic=topic,
+                version='1.1')
+        return len(agent_router_ids)
 
     def _agent_notification_arp(self, context, method, router_id,
                                 operation, data):
@@ -98,25 +141,29 @@ class L3AgentNotifyAPI(n_rpc.RpcProxy):
 
     def _notification(self, context, method, router_ids, operation,
                       shuffle_agents):
-        """Notify all the agents that are hosting the routers."""
+        """Notify all the agents that are hosting the routers.
+
+        Returns the number of messages sent.
+        """
         plugin = manager.NeutronManager.get_service_plugins().get(
             service_constants.L3_ROUTER_NAT)
         if not plugin:
             LOG.error(_('No plugin for L3 routing registered. Cannot notify '
                         'agents with the message %s'), method)
-            return
+            return 0
         if utils.is_extension_supported(
                 plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
             adminContext = (context.is_admin and
                             context or context.elevated())
             plugin.schedule_routers(adminContext, router_ids)
-            self._agent_notification(
+            return self._agent_notification(
                 context, method, router_ids, operation, shuffle_agents)
         else:
             self.fanout_cast(
                 context, self.make_msg(method,
                                        routers=router_ids),
                 topic=topics.L3_AGENT)
+            return 1
 
     def _notification_fanout(self, context, method, router_id):
         """Fanout the deleted router to all L3 agents."""
@@ -138,9 +185,108 @@ class L3AgentNotifyAPI(n_rpc.RpcProxy):
     def router_deleted(self, context, router_id):
         self._notification_fanout(context, 'router_deleted', router_id)
 
+    def _queue_routers_updated(self, router_ids, shuffle_agents):
+        """Queue updated routers to be notified with the next batch.
+
+        The first queued update starts a short-lived thread, which sleeps
+        for l3_notification_batch_interval while the next updates are merged
+        with it, and then notifies all the routers queued meanwhile.
+        """
+        queued_at = timeutils.utcnow()
+        for router_id in router_ids:
+            self.pending_routers.setdefault(router_id, queued_at)
+        self._pending_shuffle_agents |= shuffle_agents
+        self.stats['notifications'] += 1
+        self._schedule_send()
+
+    def _schedule_send(self):
+        if self._waiting_to_send:
+            return
+
+        self._waiting_to_send = True
+
+        def last_out_sends():
+            eventlet.sleep(cfg.CONF.l3_notification_batch_interval)
+            self._waiting_to_send = False
+            self.send_routers_updated()
+
+        eventlet.spawn_n(last_out_sends)
+
+    def send_routers_updated(self):
+        """Notify the agents of the routers updated since the last batch.
+
+        The routers deleted meanwhile are left out, their deletion was
+        notified already. If the agents can't be notified, the routers are
+        queued again to be notified with the next batch, at most
+        l3_notification_max_retries times.
+        """
+        pending_routers, self.pending_routers = self.pending_routers, {}
+        shuffle_agents = self._pending_shuffle_agents
+        self._pending_shuffle_agents = False
+        if not pending_routers:
+            return
+        context = n_context.get_admin_context()
+        try:
+            plugin = manager.NeutronManager.get_service_plugins().get(
+                service_constants.L3_ROUTER_NAT)
+            router_ids = pending_routers.keys()
+            if plugin:
+                router_ids = [router['id'] for router in plugin.get_routers(
+                    context, filters={'id': router_ids}, fields=['id'])]
+            casts = 0
+            if router_ids:
+                casts = self._notification(context, 'routers_updated',
+                                           router_ids, None, shuffle_agents)
+        except Exception:
+            LOG.exception(_("Failed to notify the L3 agents of the updated "
+                            "routers %s"), pending_routers.keys())
+            self._requeue_routers(pending_routers, shuffle_agents)
+            return
+        for router_id in pending_routers:
+            self._failed_batches.pop(router_id, None)
+        sent_at = timeutils.utcnow()
+        delay = max(timeutils.delta_seconds(queued_at, sent_at)
+                    for queued_at in pending_routers.values())
+        self.stats['batches'] += 1
+        self.stats['routers'] += len(router_ids)
+        self.stats['casts'] += casts
+        self.stats['last_delay'] = delay
+        self.stats['max_delay'] = max(self.stats['max_delay'], delay)
+        LOG.debug("Notified %(routers)d updated routers in %(casts)d "
+                  "messages, delayed by up to %(delay).3f seconds. "
+                  "Totals: %(stats)s",
+                  {'routers': len(router_ids), 'casts': casts,
+                   'delay': delay, 'stats': self.stats})
+
+    def _requeue_routers(self, pending_routers, shuffle_agents):
+        """Queue again the routers of a failed batch, or drop them."""
+        dropped = []
+        for router_id, queued_at in pending_routers.iteritems():
+            failed_batches = self._failed_batches.get(router_id, 0) + 1
+            if failed_batches > cfg.CONF.l3_notification_max_retries:
+                self._failed_batches.pop(router_id, None)
+                dropped.append(router_id)
+                continue
+            self._failed_batches[router_id] = failed_batches
+            self.pending_routers[router_id] = min(
+                queued_at, self.pending_routers.get(router_id, queued_at))
+        if dropped:
+            self.stats['dropped'] += len(dropped)
+            LOG.error(_("Dropped the notification of the updated routers "
+                        "%(routers)s after %(batches)d failed batches"),
+                      {'routers': dropped,
+                       'batches': cfg.CONF.l3_notification_max_retries + 1})
+        if self.pending_routers:
+            self._pending_shuffle_agents |= shuffle_agents
+            self._schedule_send()
+
     def routers_updated(self, context, router_ids, operation=None, data=None,
                         shuffle_agents=False):
-        if router_ids:
+        if not router_ids:
+            return
+        if cfg.CONF.l3_notification_batch_interval > 0:
+            self._queue_routers_updated(router_ids, shuffle_agents)
+        else:
             self._notification(context, 'routers_updated', router_ids,
                                operation, shuffle_agents)
 
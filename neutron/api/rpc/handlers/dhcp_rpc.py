@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo.config import cfg
 from oslo.db import exception as db_exc
 
@@ -24,12 +26,18 @@ from neutron.common import utils
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.openstack.common import excutils
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
 
+def get_revision(resource):
+    """Return a digest identifying the content of a resource."""
+    return hashlib.md5(jsonutils.dumps(resource, sort_keys=True)).hexdigest()
+
+
 class DhcpRpcCallback(n_rpc.RpcCallback):
     """DHCP agent RPC callback in plugin implementations."""
 
@@ -37,7 +45,10 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
     #     1.0 - Initial version.
     #     1.1 - Added get_active_networks_info, create_dhcp_port,
     #           and update_dhcp_port methods.
-    RPC_API_VERSION = '1.1'
+    #     1.2 - Added revisions argument to get_active_networks_info and
+    #           get_network_info.
+    #     1.3 - Added create_dhcp_ports and update_dhcp_ports methods.
+    RPC_API_VERSION = '1.3'
 
     def _get_active_networks(self, context, **kwargs):
         """Retrieve and return a list of the active networks."""
@@ -83,6 +94,48 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
                            "could not complete successfully: %(reason)s")
                          % {"action": action, "net_id": net_id, 'reason': e})
 
+    def _make_network_delta(self, network, subnets, ports, revisions):
+        """Return the changes of a network since the given revisions.
+
+        revisions holds the revision of the network and of each of its
+        subnets and ports the agent knows about. Only the subnets and ports
+        which are new or whose revision changed are returned, along with the
+        ids of the deleted ones and the revisions of the returned resources.
+        """
+        subnet_revisions = dict((subnet['id'], get_revision(subnet))
+                                for subnet in subnets)
+        port_revisions = dict((port['id'], get_revision(port))
+                              for port in ports)
+        network['revision'] = get_revision(
+            [network, sorted(subnet_revisions.items()),
+             sorted(port_revisions.items())])
+
+        if revisions.get('revision') == network['revision']:
+            subnets = ports = []
+            known_subnets = known_ports = {}
+        else:
+            known_subnets = revisions.get('subnets') or {}
+            known_ports = revisions.get('ports') or {}
+            subnets = [subnet for subnet in subnets
+                       if (known_subnets.get(subnet['id']) !=
+                           subnet_revisions[subnet['id']])]
+            ports = [port for port in ports
+                     if (known_ports.get(port['id']) !=
+                         port_revisions[port['id']])]
+
+        network['subnets'] = subnets
+        network['ports'] = ports
+        network['subnet_revisions'] = dict(
+            (subnet['id'], subnet_revisions[subnet['id']])
+            for subnet in subnets)
+        network['port_revisions'] = dict(
+            (port['id'], port_revisions[port['id']]) for port in ports)
+        network['deleted_subnets'] = [subnet_id for subnet_id in known_subnets
+                                      if subnet_id not in subnet_revisions]
+        network['deleted_ports'] = [port_id for port_id in known_ports
+                                    if port_id not in port_revisions]
+        return network
+
     def get_active_networks(self, context, **kwargs):
         """Retrieve and return a list of the active network ids."""
         # NOTE(arosen): This method is no longer used by the DHCP agent but is
@@ -94,8 +147,13 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
         return [net['id'] for net in nets]
 
     def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
+        """Returns all the networks/subnets/ports in system.
+
+        When the agent sends the revisions of the networks it knows, a delta
+        is returned for each network instead of all its subnets and ports.
+        """
         host = kwargs.get('host')
+        revisions = kwargs.get('revisions')
         LOG.debug(_('get_active_networks_info from %s'), host)
         networks = self._get_active_networks(context, **kwargs)
         plugin = manager.NeutronManager.get_plugin()
@@ -105,10 +163,17 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
         subnets = plugin.get_subnets(context, filters=filters)
 
         for network in networks:
-            network['subnets'] = [subnet for subnet in subnets
-                                  if subnet['network_id'] == network['id']]
-            network['ports'] = [port for port in ports
-                                if port['network_id'] == network['id']]
+            network_subnets = [subnet for subnet in subnets
+                               if subnet['network_id'] == network['id']]
+            network_ports = [port for port in ports
+                             if port['network_id'] == network['id']]
+            if revisions is None:
+                network['subnets'] = network_subnets
+                network['ports'] = network_ports
+            else:
+                self._make_network_delta(network, network_subnets,
+                                         network_ports,
+                                         revisions.get(network['id']) or {})
 
         return networks
 
@@ -127,9 +192,14 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
                        "been deleted concurrently."), network_id)
             return
         filters = dict(network_id=[network_id])
-        network['subnets'] = plugin.get_subnets(context, filters=filters)
-        network['ports'] = plugin.get_ports(context, filters=filters)
-        return network
+        subnets = plugin.get_subnets(context, filters=filters)
+        ports = plugin.get_ports(context, filters=filters)
+        revisions = kwargs.get('revisions')
+        if revisions is None:
+            network['subnets'] = subnets
+            network['ports'] = ports
+            return network
+        return self._make_network_delta(network, subnets, ports, revisions)
 
     def get_dhcp_port(self, context, **kwargs):
         """Allocate a DHCP port for the host and return port information.
@@ -290,3 +360,43 @@ class DhcpRpcCallback(n_rpc.RpcCallback):
                    'host': host})
         plugin = manager.NeutronManager.get_plugin()
         return self._port_action(plugin, context, port, 'update_port')
+
+    def create_dhcp_ports(self, context, **kwargs):
+        """Create several dhcp ports and return their information.
+
+        A None port is returned for each port which could not be created.
+        """
+        host = kwargs.get('host')
+        ports = []
+        for port in kwargs.get('ports', []):
+            try:
+                ports.append(self.create_dhcp_port(context, host=host,
+                                                   port=port))
+            except n_exc.NeutronException as e:
+                LOG.warn(_('Unable to create dhcp port on network '
+                           '%(net_id)s: %(reason)s'),
+                         {'net_id': port['port'].get('network_id'),
+                          'reason': e})
+                ports.append(None)
+        return ports
+
+    def update_dhcp_ports(self, context, **kwargs):
+        """Update several dhcp ports.
+
+        ports is a list of dicts with the port_id and port arguments of
+        update_dhcp_port. A None port is returned for each port which could
+        not be updated.
+        """
+        host = kwargs.get('host')
+        ports = []
+        for update in kwargs.get('ports', []):
+            try:
+                ports.append(self.update_dhcp_port(
+                    context, host=host, port_id=update['port_id'],
+                    port=update['port']))
+            except n_exc.NeutronException as e:
+                LOG.warn(_('Unable to update dhcp port %(port_id)s: '
+                           '%(reason)s'),
+                         {'port_id': update['port_id'], 'reason': e})
+                ports.append(None)
+        return ports
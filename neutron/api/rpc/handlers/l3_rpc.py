@@ -39,7 +39,8 @@ class L3RpcCallback(n_rpc.RpcCallback):
     # 1.2 Added methods for DVR support
     # 1.3 Added a method that returns the list of activated services
     # 1.4 Added L3 HA update_router_state
-    RPC_API_VERSION = '1.4'
+    # 1.5 Added get_router_ids
+    RPC_API_VERSION = '1.5'
 
     @property
     def plugin(self):
@@ -85,6 +86,30 @@ class L3RpcCallback(n_rpc.RpcCallback):
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def get_router_ids(self, context, **kwargs):
+        """List the ids of the routers to sync to a specific agent.
+
+        The agent can then sync its routers by chunks, calling sync_routers
+        with a part of these ids at a time.
+        @param context: contain user information
+        @param kwargs: host
+        @return: a list of router ids
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        if not self.l3plugin:
+            LOG.error(_('No plugin for L3 routing registered! Will reply '
+                        'to l3 agent with empty router list.'))
+            return []
+        elif utils.is_extension_supported(
+                self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                self.l3plugin.auto_schedule_routers(context, host, None)
+            return self.l3plugin.list_router_ids_on_host(context, host)
+        else:
+            return [router['id'] for router in
+                    self.l3plugin.get_routers(context, fields=['id'])]
+
     def _ensure_host_set_on_ports(self, context, host, routers):
         for router in routers:
             LOG.debug(_("Checking router: %(id)s for host: %(host)s"),
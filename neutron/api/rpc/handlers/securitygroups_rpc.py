@@ -26,10 +26,12 @@ class SecurityGroupServerRpcCallback(n_rpc.RpcCallback):
     # API version history:
     #   1.1 - Initial version
     #   1.2 - security_group_info_for_devices introduced as an optimization
+    #   1.3 - security_group_info_for_devices takes the revisions the agent
+    #         holds and only returns the security groups which changed
 
     # NOTE: RPC_API_VERSION must not be overridden in subclasses
     # to keep RPC API version consistent across plugins.
-    RPC_API_VERSION = '1.2'
+    RPC_API_VERSION = '1.3'
 
     @property
     def plugin(self):
@@ -59,13 +61,23 @@ class SecurityGroupServerRpcCallback(n_rpc.RpcCallback):
         """Return security group information for requested devices.
 
         :params devices: list of devices
+        :params revisions: optional revisions of the security group
+                           information the agent holds, e.g.
+                           {'security_groups': {sg_id: 3},
+                            'sg_member_ips': {sg_id: 3}}
         :returns:
         sg_info{
           'security_groups': {sg_id: [rule1, rule2]}
           'sg_member_ips': {sg_id: {'IPv4': [], 'IPv6': []}}
           'devices': {device_id: {device_info}}
+          'revisions': {'security_groups': {sg_id: revision},
+                        'sg_member_ips': {sg_id: revision}}
         }
+        'revisions' is only returned when revisions were given, in which
+        case 'security_groups' and 'sg_member_ips' leave out the entries
+        the agent already holds.
         """
         devices_info = kwargs.get('devices')
         ports = self._get_devices_info(devices_info)
-        return self.plugin.security_group_info_for_ports(context, ports)
+        return self.plugin.security_group_info_for_ports(
+            context, ports, revisions=kwargs.get('revisions'))
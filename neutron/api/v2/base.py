@@ -14,6 +14,8 @@
 #    under the License.
 
 import copy
+import itertools
+
 import netaddr
 import webob.exc
 
@@ -66,6 +68,7 @@ class Controller(object):
         self._native_bulk = self._is_native_bulk_supported()
         self._native_pagination = self._is_native_pagination_supported()
         self._native_sorting = self._is_native_sorting_supported()
+        self._native_streaming = self._is_native_streaming_supported()
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
         self._notifier = n_rpc.get_notifier('network')
@@ -126,6 +129,11 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
+    def _is_native_streaming_supported(self):
+        native_streaming_attr_name = ("_%s__native_streaming_support"
+                                      % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_streaming_attr_name, False)
+
     def _exclude_attributes_by_policy(self, context, data):
         """Identifies attributes to exclude according to authZ policies.
 
@@ -133,21 +141,14 @@ class Controller(object):
         response returned to the user because the user is not authorized
         to see them.
         """
-        attributes_to_exclude = []
-        for attr_name in data.keys():
-            attr_data = self._attr_info.get(attr_name)
-            if attr_data and attr_data['is_visible']:
-                if policy.check(
-                    context,
-                    '%s:%s' % (self._plugin_handlers[self.SHOW], attr_name),
-                    data,
-                    might_not_exist=True):
-                    # this attribute is visible, check next one
-                    continue
-            # if the code reaches this point then either the policy check
-            # failed or the attribute was not visible in the first place
-            attributes_to_exclude.append(attr_name)
-        return attributes_to_exclude
+        visible = [attr_name for attr_name in data
+                   if self._attr_info.get(attr_name, {}).get('is_visible')]
+        permitted = set(policy.check_attributes(
+            context, self._plugin_handlers[self.SHOW], data, visible))
+        # Strip the attributes which were not visible in the first place,
+        # or whose policy check failed
+        return [attr_name for attr_name in data.keys()
+                if attr_name not in permitted]
 
     def _view(self, context, data, fields_to_strip=None):
         """Build a view of an API resource.
@@ -232,6 +233,11 @@ class Controller(object):
                   'fields': original_fields}
         sorting_helper = self._get_sorting_helper(request)
         pagination_helper = self._get_pagination_helper(request)
+        if not parent_id and self._can_stream(sorting_helper,
+                                              pagination_helper):
+            return {self._collection: self._stream_items(
+                request.context, filters, original_fields, do_authz,
+                fields_to_add or [])}
         sorting_helper.update_args(kwargs)
         sorting_helper.update_fields(original_fields, fields_to_add)
         pagination_helper.update_args(kwargs)
@@ -244,14 +250,7 @@ class Controller(object):
         obj_list = pagination_helper.paginate(obj_list)
         # Check authz
         if do_authz:
-            # FIXME(salvatore-orlando): obj_getter might return references to
-            # other resources. Must check authZ on them too.
-            # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            obj_list = self._authorized_items(request.context, obj_list)
         # Use the first element in the list for discriminating which attributes
         # should be filtered out because of authZ policies
         # fields_to_add contains a list of attributes added for request policy
@@ -271,6 +270,59 @@ class Controller(object):
             collection[self._collection + "_links"] = pagination_links
         return collection
 
+    def _authorized_items(self, context, obj_list):
+        # FIXME(salvatore-orlando): obj_getter might return references to
+        # other resources. Must check authZ on them too.
+        # Omit items from list that should not be visible
+        results = policy.check_items(context,
+                                     self._plugin_handlers[self.SHOW],
+                                     obj_list)
+        return [obj for obj, result in zip(obj_list, results) if result]
+
+    def _can_stream(self, sorting_helper, pagination_helper):
+        return (cfg.CONF.list_streaming_chunk_size > 0 and
+                self._native_streaming and
+                hasattr(self._plugin, 'iter_%s' % self._collection) and
+                not getattr(sorting_helper, 'sort_dict', None) and
+                not getattr(pagination_helper, 'limit', None))
+
+    def _stream_items(self, context, filters, fields, do_authz,
+                      fields_to_strip):
+        """Returns an iterator over the formatted elements of a list.
+
+        The elements are fetched from the plugin, checked and formatted
+        list_streaming_chunk_size at a time. The first chunk is processed
+        before returning, so that most failures are still reported with
+        the status of the response.
+        """
+        chunk_size = cfg.CONF.list_streaming_chunk_size
+        obj_iter = getattr(self._plugin, 'iter_%s' % self._collection)(
+            context, chunk_size, filters=filters, fields=fields)
+
+        def chunks():
+            excluded = False
+            while True:
+                obj_list = list(itertools.islice(obj_iter, chunk_size))
+                if not obj_list:
+                    return
+                if do_authz:
+                    obj_list = self._authorized_items(context, obj_list)
+                if obj_list and not excluded:
+                    # As for whole lists, the first element is used for
+                    # discriminating which attributes should be filtered out
+                    fields_to_strip.extend(
+                        self._exclude_attributes_by_policy(context,
+                                                           obj_list[0]))
+                    excluded = True
+                yield [self._filter_attributes(context, obj,
+                                               fields_to_strip=fields_to_strip)
+                       for obj in obj_list]
+
+        chunk_iter = chunks()
+        first_chunk = next(chunk_iter, [])
+        return itertools.chain(first_chunk,
+                               itertools.chain.from_iterable(chunk_iter))
+
     def _item(self, request, id, do_authz=False, field_list=None,
               parent_id=None):
         """Retrieves and formats a single element of the requested entity."""
@@ -389,12 +441,19 @@ class Controller(object):
             bulk = False
         # Ensure policy engine is initialized
         policy.init()
+        tracked = quota.QUOTAS.tracks_usages(self._resource)
+        tracked_deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
+            if tracked:
+                tenant_id = item[self._resource]['tenant_id']
+                tracked_deltas[tenant_id] = (
+                    tracked_deltas.get(tenant_id, 0) + 1)
+                continue
             try:
                 tenant_id = item[self._resource]['tenant_id']
                 count = quota.QUOTAS.count(request.context, self._resource,
@@ -414,6 +473,19 @@ class Controller(object):
                                          item[self._resource]['tenant_id'],
                                          **kwargs)
 
+        reservations = []
+        try:
+            for tenant_id, delta in sorted(tracked_deltas.items()):
+                reservations.append(quota.QUOTAS.make_reservation(
+                    request.context, tenant_id, **{self._resource: delta}))
+            return self._create(request, body, action, parent_id)
+        finally:
+            # The usages already account for the created resources
+            for reservation_id in reservations:
+                quota.QUOTAS.remove_reservation(request.context,
+                                                reservation_id)
+
+    def _create(self, request, body, action, parent_id):
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
             self._notifier.info(request.context,
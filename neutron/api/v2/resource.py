@@ -17,6 +17,7 @@
 Utility methods for working with WSGI servers redux
 """
 
+import collections
 import sys
 
 import netaddr
@@ -137,6 +138,14 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
+        if _is_streamed(result):
+            if hasattr(serializer, 'serialize_iter'):
+                return webob.Response(
+                    request=request, status=status,
+                    content_type=content_type,
+                    app_iter=serializer.serialize_iter(result))
+            result = dict((key, list(value) if _is_streamed_value(value)
+                           else value) for key, value in result.iteritems())
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
@@ -149,6 +158,16 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
     return resource
 
 
+def _is_streamed_value(value):
+    return isinstance(value, collections.Iterator)
+
+
+def _is_streamed(result):
+    """Whether a controller result holds lazily produced lists."""
+    return (isinstance(result, dict) and
+            any(_is_streamed_value(value) for value in result.itervalues()))
+
+
 def get_exception_data(e):
     """Extract the information about an exception.
 
@@ -63,6 +63,13 @@ core_opts = [
                help=_("The maximum number of items returned in a single "
                       "response, value was 'infinite' or negative integer "
                       "means no limit")),
+    cfg.IntOpt('list_streaming_chunk_size', default=0,
+               help=_("Number of items fetched, filtered and serialized at "
+                      "a time by the unsorted and unpaginated JSON list "
+                      "requests of the resources whose plugin supports it. "
+                      "The response is then streamed, so that its memory "
+                      "usage does not grow with the number of items. 0 "
+                      "builds the whole response at once")),
     cfg.IntOpt('max_dns_nameservers', default=5,
                help=_("Maximum number of DNS nameservers")),
     cfg.IntOpt('max_subnet_host_routes', default=20,
@@ -73,6 +80,12 @@ core_opts = [
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration (in seconds). Use -1 to tell "
                       "dnsmasq to use infinite lease times.")),
+    cfg.StrOpt('ipam_driver', default='availability_range',
+               choices=['availability_range', 'bitmap'],
+               help=_("How the free IP addresses of the allocation pools "
+                      "created from now on are stored. 'bitmap' spreads "
+                      "concurrent allocations on a subnet over blocks of "
+                      "addresses instead of a single availability range")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+
+import eventlet
 from eventlet import greenthread
 
 from oslo.config import cfg
@@ -22,6 +25,7 @@ from sqlalchemy.orm import exc
 from sqlalchemy import sql
 
 from neutron.common import rpc as n_rpc
+from neutron.db import api as db_api
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
@@ -32,11 +36,24 @@ from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
-cfg.CONF.register_opt(
+AGENT_OPTS = [
     cfg.IntOpt('agent_down_time', default=75,
                help=_("Seconds to regard the agent is down; should be at "
                       "least twice report_interval, to be sure the "
-                      "agent is down for good.")))
+                      "agent is down for good.")),
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=0,
+               help=_("Seconds between two writes of the agent heartbeats "
+                      "to the database. The heartbeats of the agents whose "
+                      "configurations did not change are kept in memory "
+                      "and written together once per interval. Should be "
+                      "well below agent_down_time, as other servers only "
+                      "see the written heartbeats. 0 writes each heartbeat "
+                      "when it is reported.")),
+]
+cfg.CONF.register_opts(AGENT_OPTS)
+
+# Number of agents whose heartbeats are written by a single UPDATE
+HEARTBEAT_FLUSH_BATCH_SIZE = 500
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -67,9 +84,136 @@ class Agent(model_base.BASEV2, models_v2.HasId):
     # configurations: a json dict string, I think 4095 is enough
     configurations = sa.Column(sa.String(4095), nullable=False)
 
+    @property
+    def last_heartbeat(self):
+        """Last heartbeat of the agent, even if not yet written."""
+        return HEARTBEATS.get_heartbeat(self.id, self.heartbeat_timestamp)
+
     @property
     def is_active(self):
-        return not AgentDbMixin.is_agent_down(self.heartbeat_timestamp)
+        return not AgentDbMixin.is_agent_down(self.last_heartbeat)
+
+
+def _hash_configurations(configurations):
+    return hashlib.sha1(jsonutils.dumps(configurations,
+                                        sort_keys=True)).hexdigest()
+
+
+class AgentHeartbeats(object):
+    """Coalesce the heartbeats of the agents of a server.
+
+    The heartbeat of an agent known by the server, whose configurations did
+    not change and which was not restarted, is only recorded in memory. The
+    recorded heartbeats are written by batched UPDATEs every
+    agent_heartbeat_flush_interval seconds.
+    """
+
+    def __init__(self):
+        # (agent_type, host) => (agent id, hash of the configurations)
+        self.agents = {}
+        # agent id => heartbeat not yet written
+        self.pending_heartbeats = {}
+        self._waiting_to_flush = False
+
+    def register(self, agent_id, agent_type, host, configurations_hash):
+        """Note an agent whose report was written to the database."""
+        if cfg.CONF.agent_heartbeat_flush_interval <= 0:
+            return
+        self.agents[(agent_type, host)] = (agent_id, configurations_hash)
+        self.pending_heartbeats.pop(agent_id, None)
+
+    def forget(self, agent_id):
+        for key, (known_id, _hash) in self.agents.items():
+            if known_id == agent_id:
+                del self.agents[key]
+        self.pending_heartbeats.pop(agent_id, None)
+
+    def get_heartbeat(self, agent_id, heartbeat_timestamp):
+        pending = self.pending_heartbeats.get(agent_id)
+        if pending and pending > heartbeat_timestamp:
+            return pending
+        return heartbeat_timestamp
+
+    def record(self, agent, configurations_hash):
+        """Record the heartbeat of a report which can be coalesced.
+
+        Returns False if the report must be written to the database.
+        """
+        if cfg.CONF.agent_heartbeat_flush_interval <= 0:
+            return False
+        if agent.get('start_flag'):
+            return False
+        agent_id, known_hash = self.agents.get(
+            (agent['agent_type'], agent['host']), (None, None))
+        if not agent_id or known_hash != configurations_hash:
+            return False
+        self.pending_heartbeats[agent_id] = timeutils.utcnow()
+        self._queue_flush()
+        return True
+
+    def _queue_flush(self):
+        if self._waiting_to_flush:
+            return
+
+        self._waiting_to_flush = True
+
+        def last_out_flushes():
+            eventlet.sleep(cfg.CONF.agent_heartbeat_flush_interval)
+            self._waiting_to_flush = False
+            self.flush()
+
+        eventlet.spawn_n(last_out_flushes)
+
+    def flush(self):
+        """Write the recorded heartbeats to the database.
+
+        The agents deleted meanwhile, or whose configurations were changed
+        by another server, are forgotten so that their next report is
+        written as it comes. Heartbeats newer than the recorded ones are
+        kept.
+        """
+        heartbeats, self.pending_heartbeats = self.pending_heartbeats, {}
+        known_hashes = dict(self.agents.values())
+        agent_ids = sorted(heartbeats)
+        session = db_api.get_session()
+        for i in range(0, len(agent_ids), HEARTBEAT_FLUSH_BATCH_SIZE):
+            batch = agent_ids[i:i + HEARTBEAT_FLUSH_BATCH_SIZE]
+            outdated = set(batch)
+            try:
+                with session.begin(subtransactions=True):
+                    rows = session.query(Agent.id, Agent.configurations)
+                    for agent_id, configurations in rows.filter(
+                            Agent.id.in_(batch)):
+                        try:
+                            configurations_hash = _hash_configurations(
+                                jsonutils.loads(configurations))
+                        except ValueError:
+                            continue
+                        if configurations_hash == known_hashes.get(agent_id):
+                            outdated.discard(agent_id)
+                    current = [agent_id for agent_id in batch
+                               if agent_id not in outdated]
+                    if current:
+                        new_heartbeat = sa.case(
+                            dict((agent_id, heartbeats[agent_id])
+                                 for agent_id in current),
+                            value=Agent.id)
+                        # Don't move back a heartbeat written by another
+                        # server
+                        session.query(Agent).filter(
+                            Agent.id.in_(current),
+                            Agent.heartbeat_timestamp < new_heartbeat).update(
+                                {'heartbeat_timestamp': new_heartbeat},
+                                synchronize_session=False)
+            except Exception:
+                LOG.exception(_("Failed to write the heartbeats of agents "
+                                "%s"), batch)
+                outdated = batch
+            for agent_id in outdated:
+                self.forget(agent_id)
+
+
+HEARTBEATS = AgentHeartbeats()
 
 
 class AgentDbMixin(ext_agent.AgentPluginBase):
@@ -94,7 +238,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
             LOG.debug('No enabled %(agent_type)s agent on host '
                       '%(host)s' % {'agent_type': agent_type, 'host': host})
             return
-        if self.is_agent_down(agent.heartbeat_timestamp):
+        if self.is_agent_down(agent.last_heartbeat):
             LOG.warn(_('%(agent_type)s agent %(agent_id)s is not active')
                      % {'agent_type': agent_type, 'agent_id': agent.id})
         return agent
@@ -120,6 +264,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
             ext_agent.RESOURCE_NAME + 's')
         res = dict((k, agent[k]) for k in attr
                    if k not in ['alive', 'configurations'])
+        res['heartbeat_timestamp'] = agent.last_heartbeat
         res['alive'] = not AgentDbMixin.is_agent_down(
             res['heartbeat_timestamp'])
         res['configurations'] = self.get_configuration_dict(agent)
@@ -129,6 +274,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        HEARTBEATS.forget(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -163,7 +309,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         agent = self._get_agent(context, id)
         return self._make_agent_dict(agent, fields)
 
-    def _create_or_update_agent(self, context, agent):
+    def _create_or_update_agent(self, context, agent, configurations_hash):
         with context.session.begin(subtransactions=True):
             res_keys = ['agent_type', 'binary', 'host', 'topic']
             res = dict((k, agent[k]) for k in res_keys)
@@ -189,12 +335,19 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 greenthread.sleep(0)
                 context.session.add(agent_db)
             greenthread.sleep(0)
+        HEARTBEATS.register(agent_db.id, agent['agent_type'], agent['host'],
+                            configurations_hash)
 
     def create_or_update_agent(self, context, agent):
         """Create or update agent according to report."""
 
+        configurations_hash = _hash_configurations(
+            agent.get('configurations', {}))
+        if HEARTBEATS.record(agent, configurations_hash):
+            return
         try:
-            return self._create_or_update_agent(context, agent)
+            return self._create_or_update_agent(context, agent,
+                                                configurations_hash)
         except db_exc.DBDuplicateEntry as e:
             with excutils.save_and_reraise_exception() as ctxt:
                 if e.columns == ['agent_type', 'host']:
@@ -211,7 +364,8 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                     # _get_agent_by_type_and_host() will return the existing
                     # agent entry, which will be updated multiple times
                     ctxt.reraise = False
-                    return self._create_or_update_agent(context, agent)
+                    return self._create_or_update_agent(
+                        context, agent, configurations_hash)
 
 
 class AgentExtRpcCallback(n_rpc.RpcCallback):
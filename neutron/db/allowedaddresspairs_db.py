@@ -74,7 +74,10 @@ class AllowedAddressPairsMixin(object):
 
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attr.PORTS, ['_extend_port_dict_allowed_address_pairs'])
+        attr.PORTS, ['_extend_port_dict_allowed_address_pairs'],
+        fields=[addr_pair.ADDRESS_PAIRS])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_relationship_fields(
+        models_v2.Port, 'allowed_address_pairs', [addr_pair.ADDRESS_PAIRS])
 
     def _delete_allowed_address_pairs(self, context, id):
         query = self._model_query(context, AllowedAddressPair)
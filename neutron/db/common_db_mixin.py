@@ -15,6 +15,7 @@
 
 import weakref
 
+from sqlalchemy import orm
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
@@ -35,6 +36,16 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # This dictionary maps the resource attributes added by the dict extend
+    # functions which registered them, so that the functions only adding
+    # attributes which are not requested can be skipped
+    _dict_extend_fields = {}
+
+    # This dictionary maps the eagerly loaded relationships of the models to
+    # the resource attributes built from them, so that the collection queries
+    # only join the relationships of the requested attributes
+    _model_relationship_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -60,6 +71,21 @@ class CommonDbMixin(object):
         model_hooks[name] = {'query': query_hook, 'filter': filter_hook,
                              'result_filters': result_filters}
 
+    @classmethod
+    def register_model_relationship_fields(cls, model, relationship, fields):
+        """Register the resource attributes built from a relationship.
+
+        When a collection is queried for given fields, and none of these
+        attributes is requested, the relationship is lazily loaded instead
+        of being joined. Reading it to build other attributes would then
+        issue a query per item, so the dict extend functions reading it must
+        register the attributes they add too.
+        An empty list of attributes means that the relationship is never read
+        to build the resource.
+        """
+        relationships = cls._model_relationship_fields.setdefault(model, {})
+        relationships[relationship] = frozenset(fields)
+
     @property
     def safe_reference(self):
         """Return a weakref to the instance.
@@ -140,10 +166,23 @@ class CommonDbMixin(object):
                     query = result_filter(query, filters)
         return query
 
+    def _apply_fields_to_query(self, query, model, fields):
+        if fields:
+            for relationship, relationship_fields in (
+                    self._model_relationship_fields.get(model,
+                                                        {}).iteritems()):
+                if relationship_fields.isdisjoint(fields):
+                    query = query.options(orm.lazyload(relationship))
+        return query
+
     def _apply_dict_extend_functions(self, resource_type,
-                                     response, db_object):
+                                     response, db_object, fields=None):
+        funcs_fields = self._dict_extend_fields.get(resource_type, {})
         for func in self._dict_extend_functions.get(
             resource_type, []):
+            if (fields and func in funcs_fields and
+                    funcs_fields[func].isdisjoint(fields)):
+                continue
             args = (response, db_object)
             if isinstance(func, basestring):
                 func = getattr(self, func, None)
@@ -155,9 +194,10 @@ class CommonDbMixin(object):
 
     def _get_collection_query(self, context, model, filters=None,
                               sorts=None, limit=None, marker_obj=None,
-                              page_reverse=False):
+                              page_reverse=False, fields=None):
         collection = self._model_query(context, model)
         collection = self._apply_filters_to_query(collection, model, filters)
+        collection = self._apply_fields_to_query(collection, model, fields)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         collection = sqlalchemyutils.paginate_query(collection, model, limit,
@@ -172,12 +212,39 @@ class CommonDbMixin(object):
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
-                                           page_reverse=page_reverse)
+                                           page_reverse=page_reverse,
+                                           fields=fields)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
 
+    def _iter_collection_query(self, query, model, chunk_size):
+        """Yield the rows of a query, loading chunk_size rows at a time.
+
+        Each chunk is read with its own query, ordered by id and starting
+        after the last id of the previous chunk, so that the eager loads of
+        the model are bounded by the chunk too.
+        """
+        last_id = None
+        while True:
+            chunk_query = query
+            if last_id is not None:
+                chunk_query = chunk_query.filter(model.id > last_id)
+            rows = chunk_query.order_by(model.id).limit(chunk_size).all()
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            last_id = rows[-1].id
+
+    def _iter_collection(self, context, model, dict_func, chunk_size,
+                         filters=None, fields=None):
+        query = self._get_collection_query(context, model, filters=filters,
+                                           fields=fields)
+        for row in self._iter_collection_query(query, model, chunk_size):
+            yield dict_func(row, fields)
+
     def _get_collection_count(self, context, model, filters=None):
         return self._get_collection_query(context, model, filters).count()
 
@@ -28,6 +28,7 @@ from neutron.common import exceptions as n_exc
 from neutron.common import ipv6_utils
 from neutron import context as ctx
 from neutron.db import common_db_mixin
+from neutron.db import ipam_bitmap_db
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron.extensions import l3
@@ -50,6 +51,25 @@ LOG = logging.getLogger(__name__)
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = [constants.DEVICE_OWNER_DHCP]
 
+_resource_delete_hook = None
+
+
+def register_resource_delete_hook(hook):
+    """Register the function deleting ports and subnets in bulk.
+
+    hook(query, resource) is called instead of query.delete(), resource
+    being 'port' or 'subnet'. This lets neutron.db.quota_db keep track of
+    their usages without being loaded by the plugins not supporting quotas.
+    """
+    global _resource_delete_hook
+    _resource_delete_hook = hook
+
+
+def _delete_resources(query, resource):
+    if _resource_delete_hook:
+        return _resource_delete_hook(query, resource)
+    return query.delete()
+
 
 class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         common_db_mixin.CommonDbMixin):
@@ -62,11 +82,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     """
 
     # This attribute specifies whether the plugin supports or not
-    # bulk/pagination/sorting operations. Name mangling is used in
-    # order to ensure it is qualified by class
+    # bulk/pagination/sorting/streaming operations. Name mangling is used
+    # in order to ensure it is qualified by class
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __native_streaming_support = True
 
     def __init__(self):
         if cfg.CONF.notify_nova_on_port_status_changes:
@@ -82,10 +103,31 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                          self.nova_notifier.record_port_status_changed)
 
     @classmethod
-    def register_dict_extend_funcs(cls, resource, funcs):
+    def register_dict_extend_funcs(cls, resource, funcs, fields=None):
+        """Register functions adding attributes to the resource dicts.
+
+        :param fields: the attributes added by the functions, if known.
+                       The functions are then not called when building
+                       resources for other fields.
+        """
         cur_funcs = cls._dict_extend_functions.get(resource, [])
         cur_funcs.extend(funcs)
         cls._dict_extend_functions[resource] = cur_funcs
+        if fields is not None:
+            funcs_fields = cls._dict_extend_fields.setdefault(resource, {})
+            for func in funcs:
+                funcs_fields[func] = frozenset(fields)
+
+    # Register the attributes built from the eagerly loaded relationships
+    # of the core models
+    common_db_mixin.CommonDbMixin.register_model_relationship_fields(
+        models_v2.Network, 'subnets', ['subnets'])
+    common_db_mixin.CommonDbMixin.register_model_relationship_fields(
+        models_v2.Subnet, 'allocation_pools', ['allocation_pools'])
+    common_db_mixin.CommonDbMixin.register_model_relationship_fields(
+        models_v2.Subnet, 'allocation_pools.available_ranges', [])
+    common_db_mixin.CommonDbMixin.register_model_relationship_fields(
+        models_v2.Port, 'fixed_ips', ['fixed_ips'])
 
     def _get_network(self, context, id):
         try:
@@ -127,15 +169,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _generate_mac(context, network_id):
-        base_mac = cfg.CONF.base_mac.split(':')
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._make_random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -152,6 +188,40 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise n_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _make_random_mac():
+        base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_macs(context, network_id, count):
+        """Generate count MAC addresses unique on the network.
+
+        Each attempt checks all the remaining candidates with one query.
+        """
+        max_retries = cfg.CONF.mac_generation_retries
+        mac_addresses = set()
+        for i in range(max_retries):
+            candidates = set(NeutronDbPluginV2._make_random_mac()
+                             for j in range(count - len(mac_addresses)))
+            candidates -= mac_addresses
+            used = context.session.query(models_v2.Port.mac_address).filter(
+                models_v2.Port.network_id == network_id,
+                models_v2.Port.mac_address.in_(candidates))
+            candidates -= set(mac for mac, in used)
+            mac_addresses |= candidates
+            if len(mac_addresses) == count:
+                return list(mac_addresses)
+        LOG.error(_("Unable to generate %(count)s mac addresses after "
+                    "%(max_retries)s attempts"),
+                  {'count': count, 'max_retries': max_retries})
+        raise n_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -212,9 +282,24 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
                 models_v2.IPAllocationPool).with_lockmode('update')
+        # With the bitmap driver most subnets have no range, try their
+        # blocks before locking the ranges of the subnet
+        bitmap_first = ipam_bitmap_db.is_enabled()
         for subnet in subnets:
+            ip_address = None
+            if bitmap_first:
+                ip_address = ipam_bitmap_db.generate_ip(context, subnet['id'])
+            if ip_address:
+                return {'ip_address': ip_address,
+                        'subnet_id': subnet['id']}
             ip_range = range_qry.filter_by(subnet_id=subnet['id']).first()
             if not ip_range:
+                if not bitmap_first:
+                    ip_address = ipam_bitmap_db.generate_ip(context,
+                                                            subnet['id'])
+                if ip_address:
+                    return {'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
                 LOG.debug("All IPs from subnet %(subnet_id)s (%(cidr)s) "
                           "allocated",
                           {'subnet_id': subnet['id'],
@@ -240,7 +325,54 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
     @staticmethod
-    def _rebuild_availability_ranges(context, subnets):
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses, as count calls to _generate_ip."""
+        ips = NeutronDbPluginV2._try_generate_ips(context, subnets, count)
+        if len(ips) < count:
+            # The addresses generated above are not stored yet, the rebuild
+            # must not make them available again
+            NeutronDbPluginV2._rebuild_availability_ranges(
+                context, subnets, pending_ips=ips)
+            ips.extend(NeutronDbPluginV2._try_generate_ips(
+                context, subnets, count - len(ips)))
+            if len(ips) < count:
+                raise n_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+        return ips
+
+    @staticmethod
+    def _try_generate_ips(context, subnets, count):
+        """Generate up to count IP addresses.
+
+        The addresses are taken from the availability ranges or blocks of
+        the first subnets, several at a time.
+        """
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        ips = []
+        for subnet in subnets:
+            for ip_range in range_qry.filter_by(subnet_id=subnet['id']).all():
+                if len(ips) == count:
+                    return ips
+                first_ip = netaddr.IPAddress(ip_range['first_ip'])
+                last_ip = netaddr.IPAddress(ip_range['last_ip'])
+                size = min(count - len(ips), int(last_ip) - int(first_ip) + 1)
+                ips.extend({'ip_address': str(first_ip + i),
+                            'subnet_id': subnet['id']} for i in range(size))
+                if first_ip + size > last_ip:
+                    context.session.delete(ip_range)
+                else:
+                    ip_range['first_ip'] = str(first_ip + size)
+            if len(ips) < count:
+                ips.extend({'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+                           for ip_address in ipam_bitmap_db.generate_ips(
+                               context, subnet['id'], count - len(ips)))
+        return ips
+
+    @staticmethod
+    def _rebuild_availability_ranges(context, subnets, pending_ips=None):
         """Rebuild availability ranges.
 
         This method is called only when there's no more IP available or by
@@ -248,6 +380,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         _update_subnet_allocation_pools before calling this function deletes
         the IPAllocationPools associated with the subnet that is updating,
         which will result in deleting the IPAvailabilityRange too.
+        pending_ips are the addresses generated but not stored yet as
+        IPAllocations, they are considered allocated too.
         """
         ip_qry = context.session.query(
             models_v2.IPAllocation).with_lockmode('update')
@@ -264,8 +398,15 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             ip_qry_results = ip_qry.filter_by(subnet_id=subnet['id'])
             allocations = netaddr.IPSet([netaddr.IPAddress(i['ip_address'])
                                         for i in ip_qry_results])
+            allocations.update(netaddr.IPAddress(ip['ip_address'])
+                               for ip in pending_ips or []
+                               if ip['subnet_id'] == subnet['id'])
 
             for pool in pool_qry.filter_by(subnet_id=subnet['id']):
+                if NeutronDbPluginV2._add_availability_chunks(
+                        context, pool, allocations):
+                    continue
+
                 # Create a set of all addresses in the pool
                 poolset = netaddr.IPSet(netaddr.IPRange(pool['first_ip'],
                                                         pool['last_ip']))
@@ -292,6 +433,21 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         last_ip=str(netaddr.IPAddress(ip_range.last)))
                     context.session.add(available_range)
 
+    @staticmethod
+    def _add_availability_chunks(context, pool, allocations=None):
+        """Store the free addresses of an allocation pool as bitmaps.
+
+        Returns False, and stores nothing, unless ipam_driver is 'bitmap'
+        and the pool is small enough; availability ranges are used then.
+        """
+        if (ipam_bitmap_db.is_enabled() and
+                ipam_bitmap_db.can_use_chunks(pool['first_ip'],
+                                              pool['last_ip'])):
+            allocated = set(int(ip) for ip in allocations or [])
+            ipam_bitmap_db.add_pool_chunks(context, pool, allocated)
+            return True
+        return False
+
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
@@ -329,6 +485,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         last_ip=old_last_ip)
                     context.session.add(new_ip_range)
                     return
+        ipam_bitmap_db.allocate_specific_ip(context, subnet_id, ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -528,6 +685,36 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             ips = self._allocate_fixed_ips(context, to_add, mac_address)
         return ips, prev_ips
 
+    @staticmethod
+    def _split_subnets(subnets):
+        """Split subnets into v4, v6 stateful and v6 stateless subnets."""
+        v4 = []
+        v6_stateful = []
+        v6_stateless = []
+        for subnet in subnets:
+            if subnet['ip_version'] == 4:
+                v4.append(subnet)
+            else:
+                if ipv6_utils.is_auto_address_subnet(subnet):
+                    v6_stateless.append(subnet)
+                else:
+                    v6_stateful.append(subnet)
+        return v4, v6_stateful, v6_stateless
+
+    def _allocate_eui64_ips(self, context, network_id, subnets, mac_address):
+        """Allocate the EUI-64 addresses of a MAC on SLAAC subnets."""
+        ips = []
+        for subnet in subnets:
+            prefix = subnet['cidr']
+            ip_address = ipv6_utils.get_ipv6_addr_by_EUI64(prefix, mac_address)
+            if not self._check_unique_ip(context, network_id,
+                                         subnet['id'], ip_address.format()):
+                raise n_exc.IpAddressInUse(net_id=network_id,
+                                           ip_address=ip_address.format())
+            ips.append({'ip_address': ip_address.format(),
+                        'subnet_id': subnet['id']})
+        return ips
+
     def _allocate_ips_for_port(self, context, port):
         """Allocate IP addresses for the port.
 
@@ -550,31 +737,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         else:
             filter = {'network_id': [p['network_id']]}
             subnets = self.get_subnets(context, filters=filter)
-            # Split into v4 and v6 subnets
-            v4 = []
-            v6_stateful = []
-            v6_stateless = []
-            for subnet in subnets:
-                if subnet['ip_version'] == 4:
-                    v4.append(subnet)
-                else:
-                    if ipv6_utils.is_auto_address_subnet(subnet):
-                        v6_stateless.append(subnet)
-                    else:
-                        v6_stateful.append(subnet)
-
-            for subnet in v6_stateless:
-                prefix = subnet['cidr']
-                ip_address = ipv6_utils.get_ipv6_addr_by_EUI64(
-                    prefix, p['mac_address'])
-                if not self._check_unique_ip(
-                    context, p['network_id'],
-                    subnet['id'], ip_address.format()):
-                    raise n_exc.IpAddressInUse(
-                        net_id=p['network_id'],
-                        ip_address=ip_address.format())
-                ips.append({'ip_address': ip_address.format(),
-                            'subnet_id': subnet['id']})
+            v4, v6_stateful, v6_stateless = self._split_subnets(subnets)
+
+            ips = self._allocate_eui64_ips(context, p['network_id'],
+                                           v6_stateless, p['mac_address'])
             version_subnets = [v4, v6_stateful]
             for subnets in version_subnets:
                 if subnets:
@@ -822,13 +988,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        # The relationships of unrequested fields may not have been loaded
+        if not fields or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.NETWORKS, res, network)
+                attributes.NETWORKS, res, network, fields)
         return self._fields(res, fields)
 
     def _make_subnet_dict(self, subnet, fields=None):
@@ -838,22 +1005,27 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'network_id': subnet['network_id'],
                'ip_version': subnet['ip_version'],
                'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
                'ipv6_ra_mode': subnet['ipv6_ra_mode'],
                'ipv6_address_mode': subnet['ipv6_address_mode'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        # The relationships of unrequested fields may not have been loaded
+        if not fields or 'allocation_pools' in fields:
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in subnet['allocation_pools']]
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         # Call auxiliary extend functions, if any
-        self._apply_dict_extend_functions(attributes.SUBNETS, res, subnet)
+        self._apply_dict_extend_functions(attributes.SUBNETS, res, subnet,
+                                          fields)
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -865,15 +1037,17 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                "mac_address": port["mac_address"],
                "admin_state_up": port["admin_state_up"],
                "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
                "device_id": port["device_id"],
                "device_owner": port["device_owner"]}
+        # The relationships of unrequested fields may not have been loaded
+        if not fields or 'fixed_ips' in fields:
+            res['fixed_ips'] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.PORTS, res, port)
+                attributes.PORTS, res, port, fields)
         return self._fields(res, fields)
 
     def _create_bulk(self, resource, context, request_items):
@@ -953,7 +1127,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
             # clean up subnets
             subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            _delete_resources(subnets_qry.filter_by(network_id=id), 'subnet')
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None):
@@ -1135,6 +1309,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
+                if NeutronDbPluginV2._add_availability_chunks(context,
+                                                              ip_pool):
+                    continue
                 ip_range = models_v2.IPAvailabilityRange(
                     ipallocationpool=ip_pool,
                     first_ip=pool['start'],
@@ -1301,6 +1478,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     marker_obj=marker_obj,
                                     page_reverse=page_reverse)
 
+    def iter_subnets(self, context, chunk_size, filters=None, fields=None):
+        return self._iter_collection(context, models_v2.Subnet,
+                                     self._make_subnet_dict, chunk_size,
+                                     filters=filters, fields=fields)
+
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
@@ -1308,6 +1490,103 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     def create_port_bulk(self, context, ports):
         return self._create_bulk('port', context, ports)
 
+    def _create_port_bulk_db(self, context, ports):
+        """Create several ports in the database, as create_port does.
+
+        The MAC addresses of the ports of a network, and the IP addresses of
+        those which do not request fixed_ips, are reserved for all of them
+        with a few queries. The ports and IP allocations are then added to
+        the session together, so that they are flushed as multi-row inserts.
+        Ports requesting fixed_ips are allocated their addresses one by one,
+        before the addresses of the other ports are generated.
+        """
+        items = [item['port'] for item in ports['ports']]
+        db_ports = [None] * len(items)
+        with context.session.begin(subtransactions=True):
+            by_network = {}
+            for index, p in enumerate(items):
+                by_network.setdefault(p['network_id'], []).append(index)
+            for network_id, indexes in by_network.iteritems():
+                self._get_network(context, network_id)
+                self._set_port_macs(context, network_id,
+                                    [items[index] for index in indexes])
+            # Ports requesting fixed_ips are allocated their addresses first,
+            # as they would be if created before the other ports, so that
+            # the addresses generated below skip them
+            for index, p in enumerate(items):
+                if p['fixed_ips'] is not attributes.ATTR_NOT_SPECIFIED:
+                    ips = self._allocate_ips_for_port(context, {'port': p})
+                    db_ports[index] = self._add_port_db(context, p, ips)
+            for network_id, indexes in by_network.iteritems():
+                auto = [index for index in indexes
+                        if items[index]['fixed_ips'] is
+                        attributes.ATTR_NOT_SPECIFIED]
+                if not auto:
+                    continue
+                subnets = self.get_subnets(
+                    context, filters={'network_id': [network_id]})
+                v4, v6_stateful, v6_stateless = self._split_subnets(subnets)
+                port_ips = dict((index, self._allocate_eui64_ips(
+                    context, network_id, v6_stateless,
+                    items[index]['mac_address'])) for index in auto)
+                for version_subnets in (v4, v6_stateful):
+                    if version_subnets:
+                        ips = self._generate_ips(context, version_subnets,
+                                                 len(auto))
+                        for index, ip in zip(auto, ips):
+                            port_ips[index].append(ip)
+                for index in auto:
+                    db_ports[index] = self._add_port_db(context, items[index],
+                                                        port_ips[index])
+        LOG.debug("Created ports %s", [db_port.id for db_port in db_ports])
+        return [self._make_port_dict(db_port, process_extensions=False)
+                for db_port in db_ports]
+
+    def _set_port_macs(self, context, network_id, items):
+        """Set the MAC addresses of ports of a network, checking them."""
+        requested = [p['mac_address'] for p in items
+                     if p['mac_address'] is not attributes.ATTR_NOT_SPECIFIED]
+        if requested:
+            used = context.session.query(models_v2.Port.mac_address).filter(
+                models_v2.Port.network_id == network_id,
+                models_v2.Port.mac_address.in_(requested)).first()
+            if used or len(set(requested)) < len(requested):
+                mac = used[0] if used else next(
+                    mac for mac in requested if requested.count(mac) > 1)
+                raise n_exc.MacAddressInUse(net_id=network_id, mac=mac)
+        unset = [p for p in items
+                 if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED]
+        if unset:
+            mac_addresses = NeutronDbPluginV2._generate_macs(
+                context, network_id, len(unset))
+            for p, mac_address in zip(unset, mac_addresses):
+                p['mac_address'] = mac_address
+
+    def _add_port_db(self, context, p, ips):
+        port_id = p.get('id') or uuidutils.generate_uuid()
+        tenant_id = self._get_tenant_id_for_create(context, p)
+        if p.get('device_owner') == constants.DEVICE_OWNER_ROUTER_INTF:
+            self._enforce_device_owner_not_router_intf_or_device_id(context, p,
+                                                                    tenant_id)
+        fixed_ips = [models_v2.IPAllocation(network_id=p['network_id'],
+                                            port_id=port_id,
+                                            ip_address=ip['ip_address'],
+                                            subnet_id=ip['subnet_id'])
+                     for ip in ips]
+        db_port = models_v2.Port(tenant_id=tenant_id,
+                                 name=p['name'],
+                                 id=port_id,
+                                 network_id=p['network_id'],
+                                 mac_address=p['mac_address'],
+                                 admin_state_up=p['admin_state_up'],
+                                 status=p.get('status',
+                                              constants.PORT_STATUS_ACTIVE),
+                                 device_id=p['device_id'],
+                                 device_owner=p['device_owner'],
+                                 fixed_ips=fixed_ips)
+        context.session.add(db_port)
+        return db_port
+
     def create_port(self, context, port):
         p = port['port']
         port_id = p.get('id') or uuidutils.generate_uuid()
@@ -1439,14 +1718,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                  enable_eagerloads(False).filter_by(id=id))
         if not context.is_admin:
             query = query.filter_by(tenant_id=context.tenant_id)
-        query.delete()
+        _delete_resources(query, 'port')
 
     def get_port(self, context, id, fields=None):
         port = self._get_port(context, id)
         return self._make_port_dict(port, fields)
 
     def _get_ports_query(self, context, filters=None, sorts=None, limit=None,
-                         marker_obj=None, page_reverse=False):
+                         marker_obj=None, page_reverse=False, fields=None):
         Port = models_v2.Port
         IPAllocation = models_v2.IPAllocation
 
@@ -1466,6 +1745,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 query = query.filter(IPAllocation.subnet_id.in_(subnet_ids))
 
         query = self._apply_filters_to_query(query, Port, filters)
+        query = self._apply_fields_to_query(query, Port, fields)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         query = sqlalchemyutils.paginate_query(query, Port, limit,
@@ -1479,12 +1759,19 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
-                                      page_reverse=page_reverse)
+                                      page_reverse=page_reverse,
+                                      fields=fields)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
 
+    def iter_ports(self, context, chunk_size, filters=None, fields=None):
+        query = self._get_ports_query(context, filters=filters, fields=fields)
+        for port in self._iter_collection_query(query, models_v2.Port,
+                                                chunk_size):
+            yield self._make_port_dict(port, fields)
+
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
 
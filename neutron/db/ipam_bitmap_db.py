@@ -0,0 +1,187 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Bitmap backed IP address availability.
+
+The allocation pools of the subnets created while ipam_driver is 'bitmap'
+are split in blocks of CHUNK_SIZE addresses, and the free addresses of each
+block are stored as a bitmap in a single IPAvailabilityChunk row. An address
+is generated by locking a random block which still has free addresses, so
+that concurrent port creations on the same subnet seldom wait on the same
+row, unlike the single IPAvailabilityRange row they all lock otherwise.
+
+As with availability ranges, a block without free addresses is deleted and
+released addresses are only recovered when the subnet is exhausted and its
+availability is rebuilt from the IP allocations.
+"""
+
+import random
+
+import netaddr
+from oslo.config import cfg
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+IPAM_DRIVER_RANGE = 'availability_range'
+IPAM_DRIVER_BITMAP = 'bitmap'
+
+CHUNK_SIZE = 256
+# Pools which would need more blocks than this, such as most IPv6 pools,
+# keep using availability ranges.
+MAX_CHUNKS_PER_POOL = 1024
+
+
+class IPAvailabilityChunk(model_base.BASEV2):
+    """Free addresses of a block of an allocation pool.
+
+    Bit n of the bitmap, stored as an hexadecimal string, is set when the
+    address first_ip + n is free.
+    """
+
+    allocation_pool_id = sa.Column(sa.String(36),
+                                   sa.ForeignKey('ipallocationpools.id',
+                                                 ondelete="CASCADE"),
+                                   nullable=False,
+                                   primary_key=True)
+    first_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    bitmap = sa.Column(sa.String(CHUNK_SIZE / 4), nullable=False)
+    ipallocationpool = orm.relationship(models_v2.IPAllocationPool)
+
+    def __repr__(self):
+        return "%s/%s" % (self.first_ip, self.bitmap)
+
+
+def is_enabled():
+    """Return whether new allocation pools use bitmaps."""
+    return cfg.CONF.ipam_driver == IPAM_DRIVER_BITMAP
+
+
+def can_use_chunks(first_ip, last_ip):
+    size = int(netaddr.IPAddress(last_ip)) - int(netaddr.IPAddress(first_ip))
+    return size < CHUNK_SIZE * MAX_CHUNKS_PER_POOL
+
+
+def make_chunks(first_ip, last_ip, allocated=()):
+    """Yield the first address and bitmap of the blocks of a pool.
+
+    allocated is a set of the integer values of the allocated addresses.
+    Blocks without any free address are skipped.
+    """
+    first = netaddr.IPAddress(first_ip)
+    size = int(netaddr.IPAddress(last_ip)) - int(first) + 1
+    for offset in xrange(0, size, CHUNK_SIZE):
+        chunk_first = first + offset
+        chunk_size = min(CHUNK_SIZE, size - offset)
+        bitmap = (1 << chunk_size) - 1
+        base = int(chunk_first)
+        for n in xrange(chunk_size):
+            if base + n in allocated:
+                bitmap &= ~(1 << n)
+        if bitmap:
+            yield str(chunk_first), bitmap
+
+
+def add_pool_chunks(context, pool, allocated=()):
+    """Store the availability of an allocation pool as bitmaps."""
+    for first_ip, bitmap in make_chunks(pool['first_ip'], pool['last_ip'],
+                                        allocated):
+        context.session.add(IPAvailabilityChunk(ipallocationpool=pool,
+                                                first_ip=first_ip,
+                                                bitmap='%x' % bitmap))
+
+
+def _store_bitmap(context, chunk, bitmap):
+    if bitmap:
+        chunk.bitmap = '%x' % bitmap
+    else:
+        # No more free addresses in the block => delete
+        context.session.delete(chunk)
+
+
+def _lock_chunk(context, allocation_pool_id, first_ip):
+    return context.session.query(IPAvailabilityChunk).filter_by(
+        allocation_pool_id=allocation_pool_id,
+        first_ip=first_ip).with_lockmode('update').first()
+
+
+def generate_ips(context, subnet_id, count):
+    """Allocate up to count free addresses of the blocks of a subnet.
+
+    Each locked block gives as many addresses as needed before the next
+    one is tried. Fewer addresses are returned if the blocks run out.
+    """
+    keys = context.session.query(
+        IPAvailabilityChunk.allocation_pool_id,
+        IPAvailabilityChunk.first_ip).join(
+            models_v2.IPAllocationPool,
+            models_v2.IPAllocationPool.id ==
+            IPAvailabilityChunk.allocation_pool_id).filter(
+                models_v2.IPAllocationPool.subnet_id == subnet_id).all()
+    random.shuffle(keys)
+    ip_addresses = []
+    for allocation_pool_id, first_ip in keys:
+        if len(ip_addresses) == count:
+            break
+        chunk = _lock_chunk(context, allocation_pool_id, first_ip)
+        if not chunk:
+            # Filled up by a concurrent allocation
+            continue
+        bitmap = int(chunk.bitmap, 16)
+        while bitmap and len(ip_addresses) < count:
+            offset = (bitmap & -bitmap).bit_length() - 1
+            bitmap &= ~(1 << offset)
+            ip_addresses.append(str(netaddr.IPAddress(first_ip) + offset))
+        _store_bitmap(context, chunk, bitmap)
+    LOG.debug("Allocated IPs %(ip_addresses)s from the blocks of subnet "
+              "%(subnet_id)s",
+              {'ip_addresses': ip_addresses, 'subnet_id': subnet_id})
+    return ip_addresses
+
+
+def generate_ip(context, subnet_id):
+    """Allocate a free address of the blocks of a subnet.
+
+    Returns None if the subnet has no block with a free address.
+    """
+    ip_addresses = generate_ips(context, subnet_id, 1)
+    if ip_addresses:
+        return ip_addresses[0]
+
+
+def allocate_specific_ip(context, subnet_id, ip_address):
+    """Remove an address from the free addresses of its block.
+
+    Returns False if the address is not free in any block of the subnet.
+    """
+    ip = netaddr.IPAddress(ip_address)
+    pools = context.session.query(models_v2.IPAllocationPool).options(
+        orm.noload('available_ranges')).filter_by(subnet_id=subnet_id)
+    for pool in pools:
+        first = netaddr.IPAddress(pool['first_ip'])
+        if not first <= ip <= netaddr.IPAddress(pool['last_ip']):
+            continue
+        index, offset = divmod(int(ip) - int(first), CHUNK_SIZE)
+        chunk = _lock_chunk(context, pool['id'],
+                            str(first + index * CHUNK_SIZE))
+        if chunk and int(chunk.bitmap, 16) & (1 << offset):
+            _store_bitmap(context, chunk,
+                          int(chunk.bitmap, 16) & ~(1 << offset))
+            return True
+    return False
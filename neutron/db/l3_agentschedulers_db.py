@@ -124,6 +124,10 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
                           l3_attrs_db.RouterExtraAttributes.ha == sql.null())))
 
         for binding in down_bindings:
+            # The last heartbeats may not be written yet
+            if agents_db.HEARTBEATS.get_heartbeat(binding.l3_agent_id,
+                                                  cutoff) > cutoff:
+                continue
             LOG.warn(_LW("Rescheduling router %(router)s from agent %(agent)s "
                          "because the agent did not report to the server in "
                          "the last %(dead_time)s seconds."),
@@ -277,8 +281,11 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         else:
             return {'routers': []}
 
-    def list_active_sync_routers_on_active_l3_agent(
-            self, context, host, router_ids):
+    def list_router_ids_on_host(self, context, host, router_ids=None):
+        """List the ids of the routers hosted by the l3 agent of a host.
+
+        No router is listed when the agent is administratively down.
+        """
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_L3, host)
         if not agent.admin_state_up:
@@ -290,7 +297,11 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         if router_ids:
             query = query.filter(
                 RouterL3AgentBinding.router_id.in_(router_ids))
-        router_ids = [item[0] for item in query]
+        return [item[0] for item in query]
+
+    def list_active_sync_routers_on_active_l3_agent(
+            self, context, host, router_ids):
+        router_ids = self.list_router_ids_on_host(context, host, router_ids)
         if router_ids:
             if n_utils.is_extension_supported(self,
                                               constants.L3_HA_MODE_EXT_ALIAS):
@@ -306,6 +317,18 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
     def get_l3_agents_hosting_routers(self, context, router_ids,
                                       admin_state_up=None,
                                       active=None):
+        return [binding.l3_agent for binding in
+                self.get_l3_agent_bindings_hosting_routers(
+                    context, router_ids, admin_state_up=admin_state_up,
+                    active=active)]
+
+    def get_l3_agent_bindings_hosting_routers(self, context, router_ids,
+                                              admin_state_up=None,
+                                              active=None):
+        """Return the bindings of routers to the L3 agents hosting them.
+
+        The l3_agent of the bindings is loaded by the same query.
+        """
         if not router_ids:
             return []
         query = context.session.query(RouterL3AgentBinding)
@@ -316,15 +339,14 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
             query = query.options(joinedload('l3_agent')).filter(
                 RouterL3AgentBinding.router_id == router_ids[0])
         if admin_state_up is not None:
-            query = (query.filter(agents_db.Agent.admin_state_up ==
-                                  admin_state_up))
-        l3_agents = [binding.l3_agent for binding in query]
+            query = query.filter(RouterL3AgentBinding.l3_agent.has(
+                admin_state_up=admin_state_up))
+        bindings = query.all()
         if active is not None:
-            l3_agents = [l3_agent for l3_agent in
-                         l3_agents if not
-                         agents_db.AgentDbMixin.is_agent_down(
-                             l3_agent['heartbeat_timestamp'])]
-        return l3_agents
+            bindings = [binding for binding in bindings if not
+                        agents_db.AgentDbMixin.is_agent_down(
+                            binding.l3_agent['last_heartbeat'])]
+        return bindings
 
     def _get_l3_bindings_hosting_routers(self, context, router_ids):
         if not router_ids:
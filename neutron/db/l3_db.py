@@ -979,19 +979,27 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
         device_owners = device_owners or [DEVICE_OWNER_ROUTER_INTF]
         if not router_ids:
             return []
-        qry = context.session.query(RouterPort)
+        return self._get_sync_router_ports(context, router_ids, device_owners)
+
+    def _get_sync_router_ports(self, context, router_ids, port_types):
+        """Query the ports of the given types of a list of router_ids.
+
+        Only the port ids are read from the router ports, the ports and
+        their subnets are then queried at once, whatever the number of
+        routers.
+        """
+        qry = context.session.query(RouterPort.port_id)
         qry = qry.filter(
-            Router.id.in_(router_ids),
-            RouterPort.port_type.in_(device_owners)
+            RouterPort.router_id.in_(router_ids),
+            RouterPort.port_type.in_(port_types)
         )
-
-        # TODO(markmcclain): This is suboptimal but was left to reduce
-        # changeset size since it is late in cycle
-        ports = [rp.port.id for rp in qry]
-        interfaces = self._core_plugin.get_ports(context, {'id': ports})
-        if interfaces:
-            self._populate_subnet_for_ports(context, interfaces)
-        return interfaces
+        port_ids = [port_id for port_id, in qry]
+        if not port_ids:
+            return []
+        ports = self._core_plugin.get_ports(context, {'id': port_ids})
+        if ports:
+            self._populate_subnet_for_ports(context, ports)
+        return ports
 
     def _populate_subnet_for_ports(self, context, ports):
         """Populate ports with subnet.
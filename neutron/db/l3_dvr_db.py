@@ -266,19 +266,9 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
         """Query router interfaces that relate to list of router_ids."""
         if not router_ids:
             return []
-        qry = context.session.query(l3_db.RouterPort)
-        qry = qry.filter(
-            l3_db.RouterPort.router_id.in_(router_ids),
-            l3_db.RouterPort.port_type == DEVICE_OWNER_DVR_SNAT
-        )
-
-        # TODO(markmcclain): This is suboptimal but was left to reduce
-        # changeset size since it is late in cycle
-        ports = [rp.port.id for rp in qry]
-        interfaces = self._core_plugin.get_ports(context, {'id': ports})
+        interfaces = self._get_sync_router_ports(
+            context, router_ids, [DEVICE_OWNER_DVR_SNAT])
         LOG.debug("Return the SNAT ports: %s", interfaces)
-        if interfaces:
-            self._populate_subnet_for_ports(context, interfaces)
         return interfaces
 
     def _build_routers_list(self, context, routers, gw_ports):
@@ -310,35 +300,48 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
 
     def _process_routers(self, context, routers):
         routers_dict = {}
+        # The SNAT ports of all the routers with a gateway are queried at once
+        snat_router_intfs_by_router = dict(
+            (router['id'], []) for router in routers if router['gw_port_id'])
+        for snat_router_intf in self.get_snat_sync_interfaces(
+                context, snat_router_intfs_by_router.keys()):
+            router_intfs = snat_router_intfs_by_router.get(
+                snat_router_intf['device_id'])
+            if router_intfs is not None:
+                router_intfs.append(snat_router_intf)
         for router in routers:
             routers_dict[router['id']] = router
-            router_ids = [router['id']]
             if router['gw_port_id']:
-                snat_router_intfs = self.get_snat_sync_interfaces(context,
-                                                                  router_ids)
+                snat_router_intfs = snat_router_intfs_by_router[router['id']]
                 LOG.debug("SNAT ports returned: %s ", snat_router_intfs)
                 router[SNAT_ROUTER_INTF_KEY] = snat_router_intfs
         return routers_dict
 
     def _process_floating_ips(self, context, routers_dict, floating_ips):
+        # The FIP agent ports are queried once per host
+        fip_agent_intfs_by_host = {}
         for floating_ip in floating_ips:
             router = routers_dict.get(floating_ip['router_id'])
             if router:
                 router_floatingips = router.get(l3_const.FLOATINGIP_KEY, [])
                 floatingip_agent_intfs = []
                 if router['distributed']:
-                    floating_ip['host'] = self.get_vm_port_hostid(
-                        context, floating_ip['port_id'])
-                    LOG.debug("Floating IP host: %s", floating_ip['host'])
+                    if 'host' not in floating_ip:
+                        floating_ip['host'] = self.get_vm_port_hostid(
+                            context, floating_ip['port_id'])
+                    host = floating_ip['host']
+                    LOG.debug("Floating IP host: %s", host)
                     # if no VM there won't be an agent assigned
-                    if not floating_ip['host']:
+                    if not host:
                         continue
-                    fip_agent = self._get_agent_by_type_and_host(
-                        context, l3_const.AGENT_TYPE_L3,
-                        floating_ip['host'])
-                    LOG.debug("FIP Agent : %s ", fip_agent['id'])
-                    floatingip_agent_intfs = self.get_fip_sync_interfaces(
-                        context, fip_agent['id'])
+                    if host not in fip_agent_intfs_by_host:
+                        fip_agent = self._get_agent_by_type_and_host(
+                            context, l3_const.AGENT_TYPE_L3, host)
+                        LOG.debug("FIP Agent : %s ", fip_agent['id'])
+                        fip_agent_intfs_by_host[host] = (
+                            self.get_fip_sync_interfaces(context,
+                                                         fip_agent['id']))
+                    floatingip_agent_intfs = fip_agent_intfs_by_host[host]
                     LOG.debug("FIP Agent ports: %s", floatingip_agent_intfs)
                 router_floatingips.append(floating_ip)
                 router[l3_const.FLOATINGIP_KEY] = router_floatingips
@@ -363,8 +366,10 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
             device_owners=[l3_const.DEVICE_OWNER_ROUTER_INTF,
                            DEVICE_OWNER_DVR_INTERFACE])
         # Add the port binding host to the floatingip dictionary
+        hosts = self.get_vm_port_hostids(
+            context, [fip['port_id'] for fip in floating_ips])
         for fip in floating_ips:
-            fip['host'] = self.get_vm_port_hostid(context, fip['port_id'])
+            fip['host'] = hosts.get(fip['port_id'])
         routers_dict = self._process_routers(context, routers)
         self._process_floating_ips(context, routers_dict, floating_ips)
         self._process_interfaces(routers_dict, interfaces)
@@ -378,6 +383,20 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
             device_owner == DEVICE_OWNER_AGENT_GW):
             return vm_port_db[portbindings.HOST_ID]
 
+    def get_vm_port_hostids(self, context, port_ids):
+        """Return the portbinding host_id of a list of ports by port id.
+
+        The ports are queried at once, the ports which do not exist anymore
+        are left out.
+        """
+        port_ids = [port_id for port_id in port_ids if port_id]
+        if not port_ids:
+            return {}
+        ports = self._core_plugin.get_ports(context, {'id': port_ids})
+        return dict((port['id'],
+                     self.get_vm_port_hostid(context, port['id'], port))
+                    for port in ports)
+
     def get_agent_gw_ports_exist_for_network(
             self, context, network_id, host, agent_id):
         """Return agent gw port if exist, or None otherwise."""
@@ -545,28 +564,49 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
         a Nova instance gets created or deleted.
         """
         port_dict = self._core_plugin._get_port(context, port_id)
-        # Check this is a valid VM port
-        if ("compute:" not in port_dict['device_owner'] or
-            not port_dict['fixed_ips']):
-            return
-        ip_address = port_dict['fixed_ips'][0]['ip_address']
-        subnet = port_dict['fixed_ips'][0]['subnet_id']
-        filters = {'fixed_ips': {'subnet_id': [subnet]}}
+        self._dvr_vmarp_table_update(context, [port_dict], action)
+
+    def dvr_vmarp_tables_update(self, context, port_ids, action):
+        """Notify the L3 agents of the VM ARP table changes of many ports.
+
+        The ports are fetched at once, and the distributed router of each
+        of their subnets is only looked up once.
+        """
+        ports = self._core_plugin.get_ports(context,
+                                            filters={'id': list(port_ids)})
+        self._dvr_vmarp_table_update(context, ports, action)
+
+    def _get_subnet_dvr_router_id(self, context, subnet_id):
+        filters = {'fixed_ips': {'subnet_id': [subnet_id]},
+                   'device_owner': [DEVICE_OWNER_DVR_INTERFACE]}
         ports = self._core_plugin.get_ports(context, filters=filters)
         for port in ports:
-            if port['device_owner'] == DEVICE_OWNER_DVR_INTERFACE:
-                router_id = port['device_id']
-                router_dict = self._get_router(context, router_id)
-                if router_dict.extra_attributes.distributed:
-                    arp_table = {'ip_address': ip_address,
-                                 'mac_address': port_dict['mac_address'],
-                                 'subnet_id': subnet}
-                    if action == "add":
-                        notify_action = self.l3_rpc_notifier.add_arp_entry
-                    elif action == "del":
-                        notify_action = self.l3_rpc_notifier.del_arp_entry
-                    notify_action(context, router_id, arp_table)
-                    return
+            router_id = port['device_id']
+            router_dict = self._get_router(context, router_id)
+            if router_dict.extra_attributes.distributed:
+                return router_id
+
+    def _dvr_vmarp_table_update(self, context, ports, action):
+        if action == "add":
+            notify_action = self.l3_rpc_notifier.add_arp_entry
+        elif action == "del":
+            notify_action = self.l3_rpc_notifier.del_arp_entry
+        router_ids = {}
+        for port_dict in ports:
+            # Check this is a valid VM port
+            if ("compute:" not in port_dict['device_owner'] or
+                not port_dict['fixed_ips']):
+                continue
+            ip_address = port_dict['fixed_ips'][0]['ip_address']
+            subnet = port_dict['fixed_ips'][0]['subnet_id']
+            if subnet not in router_ids:
+                router_ids[subnet] = self._get_subnet_dvr_router_id(context,
+                                                                    subnet)
+            if router_ids[subnet]:
+                arp_table = {'ip_address': ip_address,
+                             'mac_address': port_dict['mac_address'],
+                             'subnet_id': subnet}
+                notify_action(context, router_ids[subnet], arp_table)
 
     def delete_csnat_router_interface_ports(self, context,
                                             router, subnet_id=None):
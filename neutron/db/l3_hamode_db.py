@@ -430,6 +430,7 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin):
 
         query = query.filter(
             L3HARouterAgentPortBinding.router_id.in_(router_ids))
+        query = query.options(orm.joinedload('port'))
 
         return query.all()
 
@@ -439,17 +440,16 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin):
         bindings = self.get_ha_router_port_bindings(context,
                                                     routers_dict.keys(),
                                                     host)
+        interfaces = []
         for binding in bindings:
             port_dict = self._core_plugin._make_port_dict(binding.port)
+            interfaces.append(port_dict)
 
             router = routers_dict.get(binding.router_id)
             router[constants.HA_INTERFACE_KEY] = port_dict
             router[constants.HA_ROUTER_STATE_KEY] = binding.state
 
-        for router in routers_dict.values():
-            interface = router.get(constants.HA_INTERFACE_KEY)
-            if interface:
-                self._populate_subnet_for_ports(context, [interface])
+        self._populate_subnet_for_ports(context, interfaces)
 
         return routers_dict.values()
 
@@ -0,0 +1,39 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add security group revision
+
+Revision ID: 1f5e3c7a9b2d
+Revises: 3c2a4b5d9e1f
+Create Date: 2014-11-10 15:42:08.412396
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f5e3c7a9b2d'
+down_revision = '3c2a4b5d9e1f'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('securitygroups',
+                  sa.Column('revision', sa.Integer(), nullable=False,
+                            server_default='0'))
+
+
+def downgrade():
+    op.drop_column('securitygroups', 'revision')
@@ -0,0 +1,62 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add quota usages and reservations
+
+Revision ID: 2b7c4e9d5a1f
+Revises: 4d8e2f6a1c3b
+Create Date: 2014-11-20 15:42:08.331467
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2b7c4e9d5a1f'
+down_revision = '4d8e2f6a1c3b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'quotausages',
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('resource', sa.String(length=255), nullable=False),
+        sa.Column('in_use', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id', 'resource'))
+    op.create_table(
+        'reservations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('expiration', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_reservations_expiration', 'reservations',
+                    ['expiration'], unique=False)
+    op.create_table(
+        'resourcedeltas',
+        sa.Column('reservation_id', sa.String(length=36), nullable=False),
+        sa.Column('resource', sa.String(length=255), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['reservation_id'], ['reservations.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('reservation_id', 'resource'))
+
+
+def downgrade():
+    op.drop_table('resourcedeltas')
+    op.drop_index('ix_reservations_expiration',
+                  table_name='reservations')
+    op.drop_table('reservations')
+    op.drop_table('quotausages')
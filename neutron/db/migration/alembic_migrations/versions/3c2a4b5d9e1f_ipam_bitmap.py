@@ -0,0 +1,46 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add bitmap ip availability
+
+Revision ID: 3c2a4b5d9e1f
+Revises: juno
+Create Date: 2014-11-03 10:12:41.261874
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c2a4b5d9e1f'
+down_revision = 'juno'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'ipavailabilitychunks',
+        sa.Column('allocation_pool_id', sa.String(length=36),
+                  nullable=False),
+        sa.Column('first_ip', sa.String(length=64), nullable=False),
+        sa.Column('bitmap', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['allocation_pool_id'],
+                                ['ipallocationpools.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('allocation_pool_id', 'first_ip'))
+
+
+def downgrade():
+    op.drop_table('ipavailabilitychunks')
@@ -0,0 +1,44 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add l2population fdb generations
+
+Revision ID: 4d8e2f6a1c3b
+Revises: 1f5e3c7a9b2d
+Create Date: 2014-11-14 10:21:37.118529
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4d8e2f6a1c3b'
+down_revision = '1f5e3c7a9b2d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'ml2_l2pop_fdb_generations',
+        sa.Column('network_id', sa.String(length=36), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False,
+                  server_default='0'),
+        sa.ForeignKeyConstraint(['network_id'], ['networks.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('network_id'))
+
+
+def downgrade():
+    op.drop_table('ml2_l2pop_fdb_generations')
@@ -0,0 +1,39 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add security group member revision
+
+Revision ID: 5a2c8e4f7d1b
+Revises: 2b7c4e9d5a1f
+Create Date: 2014-11-24 10:12:45.207713
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5a2c8e4f7d1b'
+down_revision = '2b7c4e9d5a1f'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('securitygroups',
+                  sa.Column('member_revision', sa.Integer(), nullable=False,
+                            server_default='0'))
+
+
+def downgrade():
+    op.drop_column('securitygroups', 'member_revision')
@@ -29,6 +29,7 @@ from neutron.db import external_net_db  # noqa
 from neutron.db import extradhcpopt_db  # noqa
 from neutron.db import extraroute_db  # noqa
 from neutron.db.firewall import firewall_db  # noqa
+from neutron.db import ipam_bitmap_db  # noqa
 from neutron.db import l3_agentschedulers_db  # noqa
 from neutron.db import l3_attrs_db  # noqa
 from neutron.db import l3_db  # noqa
@@ -62,6 +63,7 @@ from neutron.plugins.ml2.drivers.brocade.db import (  # noqa
 from neutron.plugins.ml2.drivers.cisco.apic import apic_model  # noqa
 from neutron.plugins.ml2.drivers.cisco.nexus import (  # noqa
     nexus_models_v2 as ml2_nexus_models_v2)
+from neutron.plugins.ml2.drivers.l2pop import db as l2pop_db  # noqa
 from neutron.plugins.ml2.drivers import type_flat  # noqa
 from neutron.plugins.ml2.drivers import type_gre  # noqa
 from neutron.plugins.ml2.drivers import type_vlan  # noqa
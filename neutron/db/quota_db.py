@@ -13,11 +13,27 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import random
+
+from oslo.config import cfg
+from oslo.db import exception as db_exc
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
 
 from neutron.common import exceptions
+from neutron import context as n_context
+from neutron.db import db_base_plugin_v2
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron import quota
+
+LOG = logging.getLogger(__name__)
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -31,6 +47,114 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Number of resources of a tenant, tracked as they are created."""
+
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Resources reserved by a tenant until they are created."""
+
+    tenant_id = sa.Column(sa.String(255), nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False, index=True)
+    resource_deltas = orm.relationship('ResourceDelta',
+                                       cascade='all, delete-orphan',
+                                       lazy='joined')
+
+
+class ResourceDelta(model_base.BASEV2):
+    """Number of resources of a reservation."""
+
+    reservation_id = sa.Column(sa.String(36),
+                               sa.ForeignKey('reservations.id',
+                                             ondelete='CASCADE'),
+                               primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    amount = sa.Column(sa.Integer, nullable=False)
+
+
+# Resource name => model whose rows are counted by QuotaUsage
+TRACKED_RESOURCES = {}
+
+
+def register_tracked_resource(resource, model):
+    """Track the usage of a resource stored as rows of model.
+
+    The usages are only tracked while quota_driver is
+    TrackedDbQuotaDriver.
+    """
+    TRACKED_RESOURCES[resource] = model
+
+
+def _count_tenant_resources(session, model, tenant_id=None):
+    query = session.query(model.tenant_id, sa.func.count(model.id))
+    if tenant_id is not None:
+        query = query.filter(model.tenant_id == tenant_id)
+    return dict(query.group_by(model.tenant_id))
+
+
+def _tracks_usages():
+    return cfg.CONF.QUOTAS.quota_driver == quota.QUOTA_DB_TRACKED_DRIVER
+
+
+def _apply_usage_deltas(session, deltas):
+    usages = QuotaUsage.__table__
+    for (tenant_id, resource), delta in sorted(deltas.items()):
+        if delta:
+            # The usages not yet counted are counted when first checked
+            session.execute(usages.update().where(sa.and_(
+                usages.c.tenant_id == tenant_id,
+                usages.c.resource == resource)).values(
+                    in_use=usages.c.in_use + delta))
+
+
+def _update_usages(session, flush_context):
+    """Count the tracked resources created or deleted by a flush."""
+    if not _tracks_usages():
+        return
+    models = dict((model, resource)
+                  for resource, model in TRACKED_RESOURCES.items())
+    deltas = {}
+    for objs, delta in ((session.new, 1), (session.deleted, -1)):
+        for obj in objs:
+            resource = models.get(type(obj))
+            if resource and obj.tenant_id:
+                key = (obj.tenant_id, resource)
+                deltas[key] = deltas.get(key, 0) + delta
+    _apply_usage_deltas(session, deltas)
+
+
+event.listen(orm.Session, 'after_flush', _update_usages)
+
+
+def delete_tracked_resources(query, resource):
+    """Delete the rows of a query of a tracked resource.
+
+    Query.delete() does not go through the flushes the usages are updated
+    by, so the deleted rows are counted out of the usages here.
+    """
+    if not _tracks_usages():
+        return query.delete()
+    model = TRACKED_RESOURCES[resource]
+    deltas = dict(((tenant_id, resource), -count)
+                  for tenant_id, count in query.with_entities(
+                      model.tenant_id, sa.func.count(model.id)).group_by(
+                          model.tenant_id)
+                  if tenant_id)
+    result = query.delete()
+    _apply_usage_deltas(query.session, deltas)
+    return result
+
+db_base_plugin_v2.register_resource_delete_hook(delete_tracked_resources)
+
+register_tracked_resource('network', models_v2.Network)
+register_tracked_resource('subnet', models_v2.Subnet)
+register_tracked_resource('port', models_v2.Port)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -177,3 +301,152 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+class TrackedDbQuotaDriver(DbQuotaDriver):
+    """Quota driver keeping count of the resources of the tenants.
+
+    The usages of the tracked resources are counted once, then updated in
+    the transactions creating or deleting the resources, instead of being
+    counted on each request. Requests reserve the resources they create
+    until they are done; reservations not removed by then expire after
+    reservation_expiration seconds. The usages are checked against the
+    resources every quota_usage_reconcile_interval seconds, in case they
+    were created or deleted without the ORM.
+    """
+
+    def __init__(self):
+        interval = cfg.CONF.QUOTAS.quota_usage_reconcile_interval
+        if interval > 0:
+            self.reconcile_loop = loopingcall.FixedIntervalLoopingCall(
+                self._reconcile)
+            # random initial delay to offset the servers and their workers
+            self.reconcile_loop.start(
+                interval=interval,
+                initial_delay=random.randint(interval, interval * 2))
+
+    @staticmethod
+    def tracks_usages(resource):
+        return resource in TRACKED_RESOURCES
+
+    @staticmethod
+    def _count_usage(context, tenant_id, resource):
+        """Start tracking the usage of a resource of a tenant."""
+        query = context.session.query(QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource)
+        if query.first():
+            return
+        in_use = _count_tenant_resources(
+            context.session, TRACKED_RESOURCES[resource],
+            tenant_id).get(tenant_id, 0)
+        try:
+            with context.session.begin(subtransactions=True):
+                context.session.add(QuotaUsage(tenant_id=tenant_id,
+                                               resource=resource,
+                                               in_use=in_use))
+        except db_exc.DBDuplicateEntry:
+            # Counted by a concurrent request
+            pass
+
+    def make_reservation(self, context, tenant_id, resources, deltas):
+        """Reserve resources for a tenant if its quotas allow it.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param deltas: A dictionary of the number of tracked resources to
+                       reserve.
+        :return: the id of the reservation.
+        """
+        unders = [key for key, val in deltas.items() if val < 0]
+        if unders:
+            raise exceptions.InvalidQuotaValue(unders=sorted(unders))
+        quotas = self._get_quotas(context, tenant_id, resources,
+                                  deltas.keys())
+        limited = sorted(resource for resource in deltas
+                         if quotas[resource] >= 0)
+        for resource in limited:
+            self._count_usage(context, tenant_id, resource)
+        now = timeutils.utcnow()
+        with context.session.begin(subtransactions=True):
+            overs = []
+            for resource in limited:
+                usage = context.session.query(QuotaUsage).filter_by(
+                    tenant_id=tenant_id,
+                    resource=resource).with_lockmode('update').one()
+                reserved = context.session.query(
+                    sa.func.sum(ResourceDelta.amount)).join(
+                        Reservation).filter(
+                            Reservation.tenant_id == tenant_id,
+                            Reservation.expiration > now,
+                            ResourceDelta.resource == resource).scalar()
+                if (usage.in_use + (reserved or 0) + deltas[resource] >
+                        quotas[resource]):
+                    overs.append(resource)
+            if overs:
+                raise exceptions.OverQuota(overs=sorted(overs))
+            expiration = now + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.reservation_expiration)
+            reservation = Reservation(
+                id=uuidutils.generate_uuid(), tenant_id=tenant_id,
+                expiration=expiration,
+                resource_deltas=[ResourceDelta(resource=resource,
+                                               amount=delta)
+                                 for resource, delta in deltas.items()])
+            context.session.add(reservation)
+        return reservation.id
+
+    @staticmethod
+    def remove_reservation(context, reservation_id):
+        """Release the resources of a reservation.
+
+        The usages of the resources created meanwhile were already updated
+        by their creation, so committing and cancelling a reservation are
+        the same.
+        """
+        with context.session.begin(subtransactions=True):
+            context.session.query(Reservation).filter_by(
+                id=reservation_id).delete()
+
+    def _reconcile(self):
+        try:
+            self.reconcile_usages(n_context.get_admin_context())
+        except Exception:
+            LOG.exception(_("Failed to reconcile the quota usages"))
+
+    @staticmethod
+    def reconcile_usages(context):
+        """Fix the usages which drifted from the counts of the resources.
+
+        Expired reservations are removed as well.
+        """
+        session = context.session
+        with session.begin(subtransactions=True):
+            session.query(Reservation).filter(
+                Reservation.expiration <= timeutils.utcnow()).delete()
+        for resource, model in TRACKED_RESOURCES.items():
+            usages = dict(session.query(QuotaUsage.tenant_id,
+                                        QuotaUsage.in_use).filter_by(
+                                            resource=resource))
+            counts = _count_tenant_resources(session, model)
+            for tenant_id, in_use in usages.items():
+                if in_use == counts.get(tenant_id, 0):
+                    continue
+                with session.begin(subtransactions=True):
+                    # Count again once the usage is locked, as resources
+                    # may be created or deleted meanwhile
+                    usage = session.query(QuotaUsage).filter_by(
+                        tenant_id=tenant_id,
+                        resource=resource).with_lockmode('update').first()
+                    if not usage:
+                        continue
+                    count = _count_tenant_resources(
+                        session, model, tenant_id).get(tenant_id, 0)
+                    if usage.in_use != count:
+                        LOG.info(_("Fixing the %(resource)s usage of tenant "
+                                   "%(tenant_id)s from %(in_use)s to "
+                                   "%(count)s"),
+                                 {'resource': resource,
+                                  'tenant_id': tenant_id,
+                                  'in_use': usage.in_use, 'count': count})
+                        usage.in_use = count
@@ -38,6 +38,12 @@ class SecurityGroup(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
 
     name = sa.Column(sa.String(255))
     description = sa.Column(sa.String(255))
+    # Bumped whenever the rules, or the member IPs, of the group change, to
+    # invalidate their cached copies
+    revision = sa.Column(sa.Integer, nullable=False, default=0,
+                         server_default='0')
+    member_revision = sa.Column(sa.Integer, nullable=False, default=0,
+                                server_default='0')
 
 
 class SecurityGroupPortBinding(model_base.BASEV2):
@@ -485,7 +491,10 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
 
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attr.PORTS, ['_extend_port_dict_security_group'])
+        attr.PORTS, ['_extend_port_dict_security_group'],
+        fields=[ext_sg.SECURITYGROUPS])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_relationship_fields(
+        models_v2.Port, 'security_groups', [ext_sg.SECURITYGROUPS])
 
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
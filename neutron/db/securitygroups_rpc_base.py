@@ -14,14 +14,17 @@
 #    under the License.
 
 import netaddr
+from sqlalchemy import event
 from sqlalchemy.orm import exc
 
 from neutron.common import constants as q_const
 from neutron.common import ipv6_utils as ipv6
 from neutron.common import utils
 from neutron.db import allowedaddresspairs_db as addr_pair
+from neutron.db import api as db_api
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
+from neutron.extensions import allowedaddresspairs as ext_addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.openstack.common import log as logging
 
@@ -33,6 +36,58 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
 
 DHCP_RULE_PORT = {4: (67, 68, q_const.IPv4), 6: (547, 546, q_const.IPv6)}
 
+# Key of the session info holding the groups whose member revisions are
+# bumped once the transaction commits
+PENDING_MEMBER_REVISIONS = 'pending_sg_member_revisions'
+
+
+def _update_security_group_revisions(session, security_group_ids, column):
+    with session.begin(subtransactions=True):
+        session.query(sg_db.SecurityGroup).filter(
+            sg_db.SecurityGroup.id.in_(security_group_ids)).update(
+                {column: column + 1}, synchronize_session=False)
+
+
+class SecurityGroupInfoCache(object):
+    """Compiled rules and member IPs of security groups.
+
+    Each entry is stored with the revision its security group had when it
+    was built, and is only returned for that revision. The rules and the
+    member IPs of a group have revisions of their own.
+    """
+
+    def __init__(self):
+        self._rules = {}
+        self._member_ips = {}
+
+    def get_rules(self, sg_id, revision):
+        entry = self._rules.get(sg_id)
+        if entry and entry[0] == revision:
+            return entry[1]
+
+    def set_rules(self, sg_id, revision, rules):
+        self._rules[sg_id] = (revision, rules)
+
+    def get_member_ips(self, sg_id, revision):
+        entry = self._member_ips.get(sg_id)
+        if entry and entry[0] == revision:
+            return entry[1]
+
+    def set_member_ips(self, sg_id, revision, member_ips):
+        self._member_ips[sg_id] = (revision, member_ips)
+
+    def invalidate_rules(self, sg_ids):
+        for sg_id in sg_ids:
+            self._rules.pop(sg_id, None)
+
+    def invalidate_member_ips(self, sg_ids):
+        for sg_id in sg_ids:
+            self._member_ips.pop(sg_id, None)
+
+    def invalidate(self, sg_ids):
+        self.invalidate_rules(sg_ids)
+        self.invalidate_member_ips(sg_ids)
+
 
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
     """Mixin class to add agent-based security group implementation."""
@@ -71,6 +126,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        self._bump_security_group_revisions(context, sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -80,6 +136,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        self._bump_security_group_revisions(context, sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -87,9 +144,16 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        self._bump_security_group_revisions(context,
+                                            [rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
+    def delete_security_group(self, context, id):
+        super(SecurityGroupServerRpcMixin,
+              self).delete_security_group(context, id)
+        self.sg_info_cache.invalidate([id])
+
     def update_security_group_on_port(self, context, id, port,
                                       original_port, updated_port):
         """Update security groups on port.
@@ -132,6 +196,13 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
             need_notify = True
+        if need_notify or (original_port.get(ext_addr_pair.ADDRESS_PAIRS) !=
+                           updated_port.get(ext_addr_pair.ADDRESS_PAIRS)):
+            # The member IPs of the groups cached for the agents changed
+            self._bump_security_group_member_revisions(
+                context,
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(updated_port.get(ext_sg.SECURITYGROUPS) or []))
         return need_notify
 
     def notify_security_groups_member_updated(self, context, port):
@@ -145,6 +216,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
         """
+        self._bump_security_group_member_revisions(
+            context, port.get(ext_sg.SECURITYGROUPS))
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
         # For IPv6, provider rule need to be updated in case router
@@ -157,36 +230,137 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
-    def security_group_info_for_ports(self, context, ports):
-        sg_info = {'devices': ports,
-                   'security_groups': {},
-                   'sg_member_ips': {}}
-        rules_in_db = self._select_rules_for_ports(context, ports)
-        remote_security_group_info = {}
-        for (port_id, rule_in_db) in rules_in_db:
-            remote_gid = rule_in_db.get('remote_group_id')
-            security_group_id = rule_in_db.get('security_group_id')
-            ethertype = rule_in_db['ethertype']
-            if ('security_group_source_groups'
-                not in sg_info['devices'][port_id]):
-                sg_info['devices'][port_id][
-                    'security_group_source_groups'] = []
-
-            if remote_gid:
-                if (remote_gid
-                    not in sg_info['devices'][port_id][
-                        'security_group_source_groups']):
-                    sg_info['devices'][port_id][
-                        'security_group_source_groups'].append(remote_gid)
-                if remote_gid not in remote_security_group_info:
-                    remote_security_group_info[remote_gid] = {}
-                if ethertype not in remote_security_group_info[remote_gid]:
-                    remote_security_group_info[remote_gid][ethertype] = []
+    def notify_security_groups_member_updated_bulk(self, context, ports):
+        """Notify update event of security group members for many ports.
+
+        This sends at most one provider update and one member update
+        covering the security groups of all the ports.
+        """
+        provider_updated = False
+        security_groups = set()
+        for port in ports:
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            elif port['device_owner'] == q_const.DEVICE_OWNER_ROUTER_INTF:
+                if any(netaddr.IPAddress(fixed_ip['ip_address']).version == 6
+                       for fixed_ip in port['fixed_ips']):
+                    provider_updated = True
+            else:
+                security_groups.update(port.get(ext_sg.SECURITYGROUPS) or [])
+        self._bump_security_group_member_revisions(
+            context, set(sg_id for port in ports
+                         for sg_id in port.get(ext_sg.SECURITYGROUPS) or []))
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if security_groups:
+            self.notifier.security_groups_member_updated(
+                context, sorted(security_groups))
+
+    @property
+    def sg_info_cache(self):
+        try:
+            return self._sg_info_cache
+        except AttributeError:
+            self._sg_info_cache = SecurityGroupInfoCache()
+            return self._sg_info_cache
+
+    def _bump_security_group_revisions(self, context, security_group_ids):
+        """Mark the cached rules of groups as outdated.
+
+        The revisions are stored in the database, so that the other server
+        processes drop their cached copies too.
+        """
+        security_group_ids = set(security_group_ids or [])
+        if not security_group_ids:
+            return
+        _update_security_group_revisions(
+            context.session, security_group_ids, sg_db.SecurityGroup.revision)
+        self.sg_info_cache.invalidate_rules(security_group_ids)
+
+    def _bump_security_group_member_revisions(self, context,
+                                              security_group_ids):
+        """Mark the cached member IPs of groups as outdated.
+
+        Within a transaction, the revisions are bumped once it commits, so
+        that the rows of busy groups, like the default one, are not locked
+        until then by the port updates.
+        """
+        security_group_ids = set(security_group_ids or [])
+        if not security_group_ids:
+            return
+        session = context.session
+        if not session.is_active:
+            _update_security_group_revisions(
+                session, security_group_ids,
+                sg_db.SecurityGroup.member_revision)
+            self.sg_info_cache.invalidate_member_ips(security_group_ids)
+            return
+        pending = session.info.setdefault(PENDING_MEMBER_REVISIONS, set())
+        if not pending:
+            event.listen(session, 'after_commit',
+                         self._bump_pending_member_revisions, once=True)
+        pending.update(security_group_ids)
+
+    def _bump_pending_member_revisions(self, session):
+        security_group_ids = session.info.pop(PENDING_MEMBER_REVISIONS, None)
+        if not security_group_ids:
+            return
+        # No SQL can be run by the session which just committed
+        _update_security_group_revisions(
+            db_api.get_session(), security_group_ids,
+            sg_db.SecurityGroup.member_revision)
+        self.sg_info_cache.invalidate_member_ips(security_group_ids)
+
+    def _select_security_group_revisions(self, context, security_group_ids,
+                                         column=sg_db.SecurityGroup.revision):
+        if not security_group_ids:
+            return {}
+        query = context.session.query(sg_db.SecurityGroup.id, column)
+        query = query.filter(sg_db.SecurityGroup.id.in_(security_group_ids))
+        return dict(query)
+
+    def _select_security_groups_for_ports(self, context, ports):
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+        security_groups = {}
+        if not ports:
+            return security_groups
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        query = query.filter(sg_binding_port.in_(ports.keys()))
+        for port_id, security_group_id in query:
+            security_groups.setdefault(port_id, []).append(security_group_id)
+        return security_groups
+
+    def _get_security_group_rules(self, context, revisions):
+        """Return the compiled rules of the groups of revisions.
 
+        Only the groups whose cached rules are outdated are read from the
+        database.
+        """
+        rules = {}
+        outdated = set()
+        for sg_id, revision in revisions.items():
+            cached = self.sg_info_cache.get_rules(sg_id, revision)
+            if cached is None:
+                outdated.add(sg_id)
+            else:
+                rules[sg_id] = cached
+        if not outdated:
+            return rules
+
+        seen_rules = {}
+        for sg_id in outdated:
+            rules[sg_id] = []
+            seen_rules[sg_id] = set()
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(
+            sg_db.SecurityGroupRule.security_group_id.in_(outdated))
+        for rule_in_db in query:
+            security_group_id = rule_in_db['security_group_id']
             direction = rule_in_db['direction']
             rule_dict = {
                 'direction': direction,
-                'ethertype': ethertype}
+                'ethertype': rule_in_db['ethertype']}
 
             for key in ('protocol', 'port_range_min', 'port_range_max',
                         'remote_ip_prefix', 'remote_group_id'):
@@ -196,28 +370,104 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                         rule_dict[direction_ip_prefix] = rule_in_db[key]
                         continue
                     rule_dict[key] = rule_in_db[key]
-            if security_group_id not in sg_info['security_groups']:
-                sg_info['security_groups'][security_group_id] = []
-            if rule_dict not in sg_info['security_groups'][security_group_id]:
-                sg_info['security_groups'][security_group_id].append(
-                    rule_dict)
+            rule_key = tuple(sorted(rule_dict.items()))
+            if rule_key not in seen_rules[security_group_id]:
+                seen_rules[security_group_id].add(rule_key)
+                rules[security_group_id].append(rule_dict)
+        for sg_id in outdated:
+            self.sg_info_cache.set_rules(sg_id, revisions[sg_id],
+                                         rules[sg_id])
+        return rules
+
+    def _get_security_group_member_ips(self, context, revisions):
+        """Return the member IPs of the groups of revisions by ethertype.
+
+        Only the groups whose cached members are outdated are read from the
+        database.
+        """
+        member_ips = {}
+        outdated = []
+        for sg_id, revision in revisions.items():
+            cached = self.sg_info_cache.get_member_ips(sg_id, revision)
+            if cached is None:
+                outdated.append(sg_id)
+            else:
+                member_ips[sg_id] = cached
+        ips = self._select_ips_by_ethertype_for_remote_group(context,
+                                                             outdated)
+        for sg_id, ips_by_ethertype in ips.items():
+            # The agents expect lists, sorted to keep the result stable
+            member_ips[sg_id] = dict(
+                (ethertype, sorted(ethertype_ips))
+                for ethertype, ethertype_ips in ips_by_ethertype.items())
+            self.sg_info_cache.set_member_ips(sg_id, revisions[sg_id],
+                                              member_ips[sg_id])
+        return member_ips
+
+    def security_group_info_for_ports(self, context, ports, revisions=None):
+        """Return the security group information of ports.
+
+        revisions holds the revisions of the 'security_groups' and
+        'sg_member_ips' entries a caller already has, by security group.
+        When it is given, the entries which did not change are left out
+        and the revisions of all the entries the ports need are returned
+        under the 'revisions' key.
+        """
+        sg_info = {'devices': ports,
+                   'security_groups': {},
+                   'sg_member_ips': {}}
+        port_security_groups = self._select_security_groups_for_ports(
+            context, ports)
+        sg_ids = set()
+        for security_group_ids in port_security_groups.values():
+            sg_ids.update(security_group_ids)
+        # The revisions are read before the rules and members, so that a
+        # concurrent change cannot be cached under its new revision
+        rule_revisions = self._select_security_group_revisions(context,
+                                                               sg_ids)
+        rules = self._get_security_group_rules(context, rule_revisions)
+
+        remote_group_ids = {}
+        for sg_id, sg_rules in rules.items():
+            remote_group_ids[sg_id] = []
+            for rule in sg_rules:
+                remote_gid = rule.get('remote_group_id')
+                if remote_gid and remote_gid not in remote_group_ids[sg_id]:
+                    remote_group_ids[sg_id].append(remote_gid)
+        for port_id, security_group_ids in port_security_groups.items():
+            source_groups = []
+            seen_source_groups = set()
+            for sg_id in security_group_ids:
+                for remote_gid in remote_group_ids.get(sg_id, []):
+                    if remote_gid not in seen_source_groups:
+                        seen_source_groups.add(remote_gid)
+                        source_groups.append(remote_gid)
+            sg_info['devices'][port_id][
+                'security_group_source_groups'] = source_groups
+
+        remote_gids = set()
+        for gids in remote_group_ids.values():
+            remote_gids.update(gids)
+        member_revisions = self._select_security_group_revisions(
+            context, remote_gids, sg_db.SecurityGroup.member_revision)
+        member_ips = self._get_security_group_member_ips(context,
+                                                         member_revisions)
+
+        held = revisions or {}
+        for key, values, key_revisions in (
+                ('security_groups', rules, rule_revisions),
+                ('sg_member_ips', member_ips, member_revisions)):
+            held_revisions = held.get(key) or {}
+            for sg_id, value in values.items():
+                if held_revisions.get(sg_id) != key_revisions[sg_id]:
+                    sg_info[key][sg_id] = value
+        if revisions is not None:
+            sg_info['revisions'] = {'security_groups': rule_revisions,
+                                    'sg_member_ips': member_revisions}
 
-        sg_info['sg_member_ips'] = remote_security_group_info
         # the provider rules do not belong to any security group, so these
         # rules still reside in sg_info['devices'] [port_id]
         self._apply_provider_rule(context, sg_info['devices'])
-
-        return self._get_security_group_member_ips(context, sg_info)
-
-    def _get_security_group_member_ips(self, context, sg_info):
-        ips = self._select_ips_for_remote_group(
-            context, sg_info['sg_member_ips'].keys())
-        for sg_id, member_ips in ips.items():
-            for ip in member_ips:
-                ethertype = 'IPv%d' % netaddr.IPNetwork(ip).version
-                if (ethertype in sg_info['sg_member_ips'][sg_id]
-                    and ip not in sg_info['sg_member_ips'][sg_id][ethertype]):
-                    sg_info['sg_member_ips'][sg_id][ethertype].append(ip)
         return sg_info
 
     def _select_rules_for_ports(self, context, ports):
@@ -235,12 +485,23 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
-    def _select_ips_for_remote_group(self, context, remote_group_ids):
+    @staticmethod
+    def _ethertype_for_ip(ip_address):
+        return q_const.IPv6 if ':' in ip_address else q_const.IPv4
+
+    def _select_ips_by_ethertype_for_remote_group(self, context,
+                                                  remote_group_ids):
+        """Return the member IPs of the remote groups by ethertype.
+
+        The ethertype of the fixed IPs comes from the ip_version of their
+        subnet, so that no address needs to be parsed.
+        """
         ips_by_group = {}
         if not remote_group_ids:
             return ips_by_group
         for remote_group_id in remote_group_ids:
-            ips_by_group[remote_group_id] = set()
+            ips_by_group[remote_group_id] = {q_const.IPv4: set(),
+                                             q_const.IPv6: set()}
 
         ip_port = models_v2.IPAllocation.port_id
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
@@ -250,9 +511,13 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         # table instead of via the Port table skip an unnecessary intermediary
         query = context.session.query(sg_binding_sgid,
                                       models_v2.IPAllocation.ip_address,
+                                      models_v2.Subnet.ip_version,
                                       addr_pair.AllowedAddressPair.ip_address)
         query = query.join(models_v2.IPAllocation,
                            ip_port == sg_binding_port)
+        query = query.join(
+            models_v2.Subnet,
+            models_v2.IPAllocation.subnet_id == models_v2.Subnet.id)
         # Outerjoin because address pairs may be null and we still want the
         # IP for the port.
         query = query.outerjoin(
@@ -262,10 +527,12 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         # Each allowed address pair IP record for a port beyond the 1st
         # will have a duplicate regular IP in the query response since
         # the relationship is 1-to-many. Dedup with a set
-        for security_group_id, ip_address, allowed_addr_ip in query:
-            ips_by_group[security_group_id].add(ip_address)
+        for sg_id, ip_address, ip_version, allowed_addr_ip in query:
+            ips = ips_by_group[sg_id]
+            ips['IPv%d' % ip_version].add(ip_address)
             if allowed_addr_ip:
-                ips_by_group[security_group_id].add(allowed_addr_ip)
+                ips[self._ethertype_for_ip(allowed_addr_ip)].add(
+                    allowed_addr_ip)
         return ips_by_group
 
     def _select_remote_group_ids(self, ports):
@@ -366,8 +633,12 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def _convert_remote_group_id_to_ip_prefix(self, context, ports):
         remote_group_ids = self._select_remote_group_ids(ports)
-        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        ips = self._get_security_group_member_ips(
+            context, self._select_security_group_revisions(
+                context, set(remote_group_ids),
+                sg_db.SecurityGroup.member_revision))
         for port in ports.values():
+            fixed_ips = set(port.get('fixed_ips', []))
             updated_rule = []
             for rule in port.get('security_group_rules'):
                 remote_group_id = rule.get('remote_group_id')
@@ -379,14 +650,11 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
                 port['security_group_source_groups'].append(remote_group_id)
                 base_rule = rule
-                for ip in ips[remote_group_id]:
-                    if ip in port.get('fixed_ips', []):
+                for ip in set(ips.get(remote_group_id, {}).get(
+                        base_rule['ethertype'], ())):
+                    if ip in fixed_ips:
                         continue
                     ip_rule = base_rule.copy()
-                    version = netaddr.IPNetwork(ip).version
-                    ethertype = 'IPv%s' % version
-                    if base_rule['ethertype'] != ethertype:
-                        continue
                     ip_rule[direction_ip_prefix] = str(
                         netaddr.IPNetwork(ip).cidr)
                     updated_rule.append(ip_rule)
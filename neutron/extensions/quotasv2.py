@@ -122,7 +122,8 @@ class Quotasv2(extensions.ExtensionDescriptor):
     @classmethod
     def get_description(cls):
         description = 'Expose functions for quotas management'
-        if cfg.CONF.QUOTAS.quota_driver == DB_QUOTA_DRIVER:
+        if cfg.CONF.QUOTAS.quota_driver in (DB_QUOTA_DRIVER,
+                                            quota.QUOTA_DB_TRACKED_DRIVER):
             description += ' per tenant'
         return description
 
@@ -30,7 +30,6 @@ from neutron.api.rpc.handlers import securitygroups_rpc
 from neutron.common import constants as q_const
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
-from neutron.common import utils
 from neutron.db import agents_db
 from neutron.db import agentschedulers_db
 from neutron.db import api as db
@@ -456,12 +455,9 @@ class BrocadePluginV2(db_base_plugin_v2.NeutronDbPluginV2,
         if original_port['admin_state_up'] != port['admin_state_up']:
             port_updated = True
 
-        if (original_port['fixed_ips'] != port['fixed_ips'] or
-            not utils.compare_elements(
-                original_port.get(ext_sg.SECURITYGROUPS),
-                port.get(ext_sg.SECURITYGROUPS))):
-            self.notifier.security_groups_member_updated(
-                context, port.get(ext_sg.SECURITYGROUPS))
+        if self.is_security_group_member_updated(context, original_port,
+                                                 port):
+            self.notify_security_groups_member_updated(context, port)
 
         if port_updated:
             self._notify_port_updated(context, port)
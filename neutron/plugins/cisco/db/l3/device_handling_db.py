@@ -304,7 +304,7 @@ class DeviceHandlingMixin(object):
                       if hosting_device.cfg_agent is not None]
         if active is not None:
             agents = [agent for agent in agents if not
-                      self.is_agent_down(agent['heartbeat_timestamp'])]
+                      self.is_agent_down(agent['last_heartbeat'])]
         return agents
 
     def auto_schedule_hosting_devices(self, context, agent_host):
@@ -324,7 +324,7 @@ class DeviceHandlingMixin(object):
                           agent_host)
                 return False
             if self.is_agent_down(
-                    cfg_agent.heartbeat_timestamp):
+                    cfg_agent.last_heartbeat):
                 LOG.warn(_('Cisco cfg agent %s is not alive'), cfg_agent.id)
             query = context.session.query(l3_models.HostingDevice)
             query = query.filter_by(cfg_agent_id=None)
@@ -483,5 +483,5 @@ class DeviceHandlingMixin(object):
         if active is not None:
             cfg_agents = [cfg_agent for cfg_agent in cfg_agents
                           if not self.is_agent_down(
-                              cfg_agent['heartbeat_timestamp'])]
+                              cfg_agent['last_heartbeat'])]
         return cfg_agents
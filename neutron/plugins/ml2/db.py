@@ -73,6 +73,21 @@ def get_network_segments(session, network_id, filter_dynamic=False):
         return [_make_segment_dict(record) for record in records]
 
 
+def get_networks_segments(session, network_ids, filter_dynamic=False):
+    """Get the segments of several networks, keyed by network id."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        query = (session.query(models.NetworkSegment).
+                 filter(models.NetworkSegment.network_id.in_(network_ids)))
+        if filter_dynamic is not None:
+            query = query.filter_by(is_dynamic=filter_dynamic)
+        for record in query:
+            segments[record.network_id].append(_make_segment_dict(record))
+    return segments
+
+
 def get_segment_by_id(session, segment_id):
     with session.begin(subtransactions=True):
         try:
@@ -203,6 +218,78 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get the port records of several, possibly truncated, port ids.
+
+    Returns a dict mapping each port id to its record, or to None if no
+    port or more than one port have an id starting with it.
+    """
+    records = []
+    with session.begin(subtransactions=True):
+        for index in range(0, len(port_ids), MAX_PORTS_PER_QUERY):
+            chunk = port_ids[index:index + MAX_PORTS_PER_QUERY]
+            partial_uuids = set(port_id for port_id in chunk
+                                if not uuidutils.is_uuid_like(port_id))
+            full_uuids = set(chunk) - partial_uuids
+            or_criteria = [models_v2.Port.id.startswith(port_id)
+                           for port_id in partial_uuids]
+            if full_uuids:
+                or_criteria.append(models_v2.Port.id.in_(full_uuids))
+            records.extend(session.query(models_v2.Port).
+                           filter(or_(*or_criteria)))
+    records_by_id = dict((record.id, record) for record in records)
+    ports = {}
+    for port_id in port_ids:
+        if port_id in records_by_id:
+            ports[port_id] = records_by_id[port_id]
+            continue
+        matches = [record for record in records_by_id.itervalues()
+                   if record.id.startswith(port_id)]
+        if len(matches) > 1:
+            LOG.error(_("Multiple ports have port_id starting with %s"),
+                      port_id)
+        ports[port_id] = matches[0] if len(matches) == 1 else None
+    return ports
+
+
+def get_locked_ports_and_bindings(session, port_ids):
+    """Get the port and binding records of several ports for update.
+
+    The ports are found as in get_ports, then their port and port binding
+    records are locked and refreshed as in get_locked_port_and_binding.
+    Returns a dict mapping each port id to its port and binding records,
+    or to (None, None).
+    """
+    with session.begin(subtransactions=True):
+        ports = get_ports(session, port_ids)
+        full_ids = list(set(port.id for port in ports.itervalues() if port))
+        locked_ports = {}
+        bindings = {}
+        for index in range(0, len(full_ids), MAX_PORTS_PER_QUERY):
+            chunk = full_ids[index:index + MAX_PORTS_PER_QUERY]
+            locked_ports.update(
+                (port.id, port) for port in
+                session.query(models_v2.Port).
+                enable_eagerloads(False).
+                filter(models_v2.Port.id.in_(chunk)).
+                with_lockmode('update').
+                populate_existing())
+            bindings.update(
+                (binding.port_id, binding) for binding in
+                session.query(models.PortBinding).
+                enable_eagerloads(False).
+                filter(models.PortBinding.port_id.in_(chunk)).
+                with_lockmode('update').
+                populate_existing())
+    result = {}
+    for port_id, port in ports.iteritems():
+        if port and port.id in locked_ports and port.id in bindings:
+            result[port_id] = port, bindings[port.id]
+        else:
+            result[port_id] = None, None
+    return result
+
+
 def get_port_from_device_mac(device_mac):
     LOG.debug(_("get_port_from_device_mac() called for mac %s"), device_mac)
     session = db_api.get_session()
@@ -625,6 +625,20 @@ class MechanismDriver(object):
         """
         pass
 
+    def update_ports_postcommit(self, contexts):
+        """Update several ports.
+
+        :param contexts: list of PortContext instances, as given to
+        update_port_postcommit, of ports updated in the same transaction.
+
+        Called after the transaction completes by bulk operations, such
+        as an agent reporting the status of many devices at once. The
+        default implementation calls update_port_postcommit for each
+        port, mechanism drivers may override it to aggregate their work.
+        """
+        for context in contexts:
+            self.update_port_postcommit(context)
+
     def delete_port_precommit(self, context):
         """Delete resources of a port.
 
@@ -33,12 +33,14 @@ class MechanismDriverContext(object):
 class NetworkContext(MechanismDriverContext, api.NetworkContext):
 
     def __init__(self, plugin, plugin_context, network,
-                 original_network=None):
+                 original_network=None, segments=None):
         super(NetworkContext, self).__init__(plugin, plugin_context)
         self._network = network
         self._original_network = original_network
-        self._segments = db.get_network_segments(plugin_context.session,
-                                                 network['id'])
+        if segments is None:
+            segments = db.get_network_segments(plugin_context.session,
+                                               network['id'])
+        self._segments = segments
 
     @property
     def current(self):
@@ -72,12 +74,13 @@ class SubnetContext(MechanismDriverContext, api.SubnetContext):
 class PortContext(MechanismDriverContext, api.PortContext):
 
     def __init__(self, plugin, plugin_context, port, network, binding,
-                 original_port=None):
+                 original_port=None, network_segments=None):
         super(PortContext, self).__init__(plugin, plugin_context)
         self._port = port
         self._original_port = original_port
         self._network_context = NetworkContext(plugin, plugin_context,
-                                               network)
+                                               network,
+                                               segments=network_segments)
         self._binding = binding
         if original_port:
             self._original_bound_segment_id = self._binding.segment
@@ -165,10 +168,10 @@ class PortContext(MechanismDriverContext, api.PortContext):
 class DvrPortContext(PortContext):
 
     def __init__(self, plugin, plugin_context, port, network, binding,
-                 original_port=None):
+                 original_port=None, network_segments=None):
         super(DvrPortContext, self).__init__(
             plugin, plugin_context, port, network, binding,
-            original_port=original_port)
+            original_port=original_port, network_segments=network_segments)
 
     @property
     def host(self):
@@ -20,6 +20,11 @@ l2_population_options = [
     cfg.IntOpt('agent_boot_time', default=180,
                help=_('Delay within which agent is expected to update '
                       'existing ports whent it restarts')),
+    cfg.FloatOpt('notification_interval', default=0,
+                 help=_('Number of seconds during which the fdb entries '
+                        'sent to an agent are accumulated and merged into '
+                        'as few messages as possible. 0 sends them right '
+                        'away')),
 ]
 
 cfg.CONF.register_opts(l2_population_options, "l2pop")
@@ -13,11 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.db import exception as db_exc
+import sqlalchemy as sa
 from sqlalchemy import sql
 
 from neutron.common import constants as const
 from neutron.db import agents_db
 from neutron.db import common_db_mixin as base_db
+from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import timeutils
@@ -25,6 +28,18 @@ from neutron.plugins.ml2.drivers.l2pop import constants as l2_const
 from neutron.plugins.ml2 import models as ml2_models
 
 
+class FdbGeneration(model_base.BASEV2):
+    """Number of changes sent to the agents for the fdb of a network."""
+
+    __tablename__ = 'ml2_l2pop_fdb_generations'
+
+    network_id = sa.Column(sa.String(36),
+                           sa.ForeignKey('networks.id', ondelete="CASCADE"),
+                           primary_key=True)
+    generation = sa.Column(sa.BigInteger, nullable=False, default=0,
+                           server_default='0')
+
+
 class L2populationDbMixin(base_db.CommonDbMixin):
 
     def get_agent_ip_by_host(self, session, agent_host):
@@ -38,7 +53,7 @@ class L2populationDbMixin(base_db.CommonDbMixin):
 
     def get_agent_uptime(self, agent):
         return timeutils.delta_seconds(agent.started_at,
-                                       agent.heartbeat_timestamp)
+                                       agent.last_heartbeat)
 
     def get_agent_tunnel_types(self, agent):
         configuration = jsonutils.loads(agent.configurations)
@@ -91,6 +106,76 @@ class L2populationDbMixin(base_db.CommonDbMixin):
                                      l2_const.SUPPORTED_AGENT_TYPES))
             return query
 
+    def get_network_hosts(self, session, network_id):
+        """Return the hosts of the agents with ports on the network.
+
+        Every port bound to a host with admin_state_up counts, whatever its
+        status, so that a host whose ports are still coming up does not
+        miss updates sent before it fetches the fdb entries itself.
+        """
+        with session.begin(subtransactions=True):
+            hosts = set()
+            for query in (self.get_network_ports(session, network_id),
+                          self.get_dvr_network_ports(session, network_id)):
+                hosts.update(host for host, in query.with_entities(
+                    agents_db.Agent.host).distinct())
+            return sorted(hosts)
+
+    def get_agent_fdb_sync(self, agent):
+        """Return whether the agent fetches the fdb entries by itself."""
+        configuration = jsonutils.loads(agent.configurations)
+        return configuration.get('l2pop_fdb_sync', False)
+
+    def get_fdb_generation(self, session, network_id):
+        record = session.query(FdbGeneration).filter_by(
+            network_id=network_id).first()
+        return record.generation if record else 0
+
+    def _get_locked_fdb_generation(self, session, network_id):
+        return session.query(FdbGeneration).filter_by(
+            network_id=network_id).with_lockmode('update').first()
+
+    def _bump_fdb_generation(self, session, network_id):
+        with session.begin(subtransactions=True):
+            record = self._get_locked_fdb_generation(session, network_id)
+            if not record:
+                record = FdbGeneration(network_id=network_id, generation=0)
+                session.add(record)
+            record.generation += 1
+            return record.generation - 1, record.generation
+
+    def bump_fdb_generation(self, session, network_id):
+        """Increment the fdb generation of a network.
+
+        Returns the generations before and after the increment.
+        """
+        try:
+            return self._bump_fdb_generation(session, network_id)
+        except (db_exc.DBDuplicateEntry, db_exc.DBDeadlock):
+            # The record of the network was inserted by a concurrent first
+            # bump, it can be locked now. On MySQL, the gap locks taken by
+            # both bumps make one of their inserts deadlock instead.
+            return self._bump_fdb_generation(session, network_id)
+
+    def get_host_network_ids(self, session, host, network_ids=None,
+                             marker=None, limit=None):
+        """Return the sorted ids of the networks with ports on a host."""
+        with session.begin(subtransactions=True):
+            query = session.query(models_v2.Port.network_id).outerjoin(
+                ml2_models.PortBinding).outerjoin(
+                    ml2_models.DVRPortBinding).filter(
+                        sql.or_(ml2_models.PortBinding.host == host,
+                                ml2_models.DVRPortBinding.host == host))
+            if network_ids is not None:
+                query = query.filter(
+                    models_v2.Port.network_id.in_(network_ids))
+            if marker:
+                query = query.filter(models_v2.Port.network_id > marker)
+            query = query.distinct().order_by(models_v2.Port.network_id)
+            if limit:
+                query = query.limit(limit)
+            return [network_id for network_id, in query]
+
     def get_agent_network_active_port_count(self, session, agent_host,
                                             network_id):
         with session.begin(subtransactions=True):
@@ -13,12 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import threading
+
 from oslo.config import cfg
 
 from neutron.common import constants as const
 from neutron import context as n_context
 from neutron.db import api as db_api
 from neutron.openstack.common import log as logging
+from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers.l2pop import config  # noqa
 from neutron.plugins.ml2.drivers.l2pop import db as l2pop_db
@@ -38,6 +42,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
         LOG.debug(_("Experimental L2 population driver"))
         self.rpc_ctx = n_context.get_admin_context_without_session()
         self.migrated_ports = {}
+        # State of the update_ports_postcommit call of the current thread
+        self._batch = threading.local()
 
     def _get_port_fdb_entries(self, port):
         return [[port['mac_address'],
@@ -48,8 +54,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
         agent_host = context.host
 
         fdb_entries = self._update_port_down(context, port, agent_host)
-        self.L2populationAgentNotify.remove_fdb_entries(self.rpc_ctx,
-            fdb_entries)
+        self._notify_network_hosts('remove_fdb_entries', fdb_entries, port)
 
     def _get_diff_ips(self, orig, port):
         orig_ips = set([ip['ip_address'] for ip in orig['fixed_ips']])
@@ -87,8 +92,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
         if port_mac_ip:
             ports['after'] = port_mac_ip
 
-        self.L2populationAgentNotify.update_fdb_entries(
-            self.rpc_ctx, {'chg_ip': upd_fdb_entries})
+        self._notify_network_hosts('update_fdb_entries',
+                                   {'chg_ip': upd_fdb_entries}, port)
 
         return True
 
@@ -106,8 +111,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
                 agent_host = context.host
                 fdb_entries = self._update_port_down(
                         context, port, agent_host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._notify_network_hosts('remove_fdb_entries',
+                                           fdb_entries, port)
         elif (context.host != context.original_host
             and context.status == const.PORT_STATUS_ACTIVE
             and not self.migrated_ports.get(orig['id'])):
@@ -122,8 +127,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
             elif context.status == const.PORT_STATUS_DOWN:
                 fdb_entries = self._update_port_down(
                     context, port, context.host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._notify_network_hosts('remove_fdb_entries',
+                                           fdb_entries, port)
             elif context.status == const.PORT_STATUS_BUILD:
                 orig = self.migrated_ports.pop(port['id'], None)
                 if orig:
@@ -132,8 +137,102 @@ class L2populationMechanismDriver(api.MechanismDriver,
                     # this port has been migrated: remove its entries from fdb
                     fdb_entries = self._update_port_down(
                         context, original_port, original_host)
-                    self.L2populationAgentNotify.remove_fdb_entries(
-                        self.rpc_ctx, fdb_entries)
+                    self._notify_network_hosts('remove_fdb_entries',
+                                               fdb_entries, original_port)
+
+    def update_ports_postcommit(self, contexts):
+        """Update several ports, aggregating their fdb notifications.
+
+        The fdb entries added, or removed, by the ports of a network are
+        sent in a single notification, which only bumps the fdb generation
+        of the network once.
+        """
+        pending_ports = collections.Counter()
+        for context in contexts:
+            port = context.current
+            if (port['device_owner'] != const.DEVICE_OWNER_DVR_INTERFACE and
+                context.host == context.original_host and
+                context.status != context.original_status and
+                context.status in (const.PORT_STATUS_ACTIVE,
+                                   const.PORT_STATUS_DOWN)):
+                pending_ports[(context.host, port['network_id'],
+                               context.status)] += 1
+        self._batch.pending_ports = pending_ports
+        self._batch.notifications = collections.OrderedDict()
+        try:
+            for context in contexts:
+                self.update_port_postcommit(context)
+        finally:
+            notifications = self._batch.notifications
+            self._batch.pending_ports = None
+            self._batch.notifications = None
+            for (method, network_id), (fdb_entries, port) in (
+                    notifications.iteritems()):
+                self._notify_network_hosts(method, fdb_entries, port)
+
+    def _pop_pending_port(self, agent_host, network_id, status):
+        """Return how many other ports of the batch will get a status.
+
+        The ports of the batch being processed by update_ports_postcommit
+        have all been updated by the same transaction. Those which have
+        not been processed yet must not be taken into account when
+        counting the active ports of their host network.
+        """
+        pending_ports = getattr(self._batch, 'pending_ports', None)
+        key = (agent_host, network_id, status)
+        if not pending_ports or not pending_ports[key]:
+            return 0
+        pending_ports[key] -= 1
+        return pending_ports[key]
+
+    def _aggregate_notification(self, notifications, method, fdb_entries,
+                                port):
+        key = (method, port['network_id'])
+        if key not in notifications:
+            notifications[key] = (fdb_entries, port)
+            return
+        aggregated = notifications[key][0]
+        for network_id, network_entries in fdb_entries.iteritems():
+            if network_id not in aggregated:
+                aggregated[network_id] = network_entries
+                continue
+            aggregated_ports = aggregated[network_id]['ports']
+            for agent_ip, entries in network_entries['ports'].iteritems():
+                agent_entries = aggregated_ports.setdefault(agent_ip, [])
+                for entry in entries:
+                    if entry not in agent_entries:
+                        agent_entries.append(entry)
+
+    def _notify_network_hosts(self, method, fdb_entries, port):
+        """Send fdb entries to the agents of the hosts of the port network.
+
+        Only the agents with ports on the network have tunnels or flooding
+        entries to update, the others get the whole list of fdb entries of
+        the network when their first port on it goes up.
+
+        Added and removed entries are tagged with the fdb generation of the
+        network before and after the change, so that the agents can detect
+        the changes they missed. The host of the port gets them too, to
+        keep its generation up to date.
+        """
+        if not fdb_entries:
+            return
+        notifications = getattr(self._batch, 'notifications', None)
+        if notifications is not None:
+            self._aggregate_notification(notifications, method, fdb_entries,
+                                         port)
+            return
+        session = db_api.get_session()
+        network_id = port['network_id']
+        if network_id in fdb_entries:
+            prev_generation, generation = self.bump_fdb_generation(
+                session, network_id)
+            fdb_entries[network_id]['prev_generation'] = prev_generation
+            fdb_entries[network_id]['generation'] = generation
+        hosts = self.get_network_hosts(session, network_id)
+        if hosts:
+            getattr(self.L2populationAgentNotify, method)(
+                self.rpc_ctx, fdb_entries, hosts=hosts)
 
     def _get_port_infos(self, context, port, agent_host):
         if not agent_host:
@@ -167,9 +266,88 @@ class L2populationMechanismDriver(api.MechanismDriver,
 
         return agent, agent_host, agent_ip, segment, fdb_entries
 
+    def _get_network_fdb_entries(self, session, network_id, segment,
+                                 agent_host):
+        """Return the fdb entries of the other hosts of a network."""
+        fdb_entries = {network_id:
+                       {'segment_id': segment['segmentation_id'],
+                        'network_type': segment['network_type'],
+                        'generation': self.get_fdb_generation(session,
+                                                              network_id),
+                        'ports': {}}}
+        ports = fdb_entries[network_id]['ports']
+
+        nondvr_network_ports = self.get_nondvr_network_ports(session,
+                                                             network_id)
+        for network_port in nondvr_network_ports:
+            binding, agent = network_port
+            if agent.host == agent_host:
+                continue
+
+            ip = self.get_agent_ip(agent)
+            if not ip:
+                LOG.debug(_("Unable to retrieve the agent ip, check "
+                            "the agent %(agent_host)s configuration."),
+                          {'agent_host': agent.host})
+                continue
+
+            agent_ports = ports.get(ip, [const.FLOODING_ENTRY])
+            agent_ports += self._get_port_fdb_entries(binding.port)
+            ports[ip] = agent_ports
+
+        dvr_network_ports = self.get_dvr_network_ports(session, network_id)
+        for network_port in dvr_network_ports:
+            binding, agent = network_port
+            if agent.host == agent_host:
+                continue
+
+            ip = self.get_agent_ip(agent)
+            if not ip:
+                LOG.debug("Unable to retrieve the agent ip, check "
+                          "the agent %(agent_host)s configuration.",
+                          {'agent_host': agent.host})
+                continue
+
+            agent_ports = ports.get(ip, [const.FLOODING_ENTRY])
+            ports[ip] = agent_ports
+
+        return fdb_entries
+
+    def get_agent_fdb_entries(self, host, network_ids=None, marker=None,
+                              limit=None):
+        """Return the fdb entries of the networks with ports on a host.
+
+        The networks are sorted by id. At most limit networks after the
+        marker one are returned, along with the marker of the next page,
+        which is None on the last one.
+        """
+        session = db_api.get_session()
+        agent = self.get_agent_by_host(session, host)
+        result = {'fdb_entries': {}, 'next_marker': None}
+        if not agent:
+            return result
+        network_types = self.get_agent_l2pop_network_types(agent)
+        if network_types is None:
+            network_types = self.get_agent_tunnel_types(agent)
+
+        ids = self.get_host_network_ids(session, host, network_ids, marker,
+                                        limit)
+        for network_id in ids:
+            segments = [segment for segment in
+                        ml2_db.get_network_segments(session, network_id)
+                        if segment[api.NETWORK_TYPE] in network_types]
+            if segments:
+                result['fdb_entries'].update(self._get_network_fdb_entries(
+                    session, network_id, segments[0], host))
+        if limit and len(ids) == limit:
+            result['next_marker'] = ids[-1]
+        return result
+
     def _update_port_up(self, context):
         port = context.current
         agent_host = context.host
+        pending_ports = self._pop_pending_port(
+            agent_host, port['network_id'], const.PORT_STATUS_ACTIVE)
         port_infos = self._get_port_infos(context, port, agent_host)
         if not port_infos:
             return
@@ -179,7 +357,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
 
         session = db_api.get_session()
         agent_active_ports = self.get_agent_network_active_port_count(
-            session, agent_host, network_id)
+            session, agent_host, network_id) - pending_ports
 
         other_fdb_entries = {network_id:
                              {'segment_id': segment['segmentation_id'],
@@ -187,49 +365,14 @@ class L2populationMechanismDriver(api.MechanismDriver,
                               'ports': {agent_ip: []}}}
 
         if agent_active_ports == 1 or (
-                self.get_agent_uptime(agent) < cfg.CONF.l2pop.agent_boot_time):
+                self.get_agent_uptime(agent) < cfg.CONF.l2pop.agent_boot_time
+                and not self.get_agent_fdb_sync(agent)):
             # First port activated on current agent in this network,
             # we have to provide it with the whole list of fdb entries
-            agent_fdb_entries = {network_id:
-                                 {'segment_id': segment['segmentation_id'],
-                                  'network_type': segment['network_type'],
-                                  'ports': {}}}
+            agent_fdb_entries = self._get_network_fdb_entries(
+                session, network_id, segment, agent_host)
             ports = agent_fdb_entries[network_id]['ports']
 
-            nondvr_network_ports = self.get_nondvr_network_ports(session,
-                                                                 network_id)
-            for network_port in nondvr_network_ports:
-                binding, agent = network_port
-                if agent.host == agent_host:
-                    continue
-
-                ip = self.get_agent_ip(agent)
-                if not ip:
-                    LOG.debug(_("Unable to retrieve the agent ip, check "
-                                "the agent %(agent_host)s configuration."),
-                              {'agent_host': agent.host})
-                    continue
-
-                agent_ports = ports.get(ip, [const.FLOODING_ENTRY])
-                agent_ports += self._get_port_fdb_entries(binding.port)
-                ports[ip] = agent_ports
-
-            dvr_network_ports = self.get_dvr_network_ports(session, network_id)
-            for network_port in dvr_network_ports:
-                binding, agent = network_port
-                if agent.host == agent_host:
-                    continue
-
-                ip = self.get_agent_ip(agent)
-                if not ip:
-                    LOG.debug("Unable to retrieve the agent ip, check "
-                              "the agent %(agent_host)s configuration.",
-                              {'agent_host': agent.host})
-                    continue
-
-                agent_ports = ports.get(ip, [const.FLOODING_ENTRY])
-                ports[ip] = agent_ports
-
             # And notify other agents to add flooding entry
             other_fdb_entries[network_id]['ports'][agent_ip].append(
                 const.FLOODING_ENTRY)
@@ -243,10 +386,12 @@ class L2populationMechanismDriver(api.MechanismDriver,
             other_fdb_entries[network_id]['ports'][agent_ip] += (
                 port_fdb_entries)
 
-        self.L2populationAgentNotify.add_fdb_entries(self.rpc_ctx,
-                                                     other_fdb_entries)
+        self._notify_network_hosts('add_fdb_entries', other_fdb_entries,
+                                   port)
 
     def _update_port_down(self, context, port, agent_host):
+        pending_ports = self._pop_pending_port(
+            agent_host, port['network_id'], const.PORT_STATUS_DOWN)
         port_infos = self._get_port_infos(context, port, agent_host)
         if not port_infos:
             return
@@ -256,7 +401,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
 
         session = db_api.get_session()
         agent_active_ports = self.get_agent_network_active_port_count(
-            session, agent_host, network_id)
+            session, agent_host, network_id) + pending_ports
 
         other_fdb_entries = {network_id:
                              {'segment_id': segment['segmentation_id'],
@@ -13,13 +13,76 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
+from neutron import manager
 from neutron.openstack.common import log as logging
+from neutron.plugins.ml2.drivers.l2pop import config  # noqa
 
 
 LOG = logging.getLogger(__name__)
 
+# Messages whose fdb entries can be merged with the ones of the next message
+# with the same method
+MERGEABLE_METHODS = ('add_fdb_entries', 'remove_fdb_entries')
+
+
+def merge_fdb_entries(fdb_entries, other_fdb_entries):
+    """Add the entries of other_fdb_entries to fdb_entries.
+
+    The entries of a network are only merged if they apply to the
+    generation the first ones lead to, or the agents could not detect the
+    changes they missed. Returns False, leaving fdb_entries unchanged, if
+    the entries of a network can't be merged.
+    """
+    for network_id, values in other_fdb_entries.items():
+        if (network_id in fdb_entries and 'prev_generation' in values and
+                fdb_entries[network_id].get('generation') !=
+                values['prev_generation']):
+            return False
+    for network_id, values in other_fdb_entries.items():
+        if network_id not in fdb_entries:
+            fdb_entries[network_id] = copy.deepcopy(values)
+            continue
+        if 'generation' in values:
+            # The merged entries apply to the generation of the first ones
+            fdb_entries[network_id]['generation'] = values['generation']
+        ports = fdb_entries[network_id]['ports']
+        for agent_ip, agent_ports in values['ports'].items():
+            merged_ports = ports.setdefault(agent_ip, [])
+            known = set(tuple(port) for port in merged_ports)
+            for port in agent_ports:
+                if tuple(port) not in known:
+                    known.add(tuple(port))
+                    merged_ports.append(port)
+    return True
+
+
+class L2populationServerRpcCallback(n_rpc.RpcCallback):
+    """Plugin-side RPC (implementation) for agent-to-plugin interaction."""
+
+    # History
+    #   1.0 Initial version
+
+    RPC_API_VERSION = '1.0'
+
+    def get_fdb_entries(self, context, **kwargs):
+        """Agent requests the fdb entries of the networks of its host."""
+        host = kwargs.get('host')
+        LOG.debug("Fdb entries requested by host %s", host)
+        plugin = manager.NeutronManager.get_plugin()
+        driver = plugin.mechanism_manager.mech_drivers.get('l2population')
+        if not driver:
+            return {'fdb_entries': {}, 'next_marker': None}
+        return driver.obj.get_agent_fdb_entries(
+            host, network_ids=kwargs.get('network_ids'),
+            marker=kwargs.get('marker'), limit=kwargs.get('limit'))
+
 
 class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
     BASE_RPC_API_VERSION = '1.0'
@@ -31,6 +94,10 @@ class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
         self.topic_l2pop_update = topics.get_topic_name(topic,
                                                         topics.L2POPULATION,
                                                         topics.UPDATE)
+        # Messages waiting to be sent, by host. None stands for all the
+        # agents.
+        self.pending_messages = {}
+        self._waiting_to_send = False
 
     def _notification_fanout(self, context, method, fdb_entries):
         LOG.debug(_('Fanout notify l2population agents at %(topic)s '
@@ -54,29 +121,66 @@ class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
                   self.make_msg(method, fdb_entries=fdb_entries),
                   topic='%s.%s' % (self.topic_l2pop_update, host))
 
-    def add_fdb_entries(self, context, fdb_entries, host=None):
-        if fdb_entries:
-            if host:
-                self._notification_host(context, 'add_fdb_entries',
-                                        fdb_entries, host)
-            else:
-                self._notification_fanout(context, 'add_fdb_entries',
-                                          fdb_entries)
-
-    def remove_fdb_entries(self, context, fdb_entries, host=None):
-        if fdb_entries:
-            if host:
-                self._notification_host(context, 'remove_fdb_entries',
-                                        fdb_entries, host)
-            else:
-                self._notification_fanout(context, 'remove_fdb_entries',
-                                          fdb_entries)
-
-    def update_fdb_entries(self, context, fdb_entries, host=None):
-        if fdb_entries:
-            if host:
-                self._notification_host(context, 'update_fdb_entries',
-                                        fdb_entries, host)
+    def _send(self, context, method, fdb_entries, host):
+        if host:
+            self._notification_host(context, method, fdb_entries, host)
+        else:
+            self._notification_fanout(context, method, fdb_entries)
+
+    def _queue_notification(self, context, method, fdb_entries, host):
+        """Queue a message until the end of the notification interval.
+
+        The fdb entries of consecutive add or remove messages to the same
+        host are merged, while the order of the messages is kept, so that
+        an agent applies the same changes in fewer messages.
+        """
+        messages = self.pending_messages.setdefault(host, [])
+        if not (messages and method in MERGEABLE_METHODS and
+                messages[-1][0] == method and
+                merge_fdb_entries(messages[-1][1], fdb_entries)):
+            messages.append((method, copy.deepcopy(fdb_entries)))
+
+        if self._waiting_to_send:
+            return
+        self._waiting_to_send = True
+
+        def last_out_sends():
+            eventlet.sleep(cfg.CONF.l2pop.notification_interval)
+            self._waiting_to_send = False
+            self.send_pending_notifications(context)
+
+        eventlet.spawn_n(last_out_sends)
+
+    def send_pending_notifications(self, context):
+        pending_messages = self.pending_messages
+        self.pending_messages = {}
+        for host, messages in pending_messages.items():
+            for method, fdb_entries in messages:
+                self._send(context, method, fdb_entries, host)
+
+    def _notify(self, context, method, fdb_entries, host, hosts):
+        if not fdb_entries:
+            return
+        if host:
+            hosts = [host]
+        elif hosts is None:
+            hosts = [None]
+        for host in hosts:
+            if cfg.CONF.l2pop.notification_interval > 0:
+                self._queue_notification(context, method, fdb_entries, host)
             else:
-                self._notification_fanout(context, 'update_fdb_entries',
-                                          fdb_entries)
+                self._send(context, method, fdb_entries, host)
+
+    def add_fdb_entries(self, context, fdb_entries, host=None, hosts=None):
+        """Send fdb entries to add to the agent of host, or to those of
+        hosts, or to all the agents if neither is given.
+        """
+        self._notify(context, 'add_fdb_entries', fdb_entries, host, hosts)
+
+    def remove_fdb_entries(self, context, fdb_entries, host=None,
+                           hosts=None):
+        self._notify(context, 'remove_fdb_entries', fdb_entries, host, hosts)
+
+    def update_fdb_entries(self, context, fdb_entries, host=None,
+                           hosts=None):
+        self._notify(context, 'update_fdb_entries', fdb_entries, host, hosts)
@@ -47,6 +47,7 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import extra_dhcp_opt as edo_ext
 from neutron.extensions import l3agentscheduler
+from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as provider
 from neutron import manager
@@ -62,6 +63,7 @@ from neutron.plugins.ml2 import config  # noqa
 from neutron.plugins.ml2 import db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2 import driver_context
+from neutron.plugins.ml2.drivers.l2pop import rpc as l2pop_rpc
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import models
 from neutron.plugins.ml2 import rpc
@@ -74,6 +76,11 @@ MAX_BIND_TRIES = 10
 # providernet.py?
 TYPE_MULTI_SEGMENT = 'multi-segment'
 
+PROVIDER_ATTRIBUTES = frozenset([provider.NETWORK_TYPE,
+                                 provider.PHYSICAL_NETWORK,
+                                 provider.SEGMENTATION_ID,
+                                 mpnet.SEGMENTS])
+
 
 class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 dvr_mac_db.DVRDbMixin,
@@ -93,11 +100,12 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
     """
 
     # This attribute specifies whether the plugin supports or not
-    # bulk/pagination/sorting operations. Name mangling is used in
-    # order to ensure it is qualified by class
+    # bulk/pagination/sorting/streaming operations. Name mangling is used
+    # in order to ensure it is qualified by class
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __native_streaming_support = True
 
     # List of supported extensions
     _supported_extension_aliases = ["provider", "external-net", "binding",
@@ -147,6 +155,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                           securitygroups_rpc.SecurityGroupServerRpcCallback(),
                           dvr_rpc.DVRServerRpcCallback(),
                           dhcp_rpc.DhcpRpcCallback(),
+                          l2pop_rpc.L2populationServerRpcCallback(),
                           agents_db.AgentExtRpcCallback()]
         self.topic = topics.PLUGIN
         self.conn = n_rpc.create_connection(new=True)
@@ -415,7 +424,17 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             self._update_port_dict_binding(port_res, port_db.port_binding)
 
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_ml2_extend_port_dict_binding'])
+        attributes.PORTS, ['_ml2_extend_port_dict_binding'],
+        fields=[portbindings.HOST_ID, portbindings.VNIC_TYPE,
+                portbindings.PROFILE, portbindings.VIF_TYPE,
+                portbindings.VIF_DETAILS])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_relationship_fields(
+        models_v2.Port, 'port_binding',
+        [portbindings.HOST_ID, portbindings.VNIC_TYPE, portbindings.PROFILE,
+         portbindings.VIF_TYPE, portbindings.VIF_DETAILS])
+    # The DVR port bindings are not part of the port dicts
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_relationship_fields(
+        models_v2.Port, 'dvr_port_binding', [])
 
     # Register extend dict methods for network and port resources.
     # Each mechanism driver that supports extend attribute for the resources
@@ -550,11 +569,17 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                      sorts=None, limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
+            # The provider attributes and filters only need the ids
             nets = super(Ml2Plugin,
-                         self).get_networks(context, filters, None, sorts,
-                                            limit, marker, page_reverse)
-            for net in nets:
-                self.type_manager._extend_network_dict_provider(context, net)
+                         self).get_networks(context, filters,
+                                            fields and list(fields) + ['id'],
+                                            sorts, limit, marker,
+                                            page_reverse)
+            if (not fields or not PROVIDER_ATTRIBUTES.isdisjoint(
+                    list(fields) + list(filters or []))):
+                for net in nets:
+                    self.type_manager._extend_network_dict_provider(context,
+                                                                    net)
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -771,32 +796,47 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # the fact that an error occurred.
             LOG.error(_("mechanism_manager.delete_subnet_postcommit failed"))
 
-    def create_port(self, context, port):
+    def _before_create_port(self, context, port):
         attrs = port['port']
         attrs['status'] = const.PORT_STATUS_DOWN
+        self._ensure_default_security_group_on_port(context, port)
+        sgids = self._get_security_groups_on_port(context, port)
+        dhcp_opts = attrs.get(edo_ext.EXTRADHCPOPTS, [])
+        return sgids, dhcp_opts
+
+    def _after_create_port_db(self, context, port, result, sgids, dhcp_opts,
+                              network):
+        """Process a created port within the creation transaction.
+
+        Returns the port context and the port if it is bound to a new host.
+        """
+        attrs = port['port']
+        session = context.session
+        self.extension_manager.process_create_port(session, attrs, result)
+        self._process_port_create_security_group(context, result, sgids)
+        binding = db.add_port_binding(session, result['id'])
+        mech_context = driver_context.PortContext(self, context, result,
+                                                  network, binding)
+        new_host_port = self._get_host_port_if_changed(mech_context, attrs)
+        self._process_port_binding(mech_context, attrs)
+
+        result[addr_pair.ADDRESS_PAIRS] = (
+            self._process_create_allowed_address_pairs(
+                context, result,
+                attrs.get(addr_pair.ADDRESS_PAIRS)))
+        self._process_port_create_extra_dhcp_opts(context, result,
+                                                  dhcp_opts)
+        self.mechanism_manager.create_port_precommit(mech_context)
+        return mech_context, new_host_port
 
+    def create_port(self, context, port):
         session = context.session
         with session.begin(subtransactions=True):
-            self._ensure_default_security_group_on_port(context, port)
-            sgids = self._get_security_groups_on_port(context, port)
-            dhcp_opts = port['port'].get(edo_ext.EXTRADHCPOPTS, [])
+            sgids, dhcp_opts = self._before_create_port(context, port)
             result = super(Ml2Plugin, self).create_port(context, port)
-            self.extension_manager.process_create_port(session, attrs, result)
-            self._process_port_create_security_group(context, result, sgids)
             network = self.get_network(context, result['network_id'])
-            binding = db.add_port_binding(session, result['id'])
-            mech_context = driver_context.PortContext(self, context, result,
-                                                      network, binding)
-            new_host_port = self._get_host_port_if_changed(mech_context, attrs)
-            self._process_port_binding(mech_context, attrs)
-
-            result[addr_pair.ADDRESS_PAIRS] = (
-                self._process_create_allowed_address_pairs(
-                    context, result,
-                    attrs.get(addr_pair.ADDRESS_PAIRS)))
-            self._process_port_create_extra_dhcp_opts(context, result,
-                                                      dhcp_opts)
-            self.mechanism_manager.create_port_precommit(mech_context)
+            mech_context, new_host_port = self._after_create_port_db(
+                context, port, result, sgids, dhcp_opts, network)
 
         # Notification must be sent after the above transaction is complete
         self._notify_l3_agent_new_port(context, new_host_port)
@@ -822,6 +862,61 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 self.delete_port(context, result['id'])
         return bound_context._port
 
+    def create_port_bulk(self, context, ports):
+        """Create several ports in a single transaction.
+
+        The ports are stored by the bulk path of the db plugin, and all the
+        mechanism driver precommit calls are made in that transaction. The
+        postcommit calls and the notifications follow for the whole batch.
+        If any of them fails, all the ports of the batch are deleted.
+        """
+        items = ports['ports']
+        session = context.session
+        with session.begin(subtransactions=True):
+            args = [self._before_create_port(context, item) for item in items]
+            results = self._create_port_bulk_db(context, ports)
+            networks = {}
+            created = []
+            for item, (sgids, dhcp_opts), result in zip(items, args, results):
+                network_id = result['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
+                created.append(self._after_create_port_db(
+                    context, item, result, sgids, dhcp_opts,
+                    networks[network_id]))
+
+        for _mech_context, new_host_port in created:
+            self._notify_l3_agent_new_port(context, new_host_port)
+
+        port_ids = [result['id'] for result in results]
+        try:
+            for mech_context, _new_host_port in created:
+                self.mechanism_manager.create_port_postcommit(mech_context)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("mechanism_manager.create_port_postcommit "
+                            "failed, deleting ports %s"), port_ids)
+                self._delete_ports(context, port_ids)
+
+        self.notify_security_groups_member_updated_bulk(context, results)
+
+        try:
+            return [self._bind_port_if_needed(mech_context)._port
+                    for mech_context, _new_host_port in created]
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("_bind_port_if_needed "
+                            "failed, deleting ports %s"), port_ids)
+                self._delete_ports(context, port_ids)
+
+    def _delete_ports(self, context, port_ids):
+        for port_id in port_ids:
+            try:
+                self.delete_port(context, port_id)
+            except exc.PortNotFound:
+                pass
+
     def update_port(self, context, id, port):
         attrs = port['port']
         need_port_update_notify = False
@@ -1077,6 +1172,59 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return self._bind_port_if_needed(port_context)
 
+    def _get_networks_and_segments(self, context, network_ids):
+        network_ids = list(network_ids)
+        if not network_ids:
+            return {}, {}
+        networks = self.get_networks(context, filters={'id': network_ids})
+        segments = db.get_networks_segments(context.session, network_ids)
+        return (dict((network['id'], network) for network in networks),
+                segments)
+
+    def get_bound_ports_contexts(self, plugin_context, port_ids, host=None):
+        """Return the bound port contexts of several ports.
+
+        As for get_bound_port_context, the port ids may be truncated, but
+        the ports, bindings, networks and segments of all of them are
+        fetched with a few queries. Returns a dict mapping each port id to
+        its port context, or to None if the port is not found.
+        """
+        session = plugin_context.session
+        port_contexts = {}
+        with session.begin(subtransactions=True):
+            port_dbs = db.get_ports(session, port_ids)
+            networks, segments = self._get_networks_and_segments(
+                plugin_context,
+                set(port_db.network_id for port_db in port_dbs.values()
+                    if port_db))
+            for port_id, port_db in port_dbs.iteritems():
+                if not port_db or port_db.network_id not in networks:
+                    port_contexts[port_id] = None
+                    continue
+                port = self._make_port_dict(port_db)
+                network = networks[port['network_id']]
+                network_segments = segments[port['network_id']]
+                if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    binding = db.get_dvr_port_binding_by_host(
+                        session, port['id'], host)
+                    if not binding:
+                        LOG.error(_("Binding info for DVR port %s not found"),
+                                  port_id)
+                        port_contexts[port_id] = None
+                        continue
+                    port_contexts[port_id] = driver_context.DvrPortContext(
+                        self, plugin_context, port, network, binding,
+                        network_segments=network_segments)
+                else:
+                    port_contexts[port_id] = driver_context.PortContext(
+                        self, plugin_context, port, network,
+                        port_db.port_binding,
+                        network_segments=network_segments)
+
+        return dict((port_id, port_context and
+                     self._bind_port_if_needed(port_context))
+                    for port_id, port_context in port_contexts.iteritems())
+
     def update_port_status(self, context, port_id, status, host=None):
         """
         Returns port_id (non-truncated uuid) if the port exists.
@@ -1142,6 +1290,57 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return port['id']
 
+    def update_port_statuses(self, context, port_statuses, host=None):
+        """Update the status of several ports in a single transaction.
+
+        port_statuses maps port ids, possibly truncated, to their new
+        status. The status of DVR interface ports, which is kept per host,
+        is updated with update_port_status. Returns a dict mapping the
+        port ids of the ports which exist to their non-truncated ids.
+        """
+        found = {}
+        dvr_port_statuses = {}
+        mech_contexts = []
+        session = context.session
+        # Serialized with the same semaphore as update_port_status
+        with contextlib.nested(lockutils.lock('db-access'),
+                               session.begin(subtransactions=True)):
+            ports = db.get_locked_ports_and_bindings(session,
+                                                     port_statuses.keys())
+            networks, segments = self._get_networks_and_segments(
+                context, set(port.network_id for port, binding
+                             in ports.values() if port))
+            for port_id, (port, binding) in ports.iteritems():
+                if not port or port.network_id not in networks:
+                    LOG.warning(_("Port %(port)s updated by agent not found"),
+                                {'port': port_id})
+                    continue
+                status = port_statuses[port_id]
+                if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    dvr_port_statuses[port_id] = status
+                    continue
+                found[port_id] = port.id
+                if port.status == status:
+                    continue
+                original_port = self._make_port_dict(port)
+                port.status = status
+                updated_port = self._make_port_dict(port)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port, networks[port.network_id],
+                    binding, original_port=original_port,
+                    network_segments=segments[port.network_id])
+                self.mechanism_manager.update_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+
+        for port_id, status in dvr_port_statuses.iteritems():
+            full_port_id = self.update_port_status(context, port_id, status,
+                                                   host)
+            if full_port_id:
+                found[port_id] = full_port_id
+        if mech_contexts:
+            self.mechanism_manager.update_ports_postcommit(mech_contexts)
+        return found
+
     def port_bound_to_host(self, context, port_id, host):
         port = db.get_port(context.session, port_id)
         if not port:
@@ -1158,6 +1357,22 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             port_host = db.get_port_binding_host(port_id)
             return (port_host == host)
 
+    def ports_bound_to_host(self, context, port_ids, host):
+        """Return those of several port ids whose port is bound to host."""
+        bound = set()
+        session = context.session
+        with session.begin(subtransactions=True):
+            for port_id, port in db.get_ports(session, port_ids).iteritems():
+                if not port:
+                    LOG.debug("No Port match for: %s", port_id)
+                elif port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    if db.get_dvr_port_binding_by_host(session, port['id'],
+                                                       host):
+                        bound.add(port_id)
+                elif port.port_binding and port.port_binding.host == host:
+                    bound.add(port_id)
+        return bound
+
     def get_ports_from_devices(self, devices):
         port_ids_to_devices = dict((self._device_to_port_id(device), device)
                                    for device in devices)
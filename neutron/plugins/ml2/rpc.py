@@ -37,7 +37,7 @@ LOG = log.getLogger(__name__)
 class RpcCallbacks(n_rpc.RpcCallback,
                    type_tunnel.TunnelRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.3'
+    RPC_API_VERSION = '1.4'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
@@ -45,6 +45,7 @@ class RpcCallbacks(n_rpc.RpcCallback,
     #   1.3 get_device_details rpc signature upgrade to obtain 'host' and
     #       return value to include fixed_ips and device_owner for
     #       the device port
+    #   1.4 Support update_devices_up and update_devices_down
 
     def __init__(self, notifier, type_manager):
         self.setup_tunnel_callback_mixin(notifier, type_manager)
@@ -64,11 +65,25 @@ class RpcCallbacks(n_rpc.RpcCallback,
         port_context = plugin.get_bound_port_context(rpc_context,
                                                      port_id,
                                                      host)
+        entry, new_status = self._get_device_entry(device, agent_id, port_id,
+                                                   port_context)
+        if new_status:
+            plugin.update_port_status(rpc_context,
+                                      port_id,
+                                      new_status,
+                                      host)
+        return entry
+
+    def _get_device_entry(self, device, agent_id, port_id, port_context):
+        """Return the details of a device and the status of its port.
+
+        The status is None if the port status does not need to change.
+        """
         if not port_context:
             LOG.warning(_("Device %(device)s requested by agent "
                           "%(agent_id)s not found in database"),
                         {'device': device, 'agent_id': agent_id})
-            return {'device': device}
+            return {'device': device}, None
 
         segment = port_context.bound_segment
         port = port_context.current
@@ -81,15 +96,12 @@ class RpcCallbacks(n_rpc.RpcCallback,
                          'agent_id': agent_id,
                          'network_id': port['network_id'],
                          'vif_type': port[portbindings.VIF_TYPE]})
-            return {'device': device}
+            return {'device': device}, None
 
         new_status = (q_const.PORT_STATUS_BUILD if port['admin_state_up']
                       else q_const.PORT_STATUS_DOWN)
-        if port['status'] != new_status:
-            plugin.update_port_status(rpc_context,
-                                      port_id,
-                                      new_status,
-                                      host)
+        if port['status'] == new_status:
+            new_status = None
 
         entry = {'device': device,
                  'network_id': port['network_id'],
@@ -103,17 +115,39 @@ class RpcCallbacks(n_rpc.RpcCallback,
                  'device_owner': port['device_owner'],
                  'profile': port[portbindings.PROFILE]}
         LOG.debug(_("Returning: %s"), entry)
-        return entry
+        return entry, new_status
 
     def get_devices_details_list(self, rpc_context, **kwargs):
-        return [
-            self.get_device_details(
-                rpc_context,
-                device=device,
-                **kwargs
-            )
-            for device in kwargs.pop('devices', [])
-        ]
+        """Agent requests the details of several devices.
+
+        The ports of all the devices are fetched at once, and their status
+        updated in a single transaction.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        if not devices:
+            return []
+        LOG.debug("Devices %(devices)s details requested by agent "
+                  "%(agent_id)s with host %(host)s",
+                  {'devices': devices, 'agent_id': agent_id, 'host': host})
+
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = [plugin._device_to_port_id(device) for device in devices]
+        port_contexts = plugin.get_bound_ports_contexts(rpc_context,
+                                                        port_ids,
+                                                        host)
+        entries = []
+        new_statuses = {}
+        for device, port_id in zip(devices, port_ids):
+            entry, new_status = self._get_device_entry(
+                device, agent_id, port_id, port_contexts.get(port_id))
+            if new_status:
+                new_statuses[port_id] = new_status
+            entries.append(entry)
+        if new_statuses:
+            plugin.update_port_statuses(rpc_context, new_statuses, host)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
@@ -175,6 +209,84 @@ class RpcCallbacks(n_rpc.RpcCallback,
             except exceptions.PortNotFound:
                 LOG.debug('Port %s not found during ARP update', port_id)
 
+    def _get_bound_port_ids(self, rpc_context, plugin, devices, host):
+        """Map the devices bound to host, if given, to their port ids."""
+        port_ids = dict((device, plugin._device_to_port_id(device))
+                        for device in devices)
+        if host:
+            bound = plugin.ports_bound_to_host(rpc_context,
+                                               port_ids.values(), host)
+            for device, port_id in port_ids.items():
+                if port_id not in bound:
+                    LOG.debug("Device %(device)s not bound to the "
+                              "agent host %(host)s",
+                              {'device': device, 'host': host})
+                    del port_ids[device]
+        return port_ids
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent.
+
+        The status of their ports is updated in a single transaction.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        if not devices:
+            return []
+        LOG.debug("Devices %(devices)s no longer exist at agent "
+                  "%(agent_id)s",
+                  {'devices': devices, 'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = self._get_bound_port_ids(rpc_context, plugin, devices,
+                                            host)
+        try:
+            updated = plugin.update_port_statuses(
+                rpc_context,
+                dict((port_id, q_const.PORT_STATUS_DOWN)
+                     for port_id in port_ids.itervalues()),
+                host)
+        except exc.StaleDataError:
+            LOG.debug("delete_port and update_devices_down are being "
+                      "executed concurrently. Updating the devices one by "
+                      "one.")
+            return [self.update_device_down(rpc_context, device=device,
+                                            agent_id=agent_id, host=host)
+                    for device in devices]
+        # As for update_device_down, the devices not bound to host exist
+        return [{'device': device,
+                 'exists': (device not in port_ids or
+                            port_ids[device] in updated)}
+                for device in devices]
+
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Devices are up on agent.
+
+        The status of their ports is updated in a single transaction.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        if not devices:
+            return
+        LOG.debug("Devices %(devices)s up at agent %(agent_id)s",
+                  {'devices': devices, 'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = self._get_bound_port_ids(rpc_context, plugin, devices,
+                                            host)
+        updated = plugin.update_port_statuses(
+            rpc_context,
+            dict((port_id, q_const.PORT_STATUS_ACTIVE)
+                 for port_id in port_ids.itervalues()),
+            host)
+        l3plugin = manager.NeutronManager.get_service_plugins().get(
+            service_constants.L3_ROUTER_NAT)
+        if (updated and l3plugin and
+            utils.is_extension_supported(l3plugin,
+                                         q_const.L3_DISTRIBUTED_EXT_ALIAS)):
+            l3plugin.dvr_vmarp_tables_update(rpc_context, updated.values(),
+                                             "add")
+
 
 class AgentNotifierApi(n_rpc.RpcProxy,
                        dvr_rpc.DVRAgentRpcApiMixin,
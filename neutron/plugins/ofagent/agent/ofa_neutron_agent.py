@@ -774,6 +774,8 @@ class OFANeutronAgent(n_rpc.RpcCallback,
 
     def treat_devices_added_or_updated(self, devices):
         resync = False
+        devices_up = []
+        devices_down = []
         all_ports = dict((p.normalized_port_name(), p) for p in
                          self._get_ports(self.int_br) if p.is_neutron_port())
         for device in devices:
@@ -806,39 +808,46 @@ class OFANeutronAgent(n_rpc.RpcCallback,
                                     details['segmentation_id'],
                                     details['admin_state_up'])
 
-                # update plugin about port status
                 if details.get('admin_state_up'):
-                    LOG.debug("Setting status for %s to UP", device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
-                    LOG.debug("Setting status for %s to DOWN", device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_LI("Configuration for device %s completed."), device)
+                    devices_down.append(device)
             else:
                 LOG.warn(_LW("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        # update plugin about port status
+        if devices_up:
+            LOG.debug("Setting status for %s to UP", devices_up)
+            self.plugin_rpc.update_devices_up(
+                self.context, devices_up, self.agent_id, cfg.CONF.host)
+        if devices_down:
+            LOG.debug("Setting status for %s to DOWN", devices_down)
+            self.plugin_rpc.update_devices_down(
+                self.context, devices_down, self.agent_id, cfg.CONF.host)
+        for device in devices_up + devices_down:
+            LOG.info(_LI("Configuration for device %s completed."), device)
         return resync
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
+        devices = list(devices)
+        if not devices:
+            return False
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        try:
+            self.plugin_rpc.update_devices_down(self.context,
+                                                devices,
+                                                self.agent_id,
+                                                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return True
+        for device in devices:
             self.port_unbound(device)
-        return resync
+        return False
 
     def process_network_ports(self, port_info):
         resync_add = False
@@ -83,6 +83,7 @@ class LocalVLANMapping:
 
 class OVSPluginApi(agent_rpc.PluginApi,
                    dvr_rpc.DVRServerRpcApiMixin,
+                   l2population_rpc.L2populationServerRpcApiMixin,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
 
@@ -173,6 +174,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         self.use_call = True
         self.tunnel_types = tunnel_types or []
         self.l2_pop = l2_population
+        if self.l2_pop:
+            self.fdb_cache = l2population_rpc.FdbCache()
         # TODO(ethuleau): Change ARP responder so it's not dependent on the
         #                 ML2 l2 population mechanism driver.
         self.enable_distributed_routing = enable_distributed_routing
@@ -185,6 +188,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                'tunnel_types': self.tunnel_types,
                                'tunneling_ip': local_ip,
                                'l2_population': self.l2_pop,
+                               'l2pop_fdb_sync': self.l2_pop,
                                'arp_responder_enabled':
                                self.arp_responder_enabled,
                                'enable_distributed_routing':
@@ -218,6 +222,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         self.tunnel_count = 0
         self.vxlan_udp_port = cfg.CONF.AGENT.vxlan_udp_port
         self.dont_fragment = cfg.CONF.AGENT.dont_fragment
+        self.use_ofctl_bundle = cfg.CONF.AGENT.use_ofctl_bundle
         self.tun_br = None
         self.patch_int_ofport = constants.OFPORT_INVALID
         self.patch_tun_ofport = constants.OFPORT_INVALID
@@ -563,6 +568,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         if lvm is None:
             LOG.debug(_("Network %s not used on agent."), net_uuid)
             return
+        if self.fdb_cache is not None:
+            self.fdb_cache.forget(net_uuid)
 
         LOG.info(_("Reclaiming vlan = %(vlan_id)s from net-id = %(net_uuid)s"),
                  {'vlan_id': lvm.vlan,
@@ -962,6 +969,74 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def _get_event_port_id(self, device):
+        external_ids = device['external_ids']
+        if not isinstance(external_ids, dict):
+            return
+        if "attached-mac" not in external_ids:
+            return
+        if "iface-id" in external_ids:
+            return external_ids["iface-id"]
+        if "xs-vif-uuid" in external_ids:
+            return self.int_br.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+
+    def process_ports_events(self, events, registered_ports,
+                             updated_ports=None):
+        """Build port_info from ovsdb monitor events instead of a scan.
+
+        Only the ports reported as added or removed by the monitor are
+        looked at, so the result matches what scan_ports() would return
+        without listing every port of the integration bridge. Likewise,
+        only the registered ports in the events are checked for a lost
+        vlan tag.
+        """
+        added = set()
+        removed = set()
+        event_ports = set()
+        if events['added']:
+            port_names = set(self.int_br.get_port_name_list())
+            for device in events['added']:
+                port_id = self._get_event_port_id(device)
+                if not port_id or device['name'] not in port_names:
+                    continue
+                event_ports.add(port_id)
+                # Ports without a valid ofport are not ready yet, a new
+                # event will be received once they are.
+                ofport = device['ofport']
+                if not isinstance(ofport, int) or ofport <= 0:
+                    LOG.debug(_("Found not yet ready openvswitch port: %s"),
+                              device['name'])
+                    continue
+                added.add(port_id)
+        if updated_ports is None:
+            updated_ports = set()
+        for device in events['removed']:
+            port_id = self._get_event_port_id(device)
+            if not port_id:
+                continue
+            event_ports.add(port_id)
+            if port_id in added:
+                # The port has been plugged again, possibly with a new
+                # ofport, so it has to be wired again.
+                updated_ports.add(port_id)
+            else:
+                removed.add(port_id)
+
+        cur_ports = (registered_ports | added) - removed
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        event_ports &= registered_ports
+        if event_ports:
+            updated_ports.update(self.check_changed_vlans(event_ports))
+        updated_ports &= cur_ports
+        if updated_ports:
+            port_info['updated'] = updated_ports
+        if cur_ports == registered_ports:
+            return port_info
+        port_info['added'] = added - registered_ports
+        port_info['removed'] = registered_ports & removed
+        return port_info
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -1084,6 +1159,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
 
     def treat_devices_added_or_updated(self, devices, ovs_restarted):
         skipped_devices = []
+        devices_up = []
+        devices_down = []
         try:
             devices_details_list = self.plugin_rpc.get_devices_details_list(
                 self.context,
@@ -1115,24 +1192,32 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                     details['fixed_ips'],
                                     details['device_owner'],
                                     ovs_restarted)
-                # update plugin about port status
-                # FIXME(salv-orlando): Failures while updating device status
-                # must be handled appropriately. Otherwise this might prevent
-                # neutron server from sending network-vif-* events to the nova
-                # API server, thus possibly preventing instance spawn.
                 if details.get('admin_state_up'):
-                    LOG.debug(_("Setting status for %s to UP"), device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
-                    LOG.debug(_("Setting status for %s to DOWN"), device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_("Configuration for device %s completed."), device)
+                    devices_down.append(device)
             else:
                 LOG.warn(_("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        # The flows of the devices must be in place before they are
+        # reported to the plugin
+        self.apply_deferred_flows()
+        # update plugin about port status
+        # FIXME(salv-orlando): Failures while updating device status
+        # must be handled appropriately. Otherwise this might prevent
+        # neutron server from sending network-vif-* events to the nova
+        # API server, thus possibly preventing instance spawn.
+        if devices_up:
+            LOG.debug("Setting status for %s to UP", devices_up)
+            self.plugin_rpc.update_devices_up(
+                self.context, devices_up, self.agent_id, cfg.CONF.host)
+        if devices_down:
+            LOG.debug("Setting status for %s to DOWN", devices_down)
+            self.plugin_rpc.update_devices_down(
+                self.context, devices_down, self.agent_id, cfg.CONF.host)
+        for device in devices_up + devices_down:
+            LOG.info(_("Configuration for device %s completed."), device)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1156,22 +1241,24 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                              cfg.CONF.host)
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
+        devices = list(devices)
+        if not devices:
+            return False
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+            # Local ports are unbound even if the server can't be told
             self.port_unbound(device)
-        return resync
+        try:
+            self.plugin_rpc.update_devices_down(self.context,
+                                                devices,
+                                                self.agent_id,
+                                                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return True
+        return False
 
     def treat_ancillary_devices_removed(self, devices):
         resync = False
@@ -1334,6 +1421,30 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         canary_flow = self.int_br.dump_flows_for_table(constants.CANARY_TABLE)
         return not canary_flow
 
+    def _flow_bridges(self):
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.tun_br:
+            bridges.append(self.tun_br)
+        return bridges
+
+    def defer_apply_flows_on(self):
+        """Accumulate the flow changes of all bridges.
+
+        Until defer_apply_flows_off is called, each bridge queues its flow
+        changes, then applies them with as few ovs-ofctl calls as possible,
+        in a single bundle if use_ofctl_bundle is set.
+        """
+        for br in self._flow_bridges():
+            br.defer_apply_on(use_bundle=self.use_ofctl_bundle)
+
+    def apply_deferred_flows(self):
+        for br in self._flow_bridges():
+            br.apply_deferred_flows()
+
+    def defer_apply_flows_off(self):
+        for br in self._flow_bridges():
+            br.defer_apply_off()
+
     def rpc_loop(self, polling_manager=None):
         if not polling_manager:
             polling_manager = polling.AlwaysPoll()
@@ -1343,6 +1454,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         updated_ports_copy = set()
         ancillary_ports = set()
         tunnel_sync = True
+        fdb_sync = self.l2_pop
         ovs_restarted = False
         while self.run_daemon_loop:
             start = time.time()
@@ -1358,6 +1470,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 ports.clear()
                 ancillary_ports.clear()
                 sync = False
+                fdb_sync = self.l2_pop
                 polling_manager.force_polling()
             ovs_restarted = self.check_ovs_restart()
             if ovs_restarted:
@@ -1366,11 +1479,15 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 if self.enable_tunneling:
                     self.setup_tunnel_br()
                     tunnel_sync = True
+                    fdb_sync = self.l2_pop
                 self.dvr_agent.reset_ovs_parameters(self.int_br,
                                                     self.tun_br,
                                                     self.patch_int_ofport,
                                                     self.patch_tun_ofport)
                 self.dvr_agent.setup_dvr_flows_on_integ_tun_br()
+            # Flows changed during the iteration are applied at its end, or
+            # before notifying the plugin of the devices which were wired.
+            self.defer_apply_flows_on()
             # Notify the plugin of tunnel IP
             if self.enable_tunneling and tunnel_sync:
                 LOG.info(_("Agent tunnel out of sync with plugin!"))
@@ -1392,7 +1509,13 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
                     reg_ports = (set() if ovs_restarted else ports)
-                    port_info = self.scan_ports(reg_ports, updated_ports_copy)
+                    events = polling_manager.get_events()
+                    if events is None or ovs_restarted:
+                        port_info = self.scan_ports(reg_ports,
+                                                    updated_ports_copy)
+                    else:
+                        port_info = self.process_ports_events(
+                            events, reg_ports, updated_ports_copy)
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "port information retrieved. "
                                 "Elapsed:%(elapsed).3f"),
@@ -1451,6 +1574,20 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     self.updated_ports |= updated_ports_copy
                     sync = True
 
+            # Fetch the fdb entries once the local VLANs of the networks of
+            # the ports are provisioned, then only the networks which missed
+            # changes.
+            if self.l2_pop and not sync and (
+                    fdb_sync or self.fdb_cache.out_of_sync):
+                try:
+                    self.sync_fdb_entries(
+                        self.context, self.plugin_rpc,
+                        None if fdb_sync else list(self.fdb_cache.out_of_sync))
+                    fdb_sync = False
+                except Exception:
+                    LOG.exception(_("Error while synchronizing fdb entries"))
+
+            self.defer_apply_flows_off()
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d "
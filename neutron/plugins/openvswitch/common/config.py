@@ -94,6 +94,13 @@ agent_opts = [
                        "outgoing IP packet carrying GRE/VXLAN tunnel.")),
     cfg.BoolOpt('enable_distributed_routing', default=False,
                 help=_("Make the l2 agent run in DVR mode.")),
+    cfg.BoolOpt('use_ofctl_bundle', default=False,
+                help=_("Apply the flows changed during a polling iteration "
+                       "with one atomic 'ovs-ofctl --bundle' call per "
+                       "bridge. Requires OVS 2.6 and OpenFlow 1.4 to be "
+                       "enabled on the bridges. When disabled or failing, "
+                       "one ovs-ofctl call is done per bridge and per "
+                       "sequence of changes of the same kind.")),
 ]
 
 
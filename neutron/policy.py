@@ -38,6 +38,8 @@ from neutron.openstack.common import policy
 LOG = log.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# action => match rule of the read actions, built once per policy load
+_MATCH_RULES = {}
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -64,6 +66,7 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _MATCH_RULES.clear()
     policy.reset()
 
 
@@ -120,6 +123,7 @@ def _set_rules(data):
                               "deprecated policy %s. The policy will "
                               "not be enforced"), pol)
     policy.set_rules(policies)
+    _MATCH_RULES.clear()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target, action):
@@ -348,12 +352,62 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+def _get_match_rule(action, target):
+    """Return the rule to match for a given action.
+
+    The rules of the read actions do not depend on the target, so they are
+    only built once after the policies are loaded.
+    """
+    if get_resource_and_action(action)[1]:
+        return _build_match_rule(action, target)
+    match_rule = _MATCH_RULES.get(action)
+    if match_rule is None:
+        match_rule = _MATCH_RULES[action] = _build_match_rule(action, target)
+    return match_rule
+
+
+def _get_target_fields(rule):
+    """Return the names of the target fields a rule depends on.
+
+    Returns None if the rule uses checks whose dependencies are unknown.
+    """
+    if isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                         policy.RoleCheck)):
+        return set()
+    if isinstance(rule, policy.RuleCheck):
+        try:
+            return _get_target_fields(policy._rules[rule.match])
+        except KeyError:
+            return set()
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        fields = set()
+        for sub_rule in rule.rules:
+            sub_fields = _get_target_fields(sub_rule)
+            if sub_fields is None:
+                return
+            fields |= sub_fields
+        return fields
+    if isinstance(rule, policy.NotCheck):
+        return _get_target_fields(rule.rule)
+    if isinstance(rule, FieldCheck):
+        return set([rule.field])
+    if isinstance(rule, OwnerCheck):
+        parent_res = re.split('[:_]', rule.target_field, 1)[0]
+        parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+            "%ss" % parent_res)
+        if parent_foreign_key:
+            return set([rule.target_field, parent_foreign_key])
+        return set([rule.target_field])
+    if type(rule) is policy.GenericCheck:
+        return set(re.findall('%\\(([^)]+)\\)s', rule.match))
+
+
 def _prepare_check(context, action, target):
     """Prepare rule, target, and credentials for the policy engine."""
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
-    match_rule = _build_match_rule(action, target)
+    match_rule = _get_match_rule(action, target)
     credentials = context.to_dict()
     return match_rule, target, credentials
 
@@ -380,6 +434,67 @@ def check(context, action, target, plugin=None, might_not_exist=False):
     return policy.check(*(_prepare_check(context, action, target)))
 
 
+def check_items(context, action, targets):
+    """Verifies that the action is valid on each target in this context.
+
+    The rule and credentials are prepared once for all the targets. When
+    the rule only depends on some fields of the targets, as the rules
+    checking their owner do, the targets with the same values for these
+    fields share the result of a single check.
+
+    :param context: neutron context
+    :param action: string representing the read action to be checked
+    :param targets: list of dictionaries representing the objects of the
+        action
+
+    :return: Returns a list of booleans, True where access is permitted.
+    """
+    if not targets:
+        return []
+    match_rule, target, credentials = _prepare_check(context, action,
+                                                     targets[0])
+    fields = _get_target_fields(match_rule)
+    if fields is not None:
+        fields = sorted(fields)
+    results = []
+    memo = {}
+    for target in targets:
+        key = None
+        if fields is not None:
+            key = tuple(target.get(field) for field in fields)
+            try:
+                results.append(memo[key])
+                continue
+            except KeyError:
+                pass
+            except TypeError:
+                # unhashable field values
+                key = None
+        result = bool(policy.check(match_rule, target, credentials))
+        if key is not None:
+            memo[key] = result
+        results.append(result)
+    return results
+
+
+def check_attributes(context, action, target, attribute_names):
+    """Return the attributes of a target the context may use.
+
+    The policy of each attribute is the '<action>:<attribute>' rule, and
+    the attributes without any rule are permitted.
+    """
+    credentials = context.to_dict()
+    permitted = []
+    for attribute_name in attribute_names:
+        attr_action = '%s:%s' % (action, attribute_name)
+        if not (policy._rules and attr_action in policy._rules):
+            permitted.append(attribute_name)
+        elif policy.check(_get_match_rule(attr_action, target), target,
+                          credentials):
+            permitted.append(attribute_name)
+    return permitted
+
+
 def enforce(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -26,6 +26,7 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 QUOTA_DB_MODULE = 'neutron.db.quota_db'
 QUOTA_DB_DRIVER = 'neutron.db.quota_db.DbQuotaDriver'
+QUOTA_DB_TRACKED_DRIVER = 'neutron.db.quota_db.TrackedDbQuotaDriver'
 QUOTA_CONF_DRIVER = 'neutron.quota.ConfDriver'
 
 quota_opts = [
@@ -52,6 +53,16 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('reservation_expiration',
+               default=120,
+               help=_('Seconds after which the resources reserved by a '
+                      'request are released, if the request did not '
+                      'release them. Only used by TrackedDbQuotaDriver.')),
+    cfg.IntOpt('quota_usage_reconcile_interval',
+               default=600,
+               help=_('Seconds between two checks of the usages tracked by '
+                      'TrackedDbQuotaDriver against the resources. 0 '
+                      'disables the checks.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -219,8 +230,8 @@ class QuotaEngine(object):
         if self._driver is None:
             _driver_class = (self._driver_class or
                              cfg.CONF.QUOTAS.quota_driver)
-            if (_driver_class == QUOTA_DB_DRIVER and
-                    QUOTA_DB_MODULE not in sys.modules):
+            if (_driver_class in (QUOTA_DB_DRIVER, QUOTA_DB_TRACKED_DRIVER)
+                    and QUOTA_DB_MODULE not in sys.modules):
                 # If quotas table is not loaded, force config quota driver.
                 _driver_class = QUOTA_CONF_DRIVER
                 LOG.info(_("ConfDriver is used as quota_driver because the "
@@ -297,6 +308,38 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def tracks_usages(self, resource):
+        """Return whether the driver keeps count of a resource.
+
+        The resources whose usages are tracked are reserved through
+        make_reservation instead of being counted.
+        """
+        if resource not in self._resources:
+            return False
+        driver = self.get_driver()
+        return (hasattr(driver, 'tracks_usages') and
+                driver.tracks_usages(resource))
+
+    def make_reservation(self, context, tenant_id, **deltas):
+        """Reserve tracked resources for a tenant.
+
+        The amounts to reserve are given as keyword arguments, where the
+        key identifies the resource. An OverQuota exception is raised if
+        the quotas of the tenant do not allow them.
+
+        :param context: The request context, for access checks.
+        :return: the id of the reservation, to be removed with
+                 remove_reservation once the resources are created.
+        """
+
+        return self.get_driver().make_reservation(context, tenant_id,
+                                                  self._resources, deltas)
+
+    def remove_reservation(self, context, reservation_id):
+        """Release the resources of a reservation."""
+
+        self.get_driver().remove_reservation(context, reservation_id)
+
     @property
     def resources(self):
         return self._resources
@@ -81,7 +81,7 @@ class ChanceScheduler(object):
             active_dhcp_agents = [
                 agent for agent in set(enabled_dhcp_agents)
                 if not agents_db.AgentDbMixin.is_agent_down(
-                    agent['heartbeat_timestamp'])
+                    agent['last_heartbeat'])
                 and agent not in dhcp_agents
             ]
             if not active_dhcp_agents:
@@ -115,7 +115,7 @@ class ChanceScheduler(object):
             dhcp_agents = query.all()
             for dhcp_agent in dhcp_agents:
                 if agents_db.AgentDbMixin.is_agent_down(
-                    dhcp_agent.heartbeat_timestamp):
+                    dhcp_agent.last_heartbeat):
                     LOG.warn(_('DHCP agent %s is not active'), dhcp_agent.id)
                     continue
                 for net_id in net_ids:
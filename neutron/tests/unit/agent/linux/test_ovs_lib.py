@@ -18,6 +18,7 @@ from oslo.config import cfg
 import testtools
 
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_native
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 from neutron.openstack.common import jsonutils
@@ -448,6 +449,83 @@ class OVS_Lib_Test(base.BaseTestCase):
                           self.br.mod_flow,
                           **params)
 
+    def _defer_flows(self, use_bundle=False):
+        self.br.defer_apply_on(use_bundle=use_bundle)
+        self.br.add_flow(in_port=1, actions='drop')
+        self.br.delete_flows(in_port=2)
+        self.br.delete_flows(in_port=3)
+        self.br.add_flow(in_port=4, actions='normal')
+        self.assertFalse(self.execute.called)
+
+    def test_defer_apply_keeps_flows_order(self):
+        self._defer_flows()
+        self.br.defer_apply_off()
+        self.execute.assert_has_calls([
+            mock.call(["ovs-ofctl", "add-flows", self.BR_NAME, '-'],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,in_port=1,actions=drop",
+                      root_helper=self.root_helper),
+            mock.call(["ovs-ofctl", "del-flows", self.BR_NAME, '-'],
+                      process_input="in_port=2\nin_port=3",
+                      root_helper=self.root_helper),
+            mock.call(["ovs-ofctl", "add-flows", self.BR_NAME, '-'],
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                      "priority=1,in_port=4,actions=normal",
+                      root_helper=self.root_helper)])
+        self.assertEqual(3, self.execute.call_count)
+        self.execute.reset_mock()
+        self.br.delete_flows(in_port=5)
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_apply_deferred_flows_keeps_deferring(self):
+        self._defer_flows()
+        self.br.apply_deferred_flows()
+        self.execute.reset_mock()
+        self.br.delete_flows(in_port=5)
+        self.assertFalse(self.execute.called)
+        self.br.defer_apply_off()
+        self.execute.assert_called_once_with(
+            ["ovs-ofctl", "del-flows", self.BR_NAME, '-'],
+            process_input="in_port=5", root_helper=self.root_helper)
+
+    def test_defer_apply_with_deferred_bridge(self):
+        self.br.defer_apply_on()
+        with self.br.deferred() as deferred_br:
+            deferred_br.add_flow(in_port=1, actions='drop')
+        self.assertFalse(self.execute.called)
+        self.br.defer_apply_off()
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_defer_apply_with_bundle(self):
+        self._defer_flows(use_bundle=True)
+        self.br.defer_apply_off()
+        self.execute.assert_called_once_with(
+            ["ovs-ofctl", "-O", "OpenFlow14", "--bundle", "add-flows",
+             self.BR_NAME, '-'],
+            process_input="add hard_timeout=0,idle_timeout=0,priority=1,"
+            "in_port=1,actions=drop\n"
+            "delete in_port=2\n"
+            "delete in_port=3\n"
+            "add hard_timeout=0,idle_timeout=0,priority=1,"
+            "in_port=4,actions=normal",
+            root_helper=self.root_helper)
+
+    def test_defer_apply_with_failed_bundle(self):
+        self._defer_flows(use_bundle=True)
+        self.execute.side_effect = [RuntimeError(), None, None, None]
+        with mock.patch.object(ovs_lib.LOG, 'warn') as warn:
+            self.br.defer_apply_off()
+        self.assertTrue(warn.called)
+        self.assertEqual(4, self.execute.call_count)
+
+    def test_remove_all_flows_drops_deferred_flows(self):
+        self._defer_flows()
+        self.br.remove_all_flows()
+        self.br.defer_apply_off()
+        self.execute.assert_called_once_with(
+            ["ovs-ofctl", "del-flows", self.BR_NAME],
+            process_input=None, root_helper=self.root_helper)
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
@@ -999,3 +1077,216 @@ class TestDeferredOVSBridge(base.BaseTestCase):
     def test_getattr_unallowed_attr_failure(self):
         with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
             self.assertRaises(AttributeError, getattr, deferred_br, 'failure')
+
+
+class OVS_Lib_Native_Test(base.BaseTestCase):
+    """Exercise OVSBridge queries answered from the native OVSDB replica."""
+
+    def setUp(self):
+        super(OVS_Lib_Native_Test, self).setUp()
+        self.BR_NAME = "br-int"
+        self.root_helper = 'sudo'
+        cfg.CONF.set_override('ovsdb_interface', 'native')
+        self.conn = ovsdb_native.OvsdbConnection('tcp:127.0.0.1:6640')
+        self.conn.schema = {
+            'Port': {'columns': {
+                'tag': {'type': {'key': {'type': 'integer'}, 'min': 0}}}},
+            'Interface': {'columns': {
+                'type': {'type': 'string'},
+                'options': {'type': {'key': 'string', 'value': 'string',
+                                     'min': 0, 'max': 'unlimited'}}}},
+        }
+        self.conn.apply_update({
+            'Bridge': {
+                'br1': {'new': {'name': self.BR_NAME,
+                                'ports': ['set', [['uuid', 'p1'],
+                                                  ['uuid', 'p2'],
+                                                  ['uuid', 'p0']]],
+                                'datapath_id': '0000a6b5',
+                                'external_ids': ['map', []]}},
+                'br2': {'new': {'name': 'br-tun',
+                                'ports': ['uuid', 'p3'],
+                                'datapath_id': '0000a6b6',
+                                'external_ids': ['map', []]}}},
+            'Port': {
+                'p0': self._port(self.BR_NAME, 'i0', ['set', []]),
+                'p1': self._port('tap99', 'i1', 1),
+                'p2': self._port('tap98', 'i2', ['set', []]),
+                'p3': self._port('tap88', 'i3', ['set', []])},
+            'Interface': {
+                'i0': self._iface(self.BR_NAME, {}, 65534),
+                'i1': self._iface('tap99', {'iface-id': 'tap99id',
+                                            'attached-mac': 'tap99mac'}, 1),
+                'i2': self._iface('tap98', {'iface-id': 'tap98id',
+                                            'attached-mac': 'tap98mac'},
+                                  ['set', []]),
+                'i3': self._iface('tap88', {'iface-id': 'tap88id',
+                                            'attached-mac': 'tap88mac'}, 3)},
+        })
+        self.conn.connected = True
+        mock.patch.object(ovsdb_native, 'get_connection',
+                          return_value=self.conn).start()
+        self.br = ovs_lib.OVSBridge(self.BR_NAME, self.root_helper)
+        self.execute = mock.patch.object(
+            utils, "execute", spec=utils.execute).start()
+
+    @staticmethod
+    def _port(name, iface, tag):
+        return {'new': {'name': name, 'interfaces': ['uuid', iface],
+                        'tag': tag, 'external_ids': ['map', []]}}
+
+    @staticmethod
+    def _iface(name, external_ids, ofport):
+        return {'new': {'name': name, 'ofport': ofport, 'type': '',
+                        'external_ids': ['map', external_ids.items()],
+                        'options': ['map', []]}}
+
+    def test_get_port_name_list(self):
+        self.assertEqual(['tap99', 'tap98'], self.br.get_port_name_list())
+        self.assertFalse(self.execute.called)
+
+    def test_get_vif_port_set(self):
+        self.assertEqual(set(['tap99id']), self.br.get_vif_port_set())
+        self.assertFalse(self.execute.called)
+
+    def test_get_vif_ports(self):
+        ports = self.br.get_vif_ports()
+        self.assertEqual([('tap99', '1', 'tap99id', 'tap99mac'),
+                          ('tap98', '[]', 'tap98id', 'tap98mac')],
+                         [(p.port_name, p.ofport, p.vif_id, p.vif_mac)
+                          for p in ports])
+        self.assertFalse(self.execute.called)
+
+    def test_get_port_tag_dict(self):
+        self.assertEqual({'tap99': 1, 'tap98': []},
+                         self.br.get_port_tag_dict())
+        self.assertFalse(self.execute.called)
+
+    def test_get_vif_port_by_id(self):
+        port = self.br.get_vif_port_by_id('tap99id')
+        self.assertEqual(('tap99', 1, 'tap99mac'),
+                         (port.port_name, port.ofport, port.vif_mac))
+        self.assertFalse(self.execute.called)
+
+    def test_get_vif_port_by_id_other_bridge(self):
+        self.assertIsNone(self.br.get_vif_port_by_id('tap88id'))
+
+    def test_get_vif_port_by_id_not_ready(self):
+        self.assertIsNone(self.br.get_vif_port_by_id('tap98id'))
+
+    def test_db_get_val(self):
+        self.assertEqual('1', self.br.db_get_val('Port', 'tap99', 'tag'))
+        self.assertEqual('[]', self.br.db_get_val('Port', 'tap98', 'tag'))
+        self.assertEqual('0000a6b5', self.br.get_datapath_id())
+        self.assertFalse(self.execute.called)
+
+    def test_db_get_val_unmonitored_column_uses_vsctl(self):
+        self.execute.return_value = '{}\n'
+        self.br.db_get_val('Interface', 'tap99', 'statistics')
+        self.execute.assert_called_once_with(
+            ["ovs-vsctl", "--timeout=10", "get", "Interface", "tap99",
+             "statistics"], root_helper=self.root_helper)
+
+    def test_set_db_attribute(self):
+        with mock.patch.object(self.conn, 'transact') as transact:
+            self.br.set_db_attribute('Port', 'tap99', 'tag', '5')
+        transact.assert_called_once_with([
+            {'op': 'update', 'table': 'Port',
+             'where': [['name', '==', 'tap99']], 'row': {'tag': 5}}])
+        self.assertFalse(self.execute.called)
+
+    def test_set_db_attribute_map_key(self):
+        with mock.patch.object(self.conn, 'transact') as transact:
+            self.br.set_db_attribute('Interface', 'tap99', 'options:peer',
+                                     'patch-tun')
+        transact.assert_called_once_with([
+            {'op': 'mutate', 'table': 'Interface',
+             'where': [['name', '==', 'tap99']],
+             'mutations': [['options', 'delete', ['set', ['peer']]],
+                           ['options', 'insert',
+                            ['map', [['peer', 'patch-tun']]]]]}])
+
+    def test_clear_db_attribute(self):
+        with mock.patch.object(self.conn, 'transact') as transact:
+            self.br.clear_db_attribute('Port', 'tap99', 'tag')
+        transact.assert_called_once_with([
+            {'op': 'update', 'table': 'Port',
+             'where': [['name', '==', 'tap99']], 'row': {'tag': ['set', []]}}])
+
+    def _mock_transact(self, new_ofport=None):
+        def transact(operations):
+            # Stand for ovs-vswitchd assigning the ofport of a new port
+            if new_ofport:
+                self.conn.apply_update({
+                    'Port': {'p9': self._port('tun9', 'i9', ['set', []])},
+                    'Interface': {'i9': self._iface('tun9', {}, new_ofport)}})
+        return mock.patch.object(self.conn, 'transact', side_effect=transact)
+
+    def _set_iface_ops(self, name, iface_type, options):
+        where = [['name', '==', name]]
+        ops = [{'op': 'update', 'table': 'Interface', 'where': where,
+                'row': {'type': iface_type}}]
+        for key, value in sorted(options.items()):
+            ops.append({'op': 'mutate', 'table': 'Interface', 'where': where,
+                        'mutations': [['options', 'delete', ['set', [key]]],
+                                      ['options', 'insert',
+                                       ['map', [[key, value]]]]]})
+        return ops
+
+    def test_add_tunnel_port(self):
+        with self._mock_transact(new_ofport=9) as transact:
+            ofport = self.br.add_tunnel_port('tun9', '10.0.0.2', '10.0.0.1',
+                                             constants.TYPE_VXLAN, 4790)
+        self.assertEqual('9', ofport)
+        transact.assert_called_once_with([
+            {'op': 'insert', 'table': 'Interface',
+             'row': {'name': 'tun9'}, 'uuid-name': 'iface0'},
+            {'op': 'insert', 'table': 'Port',
+             'row': {'name': 'tun9', 'interfaces': ['named-uuid', 'iface0']},
+             'uuid-name': 'port0'},
+            {'op': 'mutate', 'table': 'Bridge',
+             'where': [['name', '==', self.BR_NAME]],
+             'mutations': [['ports', 'insert',
+                            ['set', [['named-uuid', 'port0']]]]]}] +
+            self._set_iface_ops('tun9', 'vxlan',
+                                {'df_default': 'true',
+                                 'dst_port': '4790',
+                                 'in_key': 'flow',
+                                 'local_ip': '10.0.0.1',
+                                 'out_key': 'flow',
+                                 'remote_ip': '10.0.0.2'}))
+        self.assertFalse(self.execute.called)
+
+    def test_add_patch_port_existing_port(self):
+        with self._mock_transact() as transact:
+            ofport = self.br.add_patch_port('tap99', 'patch-tun')
+        self.assertEqual('1', ofport)
+        transact.assert_called_once_with(
+            self._set_iface_ops('tap99', 'patch', {'peer': 'patch-tun'}))
+        self.assertFalse(self.execute.called)
+
+    def test_add_port_existing_on_other_bridge(self):
+        with self._mock_transact() as transact:
+            with mock.patch.object(ovs_lib.LOG, 'error') as log:
+                ofport = self.br.add_port('tap88')
+        self.assertEqual(ovs_lib.INVALID_OFPORT, ofport)
+        self.assertTrue(log.called)
+        self.assertFalse(transact.called)
+        self.assertFalse(self.execute.called)
+
+    def test_add_port_transaction_failure(self):
+        with mock.patch.object(self.conn, 'transact',
+                               side_effect=ovsdb_native.OvsdbError('x')):
+            with mock.patch.object(ovs_lib.LOG, 'error') as log:
+                ofport = self.br.add_port('tun9')
+        self.assertEqual(ovs_lib.INVALID_OFPORT, ofport)
+        self.assertEqual(3, len(log.call_args[0][1]['ops']))
+        self.assertFalse(self.execute.called)
+
+    def test_falls_back_to_vsctl_when_disconnected(self):
+        self.conn.connected = False
+        self.execute.return_value = 'tap99\n'
+        self.assertEqual(['tap99'], self.br.get_port_name_list())
+        self.execute.assert_called_once_with(
+            ["ovs-vsctl", "--timeout=10", "list-ports", self.BR_NAME],
+            root_helper=self.root_helper)
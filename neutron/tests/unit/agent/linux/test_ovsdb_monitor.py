@@ -101,3 +101,62 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+    def test__kill_sets_resync_required(self):
+        self.monitor.resync_required = False
+        with mock.patch(
+                'neutron.agent.linux.ovsdb_monitor.OvsdbMonitor._kill'):
+            self.monitor._kill()
+        self.assertTrue(self.monitor.resync_required)
+
+    def _mock_output(self, lines):
+        return mock.patch.object(self.monitor, 'iter_stdout',
+                                 return_value=iter(lines))
+
+    def test_get_events_parses_rows(self):
+        lines = [
+            '{"data":[["uuid1","initial","tap1",1,'
+            '["map",[["iface-id","port1"]]]]],'
+            '"headings":["row","action","name","ofport","external_ids"]}',
+            '{"data":[["uuid2","insert","tap2",["set",[]],'
+            '["map",[]]],["uuid1","delete","tap1",1,'
+            '["map",[["iface-id","port1"]]]]],'
+            '"headings":["row","action","name","ofport","external_ids"]}',
+            '{"data":[["uuid2","old",null,["set",[]],null],'
+            '["","new","tap2",2,["map",[]]]],'
+            '"headings":["row","action","name","ofport","external_ids"]}',
+        ]
+        with self._mock_output(lines):
+            events = self.monitor.get_events()
+        tap1 = {'name': 'tap1', 'ofport': 1,
+                'external_ids': {'iface-id': 'port1'}}
+        self.assertEqual(
+            [tap1,
+             {'name': 'tap2', 'ofport': [], 'external_ids': {}},
+             {'name': 'tap2', 'ofport': 2, 'external_ids': {}}],
+            events['added'])
+        self.assertEqual([tap1], events['removed'])
+
+    def test_get_events_clears_events(self):
+        self.monitor.new_events['added'].append('foo')
+        with self._mock_output([]):
+            self.assertEqual({'added': ['foo'], 'removed': []},
+                             self.monitor.get_events())
+            self.assertEqual({'added': [], 'removed': []},
+                             self.monitor.get_events())
+
+    def test_get_events_ignores_unparsable_output(self):
+        with self._mock_output(['foo']):
+            self.assertEqual({'added': [], 'removed': []},
+                             self.monitor.get_events())
+
+    def test_has_updates_after_events_processed(self):
+        target = ('neutron.agent.linux.ovsdb_monitor.SimpleInterfaceMonitor'
+                  '.is_active')
+        with mock.patch(target,
+                        new_callable=mock.PropertyMock(return_value=True)):
+            with self._mock_output(['{"data":[]}']):
+                self.monitor.get_events()
+            with self._mock_output([]):
+                self.assertTrue(self.monitor.has_updates)
+                self.assertFalse(self.monitor.has_updates)
@@ -0,0 +1,141 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import ovsdb_native
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+
+class TestOvsdbValues(base.BaseTestCase):
+
+    def test_decode_value(self):
+        self.assertEqual(5, ovsdb_native.decode_value(5))
+        self.assertEqual('abc', ovsdb_native.decode_value(['uuid', 'abc']))
+        self.assertEqual([], ovsdb_native.decode_value(['set', []]))
+        self.assertEqual(['a', 'b'], ovsdb_native.decode_value(
+            ['set', [['uuid', 'a'], ['uuid', 'b']]]))
+        self.assertEqual({'k': 'v'}, ovsdb_native.decode_value(
+            ['map', [['k', 'v']]]))
+
+    def test_as_list(self):
+        self.assertEqual(['a'], ovsdb_native.as_list('a'))
+        self.assertEqual(['a', 'b'], ovsdb_native.as_list(['a', 'b']))
+
+    def test_format_vsctl_value(self):
+        self.assertEqual('5', ovsdb_native.format_vsctl_value(5))
+        self.assertEqual('[]', ovsdb_native.format_vsctl_value([]))
+        self.assertEqual('tap99', ovsdb_native.format_vsctl_value('tap99'))
+        self.assertEqual('"0000a6b5"',
+                         ovsdb_native.format_vsctl_value('0000a6b5'))
+        self.assertEqual('{a="1", b=c}', ovsdb_native.format_vsctl_value(
+            {'a': '1', 'b': 'c'}))
+
+
+class TestOvsdbConnection(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOvsdbConnection, self).setUp()
+        self.conn = ovsdb_native.OvsdbConnection('unix:/tmp/db.sock')
+        self.conn._sock = mock.Mock()
+        cfg.CONF.import_opt('ovs_vsctl_timeout',
+                            'neutron.agent.linux.ovs_lib')
+
+    def test_read_message_split_across_reads(self):
+        self.conn._sock.recv.side_effect = ['{"id": 1, "res',
+                                            'ult": [] }{"id": 2,',
+                                            ' "result": null}']
+        self.assertEqual({'id': 1, 'result': []},
+                         self.conn._read_message())
+        self.assertEqual({'id': 2, 'result': None},
+                         self.conn._read_message())
+
+    def test_read_message_strings_split_across_reads(self):
+        self.conn._sock.recv.side_effect = ['{"id": "a}\\',
+                                            '"", "result": ["{[\\\\"]}']
+        self.assertEqual({'id': 'a}"', 'result': ['{[\\']},
+                         self.conn._read_message())
+
+    def test_read_message_decoded_once(self):
+        self.conn._sock.recv.side_effect = ['{"id": 1, ', '"result": ',
+                                            '[1, 2]}']
+        with mock.patch.object(ovsdb_native.json, 'loads',
+                               wraps=ovsdb_native.json.loads) as loads:
+            self.assertEqual({'id': 1, 'result': [1, 2]},
+                             self.conn._read_message())
+            loads.assert_called_once_with('{"id": 1, "result": [1, 2]}')
+
+    def test_read_message_invalid(self):
+        self.conn._sock.recv.return_value = '{"id": 1, "result": x}'
+        self.assertRaises(ovsdb_native.OvsdbError, self.conn._read_message)
+
+    def test_read_message_connection_closed(self):
+        self.conn._sock.recv.return_value = ''
+        self.assertRaises(ovsdb_native.OvsdbError, self.conn._read_message)
+
+    def test_dispatch_echo(self):
+        self.conn._dispatch({'method': 'echo', 'params': [], 'id': 'echo'})
+        self.conn._sock.sendall.assert_called_once_with(jsonutils.dumps(
+            {'result': [], 'error': None, 'id': 'echo'}))
+
+    def test_dispatch_update(self):
+        self.conn._dispatch({'method': 'update', 'id': None, 'params': [
+            None, {'Port': {'p1': {'new': {'name': 'tap1', 'tag': 1}}}}]})
+        self.assertEqual({'p1': {'name': 'tap1', 'tag': 1}},
+                         self.conn.tables['Port'])
+        self.conn._dispatch({'method': 'update', 'id': None, 'params': [
+            None, {'Port': {'p1': {'old': {'name': 'tap1', 'tag': 1}}}}]})
+        self.assertEqual({}, self.conn.tables['Port'])
+
+    def test_dispatch_reply_wakes_waiter(self):
+        waiter = mock.Mock()
+        self.conn._pending['transact-0'] = waiter
+        self.conn._dispatch({'id': 'transact-0', 'result': [{}],
+                             'error': None})
+        waiter.send.assert_called_once_with([{}])
+        self.assertEqual({}, self.conn._pending)
+
+    def test_transact_not_connected(self):
+        self.assertRaises(ovsdb_native.OvsdbError, self.conn.transact, [])
+
+    def test_transaction_error(self):
+        self.conn.connected = True
+        with mock.patch('eventlet.event.Event.wait',
+                        return_value=[{'error': 'constraint violation'}]):
+            self.assertRaises(ovsdb_native.OvsdbError, self.conn.transact,
+                              [{'op': 'update'}])
+
+    def test_transact_timeout(self):
+        cfg.CONF.set_override('ovs_vsctl_timeout', 0)
+        self.conn.connected = True
+        self.assertRaises(ovsdb_native.OvsdbError, self.conn.transact,
+                          [{'op': 'update'}])
+        self.assertEqual({}, self.conn._pending)
+
+    def test_failed_commit_keeps_operations(self):
+        txn = self.conn.transaction()
+        txn.operations.append({'op': 'update'})
+        with mock.patch.object(self.conn, 'transact',
+                               side_effect=ovsdb_native.OvsdbError('x')):
+            self.assertRaises(ovsdb_native.OvsdbError, txn.commit)
+        self.assertEqual([{'op': 'update'}], txn.operations)
+
+    def test_close_fails_pending_transactions(self):
+        waiter = mock.Mock()
+        self.conn._pending['transact-0'] = waiter
+        self.conn._close()
+        self.assertTrue(waiter.send_exception.called)
+        self.assertFalse(self.conn.connected)
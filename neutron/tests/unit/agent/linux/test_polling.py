@@ -80,6 +80,9 @@ class TestBasePollingManager(base.BaseTestCase):
         with self.mock_is_polling_required(False):
             self.assertFalse(self.pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        self.assertIsNone(self.pm.get_events())
+
 
 class TestAlwaysPoll(base.BaseTestCase):
 
@@ -115,3 +118,38 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+    def mock_monitor(self, is_active=True, resync_required=False,
+                     events=None):
+        self.pm._monitor = mock.Mock(is_active=is_active,
+                                     resync_required=resync_required)
+        self.pm._monitor.get_events.return_value = (
+            events or {'added': [], 'removed': []})
+
+    def test_get_events_returns_none_when_monitor_inactive(self):
+        self.pm._full_scan_required = False
+        self.mock_monitor(is_active=False)
+        self.assertIsNone(self.pm.get_events())
+
+    def test_get_events_requires_full_scan_once(self):
+        self.mock_monitor()
+        self.assertIsNone(self.pm.get_events())
+        self.assertEqual({'added': [], 'removed': []}, self.pm.get_events())
+
+    def test_get_events_requires_full_scan_after_resync(self):
+        self.pm._full_scan_required = False
+        self.mock_monitor(resync_required=True)
+        self.assertIsNone(self.pm.get_events())
+        self.assertFalse(self.pm._monitor.resync_required)
+
+    def test_get_events_requires_full_scan_when_forced(self):
+        self.mock_monitor()
+        self.pm.get_events()
+        self.pm.force_polling()
+        self.assertIsNone(self.pm.get_events())
+
+    def test_get_events_returns_monitor_events(self):
+        events = {'added': ['foo'], 'removed': ['bar']}
+        self.pm._full_scan_required = False
+        self.mock_monitor(events=events)
+        self.assertEqual(events, self.pm.get_events())
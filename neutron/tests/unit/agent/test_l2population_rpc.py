@@ -18,7 +18,9 @@ import contextlib
 
 import mock
 
+from neutron.agent import l2population_rpc
 from neutron.common import constants as n_const
+from neutron.tests import base
 from neutron.tests.unit.agent import l2population_rpc_base
 
 
@@ -234,3 +236,117 @@ class TestL2populationRpcCallBackTunnelMixin(
                                       upd_fdb_entry_val, self.local_ip,
                                       self.local_vlan_map1)
         self.assertFalse(m_setup_entry_for_arp_reply.call_count)
+
+    def _fdb_entries(self, ports, **generations):
+        values = {'segment_id': 'tun1', 'network_type': self.type_gre,
+                  'ports': {self.ports[0].ip: ports}}
+        values.update(generations)
+        return {self.lvms[0].net: values}
+
+    def test_add_fdb_entries_with_fdb_cache(self):
+        self.fakeagent.fdb_cache = l2population_rpc.FdbCache()
+        port1 = [self.lvms[0].mac, self.lvms[0].ip]
+        port2 = [self.lvms[1].mac, self.lvms[1].ip]
+        with mock.patch.object(self.fakeagent, 'fdb_add') as fdb_add:
+            self.fakeagent.add_fdb_entries(
+                'context', self._fdb_entries([port1], generation=1))
+            self.fakeagent.add_fdb_entries(
+                'context', self._fdb_entries([port2], prev_generation=2,
+                                             generation=3))
+        self.assertEqual(
+            [mock.call('context', self._fdb_entries([port1], generation=1)),
+             mock.call('context', {})],
+            fdb_add.call_args_list)
+        self.assertEqual(set([self.lvms[0].net]),
+                         self.fakeagent.fdb_cache.out_of_sync)
+
+    def test_sync_fdb_entries(self):
+        self.fakeagent.fdb_cache = l2population_rpc.FdbCache()
+        port1 = [self.lvms[0].mac, self.lvms[0].ip]
+        port2 = [self.lvms[1].mac, self.lvms[1].ip]
+        self.fakeagent.fdb_cache.add(self._fdb_entries(
+            [n_const.FLOODING_ENTRY, port1], generation=1))
+        plugin_rpc = mock.Mock()
+        plugin_rpc.get_fdb_entries.side_effect = [
+            {'fdb_entries': self._fdb_entries(
+                [n_const.FLOODING_ENTRY, port2], generation=4),
+             'next_marker': self.lvms[0].net},
+            {'fdb_entries': {}, 'next_marker': None}]
+        with contextlib.nested(
+            mock.patch.object(self.fakeagent, 'fdb_add'),
+            mock.patch.object(self.fakeagent, 'fdb_remove'),
+        ) as (fdb_add, fdb_remove):
+            self.fakeagent.sync_fdb_entries('context', plugin_rpc)
+
+        plugin_rpc.get_fdb_entries.assert_has_calls([
+            mock.call('context', mock.ANY, network_ids=None, marker=None,
+                      limit=l2population_rpc.FDB_SYNC_PAGE_SIZE),
+            mock.call('context', mock.ANY, network_ids=None,
+                      marker=self.lvms[0].net,
+                      limit=l2population_rpc.FDB_SYNC_PAGE_SIZE)])
+        fdb_remove.assert_any_call(
+            'context', self._fdb_entries([port1], generation=4))
+        added = fdb_add.call_args_list[0][0][1][self.lvms[0].net]
+        self.assertEqual(
+            sorted([n_const.FLOODING_ENTRY, port2]),
+            sorted(added['ports'][self.ports[0].ip]))
+        self.assertEqual({self.lvms[0].net: 4},
+                         self.fakeagent.fdb_cache.generations)
+
+
+class TestFdbCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestFdbCache, self).setUp()
+        self.cache = l2population_rpc.FdbCache()
+        self.port1 = ['mac1', '1.1.1.1']
+        self.port2 = ['mac2', '2.2.2.2']
+
+    def _fdb_entries(self, ports, **generations):
+        values = {'segment_id': 1, 'network_type': 'vxlan',
+                  'ports': {'10.1.0.1': ports}}
+        values.update(generations)
+        return {'net1': values}
+
+    def test_add_and_remove_in_sync(self):
+        entries = self._fdb_entries([self.port1, self.port2], generation=3)
+        self.assertEqual(entries, self.cache.add(entries))
+        entries = self._fdb_entries([self.port1], prev_generation=3,
+                                    generation=4)
+        self.assertEqual(entries, self.cache.remove(entries))
+        self.assertEqual({'net1': 4}, self.cache.generations)
+        self.assertEqual({'net1': {'10.1.0.1': set([tuple(self.port2)])}},
+                         self.cache.ports)
+        self.assertEqual(set(), self.cache.out_of_sync)
+
+    def test_missed_change_marks_network_out_of_sync(self):
+        self.cache.add(self._fdb_entries([self.port1], generation=3))
+        entries = self._fdb_entries([self.port2], prev_generation=4,
+                                    generation=5)
+        self.assertEqual({}, self.cache.add(entries))
+        self.assertEqual(set(['net1']), self.cache.out_of_sync)
+        # Later changes are ignored until the network is synchronized
+        entries = self._fdb_entries([self.port2], prev_generation=5,
+                                    generation=6)
+        self.assertEqual({}, self.cache.remove(entries))
+
+    def test_entries_without_generation_are_applied(self):
+        entries = self._fdb_entries([self.port1])
+        self.assertEqual(entries, self.cache.add(entries))
+        self.assertEqual({}, self.cache.generations)
+
+    def test_sync(self):
+        self.cache.add(self._fdb_entries([self.port1], generation=3))
+        self.cache.out_of_sync.add('net1')
+        values = self._fdb_entries([self.port2], generation=7)['net1']
+        to_add, to_remove = self.cache.sync('net1', values)
+        self.assertEqual({'10.1.0.1': [self.port2]}, to_add['ports'])
+        self.assertEqual({'10.1.0.1': [self.port1]}, to_remove['ports'])
+        self.assertEqual({'net1': 7}, self.cache.generations)
+        self.assertEqual(set(), self.cache.out_of_sync)
+
+    def test_forget(self):
+        self.cache.add(self._fdb_entries([self.port1], generation=3))
+        self.cache.forget('net1')
+        self.assertEqual({}, self.cache.generations)
+        self.assertEqual({}, self.cache.ports)
@@ -0,0 +1,169 @@
+# Copyright (c) 2014 OpenStack Foundation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
+from neutron.common import utils
+from neutron import manager
+from neutron.plugins.common import constants as service_constants
+from neutron.tests import base
+
+
+class TestL3AgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL3AgentNotifyAPI, self).setUp()
+        self.notifier = l3_rpc_agent_api.L3AgentNotifyAPI()
+        self.plugin = mock.Mock()
+        mock.patch.object(
+            manager.NeutronManager, 'get_service_plugins',
+            return_value={service_constants.L3_ROUTER_NAT: self.plugin}
+        ).start()
+        mock.patch.object(utils, 'is_extension_supported',
+                          return_value=True).start()
+        self.mock_cast = mock.patch.object(self.notifier, 'cast').start()
+        self.mock_spawn = mock.patch.object(l3_rpc_agent_api.eventlet,
+                                            'spawn_n').start()
+        self.context = mock.Mock(is_admin=True)
+
+    def _set_hosting_agents(self, hosts_by_router):
+        def get_l3_agent_bindings_hosting_routers(context, router_ids,
+                                                  **kwargs):
+            return [mock.Mock(router_id=router_id,
+                              l3_agent=mock.Mock(topic='l3_agent', host=host))
+                    for router_id in router_ids
+                    for host in hosts_by_router[router_id]]
+        self.plugin.get_l3_agent_bindings_hosting_routers.side_effect = (
+            get_l3_agent_bindings_hosting_routers)
+
+    def test_routers_updated_casts_once_per_agent(self):
+        self._set_hosting_agents({'r1': ['host1', 'host2'],
+                                  'r2': ['host1'],
+                                  'r3': []})
+        self.notifier.routers_updated(self.context, ['r1', 'r2', 'r3'])
+        self.assertEqual(
+            [mock.call(self.context,
+                       self.notifier.make_msg('routers_updated',
+                                              routers=['r1', 'r2']),
+                       topic='l3_agent.host1', version='1.1'),
+             mock.call(self.context,
+                       self.notifier.make_msg('routers_updated',
+                                              routers=['r1']),
+                       topic='l3_agent.host2', version='1.1')],
+            self.mock_cast.call_args_list)
+        self.plugin.schedule_routers.assert_called_once_with(
+            self.context, ['r1', 'r2', 'r3'])
+        (self.plugin.get_l3_agent_bindings_hosting_routers.
+         assert_called_once_with(self.context, ['r1', 'r2', 'r3'],
+                                 admin_state_up=True, active=True))
+        self.assertFalse(self.mock_spawn.called)
+
+    def test_routers_updated_merges_routers_within_interval(self):
+        cfg.CONF.set_override('l3_notification_batch_interval', 1)
+        self._set_hosting_agents({'r1': ['host1'], 'r2': ['host1']})
+        self.plugin.get_routers.return_value = [{'id': 'r1'}, {'id': 'r2'}]
+        for router_ids in (['r1'], ['r1', 'r2'], ['r2']):
+            self.notifier.routers_updated(self.context, router_ids)
+        self.assertEqual(1, self.mock_spawn.call_count)
+        self.assertFalse(self.mock_cast.called)
+
+        self.notifier.send_routers_updated()
+
+        self.plugin.get_routers.assert_called_once_with(
+            mock.ANY, filters={'id': mock.ANY}, fields=['id'])
+        self.assertEqual(
+            ['r1', 'r2'],
+            sorted(self.plugin.get_routers.call_args[1]['filters']['id']))
+        self.assertEqual(1, self.mock_cast.call_count)
+        self.assertEqual(['r1', 'r2'],
+                         sorted(self.mock_cast.call_args[0][1]['args'][
+                             'routers']))
+        self.assertEqual({}, self.notifier.pending_routers)
+        stats = self.notifier.stats
+        self.assertEqual(3, stats['notifications'])
+        self.assertEqual(1, stats['batches'])
+        self.assertEqual(2, stats['routers'])
+        self.assertEqual(1, stats['casts'])
+        self.assertTrue(stats['max_delay'] >= stats['last_delay'] >= 0)
+
+    def test_send_routers_updated_skips_deleted_routers(self):
+        cfg.CONF.set_override('l3_notification_batch_interval', 1)
+        self._set_hosting_agents({'r1': ['host1']})
+        self.plugin.get_routers.return_value = [{'id': 'r1'}]
+        self.notifier.routers_updated(self.context, ['r1', 'r2'])
+        self.notifier.send_routers_updated()
+        self.plugin.schedule_routers.assert_called_once_with(mock.ANY,
+                                                             ['r1'])
+        self.assertEqual(['r1'],
+                         self.mock_cast.call_args[0][1]['args']['routers'])
+        self.assertEqual(1, self.notifier.stats['routers'])
+
+    def test_send_routers_updated_without_pending_routers(self):
+        self.notifier.send_routers_updated()
+        self.assertFalse(self.plugin.get_routers.called)
+        self.assertFalse(self.mock_cast.called)
+        self.assertEqual(0, self.notifier.stats['batches'])
+
+    def test_send_routers_updated_failure_queues_routers_again(self):
+        cfg.CONF.set_override('l3_notification_batch_interval', 1)
+        self.plugin.get_routers.side_effect = RuntimeError
+        self.notifier.routers_updated(self.context, ['r1'], None, None, True)
+        pending_routers = dict(self.notifier.pending_routers)
+        # The batch thread resets this flag before sending
+        self.notifier._waiting_to_send = False
+        with mock.patch.object(l3_rpc_agent_api.LOG, 'exception') as log:
+            self.notifier.send_routers_updated()
+        self.assertTrue(log.called)
+        self.assertFalse(self.mock_cast.called)
+        self.assertEqual(pending_routers, self.notifier.pending_routers)
+        self.assertTrue(self.notifier._pending_shuffle_agents)
+        self.assertEqual(2, self.mock_spawn.call_count)
+
+        self.plugin.get_routers.side_effect = None
+        self.plugin.get_routers.return_value = [{'id': 'r1'}]
+        self._set_hosting_agents({'r1': ['host1']})
+        self.notifier.send_routers_updated()
+        self.assertEqual(['r1'],
+                         self.mock_cast.call_args[0][1]['args']['routers'])
+        self.assertEqual({}, self.notifier.pending_routers)
+
+    def test_send_routers_updated_drops_routers_after_max_retries(self):
+        cfg.CONF.set_override('l3_notification_batch_interval', 1)
+        cfg.CONF.set_override('l3_notification_max_retries', 1)
+        self.plugin.get_routers.side_effect = RuntimeError
+        self.notifier.routers_updated(self.context, ['r1'])
+        with contextlib.nested(
+            mock.patch.object(l3_rpc_agent_api.LOG, 'exception'),
+            mock.patch.object(l3_rpc_agent_api.LOG, 'error')
+        ) as (log_exception, log_error):
+            self.notifier._waiting_to_send = False
+            self.notifier.send_routers_updated()
+            self.assertEqual(['r1'], self.notifier.pending_routers.keys())
+            self.assertFalse(log_error.called)
+
+            self.notifier._waiting_to_send = False
+            self.notifier.send_routers_updated()
+        self.assertEqual({}, self.notifier.pending_routers)
+        self.assertEqual(1, log_error.call_count)
+        self.assertEqual(['r1'], log_error.call_args[0][1]['routers'])
+        self.assertEqual(1, self.notifier.stats['dropped'])
+        self.assertEqual({}, self.notifier._failed_batches)
+        # Only the retry was scheduled
+        self.assertEqual(2, self.mock_spawn.call_count)
+        self.assertFalse(self.mock_cast.called)
@@ -13,7 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
 import mock
+from oslo.config import cfg
 from oslo.db import exception as exc
 
 from neutron.common import constants
@@ -111,3 +114,124 @@ class TestAgentsDbMixin(testlib_api.SqlTestCase):
 
             self.assertEqual(add_mock.call_count, 2,
                              "Agent entry creation hasn't been retried")
+
+
+class TestAgentHeartbeats(testlib_api.SqlTestCase):
+    def setUp(self):
+        super(TestAgentHeartbeats, self).setUp()
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        self.heartbeats = agents_db.AgentHeartbeats()
+        mock.patch.object(agents_db, 'HEARTBEATS', self.heartbeats).start()
+        self.spawn_n = mock.patch('eventlet.spawn_n').start()
+
+        self.context = context.get_admin_context()
+        self.plugin = FakePlugin()
+        self.agent_status = {
+            'agent_type': 'Open vSwitch agent',
+            'binary': 'neutron-openvswitch-agent',
+            'host': 'overcloud-notcompute',
+            'topic': 'N/A',
+            'configurations': {'tunnel_types': ['vxlan']}
+        }
+
+    def _report(self, later=0, **kwargs):
+        agent_status = dict(self.agent_status, **kwargs)
+        now = timeutils.utcnow() + datetime.timedelta(seconds=later)
+        with mock.patch.object(timeutils, 'utcnow', return_value=now):
+            self.plugin.create_or_update_agent(self.context, agent_status)
+        return now
+
+    def _get_agent_db(self):
+        self.context.session.expire_all()
+        return self.context.session.query(agents_db.Agent).one()
+
+    def test_heartbeat_is_coalesced(self):
+        first = self._report()
+        with mock.patch.object(self.plugin,
+                               '_create_or_update_agent') as update:
+            second = self._report(later=30)
+        self.assertFalse(update.called)
+        self.assertEqual(1, self.spawn_n.call_count)
+        agent_db = self._get_agent_db()
+        self.assertEqual(first, agent_db.heartbeat_timestamp)
+        self.assertEqual(second, agent_db.last_heartbeat)
+        self.assertEqual(second, self.plugin.get_agents(
+            self.context)[0]['heartbeat_timestamp'])
+
+        self.heartbeats.flush()
+        agent_db = self._get_agent_db()
+        self.assertEqual(second, agent_db.heartbeat_timestamp)
+        self.assertEqual({}, self.heartbeats.pending_heartbeats)
+
+    def test_heartbeat_written_without_flush_interval(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 0)
+        self._report()
+        second = self._report(later=30)
+        self.assertEqual(second, self._get_agent_db().heartbeat_timestamp)
+        self.assertFalse(self.spawn_n.called)
+
+    def test_changed_configurations_are_written(self):
+        self._report()
+        configurations = {'tunnel_types': ['gre']}
+        second = self._report(later=30, configurations=configurations)
+        agent_db = self._get_agent_db()
+        self.assertEqual(second, agent_db.heartbeat_timestamp)
+        self.assertEqual(configurations,
+                         self.plugin.get_configuration_dict(agent_db))
+        self.assertFalse(self.spawn_n.called)
+
+    def test_restarted_agent_is_written(self):
+        self._report()
+        second = self._report(later=30, start_flag=True)
+        agent_db = self._get_agent_db()
+        self.assertEqual(second, agent_db.started_at)
+        self.assertEqual(second, agent_db.heartbeat_timestamp)
+
+    def test_flush_forgets_agents_changed_by_another_server(self):
+        self._report()
+        self._report(later=30)
+        with self.context.session.begin():
+            self._get_agent_db().configurations = '{}'
+        self.heartbeats.flush()
+        self.assertEqual({}, self.heartbeats.agents)
+        third = self._report(later=60)
+        agent_db = self._get_agent_db()
+        self.assertEqual(third, agent_db.heartbeat_timestamp)
+        self.assertEqual(self.agent_status['configurations'],
+                         self.plugin.get_configuration_dict(agent_db))
+
+    def test_flush_keeps_newer_heartbeat_of_outdated_agent(self):
+        self._report()
+        self._report(later=30)
+        newer = timeutils.utcnow() + datetime.timedelta(seconds=45)
+        with self.context.session.begin():
+            agent_db = self._get_agent_db()
+            agent_db.configurations = '{}'
+            agent_db.heartbeat_timestamp = newer
+        self.heartbeats.flush()
+        self.assertEqual(newer, self._get_agent_db().heartbeat_timestamp)
+
+    def test_flush_keeps_newer_heartbeat_of_another_server(self):
+        self._report()
+        self._report(later=30)
+        newer = timeutils.utcnow() + datetime.timedelta(seconds=45)
+        with self.context.session.begin():
+            self._get_agent_db().heartbeat_timestamp = newer
+        self.heartbeats.flush()
+        self.assertEqual(newer, self._get_agent_db().heartbeat_timestamp)
+        self.assertEqual(1, len(self.heartbeats.agents))
+
+    def test_flush_forgets_deleted_agents(self):
+        self._report()
+        self._report(later=30)
+        with self.context.session.begin():
+            self.context.session.delete(self._get_agent_db())
+        self.heartbeats.flush()
+        self.assertEqual({}, self.heartbeats.agents)
+        self._report(later=60)
+        self.assertEqual(1, len(self.plugin.get_agents(self.context)))
+
+    def test_delete_agent_forgets_agent(self):
+        self._report()
+        self.plugin.delete_agent(self.context, self._get_agent_db().id)
+        self.assertEqual({}, self.heartbeats.agents)
@@ -0,0 +1,138 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+from oslo.config import cfg
+
+from neutron import context
+from neutron.db import ipam_bitmap_db
+from neutron.db import models_v2
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+
+class TestMakeChunks(base.BaseTestCase):
+
+    def test_make_chunks(self):
+        allocated = set([int(netaddr.IPAddress('10.0.0.3')),
+                         int(netaddr.IPAddress('10.0.1.4'))])
+        chunks = list(ipam_bitmap_db.make_chunks('10.0.0.2', '10.0.1.5',
+                                                 allocated))
+        self.assertEqual([('10.0.0.2', (1 << 256) - 1 - 0b10),
+                          ('10.0.1.2', 0b1011)], chunks)
+
+    def test_make_chunks_skips_full_blocks(self):
+        allocated = set(int(netaddr.IPAddress('2001::%x' % i))
+                        for i in range(1, 257))
+        chunks = list(ipam_bitmap_db.make_chunks('2001::1', '2001::101',
+                                                 allocated))
+        self.assertEqual([('2001::101', 1)], chunks)
+
+    def test_can_use_chunks(self):
+        self.assertTrue(ipam_bitmap_db.can_use_chunks('10.0.0.2',
+                                                      '10.0.255.254'))
+        self.assertFalse(ipam_bitmap_db.can_use_chunks(
+            '2001::2', '2001::ffff:ffff:ffff:fffe'))
+
+
+class IpamBitmapTestMixin(object):
+
+    def setUp(self):
+        cfg.CONF.set_override('ipam_driver',
+                              ipam_bitmap_db.IPAM_DRIVER_BITMAP)
+        super(IpamBitmapTestMixin, self).setUp()
+
+
+class TestIpamBitmap(IpamBitmapTestMixin,
+                     test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def _get_chunks(self, subnet_id):
+        ctx = context.get_admin_context()
+        return ctx.session.query(ipam_bitmap_db.IPAvailabilityChunk).join(
+            models_v2.IPAllocationPool).filter(
+                models_v2.IPAllocationPool.subnet_id == subnet_id).all()
+
+    def _get_ranges(self, subnet_id):
+        ctx = context.get_admin_context()
+        return ctx.session.query(models_v2.IPAvailabilityRange).join(
+            models_v2.IPAllocationPool).filter(
+                models_v2.IPAllocationPool.subnet_id == subnet_id).all()
+
+    def _port_ips(self, port):
+        return [ip['ip_address'] for ip in port['port']['fixed_ips']]
+
+    def test_create_subnet_uses_chunks(self):
+        with self.subnet(cidr='10.0.0.0/22') as subnet:
+            subnet_id = subnet['subnet']['id']
+            chunks = self._get_chunks(subnet_id)
+            self.assertEqual(['10.0.0.2', '10.0.1.2', '10.0.2.2', '10.0.3.2'],
+                             sorted(chunk.first_ip for chunk in chunks))
+            self.assertEqual([], self._get_ranges(subnet_id))
+
+    def test_large_ipv6_subnet_uses_ranges(self):
+        with self.subnet(cidr='2001::/64', ip_version=6,
+                         gateway_ip='2001::1') as subnet:
+            subnet_id = subnet['subnet']['id']
+            self.assertEqual([], self._get_chunks(subnet_id))
+            self.assertEqual(1, len(self._get_ranges(subnet_id)))
+            with self.port(subnet=subnet) as port:
+                self.assertEqual(['2001::2'], self._port_ips(port))
+
+    def test_allocate_from_chunks(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            with self.port(subnet=subnet) as port1:
+                with self.port(subnet=subnet) as port2:
+                    self.assertEqual(['10.0.0.2'], self._port_ips(port1))
+                    self.assertEqual(['10.0.0.3'], self._port_ips(port2))
+
+    def test_allocate_specific_ip(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.2'}]
+            with self.port(subnet=subnet, fixed_ips=fixed_ips):
+                with self.port(subnet=subnet) as port:
+                    self.assertEqual(['10.0.0.3'], self._port_ips(port))
+
+    def test_exhausted_subnet_is_rebuilt(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            with self.port(subnet=subnet) as port:
+                self.assertEqual(['10.0.0.2'], self._port_ips(port))
+                self.assertEqual([],
+                                 self._get_chunks(subnet['subnet']['id']))
+            self._delete('ports', port['port']['id'])
+            with self.port(subnet=subnet) as port:
+                self.assertEqual(['10.0.0.2'], self._port_ips(port))
+
+    def test_update_allocation_pools(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            data = {'subnet': {'allocation_pools': [
+                {'start': '10.0.0.10', 'end': '10.0.0.20'}]}}
+            req = self.new_update_request('subnets', data, subnet_id)
+            req.get_response(self.api)
+            chunks = self._get_chunks(subnet_id)
+            self.assertEqual(['10.0.0.10'],
+                             [chunk.first_ip for chunk in chunks])
+            with self.port(subnet=subnet) as port:
+                self.assertEqual(['10.0.0.10'], self._port_ips(port))
+
+
+class TestPortsV2IpamBitmap(IpamBitmapTestMixin,
+                            test_db_plugin.TestPortsV2):
+    pass
+
+
+class TestSubnetsV2IpamBitmap(IpamBitmapTestMixin,
+                              test_db_plugin.TestSubnetsV2):
+    pass
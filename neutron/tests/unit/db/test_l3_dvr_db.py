@@ -305,3 +305,65 @@ class L3DvrTestCase(testlib_api.SqlTestCase):
         self.assertIn(fip, router[l3_const.FLOATINGIP_KEY])
         self.assertIn('fip_interface',
             router[l3_const.FLOATINGIP_AGENT_INTF_KEY])
+
+    def test_floatingips_on_same_host_query_fip_agent_once(self):
+        router = {'id': 'foo_router_id', 'distributed': True}
+        floatingips = [{'id': _uuid(), 'port_id': _uuid(),
+                        'router_id': 'foo_router_id', 'host': 'foo_host'}
+                       for i in range(2)]
+        self.mixin.get_vm_port_hostid = mock.Mock()
+        self.mixin._get_agent_by_type_and_host = mock.Mock(
+            return_value={'id': _uuid()})
+        self.mixin.get_fip_sync_interfaces = mock.Mock(
+            return_value=['fip_interface'])
+
+        self.mixin._process_floating_ips(
+            self.ctx, {'foo_router_id': router}, floatingips)
+
+        self.assertFalse(self.mixin.get_vm_port_hostid.called)
+        self.assertEqual(1, self.mixin._get_agent_by_type_and_host.call_count)
+        self.assertEqual(1, self.mixin.get_fip_sync_interfaces.call_count)
+        self.assertEqual(floatingips, router[l3_const.FLOATINGIP_KEY])
+        self.assertEqual(['fip_interface'],
+                         router[l3_const.FLOATINGIP_AGENT_INTF_KEY])
+
+    def test_process_routers_queries_snat_interfaces_once(self):
+        routers = [{'id': 'foo_router_id', 'gw_port_id': _uuid()},
+                   {'id': 'bar_router_id', 'gw_port_id': _uuid()},
+                   {'id': 'baz_router_id', 'gw_port_id': None}]
+        snat_intfs = [{'id': _uuid(), 'device_id': 'foo_router_id'},
+                      {'id': _uuid(), 'device_id': 'foo_router_id'}]
+        self.mixin.get_snat_sync_interfaces = mock.Mock(
+            return_value=snat_intfs)
+
+        routers_dict = self.mixin._process_routers(self.ctx, routers)
+
+        self.mixin.get_snat_sync_interfaces.assert_called_once_with(
+            self.ctx, mock.ANY)
+        self.assertEqual(
+            set(['foo_router_id', 'bar_router_id']),
+            set(self.mixin.get_snat_sync_interfaces.call_args[0][1]))
+        self.assertEqual(
+            snat_intfs,
+            routers_dict['foo_router_id'][l3_dvr_db.SNAT_ROUTER_INTF_KEY])
+        self.assertEqual(
+            [], routers_dict['bar_router_id'][l3_dvr_db.SNAT_ROUTER_INTF_KEY])
+        self.assertNotIn(l3_dvr_db.SNAT_ROUTER_INTF_KEY,
+                         routers_dict['baz_router_id'])
+
+    def test_get_vm_port_hostids(self):
+        ports = [{'id': 'foo_port_id', 'device_owner': 'compute:nova',
+                  'binding:host_id': 'foo_host'},
+                 {'id': 'bar_port_id',
+                  'device_owner': l3_const.DEVICE_OWNER_ROUTER_INTF,
+                  'binding:host_id': 'bar_host'}]
+        with mock.patch.object(manager.NeutronManager, 'get_plugin') as gp:
+            plugin = gp.return_value
+            plugin.get_ports.return_value = ports
+            hosts = self.mixin.get_vm_port_hostids(
+                self.ctx, ['foo_port_id', 'bar_port_id', None])
+            plugin.get_ports.assert_called_once_with(
+                self.ctx, {'id': ['foo_port_id', 'bar_port_id']})
+            self.assertFalse(plugin.get_port.called)
+        self.assertEqual({'foo_port_id': 'foo_host', 'bar_port_id': None},
+                         hosts)
@@ -13,10 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import constants
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import db_base_plugin_v2 as base_plugin
 from neutron.db import quota_db
+from neutron import quota
+from neutron.tests.unit import test_db_plugin
 from neutron.tests.unit import testlib_api
 
 
@@ -144,3 +150,141 @@ class TestDbQuotaDriver(testlib_api.SqlTestCase):
         self.assertRaises(exceptions.QuotaResourceUnknown,
                           self.plugin.limit_check, context.get_admin_context(),
                           PROJECT, resources, values)
+
+
+class TrackedQuotaTestMixin(object):
+
+    def setUp(self):
+        cfg.CONF.set_override('quota_driver', quota.QUOTA_DB_TRACKED_DRIVER,
+                              group='QUOTAS')
+        cfg.CONF.set_override('quota_usage_reconcile_interval', 0,
+                              group='QUOTAS')
+        quota.QUOTAS._driver = None
+        self.addCleanup(setattr, quota.QUOTAS, '_driver', None)
+        super(TrackedQuotaTestMixin, self).setUp()
+
+
+class TestTrackedDbQuotaDriver(TrackedQuotaTestMixin,
+                               testlib_api.SqlTestCase):
+    def setUp(self):
+        super(TestTrackedDbQuotaDriver, self).setUp()
+        self.plugin = base_plugin.NeutronDbPluginV2()
+        self.driver = quota_db.TrackedDbQuotaDriver()
+        self.context = context.get_admin_context()
+        self.resources = {'network': TestResource('network', 2),
+                          'subnet': TestResource('subnet', 2),
+                          'port': TestResource('port', 2)}
+
+    def _create_network(self, tenant_id=PROJECT):
+        return self.plugin.create_network(self.context, {'network': {
+            'name': 'net', 'admin_state_up': True, 'shared': False,
+            'tenant_id': tenant_id}})
+
+    def _create_subnet(self, network_id):
+        return self.plugin.create_subnet(self.context, {'subnet': {
+            'name': '', 'network_id': network_id, 'tenant_id': PROJECT,
+            'cidr': '10.0.0.0/24', 'ip_version': 4, 'enable_dhcp': True,
+            'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+            'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+            'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+            'host_routes': attributes.ATTR_NOT_SPECIFIED,
+            'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+            'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED}})
+
+    def _create_port(self, network_id, device_owner=''):
+        return self.plugin.create_port(self.context, {'port': {
+            'name': '', 'network_id': network_id, 'tenant_id': PROJECT,
+            'admin_state_up': True, 'device_id': '',
+            'device_owner': device_owner,
+            'mac_address': attributes.ATTR_NOT_SPECIFIED,
+            'fixed_ips': attributes.ATTR_NOT_SPECIFIED}})
+
+    def _get_in_use(self, tenant_id=PROJECT, resource='network'):
+        usage = self.context.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource).first()
+        return usage and usage.in_use
+
+    def _make_reservation(self, amount=1, resource='network'):
+        return self.driver.make_reservation(self.context, PROJECT,
+                                            self.resources,
+                                            {resource: amount})
+
+    def test_usage_counted_on_first_reservation(self):
+        self._create_network()
+        self.assertIsNone(self._get_in_use())
+        self._make_reservation()
+        self.assertEqual(1, self._get_in_use())
+
+    def test_usage_tracked(self):
+        self._make_reservation()
+        network = self._create_network()
+        self._create_network(tenant_id='other')
+        self.assertEqual(1, self._get_in_use())
+        self.plugin.delete_network(self.context, network['id'])
+        self.assertEqual(0, self._get_in_use())
+
+    def test_port_usage_tracked(self):
+        network = self._create_network()
+        self._make_reservation(resource='port')
+        port = self._create_port(network['id'])
+        self.assertEqual(1, self._get_in_use(resource='port'))
+        self.plugin.delete_port(self.context, port['id'])
+        self.assertEqual(0, self._get_in_use(resource='port'))
+
+    def test_usages_tracked_on_network_delete(self):
+        network = self._create_network()
+        for resource in ('network', 'subnet', 'port'):
+            self._make_reservation(resource=resource)
+        self._create_subnet(network['id'])
+        self._create_port(network['id'],
+                          device_owner=constants.DEVICE_OWNER_DHCP)
+        self.assertEqual(1, self._get_in_use(resource='subnet'))
+        self.assertEqual(1, self._get_in_use(resource='port'))
+        self.plugin.delete_network(self.context, network['id'])
+        for resource in ('network', 'subnet', 'port'):
+            self.assertEqual(0, self._get_in_use(resource=resource))
+
+    def test_usage_not_tracked_by_other_drivers(self):
+        self._make_reservation()
+        cfg.CONF.set_override('quota_driver', quota.QUOTA_DB_DRIVER,
+                              group='QUOTAS')
+        self._create_network()
+        self.assertEqual(0, self._get_in_use())
+
+    def test_reservations_count_against_quota(self):
+        self._create_network()
+        reservation_id = self._make_reservation()
+        self.assertRaises(exceptions.OverQuota, self._make_reservation)
+        self.driver.remove_reservation(self.context, reservation_id)
+        self._make_reservation()
+
+    def test_expired_reservations_are_ignored(self):
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        self._make_reservation(2)
+        self._make_reservation(2)
+
+    def test_unlimited_resources_are_not_counted(self):
+        self.resources['network'] = TestResource('network', -1)
+        self._make_reservation(10)
+        self.assertIsNone(self._get_in_use())
+
+    def test_negative_reservation(self):
+        self.assertRaises(exceptions.InvalidQuotaValue,
+                          self._make_reservation, -1)
+
+    def test_reconcile_usages(self):
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        self._make_reservation()
+        with self.context.session.begin():
+            self.context.session.query(quota_db.QuotaUsage).update(
+                {'in_use': 5})
+        self._create_network()
+        self.driver.reconcile_usages(self.context)
+        self.assertEqual(1, self._get_in_use())
+        self.assertEqual(
+            [], self.context.session.query(quota_db.Reservation).all())
+
+
+class TestNetworksV2TrackedQuota(TrackedQuotaTestMixin,
+                                 test_db_plugin.TestNetworksV2):
+    pass
@@ -14,20 +14,26 @@
 #    under the License.
 
 import contextlib
+import copy
+
 import mock
+from oslo.db import exception as db_exc
 
 from neutron.common import constants
 from neutron.common import topics
 from neutron import context
 from neutron.db import agents_db
+from neutron.db import api as db_api
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
 from neutron import manager
 from neutron.openstack.common import timeutils
 from neutron.plugins.ml2 import config as config
 from neutron.plugins.ml2.drivers.l2pop import mech_driver as l2pop_mech_driver
+from neutron.plugins.ml2.drivers.l2pop import rpc as l2pop_rpc
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import rpc
+from neutron.tests import base
 from neutron.tests.unit import test_db_plugin as test_plugin
 
 HOST = 'my_l2_host'
@@ -167,42 +173,57 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                               agent_state={'agent_state': L2_AGENT_5},
                               time=timeutils.strtime())
 
+    def _host_topic(self, host):
+        return topics.get_topic_name(topics.AGENT, topics.L2POPULATION,
+                                     topics.UPDATE, host)
+
+    def _peer_port(self, subnet):
+        """Bind a port of subnet to another agent, to receive fdb entries."""
+        host_arg = {portbindings.HOST_ID: HOST + '_4'}
+        fixed_ips = [{'subnet_id': subnet['subnet']['id']}]
+        return self.port(subnet=subnet, fixed_ips=fixed_ips,
+                         arg_list=(portbindings.HOST_ID,), **host_arg)
+
     def test_fdb_add_called(self):
         self._register_ml2_agents()
 
         with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet,
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg) as port1:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
                 with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
                                arg_list=(portbindings.HOST_ID,),
-                               **host_arg):
-                    p1 = port1['port']
-
-                    device = 'tap' + p1['id']
-
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_up(self.adminContext,
-                                                    agent_id=HOST,
-                                                    device=device)
-
-                    p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
-                    expected = {'args':
-                                {'fdb_entries':
-                                 {p1['network_id']:
-                                  {'ports':
-                                   {'20.0.0.1': [constants.FLOODING_ENTRY,
-                                                 [p1['mac_address'],
-                                                  p1_ips[0]]]},
-                                   'network_type': 'vxlan',
-                                   'segment_id': 1}}},
-                                'namespace': None,
-                                'method': 'add_fdb_entries'}
-
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                               **host_arg) as port1:
+                    with self.port(subnet=subnet,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg):
+                        p1 = port1['port']
+
+                        device = 'tap' + p1['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device)
+
+                        p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
+                        expected = {'args':
+                                    {'fdb_entries':
+                                     {p1['network_id']:
+                                      {'ports':
+                                       {'20.0.0.1': [constants.FLOODING_ENTRY,
+                                                     [p1['mac_address'],
+                                                      p1_ips[0]]]},
+                                       'network_type': 'vxlan',
+                                       'segment_id': 1,
+                                       'prev_generation': mock.ANY,
+                                       'generation': mock.ANY}}},
+                                    'namespace': None,
+                                    'method': 'add_fdb_entries'}
+
+                        self.mock_cast.assert_any_call(
+                            mock.ANY, expected,
+                            topic=self._host_topic(HOST + '_4'))
 
     def test_fdb_add_not_called_type_local(self):
         self._register_ml2_agents()
@@ -220,49 +241,92 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                     device = 'tap' + p1['id']
 
                     self.mock_fanout.reset_mock()
+                    self.mock_cast.reset_mock()
                     self.callbacks.update_device_up(self.adminContext,
                                                     agent_id=HOST,
                                                     device=device)
 
                     self.assertFalse(self.mock_fanout.called)
+                    self.assertFalse(self.mock_cast.called)
 
-    def test_fdb_add_called_for_l2pop_network_types(self):
+    def test_fdb_add_cast_to_network_hosts_only(self):
         self._register_ml2_agents()
 
-        host = HOST + '_5'
-        with self.subnet(network=self._network2) as subnet:
-            host_arg = {portbindings.HOST_ID: host}
+        with self.subnet(network=self._network) as subnet:
+            host_arg = {portbindings.HOST_ID: HOST}
             with self.port(subnet=subnet,
                            device_owner=DEVICE_OWNER_COMPUTE,
                            arg_list=(portbindings.HOST_ID,),
                            **host_arg) as port1:
-                with self.port(subnet=subnet,
-                               arg_list=(portbindings.HOST_ID,),
-                               **host_arg):
-                    p1 = port1['port']
+                p1 = port1['port']
+                device = 'tap' + p1['id']
 
-                    device = 'tap' + p1['id']
+                self.mock_fanout.reset_mock()
+                self.mock_cast.reset_mock()
+                self.callbacks.update_device_up(self.adminContext,
+                                                agent_id=HOST,
+                                                device=device)
 
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_up(self.adminContext,
-                                                    agent_id=host,
-                                                    device=device)
+                p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
+                expected = {'args':
+                            {'fdb_entries':
+                             {p1['network_id']:
+                              {'ports':
+                               {'20.0.0.1': [constants.FLOODING_ENTRY,
+                                             [p1['mac_address'],
+                                              p1_ips[0]]]},
+                               'network_type': 'vxlan',
+                               'segment_id': 1,
+                               'prev_generation': 0,
+                               'generation': 1}}},
+                            'namespace': None,
+                            'method': 'add_fdb_entries'}
 
-                    p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
-                    expected = {'args':
-                                {'fdb_entries':
-                                 {p1['network_id']:
-                                  {'ports':
-                                   {'20.0.0.5': [constants.FLOODING_ENTRY,
-                                                 [p1['mac_address'],
-                                                  p1_ips[0]]]},
-                                   'network_type': 'vlan',
-                                   'segment_id': 2}}},
-                                'namespace': None,
-                                'method': 'add_fdb_entries'}
+                self.assertFalse(self.mock_fanout.called)
+                self.mock_cast.assert_called_once_with(
+                    mock.ANY, expected, topic=self._host_topic(HOST))
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+    def test_fdb_add_called_for_l2pop_network_types(self):
+        self._register_ml2_agents()
+
+        host = HOST + '_5'
+        with self.subnet(network=self._network2) as subnet:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: host}
+                with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host_arg) as port1:
+                    with self.port(subnet=subnet,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg):
+                        p1 = port1['port']
+
+                        device = 'tap' + p1['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=host,
+                                                        device=device)
+
+                        p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
+                        expected = {'args':
+                                    {'fdb_entries':
+                                     {p1['network_id']:
+                                      {'ports':
+                                       {'20.0.0.5': [constants.FLOODING_ENTRY,
+                                                     [p1['mac_address'],
+                                                      p1_ips[0]]]},
+                                       'network_type': 'vlan',
+                                       'segment_id': 2,
+                                       'prev_generation': mock.ANY,
+                                       'generation': mock.ANY}}},
+                                    'namespace': None,
+                                    'method': 'add_fdb_entries'}
+
+                        self.mock_cast.assert_any_call(
+                            mock.ANY, expected,
+                            topic=self._host_topic(HOST + '_4'))
 
     def test_fdb_add_two_agents(self):
         self._register_ml2_agents()
@@ -287,7 +351,6 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                     device = 'tap' + p1['id']
 
                     self.mock_cast.reset_mock()
-                    self.mock_fanout.reset_mock()
                     self.callbacks.update_device_up(self.adminContext,
                                                     agent_id=HOST,
                                                     device=device)
@@ -303,7 +366,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                   [p2['mac_address'],
                                                    p2_ips[0]]]},
                                     'network_type': 'vxlan',
-                                    'segment_id': 1}}},
+                                    'segment_id': 1,
+                                    'generation': mock.ANY}}},
                                  'namespace': None,
                                  'method': 'add_fdb_entries'}
 
@@ -312,9 +376,9 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                   topics.UPDATE,
                                                   HOST)
 
-                    self.mock_cast.assert_called_with(mock.ANY,
-                                                      expected1,
-                                                      topic=topic)
+                    self.mock_cast.assert_any_call(mock.ANY,
+                                                   expected1,
+                                                   topic=topic)
 
                     expected2 = {'args':
                                  {'fdb_entries':
@@ -324,12 +388,15 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                   [p1['mac_address'],
                                                    p1_ips[0]]]},
                                     'network_type': 'vxlan',
-                                    'segment_id': 1}}},
+                                    'segment_id': 1,
+                                    'prev_generation': mock.ANY,
+                                    'generation': mock.ANY}}},
                                  'namespace': None,
                                  'method': 'add_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected2, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected2,
+                        topic=self._host_topic(HOST + '_2'))
 
     def test_fdb_add_called_two_networks(self):
         self._register_ml2_agents()
@@ -356,7 +423,6 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                             device = 'tap' + p3['id']
 
                             self.mock_cast.reset_mock()
-                            self.mock_fanout.reset_mock()
                             self.callbacks.update_device_up(
                                 self.adminContext, agent_id=HOST,
                                 device=device)
@@ -372,7 +438,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                               [p1['mac_address'],
                                                p1_ips[0]]]},
                                             'network_type': 'vxlan',
-                                            'segment_id': 1}}},
+                                            'segment_id': 1,
+                                            'generation': mock.ANY}}},
                                          'namespace': None,
                                          'method': 'add_fdb_entries'}
 
@@ -381,9 +448,9 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                           topics.UPDATE,
                                                           HOST)
 
-                            self.mock_cast.assert_called_with(mock.ANY,
-                                                              expected1,
-                                                              topic=topic)
+                            self.mock_cast.assert_any_call(mock.ANY,
+                                                           expected1,
+                                                           topic=topic)
 
                             p3_ips = [p['ip_address']
                                       for p in p3['fixed_ips']]
@@ -396,46 +463,198 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                               [p3['mac_address'],
                                                p3_ips[0]]]},
                                             'network_type': 'vxlan',
-                                            'segment_id': 1}}},
+                                            'segment_id': 1,
+                                            'prev_generation': mock.ANY,
+                                            'generation': mock.ANY}}},
                                          'namespace': None,
                                          'method': 'add_fdb_entries'}
 
-                            self.mock_fanout.assert_called_with(
+                            self.mock_cast.assert_any_call(
                                 mock.ANY, expected2,
-                                topic=self.fanout_topic)
+                                topic=self._host_topic(HOST + '_2'))
 
     def test_update_port_down(self):
         self._register_ml2_agents()
 
         with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet,
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg) as port1:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
                 with self.port(subnet=subnet,
                                device_owner=DEVICE_OWNER_COMPUTE,
                                arg_list=(portbindings.HOST_ID,),
-                               **host_arg) as port2:
-                    p2 = port2['port']
-                    device2 = 'tap' + p2['id']
+                               **host_arg) as port1:
+                    with self.port(subnet=subnet,
+                                   device_owner=DEVICE_OWNER_COMPUTE,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port2:
+                        p2 = port2['port']
+                        device2 = 'tap' + p2['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device2)
+
+                        p1 = port1['port']
+                        device1 = 'tap' + p1['id']
+
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device1)
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_down(self.adminContext,
+                                                          agent_id=HOST,
+                                                          device=device2)
+
+                        p2_ips = [p['ip_address'] for p in p2['fixed_ips']]
+                        expected = {'args':
+                                    {'fdb_entries':
+                                     {p2['network_id']:
+                                      {'ports':
+                                       {'20.0.0.1': [[p2['mac_address'],
+                                                      p2_ips[0]]]},
+                                       'network_type': 'vxlan',
+                                       'segment_id': 1,
+                                       'prev_generation': mock.ANY,
+                                       'generation': mock.ANY}}},
+                                    'namespace': None,
+                                    'method': 'remove_fdb_entries'}
+
+                        self.mock_cast.assert_any_call(
+                            mock.ANY, expected,
+                            topic=self._host_topic(HOST + '_4'))
 
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_up(self.adminContext,
-                                                    agent_id=HOST,
-                                                    device=device2)
+    def test_update_port_down_last_port_up(self):
+        self._register_ml2_agents()
 
-                    p1 = port1['port']
-                    device1 = 'tap' + p1['id']
+        with self.subnet(network=self._network) as subnet:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
+                with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host_arg):
+                    with self.port(subnet=subnet,
+                                   device_owner=DEVICE_OWNER_COMPUTE,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port2:
+                        p2 = port2['port']
+                        device2 = 'tap' + p2['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device2)
+
+                        self.callbacks.update_device_down(self.adminContext,
+                                                          agent_id=HOST,
+                                                          device=device2)
+
+                        p2_ips = [p['ip_address'] for p in p2['fixed_ips']]
+                        expected = {'args':
+                                    {'fdb_entries':
+                                     {p2['network_id']:
+                                      {'ports':
+                                       {'20.0.0.1': [constants.FLOODING_ENTRY,
+                                                     [p2['mac_address'],
+                                                      p2_ips[0]]]},
+                                       'network_type': 'vxlan',
+                                       'segment_id': 1,
+                                       'prev_generation': mock.ANY,
+                                       'generation': mock.ANY}}},
+                                    'namespace': None,
+                                    'method': 'remove_fdb_entries'}
+
+                        self.mock_cast.assert_any_call(
+                            mock.ANY, expected,
+                            topic=self._host_topic(HOST + '_4'))
+
+    def _host_fdb_entries(self, method, host):
+        """Return the fdb entries of the method casts to the host agent."""
+        return [args[1]['args']['fdb_entries']
+                for args, kwargs in self.mock_cast.call_args_list
+                if (args[1]['method'] == method and
+                    kwargs.get('topic') == self._host_topic(host))]
+
+    def test_update_devices_up_and_down_aggregate_fdb_entries(self):
+        self._register_ml2_agents()
 
+        with self.subnet(network=self._network) as subnet:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
+                with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host_arg) as port1:
+                    with self.port(subnet=subnet,
+                                   device_owner=DEVICE_OWNER_COMPUTE,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port2:
+                        p1 = port1['port']
+                        p2 = port2['port']
+                        devices = ['tap' + p1['id'], 'tap' + p2['id']]
+                        expected_entries = sorted(
+                            [constants.FLOODING_ENTRY] +
+                            [[p['mac_address'],
+                              p['fixed_ips'][0]['ip_address']]
+                             for p in (p1, p2)])
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_devices_up(self.adminContext,
+                                                         agent_id=HOST,
+                                                         devices=devices,
+                                                         host=HOST)
+                        fdb_entries = self._host_fdb_entries(
+                            'add_fdb_entries', HOST + '_4')
+                        self.assertEqual(1, len(fdb_entries))
+                        self.assertEqual(
+                            expected_entries,
+                            sorted(fdb_entries[0][p1['network_id']]
+                                   ['ports']['20.0.0.1']))
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_devices_down(self.adminContext,
+                                                           agent_id=HOST,
+                                                           devices=devices,
+                                                           host=HOST)
+                        fdb_entries = self._host_fdb_entries(
+                            'remove_fdb_entries', HOST + '_4')
+                        self.assertEqual(1, len(fdb_entries))
+                        self.assertEqual(
+                            expected_entries,
+                            sorted(fdb_entries[0][p1['network_id']]
+                                   ['ports']['20.0.0.1']))
+
+    def test_delete_port(self):
+        self._register_ml2_agents()
+
+        with self.subnet(network=self._network) as subnet:
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
+                with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host_arg) as port:
+                    p1 = port['port']
+                    device = 'tap' + p1['id']
+
+                    self.mock_cast.reset_mock()
                     self.callbacks.update_device_up(self.adminContext,
                                                     agent_id=HOST,
-                                                    device=device1)
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_down(self.adminContext,
-                                                      agent_id=HOST,
-                                                      device=device2)
+                                                    device=device)
 
+                    with self.port(subnet=subnet,
+                                   device_owner=DEVICE_OWNER_COMPUTE,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port2:
+                        p2 = port2['port']
+                        device1 = 'tap' + p2['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device1)
+                    self._delete('ports', port2['port']['id'])
                     p2_ips = [p['ip_address'] for p in p2['fixed_ips']]
                     expected = {'args':
                                 {'fdb_entries':
@@ -444,248 +663,181 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                    {'20.0.0.1': [[p2['mac_address'],
                                                   p2_ips[0]]]},
                                    'network_type': 'vxlan',
-                                   'segment_id': 1}}},
+                                   'segment_id': 1,
+                                   'prev_generation': mock.ANY,
+                                   'generation': mock.ANY}}},
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected,
+                        topic=self._host_topic(HOST + '_4'))
 
-    def test_update_port_down_last_port_up(self):
+    def test_delete_port_last_port_up(self):
         self._register_ml2_agents()
 
         with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet,
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg):
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
                 with self.port(subnet=subnet,
                                device_owner=DEVICE_OWNER_COMPUTE,
                                arg_list=(portbindings.HOST_ID,),
-                               **host_arg) as port2:
-                    p2 = port2['port']
-                    device2 = 'tap' + p2['id']
-
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_up(self.adminContext,
-                                                    agent_id=HOST,
-                                                    device=device2)
+                               **host_arg):
+                    with self.port(subnet=subnet,
+                                   device_owner=DEVICE_OWNER_COMPUTE,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port:
+                        p1 = port['port']
 
-                    self.callbacks.update_device_down(self.adminContext,
-                                                      agent_id=HOST,
-                                                      device=device2)
+                        device = 'tap' + p1['id']
 
-                    p2_ips = [p['ip_address'] for p in p2['fixed_ips']]
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device)
+                    self._delete('ports', port['port']['id'])
+                    p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
                     expected = {'args':
                                 {'fdb_entries':
-                                 {p2['network_id']:
+                                 {p1['network_id']:
                                   {'ports':
                                    {'20.0.0.1': [constants.FLOODING_ENTRY,
-                                                 [p2['mac_address'],
-                                                  p2_ips[0]]]},
+                                                 [p1['mac_address'],
+                                                  p1_ips[0]]]},
                                    'network_type': 'vxlan',
-                                   'segment_id': 1}}},
+                                   'segment_id': 1,
+                                   'prev_generation': mock.ANY,
+                                   'generation': mock.ANY}}},
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected,
+                        topic=self._host_topic(HOST + '_4'))
 
-    def test_delete_port(self):
-        self._register_ml2_agents()
-
-        with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet,
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg) as port:
-                p1 = port['port']
-                device = 'tap' + p1['id']
-
-                self.mock_fanout.reset_mock()
-                self.callbacks.update_device_up(self.adminContext,
-                                                agent_id=HOST,
-                                                device=device)
-
-                with self.port(subnet=subnet,
-                               device_owner=DEVICE_OWNER_COMPUTE,
-                               arg_list=(portbindings.HOST_ID,),
-                               **host_arg) as port2:
-                    p2 = port2['port']
-                    device1 = 'tap' + p2['id']
-
-                    self.mock_fanout.reset_mock()
-                    self.callbacks.update_device_up(self.adminContext,
-                                                    agent_id=HOST,
-                                                    device=device1)
-                self._delete('ports', port2['port']['id'])
-                p2_ips = [p['ip_address'] for p in p2['fixed_ips']]
-                expected = {'args':
-                            {'fdb_entries':
-                             {p2['network_id']:
-                              {'ports':
-                               {'20.0.0.1': [[p2['mac_address'],
-                                              p2_ips[0]]]},
-                               'network_type': 'vxlan',
-                               'segment_id': 1}}},
-                            'namespace': None,
-                            'method': 'remove_fdb_entries'}
-
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, expected, topic=self.fanout_topic)
-
-    def test_delete_port_last_port_up(self):
+    def test_fixed_ips_changed(self):
         self._register_ml2_agents()
 
-        with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet,
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg):
-                with self.port(subnet=subnet,
+        with contextlib.nested(
+                self.subnet(network=self._network),
+                self.subnet(network=self._network,
+                            cidr='10.1.0.0/24')) as (subnet, subnet2):
+            # Keep the addresses of subnet for port1
+            with self._peer_port(subnet2):
+                host_arg = {portbindings.HOST_ID: HOST}
+                with self.port(subnet=subnet, cidr='10.0.0.0/24',
                                device_owner=DEVICE_OWNER_COMPUTE,
                                arg_list=(portbindings.HOST_ID,),
-                               **host_arg) as port:
-                    p1 = port['port']
+                               **host_arg) as port1:
+                    p1 = port1['port']
 
                     device = 'tap' + p1['id']
 
                     self.callbacks.update_device_up(self.adminContext,
                                                     agent_id=HOST,
                                                     device=device)
-                self._delete('ports', port['port']['id'])
-                p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
-                expected = {'args':
-                            {'fdb_entries':
-                             {p1['network_id']:
-                              {'ports':
-                               {'20.0.0.1': [constants.FLOODING_ENTRY,
-                                             [p1['mac_address'],
-                                              p1_ips[0]]]},
-                               'network_type': 'vxlan',
-                               'segment_id': 1}}},
-                            'namespace': None,
-                            'method': 'remove_fdb_entries'}
-
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, expected, topic=self.fanout_topic)
-
-    def test_fixed_ips_changed(self):
-        self._register_ml2_agents()
-
-        with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet, cidr='10.0.0.0/24',
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg) as port1:
-                p1 = port1['port']
-
-                device = 'tap' + p1['id']
-
-                self.callbacks.update_device_up(self.adminContext,
-                                                agent_id=HOST,
-                                                device=device)
-
-                self.mock_fanout.reset_mock()
-
-                data = {'port': {'fixed_ips': [{'ip_address': '10.0.0.2'},
-                                               {'ip_address': '10.0.0.10'}]}}
-                req = self.new_update_request('ports', data, p1['id'])
-                res = self.deserialize(self.fmt, req.get_response(self.api))
-                ips = res['port']['fixed_ips']
-                self.assertEqual(len(ips), 2)
-
-                add_expected = {'args':
-                                {'fdb_entries':
-                                 {'chg_ip':
-                                  {p1['network_id']:
-                                   {'20.0.0.1':
-                                    {'after': [[p1['mac_address'],
-                                                '10.0.0.10']]}}}}},
-                                'namespace': None,
-                                'method': 'update_fdb_entries'}
-
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, add_expected, topic=self.fanout_topic)
-
-                self.mock_fanout.reset_mock()
-
-                data = {'port': {'fixed_ips': [{'ip_address': '10.0.0.2'},
-                                               {'ip_address': '10.0.0.16'}]}}
-                req = self.new_update_request('ports', data, p1['id'])
-                res = self.deserialize(self.fmt, req.get_response(self.api))
-                ips = res['port']['fixed_ips']
-                self.assertEqual(len(ips), 2)
 
-                upd_expected = {'args':
-                                {'fdb_entries':
-                                 {'chg_ip':
-                                  {p1['network_id']:
-                                   {'20.0.0.1':
-                                    {'before': [[p1['mac_address'],
-                                                 '10.0.0.10']],
-                                     'after': [[p1['mac_address'],
-                                                '10.0.0.16']]}}}}},
-                                'namespace': None,
-                                'method': 'update_fdb_entries'}
+                    self.mock_cast.reset_mock()
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, upd_expected, topic=self.fanout_topic)
+                    data = {'port': {'fixed_ips': [
+                        {'ip_address': '10.0.0.2'},
+                        {'ip_address': '10.0.0.10'}]}}
+                    req = self.new_update_request('ports', data, p1['id'])
+                    res = self.deserialize(self.fmt,
+                                           req.get_response(self.api))
+                    ips = res['port']['fixed_ips']
+                    self.assertEqual(len(ips), 2)
+
+                    add_expected = {'args':
+                                    {'fdb_entries':
+                                     {'chg_ip':
+                                      {p1['network_id']:
+                                       {'20.0.0.1':
+                                        {'after': [[p1['mac_address'],
+                                                    '10.0.0.10']]}}}}},
+                                    'namespace': None,
+                                    'method': 'update_fdb_entries'}
+
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, add_expected,
+                        topic=self._host_topic(HOST + '_4'))
 
-                self.mock_fanout.reset_mock()
+                    self.mock_cast.reset_mock()
 
-                data = {'port': {'fixed_ips': [{'ip_address': '10.0.0.16'}]}}
-                req = self.new_update_request('ports', data, p1['id'])
-                res = self.deserialize(self.fmt, req.get_response(self.api))
-                ips = res['port']['fixed_ips']
-                self.assertEqual(len(ips), 1)
+                    data = {'port': {'fixed_ips': [
+                        {'ip_address': '10.0.0.2'},
+                        {'ip_address': '10.0.0.16'}]}}
+                    req = self.new_update_request('ports', data, p1['id'])
+                    res = self.deserialize(self.fmt,
+                                           req.get_response(self.api))
+                    ips = res['port']['fixed_ips']
+                    self.assertEqual(len(ips), 2)
+
+                    upd_expected = {'args':
+                                    {'fdb_entries':
+                                     {'chg_ip':
+                                      {p1['network_id']:
+                                       {'20.0.0.1':
+                                        {'before': [[p1['mac_address'],
+                                                     '10.0.0.10']],
+                                         'after': [[p1['mac_address'],
+                                                    '10.0.0.16']]}}}}},
+                                    'namespace': None,
+                                    'method': 'update_fdb_entries'}
+
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, upd_expected,
+                        topic=self._host_topic(HOST + '_4'))
 
-                del_expected = {'args':
-                                {'fdb_entries':
-                                 {'chg_ip':
-                                  {p1['network_id']:
-                                   {'20.0.0.1':
-                                    {'before': [[p1['mac_address'],
-                                                 '10.0.0.2']]}}}}},
-                                'namespace': None,
-                                'method': 'update_fdb_entries'}
+                    self.mock_cast.reset_mock()
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, del_expected, topic=self.fanout_topic)
+                    data = {'port': {'fixed_ips': [
+                        {'ip_address': '10.0.0.16'}]}}
+                    req = self.new_update_request('ports', data, p1['id'])
+                    res = self.deserialize(self.fmt,
+                                           req.get_response(self.api))
+                    ips = res['port']['fixed_ips']
+                    self.assertEqual(len(ips), 1)
+
+                    del_expected = {'args':
+                                    {'fdb_entries':
+                                     {'chg_ip':
+                                      {p1['network_id']:
+                                       {'20.0.0.1':
+                                        {'before': [[p1['mac_address'],
+                                                     '10.0.0.2']]}}}}},
+                                    'namespace': None,
+                                    'method': 'update_fdb_entries'}
+
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, del_expected,
+                        topic=self._host_topic(HOST + '_4'))
 
     def test_no_fdb_updates_without_port_updates(self):
         self._register_ml2_agents()
 
         with self.subnet(network=self._network) as subnet:
-            host_arg = {portbindings.HOST_ID: HOST}
-            with self.port(subnet=subnet, cidr='10.0.0.0/24',
-                           device_owner=DEVICE_OWNER_COMPUTE,
-                           arg_list=(portbindings.HOST_ID,),
-                           **host_arg) as port1:
-                p1 = port1['port']
-
-                device = 'tap' + p1['id']
+            with self._peer_port(subnet):
+                host_arg = {portbindings.HOST_ID: HOST}
+                with self.port(subnet=subnet, cidr='10.0.0.0/24',
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host_arg) as port1:
+                    p1 = port1['port']
 
-                self.callbacks.update_device_up(self.adminContext,
-                                                agent_id=HOST,
-                                                device=device)
-                p1['status'] = 'ACTIVE'
-                self.mock_fanout.reset_mock()
+                    device = 'tap' + p1['id']
 
-                fanout = ('neutron.plugins.ml2.drivers.l2pop.rpc.'
-                          'L2populationAgentNotifyAPI._notification_fanout')
-                fanout_patch = mock.patch(fanout)
-                mock_fanout = fanout_patch.start()
+                    self.callbacks.update_device_up(self.adminContext,
+                                                    agent_id=HOST,
+                                                    device=device)
+                    p1['status'] = 'ACTIVE'
+                    self.mock_fanout.reset_mock()
+                    self.mock_cast.reset_mock()
 
-                plugin = manager.NeutronManager.get_plugin()
-                plugin.update_port(self.adminContext, p1['id'], port1)
+                    plugin = manager.NeutronManager.get_plugin()
+                    plugin.update_port(self.adminContext, p1['id'], port1)
 
-                self.assertFalse(mock_fanout.called)
-                fanout_patch.stop()
+                    self.assertFalse(self.mock_fanout.called)
+                    self.assertFalse(self.mock_cast.called)
 
     def test_host_changed(self):
         self._register_ml2_agents()
@@ -718,7 +870,7 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                            req.get_response(self.api))
                     self.assertEqual(res['port']['binding:host_id'],
                                      L2_AGENT_2['host'])
-                    self.mock_fanout.reset_mock()
+                    self.mock_cast.reset_mock()
                     self.callbacks.get_device_details(
                         self.adminContext,
                         device=device1,
@@ -732,12 +884,15 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                  [p1['mac_address'],
                                                   p1_ips[0]]]},
                                    'network_type': 'vxlan',
-                                   'segment_id': 1}}},
+                                   'segment_id': 1,
+                                   'prev_generation': mock.ANY,
+                                   'generation': mock.ANY}}},
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected,
+                        topic=self._host_topic(L2_AGENT_2['host']))
 
     def test_host_changed_twice(self):
         self._register_ml2_agents()
@@ -776,7 +931,7 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                            req.get_response(self.api))
                     self.assertEqual(res['port']['binding:host_id'],
                                      L2_AGENT_4['host'])
-                    self.mock_fanout.reset_mock()
+                    self.mock_cast.reset_mock()
                     self.callbacks.get_device_details(
                         self.adminContext,
                         device=device1,
@@ -790,12 +945,169 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                  [p1['mac_address'],
                                                   p1_ips[0]]]},
                                    'network_type': 'vxlan',
-                                   'segment_id': 1}}},
+                                   'segment_id': 1,
+                                   'prev_generation': mock.ANY,
+                                   'generation': mock.ANY}}},
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected,
+                        topic=self._host_topic(L2_AGENT_2['host']))
+
+    def _register_fdb_sync_agent(self):
+        agent = copy.deepcopy(L2_AGENT)
+        agent['configurations']['l2pop_fdb_sync'] = True
+        callback = agents_db.AgentExtRpcCallback()
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': agent},
+                              time=timeutils.strtime())
+
+    def _test_update_port_up_during_agent_boot(self, fdb_sync):
+        self._register_ml2_agents()
+        if fdb_sync:
+            self._register_fdb_sync_agent()
+        config.cfg.CONF.set_override('agent_boot_time', 200, 'l2pop')
+
+        with self.subnet(network=self._network) as subnet:
+            host_arg = {portbindings.HOST_ID: HOST}
+            host2_arg = {portbindings.HOST_ID: HOST + '_2'}
+            with contextlib.nested(
+                self.port(subnet=subnet, device_owner=DEVICE_OWNER_COMPUTE,
+                          arg_list=(portbindings.HOST_ID,), **host_arg),
+                self.port(subnet=subnet, device_owner=DEVICE_OWNER_COMPUTE,
+                          arg_list=(portbindings.HOST_ID,), **host_arg),
+                self.port(subnet=subnet, device_owner=DEVICE_OWNER_COMPUTE,
+                          arg_list=(portbindings.HOST_ID,), **host2_arg)
+            ) as (port1, port2, port3):
+                for port in (port1, port2):
+                    self.mock_cast.reset_mock()
+                    self.callbacks.update_device_up(
+                        self.adminContext, agent_id=HOST,
+                        device='tap' + port['port']['id'])
+
+                # port2 is not the first active port of the host, only
+                # the agents which do not fetch the fdb entries by
+                # themselves get them all during their boot
+                full_dumps = [
+                    call for call in self.mock_cast.call_args_list
+                    if call[1]['topic'] == self._host_topic(HOST) and
+                    '20.0.0.2' in call[0][1]['args']['fdb_entries'][
+                        port2['port']['network_id']]['ports']]
+                self.assertEqual(not fdb_sync, bool(full_dumps))
+
+    def test_update_port_up_during_agent_boot(self):
+        self._test_update_port_up_during_agent_boot(fdb_sync=False)
+
+    def test_update_port_up_during_fdb_sync_agent_boot(self):
+        self._test_update_port_up_during_agent_boot(fdb_sync=True)
+
+    def test_get_fdb_entries(self):
+        self._register_ml2_agents()
+        callback = l2pop_rpc.L2populationServerRpcCallback()
+
+        with contextlib.nested(
+            self.subnet(network=self._network),
+            self.network(arg_list=(pnet.NETWORK_TYPE, pnet.SEGMENTATION_ID),
+                         **{pnet.NETWORK_TYPE: 'vxlan',
+                            pnet.SEGMENTATION_ID: '3'})
+        ) as (subnet, network):
+            with self.subnet(network=network, cidr='10.1.0.0/24') as subnet2:
+                host_arg = {portbindings.HOST_ID: HOST}
+                host2_arg = {portbindings.HOST_ID: HOST + '_2'}
+                with contextlib.nested(
+                    self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                              **host_arg),
+                    self.port(subnet=subnet2,
+                              arg_list=(portbindings.HOST_ID,), **host_arg),
+                    self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                              **host2_arg)
+                ) as (port1, port2, port3):
+                    p3 = port3['port']
+                    self.callbacks.update_device_up(
+                        self.adminContext, agent_id=HOST + '_2',
+                        device='tap' + p3['id'])
+                    network_ids = sorted([subnet['subnet']['network_id'],
+                                          subnet2['subnet']['network_id']])
+
+                    pages = []
+                    marker = None
+                    for i in range(3):
+                        result = callback.get_fdb_entries(
+                            self.adminContext, host=HOST, marker=marker,
+                            limit=1)
+                        pages.append(result)
+                        marker = result['next_marker']
+                        if not marker:
+                            break
+
+        self.assertEqual([[network_ids[0]], [network_ids[1]], []],
+                         [page['fdb_entries'].keys() for page in pages])
+        self.assertEqual([network_ids[0], network_ids[1], None],
+                         [page['next_marker'] for page in pages])
+        fdb_entries = dict(pages[0]['fdb_entries'], **pages[1]['fdb_entries'])
+        p3_ips = [p['ip_address'] for p in p3['fixed_ips']]
+        self.assertEqual(
+            {'segment_id': 1, 'network_type': 'vxlan', 'generation': 1,
+             'ports': {'20.0.0.2': [constants.FLOODING_ENTRY,
+                                    [p3['mac_address'], p3_ips[0]]]}},
+            fdb_entries[p3['network_id']])
+        self.assertEqual(
+            {'segment_id': 3, 'network_type': 'vxlan', 'generation': 0,
+             'ports': {}},
+            fdb_entries[network['network']['id']])
+
+    def test_get_fdb_entries_of_networks(self):
+        self._register_ml2_agents()
+        callback = l2pop_rpc.L2populationServerRpcCallback()
+
+        with self.subnet(network=self._network) as subnet:
+            host_arg = {portbindings.HOST_ID: HOST}
+            with self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                           **host_arg):
+                network_id = subnet['subnet']['network_id']
+                result = callback.get_fdb_entries(
+                    self.adminContext, host=HOST,
+                    network_ids=[network_id])
+                self.assertEqual([network_id], result['fdb_entries'].keys())
+                self.assertIsNone(result['next_marker'])
+                result = callback.get_fdb_entries(
+                    self.adminContext, host=HOST, network_ids=['other'])
+                self.assertEqual({}, result['fdb_entries'])
+
+    def test_bump_fdb_generation_concurrent_first_bump(self):
+        l2pop_mech = l2pop_mech_driver.L2populationMechanismDriver()
+        network_id = self._network['network']['id']
+        orig = l2pop_mech._get_locked_fdb_generation
+
+        def get_locked_fdb_generation(session, network_id):
+            if get_locked.call_count == 1:
+                # The record is inserted by a concurrent first bump
+                self.assertEqual((0, 1), l2pop_mech.bump_fdb_generation(
+                    db_api.get_session(), network_id))
+                return None
+            return orig(session, network_id)
+
+        with mock.patch.object(l2pop_mech, '_get_locked_fdb_generation',
+                               side_effect=get_locked_fdb_generation
+                               ) as get_locked:
+            self.assertEqual((1, 2), l2pop_mech.bump_fdb_generation(
+                db_api.get_session(), network_id))
+
+    def test_bump_fdb_generation_concurrent_first_bump_deadlock(self):
+        l2pop_mech = l2pop_mech_driver.L2populationMechanismDriver()
+        network_id = self._network['network']['id']
+        orig = l2pop_mech._bump_fdb_generation
+
+        def bump_fdb_generation(session, network_id):
+            if bump.call_count == 1:
+                raise db_exc.DBDeadlock()
+            return orig(session, network_id)
+
+        with mock.patch.object(l2pop_mech, '_bump_fdb_generation',
+                               side_effect=bump_fdb_generation) as bump:
+            self.assertEqual((0, 1), l2pop_mech.bump_fdb_generation(
+                db_api.get_session(), network_id))
 
     def test_delete_port_invokes_update_device_down(self):
         l2pop_mech = l2pop_mech_driver.L2populationMechanismDriver()
@@ -809,4 +1121,107 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                   'remove_fdb_entries')) as (upd_port_down,
                                                              rem_fdb_entries):
             l2pop_mech.delete_port_postcommit(mock.Mock())
-            self.assertTrue(upd_port_down.called)
\ No newline at end of file
+            self.assertTrue(upd_port_down.called)
+
+
+class TestL2populationAgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL2populationAgentNotifyAPI, self).setUp()
+        self.notifier = l2pop_rpc.L2populationAgentNotifyAPI()
+        self.context = mock.Mock()
+        self.mock_cast = mock.patch.object(self.notifier, 'cast').start()
+        self.mock_fanout = mock.patch.object(self.notifier,
+                                             'fanout_cast').start()
+
+    def _fdb_entries(self, *ports):
+        return {'net1': {'segment_id': 1, 'network_type': 'vxlan',
+                         'ports': {'20.0.0.1': list(ports)}}}
+
+    def _host_topic(self, host):
+        return topics.get_topic_name(topics.AGENT, topics.L2POPULATION,
+                                     topics.UPDATE, host)
+
+    def _expected_call(self, method, fdb_entries, host):
+        return mock.call(self.context,
+                         {'args': {'fdb_entries': fdb_entries},
+                          'namespace': None, 'method': method},
+                         topic=self._host_topic(host))
+
+    def test_add_fdb_entries_to_hosts(self):
+        fdb_entries = self._fdb_entries(constants.FLOODING_ENTRY)
+        self.notifier.add_fdb_entries(self.context, fdb_entries,
+                                      hosts=['host1', 'host2'])
+
+        self.assertFalse(self.mock_fanout.called)
+        self.assertEqual(
+            [self._expected_call('add_fdb_entries', fdb_entries, 'host1'),
+             self._expected_call('add_fdb_entries', fdb_entries, 'host2')],
+            self.mock_cast.call_args_list)
+
+    def test_add_fdb_entries_fanout(self):
+        fdb_entries = self._fdb_entries(constants.FLOODING_ENTRY)
+        self.notifier.add_fdb_entries(self.context, fdb_entries)
+
+        self.assertFalse(self.mock_cast.called)
+        self.assertTrue(self.mock_fanout.called)
+
+    def test_notifications_are_merged_during_interval(self):
+        config.cfg.CONF.set_override('notification_interval', 1, 'l2pop')
+        port1 = ['00:00:00:00:00:01', '10.0.0.2']
+        port2 = ['00:00:00:00:00:02', '10.0.0.3']
+        with contextlib.nested(
+                mock.patch.object(l2pop_rpc.eventlet, 'spawn_n'),
+                mock.patch.object(l2pop_rpc.eventlet, 'sleep')
+        ) as (spawn_n, sleep):
+            self.notifier.add_fdb_entries(
+                self.context, self._fdb_entries(constants.FLOODING_ENTRY,
+                                                port1), hosts=['host1'])
+            self.notifier.add_fdb_entries(
+                self.context, self._fdb_entries(port1, port2),
+                hosts=['host1'])
+            self.notifier.remove_fdb_entries(
+                self.context, self._fdb_entries(port1), hosts=['host1'])
+            self.notifier.add_fdb_entries(
+                self.context, self._fdb_entries(port1), hosts=['host1'])
+            self.assertEqual(1, spawn_n.call_count)
+            self.assertFalse(self.mock_cast.called)
+
+            spawn_n.call_args[0][0]()
+
+        sleep.assert_called_once_with(1)
+        self.assertEqual(
+            [self._expected_call('add_fdb_entries',
+                                 self._fdb_entries(constants.FLOODING_ENTRY,
+                                                   port1, port2), 'host1'),
+             self._expected_call('remove_fdb_entries',
+                                 self._fdb_entries(port1), 'host1'),
+             self._expected_call('add_fdb_entries',
+                                 self._fdb_entries(port1), 'host1')],
+            self.mock_cast.call_args_list)
+        self.assertEqual({}, self.notifier.pending_messages)
+
+    def test_notifications_merged_only_with_contiguous_generations(self):
+        config.cfg.CONF.set_override('notification_interval', 1, 'l2pop')
+        port1 = ['00:00:00:00:00:01', '10.0.0.2']
+        port2 = ['00:00:00:00:00:02', '10.0.0.3']
+        port3 = ['00:00:00:00:00:03', '10.0.0.4']
+
+        def fdb_entries(prev_generation, port):
+            fdb_entries = self._fdb_entries(port)
+            fdb_entries['net1'].update(prev_generation=prev_generation,
+                                       generation=prev_generation + 1)
+            return fdb_entries
+
+        with mock.patch.object(l2pop_rpc.eventlet, 'spawn_n'):
+            for generation, port in ((0, port1), (1, port2), (3, port3)):
+                self.notifier.add_fdb_entries(
+                    self.context, fdb_entries(generation, port),
+                    hosts=['host1'])
+        merged = fdb_entries(0, port1)
+        merged['net1']['ports']['20.0.0.1'].append(port2)
+        merged['net1']['generation'] = 2
+        self.assertEqual(
+            [('add_fdb_entries', merged),
+             ('add_fdb_entries', fdb_entries(3, port3))],
+            self.notifier.pending_messages['host1'])
@@ -23,6 +23,7 @@ from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers import mechanism_odl
 from neutron.plugins.ml2 import plugin
 from neutron.tests import base
+from neutron.tests.unit.ml2 import test_ml2_plugin
 from neutron.tests.unit import test_db_plugin as test_plugin
 from neutron.tests.unit import testlib_api
 
@@ -116,8 +117,9 @@ class OpenDaylightMechanismTestSubnetsV2(test_plugin.TestSubnetsV2,
     pass
 
 
-class OpenDaylightMechanismTestPortsV2(test_plugin.TestPortsV2,
-                                       OpenDaylightTestCase):
+class OpenDaylightMechanismTestPortsV2(
+        test_ml2_plugin.Ml2BulkPortsFailureTestMixin,
+        test_plugin.TestPortsV2, OpenDaylightTestCase):
     pass
 
 
@@ -19,6 +19,8 @@ import testtools
 import uuid
 import webob
 
+from neutron.api.v2 import base as v2_base
+from neutron.api.v2 import router
 from neutron.common import constants
 from neutron.common import exceptions as exc
 from neutron.common import utils
@@ -117,7 +119,30 @@ class TestMl2V2HTTPResponse(test_plugin.TestV2HTTPResponse,
 
 class TestMl2NetworksV2(test_plugin.TestNetworksV2,
                         Ml2PluginV2TestCase):
-    pass
+
+    def _test_get_networks_with_fields(self, fields):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.network() as network:
+            with mock.patch.object(
+                plugin.type_manager, '_extend_network_dict_provider',
+                wraps=plugin.type_manager._extend_network_dict_provider
+            ) as extend_provider:
+                nets = plugin.get_networks(ctx, fields=fields)
+            self.assertEqual([network['network']['id']],
+                             [net['id'] for net in nets])
+            return nets, extend_provider.called
+
+    def test_get_networks_with_fields_skips_provider_attributes(self):
+        nets, extended = self._test_get_networks_with_fields(['id', 'name'])
+        self.assertFalse(extended)
+        self.assertEqual(['id', 'name'], sorted(nets[0]))
+
+    def test_get_networks_with_provider_fields(self):
+        nets, extended = self._test_get_networks_with_fields(
+            ['id', pnet.NETWORK_TYPE])
+        self.assertTrue(extended)
+        self.assertEqual(['id', pnet.NETWORK_TYPE], sorted(nets[0]))
 
 
 class TestMl2SubnetsV2(test_plugin.TestSubnetsV2,
@@ -125,13 +150,130 @@ class TestMl2SubnetsV2(test_plugin.TestSubnetsV2,
     pass
 
 
-class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
+class Ml2BulkPortsFailureTestMixin(object):
+    """Inject the port bulk creation faults in the mechanism drivers.
+
+    The ML2 native bulk requests never reach create_port, and the generic
+    tests cannot select the emulated path, as the API checks the native bulk
+    support when it builds its controllers. The mechanism driver test cases
+    use this mixin rather than patching create_port themselves.
+    """
+
+    def _test_create_ports_bulk_precommit_failure(self, native):
+        if not native:
+            # The API checks the native bulk support of the plugin when it
+            # builds its controllers
+            with mock.patch.object(v2_base.Controller,
+                                   '_is_native_bulk_supported',
+                                   return_value=False):
+                self.api = router.APIRouter()
+        plugin = manager.NeutronManager.get_plugin()
+        orig = plugin.mechanism_manager.create_port_precommit
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(plugin.mechanism_manager,
+                              'create_port_precommit'),
+            mock.patch.object(plugin, 'create_port_bulk',
+                              wraps=plugin.create_port_bulk)
+        ) as (net, patched_precommit, create_port_bulk):
+
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched_precommit, orig,
+                                              *args, **kwargs)
+
+            patched_precommit.side_effect = side_effect
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True)
+            self.assertEqual(native, create_port_bulk.called)
+            # We expect a 500 as we injected a fault in the plugin
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPServerError.code)
+
+    def test_create_ports_bulk_emulated_plugin_failure(self):
+        self._test_create_ports_bulk_precommit_failure(native=False)
+
+    def test_create_ports_bulk_native_plugin_failure(self):
+        self._test_create_ports_bulk_precommit_failure(native=True)
+
+
+class TestMl2PortsV2(Ml2BulkPortsFailureTestMixin, test_plugin.TestPortsV2,
+                     Ml2PluginV2TestCase):
 
     def test_update_port_status_build(self):
         with self.port() as port:
             self.assertEqual('DOWN', port['port']['status'])
             self.assertEqual('DOWN', self.port_create_status)
 
+    def test_get_bound_ports_contexts(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.subnet() as subnet, contextlib.nested(
+                self.port(subnet=subnet),
+                self.port(subnet=subnet)) as (port1, port2):
+            port_id1 = port1['port']['id']
+            port_id2 = port2['port']['id'][:11]
+            port_contexts = plugin.get_bound_ports_contexts(
+                ctx, [port_id1, port_id2, 'unknown'])
+            self.assertIsNone(port_contexts['unknown'])
+            self.assertEqual(port_id1, port_contexts[port_id1].current['id'])
+            self.assertEqual(port2['port']['id'],
+                             port_contexts[port_id2].current['id'])
+            self.assertEqual(
+                [segment['segmentation_id'] for segment in
+                 port_contexts[port_id1].network.network_segments],
+                [segment['segmentation_id'] for segment in
+                 plugin.get_bound_port_context(
+                     ctx, port_id1).network.network_segments])
+
+    def test_update_port_statuses(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.subnet() as subnet, contextlib.nested(
+                self.port(subnet=subnet),
+                self.port(subnet=subnet)) as (port1, port2):
+            port_id1 = port1['port']['id']
+            port_id2 = port2['port']['id']
+            with contextlib.nested(
+                mock.patch.object(plugin.mechanism_manager,
+                                  'update_port_precommit'),
+                mock.patch.object(plugin.mechanism_manager,
+                                  'update_ports_postcommit'),
+                mock.patch.object(ml2_db, 'get_locked_ports_and_bindings',
+                                  wraps=ml2_db.get_locked_ports_and_bindings)
+            ) as (precommit, postcommit, get_locked_ports):
+                found = plugin.update_port_statuses(
+                    ctx, {port_id1: constants.PORT_STATUS_ACTIVE,
+                          port_id2[:11]: constants.PORT_STATUS_DOWN,
+                          'unknown': constants.PORT_STATUS_ACTIVE})
+            self.assertEqual({port_id1: port_id1, port_id2[:11]: port_id2},
+                             found)
+            self.assertEqual(1, get_locked_ports.call_count)
+            self.assertEqual(
+                port_id1,
+                precommit.call_args[0][0]._binding.port_id)
+            # port2 is already DOWN
+            self.assertEqual(1, precommit.call_count)
+            self.assertEqual(1, len(postcommit.call_args[0][0]))
+            self.assertEqual(constants.PORT_STATUS_ACTIVE,
+                             plugin.get_port(ctx, port_id1)['status'])
+            self.assertEqual(constants.PORT_STATUS_DOWN,
+                             plugin.get_port(ctx, port_id2)['status'])
+
+    def test_ports_bound_to_host(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        host_arg = {portbindings.HOST_ID: 'host1'}
+        with self.subnet() as subnet, contextlib.nested(
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg),
+                self.port(subnet=subnet)) as (port1, port2):
+            port_id1 = port1['port']['id'][:11]
+            port_id2 = port2['port']['id']
+            self.assertEqual(set([port_id1]), plugin.ports_bound_to_host(
+                ctx, [port_id1, port_id2, 'unknown'], 'host1'))
+            self.assertEqual(set(), plugin.ports_bound_to_host(
+                ctx, [port_id1, port_id2], 'host2'))
+
     def test_update_non_existent_port(self):
         ctx = context.get_admin_context()
         plugin = manager.NeutronManager.get_plugin()
@@ -215,6 +357,43 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             # by the called method
             self.assertIsNone(l3plugin.disassociate_floatingips(ctx, port_id))
 
+    def test_create_ports_bulk_postcommit_failure(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(plugin.mechanism_manager,
+                              'create_port_postcommit',
+                              side_effect=[None,
+                                           ml2_exc.MechanismDriverError(
+                                               method='create_port_postcommit')
+                                           ])
+        ) as (net, postcommit):
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPServerError.code)
+
+    def test_create_ports_bulk_single_transaction(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(plugin.notifier,
+                              'security_groups_member_updated'),
+            mock.patch.object(plugin.notifier,
+                              'security_groups_provider_updated')
+        ) as (net, member_updated, provider_updated):
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True, context=ctx)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(2, len(set(port['mac_address']
+                                        for port in ports)))
+            self.assertEqual(1, member_updated.call_count)
+            self.assertFalse(provider_updated.called)
+            for port in ports:
+                self._delete('ports', port['id'])
+
 
 class TestMl2DvrPortsV2(TestMl2PortsV2):
     def setUp(self):
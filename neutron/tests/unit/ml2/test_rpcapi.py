@@ -18,8 +18,10 @@ Unit Tests for ml2 rpc
 """
 
 import collections
+import contextlib
 
 import mock
+from oslo import messaging
 from sqlalchemy.orm import exc
 
 from neutron.agent import rpc as agent_rpc
@@ -112,25 +114,42 @@ class RpcCallbacksTestCase(base.BaseTestCase):
                 self.assertEqual(status == new_status,
                                  not self.plugin.update_port_status.called)
 
+    def _port_context(self, admin_state_up, status):
+        port_context = mock.MagicMock()
+        port_context.current = collections.defaultdict(lambda: 'fake')
+        port_context.current['admin_state_up'] = admin_state_up
+        port_context.current['status'] = status
+        return port_context
+
     def test_get_devices_details_list(self):
-        devices = [1, 2, 3, 4, 5]
-        kwargs = {'host': 'fake_host', 'agent_id': 'fake_agent_id'}
-        with mock.patch.object(self.callbacks, 'get_device_details',
-                               side_effect=devices) as f:
-            res = self.callbacks.get_devices_details_list('fake_context',
-                                                          devices=devices,
-                                                          **kwargs)
-            self.assertEqual(devices, res)
-            self.assertEqual(len(devices), f.call_count)
-            calls = [mock.call('fake_context', device=i, **kwargs)
-                     for i in devices]
-            f.assert_has_calls(calls)
+        devices = ['dev1', 'dev2', 'dev3', 'dev4']
+        self.plugin._device_to_port_id.side_effect = lambda d: 'p' + d
+        self.plugin.get_bound_ports_contexts.return_value = {
+            'pdev1': self._port_context(True, constants.PORT_STATUS_DOWN),
+            'pdev2': self._port_context(False, constants.PORT_STATUS_DOWN),
+            'pdev3': self._port_context(False, constants.PORT_STATUS_ACTIVE),
+            'pdev4': None}
+        res = self.callbacks.get_devices_details_list(
+            'fake_context', devices=devices, host='fake_host',
+            agent_id='fake_agent_id')
+        self.assertEqual(devices, [entry['device'] for entry in res])
+        self.assertEqual(['pdev1', 'pdev2', 'pdev3'],
+                         [entry['port_id'] for entry in res[:3]])
+        self.assertEqual({'device': 'dev4'}, res[3])
+        self.plugin.get_bound_ports_contexts.assert_called_once_with(
+            'fake_context', ['pdev1', 'pdev2', 'pdev3', 'pdev4'],
+            'fake_host')
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', {'pdev1': constants.PORT_STATUS_BUILD,
+                             'pdev3': constants.PORT_STATUS_DOWN},
+            'fake_host')
+        self.assertFalse(self.plugin.get_bound_port_context.called)
+        self.assertFalse(self.plugin.update_port_status.called)
 
     def test_get_devices_details_list_with_empty_devices(self):
-        with mock.patch.object(self.callbacks, 'get_device_details') as f:
-            res = self.callbacks.get_devices_details_list('fake_context')
-            self.assertFalse(f.called)
-            self.assertEqual([], res)
+        res = self.callbacks.get_devices_details_list('fake_context')
+        self.assertFalse(self.plugin.get_bound_ports_contexts.called)
+        self.assertEqual([], res)
 
     def _test_update_device_not_bound_to_host(self, func):
         self.plugin.port_bound_to_host.return_value = False
@@ -169,6 +188,62 @@ class RpcCallbacksTestCase(base.BaseTestCase):
                          self.callbacks.update_device_down(
                              'fake_context', device='fake_device'))
 
+    def _test_update_devices(self, func, **kwargs):
+        self.plugin._device_to_port_id.side_effect = lambda d: d + '_port'
+        self.plugin.ports_bound_to_host.return_value = set(['dev1_port',
+                                                            'dev2_port'])
+        res = func('fake_context', devices=['dev1', 'dev2', 'dev3'],
+                   agent_id='fake_agent', host='fake_host', **kwargs)
+        self.plugin.ports_bound_to_host.assert_called_once_with(
+            'fake_context', mock.ANY, 'fake_host')
+        return res
+
+    def test_update_devices_down(self):
+        self.plugin.update_port_statuses.return_value = {
+            'dev1_port': 'dev1_port_full_id'}
+        res = self._test_update_devices(self.callbacks.update_devices_down)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', {'dev1_port': constants.PORT_STATUS_DOWN,
+                             'dev2_port': constants.PORT_STATUS_DOWN},
+            'fake_host')
+        self.assertEqual([{'device': 'dev1', 'exists': True},
+                          {'device': 'dev2', 'exists': False},
+                          {'device': 'dev3', 'exists': True}], res)
+
+    def test_update_devices_down_falls_back_on_stale_data(self):
+        self.plugin.update_port_statuses.side_effect = exc.StaleDataError
+        with mock.patch.object(self.callbacks, 'update_device_down',
+                               return_value='details') as update_device_down:
+            res = self._test_update_devices(
+                self.callbacks.update_devices_down)
+        self.assertEqual(['details'] * 3, res)
+        self.assertEqual(3, update_device_down.call_count)
+
+    def test_update_devices_down_with_empty_devices(self):
+        self.assertEqual([], self.callbacks.update_devices_down(
+            'fake_context'))
+        self.assertFalse(self.plugin.update_port_statuses.called)
+
+    def _test_update_devices_up(self, extensions):
+        type(self.l3plugin).supported_extension_aliases = (
+            mock.PropertyMock(return_value=extensions))
+        self.plugin.update_port_statuses.return_value = {
+            'dev1_port': 'dev1_port_full_id'}
+        self._test_update_devices(self.callbacks.update_devices_up)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', {'dev1_port': constants.PORT_STATUS_ACTIVE,
+                             'dev2_port': constants.PORT_STATUS_ACTIVE},
+            'fake_host')
+
+    def test_update_devices_up_without_dvr(self):
+        self._test_update_devices_up(['router'])
+        self.assertFalse(self.l3plugin.dvr_vmarp_tables_update.called)
+
+    def test_update_devices_up_with_dvr(self):
+        self._test_update_devices_up(['router', 'dvr'])
+        self.l3plugin.dvr_vmarp_tables_update.assert_called_once_with(
+            'fake_context', ['dev1_port_full_id'], 'add')
+
 
 class RpcApiTestCase(base.BaseTestCase):
 
@@ -264,3 +339,38 @@ class RpcApiTestCase(base.BaseTestCase):
                            device='fake_device',
                            agent_id='fake_agent_id',
                            host='fake_host')
+
+    def test_update_devices_down(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_devices_down', rpc_method='call',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id', host='fake_host',
+                           version='1.4')
+
+    def test_update_devices_up(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_devices_up', rpc_method='call',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id', host='fake_host',
+                           version='1.4')
+
+    def test_update_devices_down_unsupported_version(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        with contextlib.nested(
+            mock.patch.object(n_rpc.RpcProxy, 'call',
+                              side_effect=messaging.UnsupportedVersion('1.4')),
+            mock.patch.object(rpcapi, 'update_device_down',
+                              return_value='details')
+        ) as (rpc_call, update_device_down):
+            res = rpcapi.update_devices_down('fake_context',
+                                             ['fake_device1',
+                                              'fake_device2'],
+                                             'fake_agent_id', 'fake_host')
+        self.assertEqual(['details', 'details'], res)
+        update_device_down.assert_has_calls([
+            mock.call('fake_context', 'fake_device1', 'fake_agent_id',
+                      'fake_host'),
+            mock.call('fake_context', 'fake_device2', 'fake_agent_id',
+                      'fake_host')])
@@ -313,8 +313,8 @@ class TestOFANeutronAgent(ofa_test_base.OFAAgentTestBase):
                               return_value=details),
             mock.patch.object(self.agent, '_get_ports',
                               return_value=all_ports),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, _get_ports, upd_dev_up, upd_dev_down, func):
             self.assertFalse(self.agent.treat_devices_added_or_updated([port]))
@@ -366,8 +366,8 @@ class TestOFANeutronAgent(ofa_test_base.OFAAgentTestBase):
                               return_value=fake_details_dict),
             mock.patch.object(self.agent, '_get_ports',
                               return_value=[_mock_port(True, 'xxx')]),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, _get_ports, upd_dev_up,
               upd_dev_down, treat_vif_port):
@@ -378,13 +378,13 @@ class TestOFANeutronAgent(ofa_test_base.OFAAgentTestBase):
         _get_ports.assert_called_once_with(self.agent.int_br)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        details = [dict(device='dev1', exists=port_exists)]
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                return_value=details):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
@@ -20,6 +20,7 @@ import netaddr
 from oslo.config import cfg
 import testtools
 
+from neutron.agent import l2population_rpc
 from neutron.agent.linux import async_process
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
@@ -369,7 +370,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br, 'delete_flows'),
             mock.patch.object(self.agent.dvr_agent.tun_br,
@@ -424,7 +425,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -481,7 +482,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -602,6 +603,88 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                       updated_ports)
         self.assertEqual(expected, actual)
 
+    def _device(self, name, ofport, iface_id):
+        return {'name': name, 'ofport': ofport,
+                'external_ids': {'iface-id': iface_id,
+                                 'attached-mac': 'fa:16:3e:00:00:01'}}
+
+    def mock_process_ports_events(self, events, registered_ports,
+                                  updated_ports=None, port_names=None):
+        with contextlib.nested(
+            mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                              return_value=port_names or []),
+            mock.patch.object(self.agent, 'check_changed_vlans',
+                              return_value=set())
+        ):
+            return self.agent.process_ports_events(
+                events, registered_ports, updated_ports)
+
+    def test_process_ports_events_returns_current_for_no_events(self):
+        events = {'added': [], 'removed': []}
+        actual = self.mock_process_ports_events(events, set([1, 2]))
+        self.assertEqual({'current': set([1, 2])}, actual)
+
+    def test_process_ports_events_returns_port_changes(self):
+        events = {'added': [self._device('tap3', 3, 3)],
+                  'removed': [self._device('tap2', 2, 2)]}
+        expected = dict(current=set([1, 3]), added=set([3]),
+                        removed=set([2]))
+        actual = self.mock_process_ports_events(
+            events, set([1, 2]), port_names=['tap1', 'tap3'])
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_ignores_ports_not_ready(self):
+        events = {'added': [self._device('tap3', [], 3),
+                            self._device('tap4', -1, 4)],
+                  'removed': []}
+        actual = self.mock_process_ports_events(
+            events, set([1]), port_names=['tap1', 'tap3', 'tap4'])
+        self.assertEqual({'current': set([1])}, actual)
+
+    def test_process_ports_events_ignores_ports_on_other_bridges(self):
+        events = {'added': [self._device('tap3', 3, 3)], 'removed': []}
+        actual = self.mock_process_ports_events(
+            events, set([1]), port_names=['tap1'])
+        self.assertEqual({'current': set([1])}, actual)
+
+    def test_process_ports_events_ignores_non_vif_ports(self):
+        device = {'name': 'patch-tun', 'ofport': 3, 'external_ids': {}}
+        events = {'added': [device], 'removed': [device]}
+        actual = self.mock_process_ports_events(
+            events, set([1]), port_names=['tap1', 'patch-tun'])
+        self.assertEqual({'current': set([1])}, actual)
+
+    def test_process_ports_events_updates_replugged_port(self):
+        events = {'added': [self._device('tap1', 5, 1)],
+                  'removed': [self._device('tap1', 1, 1)]}
+        expected = dict(current=set([1, 2]), updated=set([1]))
+        actual = self.mock_process_ports_events(
+            events, set([1, 2]), port_names=['tap1', 'tap2'])
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_ignores_unknown_updated_ports(self):
+        events = {'added': [], 'removed': [self._device('tap2', 2, 2)]}
+        expected = dict(current=set([1]), added=set(), removed=set([2]),
+                        updated=set([1]))
+        actual = self.mock_process_ports_events(
+            events, set([1, 2]), updated_ports=set([1, 2, 5]))
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_checks_vlans_of_event_ports(self):
+        events = {'added': [self._device('tap3', 3, 3)],
+                  'removed': [self._device('tap2', 2, 2)]}
+        with contextlib.nested(
+            mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                              return_value=['tap1', 'tap3']),
+            mock.patch.object(self.agent, 'check_changed_vlans',
+                              return_value=set())
+        ) as (get_port_name_list, check_changed_vlans):
+            self.agent.process_ports_events(
+                {'added': [], 'removed': []}, set([1, 2]))
+            self.assertFalse(check_changed_vlans.called)
+            self.agent.process_ports_events(events, set([1, 2]))
+            check_changed_vlans.assert_called_once_with(set([2]))
+
     def test_update_ports_returns_changed_vlan(self):
         br = ovs_lib.OVSBridge('br-int', 'sudo')
         mac = "ca:fe:de:ad:be:ef"
@@ -646,8 +729,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, upd_dev_up, upd_dev_down, func):
             skip_devs = self.agent.treat_devices_added_or_updated([{}], False)
@@ -681,6 +764,49 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         self.assertTrue(self._mock_treat_devices_added_updated(
             details, mock.Mock(), 'treat_vif_port'))
 
+    def test_treat_devices_added_updated_applies_flows_before_up(self):
+        details = {'device': 'dev1', 'port_id': 'dev1', 'network_id': 'net',
+                   'network_type': 'vlan', 'physical_network': 'physnet',
+                   'segmentation_id': 1, 'admin_state_up': True,
+                   'fixed_ips': [], 'device_owner': 'compute:None'}
+        parent = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.Mock()),
+            mock.patch.object(self.agent, 'treat_vif_port'),
+            mock.patch.object(self.agent, 'apply_deferred_flows'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up')
+        ) as (get_dev_fn, get_vif_func, treat_vif_port, apply_flows,
+              upd_dev_up):
+            parent.attach_mock(treat_vif_port, 'treat_vif_port')
+            parent.attach_mock(apply_flows, 'apply_deferred_flows')
+            parent.attach_mock(upd_dev_up, 'update_devices_up')
+            self.agent.treat_devices_added_or_updated(['dev1'], False)
+        self.assertEqual(['treat_vif_port', 'apply_deferred_flows',
+                          'update_devices_up'],
+                         [name for name, _args, _kwargs in parent.mock_calls])
+
+    def test_defer_apply_flows_on_all_bridges(self):
+        int_br = mock.Mock()
+        phys_br = mock.Mock()
+        tun_br = mock.Mock()
+        self.agent.use_ofctl_bundle = True
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'int_br', new=int_br),
+            mock.patch.object(self.agent, 'tun_br', new=tun_br),
+            mock.patch.dict(self.agent.phys_brs, {'physnet': phys_br})
+        ):
+            self.agent.defer_apply_flows_on()
+            self.agent.apply_deferred_flows()
+            self.agent.defer_apply_flows_off()
+        for br in (int_br, phys_br, tun_br):
+            br.assert_has_calls([mock.call.defer_apply_on(use_bundle=True),
+                                 mock.call.apply_deferred_flows(),
+                                 mock.call.defer_apply_off()])
+
     def test_treat_devices_added_updated_skips_if_port_not_found(self):
         dev_mock = mock.MagicMock()
         dev_mock.__getitem__.return_value = 'the_skipped_one'
@@ -690,8 +816,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[dev_mock]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=None),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, get_vif_func, upd_dev_up,
               upd_dev_down, treat_vif_port):
@@ -722,8 +848,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[fake_details_dict]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=mock.MagicMock()),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, get_vif_func, upd_dev_up,
               upd_dev_down, treat_vif_port):
@@ -731,20 +857,43 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             # The function should return False for resync
             self.assertFalse(skip_devs)
             self.assertTrue(treat_vif_port.called)
-            self.assertTrue(upd_dev_down.called)
+            self.assertFalse(upd_dev_up.called)
+            upd_dev_down.assert_called_once_with(
+                self.agent.context, ['xxx'], self.agent.agent_id, mock.ANY)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
+    def test_treat_devices_removed_rpc_failure_unbinds_ports(self):
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                              side_effect=Exception()),
+            mock.patch.object(self.agent, 'port_unbound')
+        ) as (upd_dev_down, port_unbound):
+            self.assertTrue(
+                self.agent.treat_devices_removed(['dev1', 'dev2']))
+        port_unbound.assert_has_calls([mock.call('dev1'), mock.call('dev2')])
+
+    def test_treat_devices_removed_no_devices(self):
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'update_devices_down') as upd_dev_down:
+            self.assertFalse(self.agent.treat_devices_removed([]))
+        self.assertFalse(upd_dev_down.called)
+
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = [dict(device='dev1', exists=port_exists),
+                   dict(device='dev2', exists=port_exists)]
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=details) as upd_dev_down:
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
-        self.assertTrue(port_unbound.called)
+                self.assertFalse(
+                    self.agent.treat_devices_removed(['dev1', 'dev2']))
+        upd_dev_down.assert_called_once_with(
+            self.agent.context, ['dev1', 'dev2'], self.agent.agent_id,
+            mock.ANY)
+        port_unbound.assert_has_calls([mock.call('dev1'), mock.call('dev2')])
 
     def test_treat_devices_removed_unbinds_port(self):
         self._mock_treat_devices_removed(True)
@@ -1203,6 +1352,15 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             self.agent.reclaim_local_vlan('net2')
             del_port_fn.assert_called_once_with('gre-02020202')
 
+    def test_recl_lv_forgets_fdb_entries(self):
+        self._prepare_l2_pop_ofports()
+        self.agent.l2_pop = True
+        self.agent.fdb_cache = l2population_rpc.FdbCache()
+        self.agent.fdb_cache.add({'net1': {'generation': 3, 'ports': {}}})
+        with mock.patch.object(self.agent.tun_br, 'delete_flows'):
+            self.agent.reclaim_local_vlan('net1')
+        self.assertEqual({}, self.agent.fdb_cache.generations)
+
     def test_dvr_mac_address_update(self):
         self._setup_for_dvr_test()
         with contextlib.nested(
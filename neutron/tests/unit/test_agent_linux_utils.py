@@ -88,6 +88,38 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                                addl_env={'foo': 'bar'})
         self.assertEqual(result, expected)
 
+    def test_with_helper_daemon(self):
+        self.config(root_helper_daemon='sudo daemon', group='AGENT')
+        with mock.patch.object(utils.RootwrapDaemonHelper,
+                               'get_client') as get_client:
+            get_client.return_value.execute.return_value = (0, 'out', 'err')
+            result = utils.execute(['ls', self.test_file],
+                                   self.root_helper,
+                                   process_input='in',
+                                   addl_env={'foo': 'bar'})
+        self.assertEqual('out', result)
+        get_client.return_value.execute.assert_called_once_with(
+            ['ls', self.test_file], {'foo': 'bar'}, 'in')
+        self.assertFalse(self.mock_popen.called)
+
+    def test_with_helper_daemon_raises_runtime(self):
+        self.config(root_helper_daemon='sudo daemon', group='AGENT')
+        with mock.patch.object(utils.RootwrapDaemonHelper,
+                               'get_client') as get_client:
+            get_client.return_value.execute.return_value = (1, '', 'err')
+            self.assertRaises(RuntimeError, utils.execute, ['ls'],
+                              self.root_helper)
+
+    def test_without_helper_ignores_daemon(self):
+        self.config(root_helper_daemon='sudo daemon', group='AGENT')
+        expected = "%s\n" % self.test_file
+        self.mock_popen.return_value = [expected, ""]
+        with mock.patch.object(utils.RootwrapDaemonHelper,
+                               'get_client') as get_client:
+            result = utils.execute(["ls", self.test_file])
+        self.assertEqual(result, expected)
+        self.assertFalse(get_client.called)
+
     def test_return_code_log_error_raise_runtime(self):
         with mock.patch.object(utils, 'create_process') as create_process:
             create_process.return_value = FakeCreateProcess(1), 'ls'
@@ -119,6 +151,41 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                 self.assertTrue(log.debug.called)
 
 
+class AgentUtilsMaxConcurrentCommandsTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsMaxConcurrentCommandsTest, self).setUp()
+        self.addCleanup(utils.set_max_concurrent_commands, 0)
+
+    def test_no_limit_by_default(self):
+        self.assertIsNone(utils._command_semaphore)
+
+    def test_execute_waits_for_a_slot(self):
+        utils.set_max_concurrent_commands(1)
+        running = []
+
+        def create_process(cmd, root_helper=None, addl_env=None):
+            running.append(utils._command_semaphore.balance)
+            return FakeCreateProcess(0), cmd
+
+        with mock.patch.object(utils, 'create_process',
+                               side_effect=create_process):
+            utils.execute(['ls'])
+        self.assertEqual([0], running)
+        self.assertEqual(1, utils._command_semaphore.balance)
+
+    def test_execute_releases_slot_on_error(self):
+        utils.set_max_concurrent_commands(2)
+        with mock.patch.object(utils, 'create_process',
+                               return_value=(FakeCreateProcess(1), 'ls')):
+            self.assertRaises(RuntimeError, utils.execute, ['ls'])
+        self.assertEqual(2, utils._command_semaphore.balance)
+
+    def test_disable_limit(self):
+        utils.set_max_concurrent_commands(2)
+        utils.set_max_concurrent_commands(0)
+        self.assertIsNone(utils._command_semaphore)
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
@@ -19,6 +19,7 @@ import itertools
 
 import mock
 from oslo.config import cfg
+import sqlalchemy
 from testtools import matchers
 import webob.exc
 
@@ -34,6 +35,7 @@ from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
 from neutron.db import db_base_plugin_v2
+from neutron.db import ipam_bitmap_db
 from neutron.db import models_v2
 from neutron import manager
 from neutron.openstack.common import importutils
@@ -4088,6 +4090,40 @@ class TestNeutronDbPluginV2(base.BaseTestCase):
         self.assertEqual(2, generate.call_count)
         rebuild.assert_called_once_with('c', 's')
 
+    def test_try_generate_ip_from_blocks_first(self):
+        context = mock.Mock()
+        range_qry = context.session.query.return_value.join.return_value
+        subnet = {'id': 's', 'cidr': '10.0.0.0/24', 'network_id': 'n'}
+        with contextlib.nested(
+            mock.patch.object(ipam_bitmap_db, 'is_enabled',
+                              return_value=True),
+            mock.patch.object(ipam_bitmap_db, 'generate_ip',
+                              return_value='10.0.0.5')
+        ) as (is_enabled, generate_ip):
+            ip = db_base_plugin_v2.NeutronDbPluginV2._try_generate_ip(
+                context, [subnet])
+        self.assertEqual({'ip_address': '10.0.0.5', 'subnet_id': 's'}, ip)
+        generate_ip.assert_called_once_with(context, 's')
+        self.assertFalse(range_qry.with_lockmode.return_value.filter_by.called)
+
+    def test_try_generate_ip_from_ranges_first(self):
+        context = mock.Mock()
+        range_qry = context.session.query.return_value.join.return_value
+        locked_qry = range_qry.with_lockmode.return_value
+        ip_range = {'first_ip': '10.0.0.5', 'last_ip': '10.0.0.9'}
+        locked_qry.filter_by.return_value.first.return_value = ip_range
+        subnet = {'id': 's', 'cidr': '10.0.0.0/24', 'network_id': 'n'}
+        with contextlib.nested(
+            mock.patch.object(ipam_bitmap_db, 'is_enabled',
+                              return_value=False),
+            mock.patch.object(ipam_bitmap_db, 'generate_ip')
+        ) as (is_enabled, generate_ip):
+            ip = db_base_plugin_v2.NeutronDbPluginV2._try_generate_ip(
+                context, [subnet])
+        self.assertEqual({'ip_address': '10.0.0.5', 'subnet_id': 's'}, ip)
+        self.assertEqual('10.0.0.6', ip_range['first_ip'])
+        self.assertFalse(generate_ip.called)
+
     def _validate_rebuild_availability_ranges(self, pools, allocations,
                                               expected):
         ip_qry = mock.Mock()
@@ -4248,6 +4284,123 @@ class NeutronDbPluginV2AsMixinTestCase(testlib_api.SqlTestCase):
         net = self.plugin.create_network(self.context, self.net_data)
         self.assertEqual(net['status'], 'BUILD')
 
+    def _create_subnet_for_ports(self, cidr):
+        self.plugin.create_network(self.context, self.net_data)
+        return self.plugin.create_subnet(self.context, {'subnet': {
+            'name': '', 'network_id': 'fake-id', 'tenant_id': 'test-tenant',
+            'cidr': cidr, 'ip_version': 4, 'enable_dhcp': True,
+            'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+            'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+            'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+            'host_routes': attributes.ATTR_NOT_SPECIFIED,
+            'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+            'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED}})
+
+    def _port_data(self, **kwargs):
+        port = {'name': '', 'network_id': 'fake-id',
+                'tenant_id': 'test-tenant', 'admin_state_up': True,
+                'device_id': '', 'device_owner': '',
+                'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                'fixed_ips': attributes.ATTR_NOT_SPECIFIED}
+        port.update(kwargs)
+        return {'port': port}
+
+    def test_create_port_bulk_db(self):
+        subnet = self._create_subnet_for_ports('10.0.0.0/24')
+        fixed_ips = [{'subnet_id': subnet['id'], 'ip_address': '10.0.0.10'}]
+        ports = {'ports': [self._port_data(),
+                           self._port_data(fixed_ips=fixed_ips),
+                           self._port_data(mac_address='fa:16:3e:00:00:01')]}
+        result = self.plugin._create_port_bulk_db(self.context, ports)
+
+        self.assertEqual([['10.0.0.2'], ['10.0.0.10'], ['10.0.0.3']],
+                         [[ip['ip_address'] for ip in port['fixed_ips']]
+                          for port in result])
+        self.assertEqual('fa:16:3e:00:00:01', result[2]['mac_address'])
+        self.assertEqual(3, len(set(port['mac_address'] for port in result)))
+        self.assertEqual(sorted(port['id'] for port in result),
+                         sorted(port['id'] for port in
+                                self.plugin.get_ports(self.context)))
+
+    def test_create_port_bulk_db_requests_first_free_ip(self):
+        subnet = self._create_subnet_for_ports('10.0.0.0/24')
+        fixed_ips = [{'subnet_id': subnet['id'], 'ip_address': '10.0.0.2'}]
+        ports = {'ports': [self._port_data(),
+                           self._port_data(fixed_ips=fixed_ips),
+                           self._port_data()]}
+        result = self.plugin._create_port_bulk_db(self.context, ports)
+
+        self.assertEqual([['10.0.0.3'], ['10.0.0.2'], ['10.0.0.4']],
+                         [[ip['ip_address'] for ip in port['fixed_ips']]
+                          for port in result])
+
+    def test_create_port_bulk_db_without_generated_ips(self):
+        subnet = self._create_subnet_for_ports('10.0.0.0/24')
+        fixed_ips = [{'subnet_id': subnet['id'], 'ip_address': '10.0.0.10'}]
+        ports = {'ports': [self._port_data(fixed_ips=fixed_ips)]}
+        with mock.patch.object(self.plugin, '_generate_ips') as generate:
+            result = self.plugin._create_port_bulk_db(self.context, ports)
+        self.assertFalse(generate.called)
+        self.assertEqual('10.0.0.10', result[0]['fixed_ips'][0]['ip_address'])
+
+    def _create_ports_bulk_db(self, count):
+        # Each call gets its own session, as each API request does
+        return self.plugin._create_port_bulk_db(
+            context.get_admin_context(),
+            {'ports': [self._port_data() for i in range(count)]})
+
+    def _get_port_addresses(self, ports):
+        return [port['fixed_ips'][0]['ip_address'] for port in ports]
+
+    def test_create_port_bulk_db_rebuilds_availability(self):
+        self._create_subnet_for_ports('10.0.0.0/29')
+        port_ids = [port['id'] for port in self._create_ports_bulk_db(5)]
+        self.plugin.delete_port(context.get_admin_context(), port_ids[1])
+        result = self._create_ports_bulk_db(1)
+        self.assertEqual(['10.0.0.3'], self._get_port_addresses(result))
+        self.assertRaises(n_exc.IpAddressGenerationFailure,
+                          self._create_ports_bulk_db, 1)
+
+    def test_create_port_bulk_db_after_partial_rebuild(self):
+        # The pool is 10.0.0.2-10.0.0.30, the bulk takes the end of the
+        # availability range then rebuilds it to take the deleted addresses
+        self._create_subnet_for_ports('10.0.0.0/27')
+        port_ids = [port['id'] for port in self._create_ports_bulk_db(20)]
+        for port_id in port_ids[:10]:
+            self.plugin.delete_port(context.get_admin_context(), port_id)
+        result = self._create_ports_bulk_db(12)
+        self.assertEqual(
+            ['10.0.0.%d' % i for i in range(22, 31) + range(2, 5)],
+            self._get_port_addresses(result))
+        result = self._create_ports_bulk_db(7)
+        self.assertEqual(['10.0.0.%d' % i for i in range(5, 12)],
+                         self._get_port_addresses(result))
+        self.assertRaises(n_exc.IpAddressGenerationFailure,
+                          self._create_ports_bulk_db, 1)
+
+    def test_create_port_bulk_db_mac_in_use(self):
+        self._create_subnet_for_ports('10.0.0.0/24')
+        ports = {'ports': [self._port_data(mac_address='fa:16:3e:00:00:01'),
+                           self._port_data(mac_address='fa:16:3e:00:00:01')]}
+        self.assertRaises(n_exc.MacAddressInUse,
+                          self.plugin._create_port_bulk_db, self.context,
+                          ports)
+        self.assertEqual([], self.plugin.get_ports(self.context))
+
+    def test_generate_macs_retries(self):
+        self._create_subnet_for_ports('10.0.0.0/24')
+        self.plugin._create_port_bulk_db(self.context, {'ports': [
+            self._port_data(mac_address='fa:16:3e:00:00:01')]})
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_make_random_mac',
+                               side_effect=['fa:16:3e:00:00:01',
+                                            'fa:16:3e:00:00:02',
+                                            'fa:16:3e:00:00:03']):
+            macs = db_base_plugin_v2.NeutronDbPluginV2._generate_macs(
+                self.context, 'fake-id', 2)
+        self.assertEqual(['fa:16:3e:00:00:02', 'fa:16:3e:00:00:03'],
+                         sorted(macs))
+
 
 class TestBasicGetXML(TestBasicGet):
     fmt = 'xml'
@@ -4267,3 +4420,117 @@ class TestSubnetsV2XML(TestSubnetsV2):
 
 class TestV2HTTPResponseXML(TestV2HTTPResponse):
     fmt = 'xml'
+
+
+class StreamingTestMixin(object):
+
+    def setUp(self):
+        cfg.CONF.set_override('list_streaming_chunk_size', 2)
+        super(StreamingTestMixin, self).setUp()
+
+
+class TestPortsV2Streaming(StreamingTestMixin, TestPortsV2):
+
+    def test_list_ports_is_streamed(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(self.port(), self.port(), self.port()) as ports:
+            with mock.patch.object(plugin, '_make_port_dict',
+                                   wraps=plugin._make_port_dict) as make_port:
+                req = self.new_list_request('ports', self.fmt)
+                res = req.get_response(self.api)
+                self.assertIsNone(res.content_length)
+                # Nothing but the first chunk is converted until the body
+                # is read
+                self.assertEqual(2, make_port.call_count)
+                body = self.deserialize(self.fmt, res)
+            self.assertEqual(sorted(p['port']['id'] for p in ports),
+                             sorted(p['id'] for p in body['ports']))
+
+    def test_list_ports_with_sort_is_not_streamed(self):
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               'iter_ports') as iter_ports:
+            self.test_list_ports_with_sort_native()
+        self.assertFalse(iter_ports.called)
+
+
+class TestSubnetsV2Streaming(StreamingTestMixin, TestSubnetsV2):
+    pass
+
+
+class TestPortsV2StreamingXML(StreamingTestMixin, TestPortsV2XML):
+
+    def test_list_ports_xml_is_not_streamed(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with contextlib.nested(self.port(), self.port(), self.port()) as ports:
+            req = self.new_list_request('ports', self.fmt)
+            res = req.get_response(self.api)
+            self.assertIsNotNone(res.content_length)
+            body = self.deserialize(self.fmt, res)
+            self.assertEqual(sorted(p['port']['id'] for p in ports),
+                             sorted(p['id'] for p in body['ports']))
+
+
+class TestFieldsProjection(NeutronDbPluginV2TestCase):
+
+    def _get_port_db(self, fields):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with mock.patch.object(plugin, '_make_port_dict',
+                               wraps=plugin._make_port_dict) as make_port:
+            ports = plugin.get_ports(ctx, fields=fields)
+        return ports, make_port.call_args[0][0]
+
+    def test_get_ports_does_not_join_unrequested_relationships(self):
+        with self.port():
+            ports, port_db = self._get_port_db(['id'])
+            self.assertEqual(['id'], ports[0].keys())
+            self.assertIn('fixed_ips', sqlalchemy.inspect(port_db).unloaded)
+
+    def test_get_ports_joins_requested_relationships(self):
+        with self.port() as port:
+            ports, port_db = self._get_port_db(['id', 'fixed_ips'])
+            self.assertEqual(port['port']['fixed_ips'], ports[0]['fixed_ips'])
+            self.assertNotIn('fixed_ips',
+                             sqlalchemy.inspect(port_db).unloaded)
+
+    def test_get_subnets_does_not_join_unrequested_relationships(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with mock.patch.object(plugin, '_make_subnet_dict',
+                                   wraps=plugin._make_subnet_dict) as make:
+                subnets = plugin.get_subnets(ctx, fields=['id',
+                                                          'allocation_pools'])
+            self.assertEqual(subnet['subnet']['allocation_pools'],
+                             subnets[0]['allocation_pools'])
+            subnet_db = make.call_args[0][0]
+            self.assertNotIn('allocation_pools',
+                             sqlalchemy.inspect(subnet_db).unloaded)
+            self.assertIn(
+                'available_ranges',
+                sqlalchemy.inspect(subnet_db.allocation_pools[0]).unloaded)
+
+    def test_dict_extend_functions_of_unrequested_fields_are_skipped(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        extend_ports = mock.Mock()
+        extend_other = mock.Mock()
+        with contextlib.nested(
+            mock.patch.dict(plugin._dict_extend_functions,
+                            {attributes.PORTS: ['_extend_ports',
+                                                '_extend_other']}),
+            mock.patch.dict(plugin._dict_extend_fields,
+                            {attributes.PORTS: {
+                                '_extend_ports': frozenset(['extended'])}}),
+            mock.patch.object(plugin, '_extend_ports', create=True,
+                              new=extend_ports),
+            mock.patch.object(plugin, '_extend_other', create=True,
+                              new=extend_other),
+            self.port()
+        ):
+            plugin.get_ports(ctx, fields=['id'])
+            self.assertFalse(extend_ports.called)
+            self.assertTrue(extend_other.called)
+            plugin.get_ports(ctx, fields=['id', 'extended'])
+            self.assertTrue(extend_ports.called)
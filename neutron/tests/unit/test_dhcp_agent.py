@@ -367,6 +367,53 @@ class TestDhcpAgent(base.BaseTestCase):
                     self.assertTrue(log.called)
                     self.assertTrue(schedule_resync.called)
 
+    def _make_network_without_port(self, network_id, subnets=None):
+        return dhcp.NetModel(True, dict(id=network_id,
+                                        tenant_id=fake_tenant_id,
+                                        admin_state_up=True,
+                                        subnets=subnets or [fake_subnet1],
+                                        ports=[]))
+
+    def test_setup_dhcp_ports_batches(self):
+        cfg.CONF.set_override('dhcp_port_batch_size', 1)
+        networks = [self._make_network_without_port('net1'),
+                    self._make_network_without_port('net2'),
+                    fake_down_network]
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.plugin_rpc = mock.Mock()
+        dhcp.plugin_rpc.create_dhcp_ports.side_effect = (
+            lambda ports: [dhcp_agent.dhcp.DictModel(
+                dict(id='port-%s' % port['port']['network_id'],
+                     network_id=port['port']['network_id'],
+                     fixed_ips=[fake_fixed_ip1])) for port in ports])
+        dhcp.setup_dhcp_ports(networks)
+
+        self.assertEqual(2, dhcp.plugin_rpc.create_dhcp_ports.call_count)
+        self.assertFalse(dhcp.plugin_rpc.update_dhcp_ports.called)
+        self.assertEqual(['port-net1'], [p.id for p in networks[0].ports])
+        self.assertEqual(['port-net2'], [p.id for p in networks[1].ports])
+
+    def test_setup_dhcp_ports_skips_networks_without_dhcp_subnet(self):
+        networks = [self._make_network_without_port('net1',
+                                                    subnets=[fake_subnet2])]
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.plugin_rpc = mock.Mock()
+        dhcp.setup_dhcp_ports(networks)
+
+        self.assertFalse(dhcp.plugin_rpc.create_dhcp_ports.called)
+        self.assertFalse(dhcp.plugin_rpc.update_dhcp_ports.called)
+        self.assertEqual([], networks[0].ports)
+
+    def test_setup_dhcp_ports_batch_error(self):
+        network = self._make_network_without_port('net1')
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.plugin_rpc = mock.Mock()
+        dhcp.plugin_rpc.create_dhcp_ports.side_effect = Exception
+        with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
+            dhcp.setup_dhcp_ports([network])
+            self.assertTrue(log.called)
+        self.assertEqual([], network.ports)
+
     def test_periodic_resync(self):
         dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
@@ -526,6 +573,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache_p = mock.patch('neutron.agent.dhcp_agent.NetworkCache')
         cache_cls = self.cache_p.start()
         self.cache = mock.Mock()
+        self.cache.apply_delta.side_effect = lambda network: network
         cache_cls.return_value = self.cache
         self.mock_makedirs_p = mock.patch("os.makedirs")
         self.mock_makedirs = self.mock_makedirs_p.start()
@@ -553,7 +601,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = network
         self.dhcp.enable_dhcp_helper(network.id)
         self.plugin.assert_has_calls(
-            [mock.call.get_network_info(network.id)])
+            [mock.call.get_network_info(network.id, revisions=mock.ANY)])
         self.call_driver.assert_called_once_with('enable', network)
         self.cache.assert_has_calls([mock.call.put(network)])
         if is_isolated_network:
@@ -621,7 +669,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
             self.dhcp, 'enable_isolated_metadata_proxy') as enable_metadata:
             self.dhcp.enable_dhcp_helper(fake_network_ipv6_ipv4.id)
             self.plugin.assert_has_calls(
-                [mock.call.get_network_info(fake_network_ipv6_ipv4.id)])
+                [mock.call.get_network_info(fake_network_ipv6_ipv4.id,
+                                            revisions=mock.ANY)])
             self.call_driver.assert_called_once_with('enable',
                                                      fake_network_ipv6_ipv4)
             self.assertFalse(self.cache.called)
@@ -638,7 +687,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_down_network
         self.dhcp.enable_dhcp_helper(fake_down_network.id)
         self.plugin.assert_has_calls(
-            [mock.call.get_network_info(fake_down_network.id)])
+            [mock.call.get_network_info(fake_down_network.id,
+                                        revisions=mock.ANY)])
         self.assertFalse(self.call_driver.called)
         self.assertFalse(self.cache.called)
         self.assertFalse(self.external_process.called)
@@ -648,7 +698,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         with mock.patch.object(dhcp_agent.LOG, 'warn') as log:
             self.dhcp.enable_dhcp_helper('fake_id')
             self.plugin.assert_has_calls(
-                [mock.call.get_network_info('fake_id')])
+                [mock.call.get_network_info('fake_id', revisions=mock.ANY)])
             self.assertFalse(self.call_driver.called)
             self.assertTrue(log.called)
             self.assertFalse(self.dhcp.schedule_resync.called)
@@ -658,7 +708,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
             self.dhcp.enable_dhcp_helper(fake_network.id)
             self.plugin.assert_has_calls(
-                [mock.call.get_network_info(fake_network.id)])
+                [mock.call.get_network_info(fake_network.id,
+                                            revisions=mock.ANY)])
             self.assertFalse(self.call_driver.called)
             self.assertTrue(log.called)
             self.assertTrue(self.schedule_resync.called)
@@ -670,7 +721,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.return_value = False
         self.dhcp.enable_dhcp_helper(fake_network.id)
         self.plugin.assert_has_calls(
-            [mock.call.get_network_info(fake_network.id)])
+            [mock.call.get_network_info(fake_network.id, revisions=mock.ANY)])
         self.call_driver.assert_called_once_with('enable', fake_network)
         self.assertFalse(self.cache.called)
         self.assertFalse(self.external_process.called)
@@ -904,6 +955,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
             mock.call.get_network_by_subnet_id(
                 'bbbbbbbb-bbbb-bbbb-bbbbbbbbbbbb'),
             mock.call.get_network_by_id('12345678-1234-5678-1234567890ab'),
+            mock.call.get_revisions('12345678-1234-5678-1234567890ab'),
+            mock.call.apply_delta(fake_network),
             mock.call.put(fake_network)])
         self.call_driver.assert_called_once_with('restart',
                                                  fake_network)
@@ -973,7 +1026,8 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self.assertTrue(self.call.called)
         self.make_msg.assert_called_once_with('get_network_info',
                                               network_id='netid',
-                                              host='foo')
+                                              host='foo',
+                                              revisions=None)
 
     def test_get_dhcp_port(self):
         self.call.return_value = dict(a=1)
@@ -992,7 +1046,8 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
     def test_get_active_networks_info(self):
         self.proxy.get_active_networks_info()
         self.make_msg.assert_called_once_with('get_active_networks_info',
-                                              host='foo')
+                                              host='foo',
+                                              revisions=None)
 
     def test_create_dhcp_port(self):
         port_body = (
@@ -1019,6 +1074,26 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                  'device_id': mock.ANY}})
         self.assertIsNone(self.proxy.create_dhcp_port(port_body))
 
+    def test_create_dhcp_ports(self):
+        self.call.return_value = [{'id': 'port1'}, None]
+        ports = [{'port': {'network_id': 'net1'}},
+                 {'port': {'network_id': 'net2'}}]
+        result = self.proxy.create_dhcp_ports(ports)
+        self.make_msg.assert_called_once_with('create_dhcp_ports',
+                                              ports=ports,
+                                              host='foo')
+        self.assertEqual('port1', result[0].id)
+        self.assertIsNone(result[1])
+
+    def test_update_dhcp_ports(self):
+        self.call.return_value = []
+        ports = [{'port_id': fake_port1.id,
+                  'port': {'port': {'network_id': 'net1'}}}]
+        self.proxy.update_dhcp_ports(ports)
+        self.make_msg.assert_called_once_with('update_dhcp_ports',
+                                              ports=ports,
+                                              host='foo')
+
     def test_update_dhcp_port_none(self):
         self.call.return_value = None
         port_body = {'port': {'fixed_ips':
@@ -1162,6 +1237,66 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def _make_delta(self, **kwargs):
+        delta = dict(id=fake_network.id, admin_state_up=True, revision='r1',
+                     subnets=[], ports=[], subnet_revisions={},
+                     port_revisions={}, deleted_subnets=[],
+                     deleted_ports=[])
+        delta.update(kwargs)
+        return dhcp.NetModel(True, delta)
+
+    def test_apply_delta_not_a_delta(self):
+        nc = dhcp_agent.NetworkCache()
+        self.assertIs(fake_network, nc.apply_delta(fake_network))
+
+    def test_apply_delta_new_network(self):
+        nc = dhcp_agent.NetworkCache()
+        network = nc.apply_delta(self._make_delta(
+            subnets=[fake_subnet1], ports=[fake_port1],
+            subnet_revisions={fake_subnet1.id: 's1'},
+            port_revisions={fake_port1.id: 'p1'}))
+        self.assertEqual([fake_subnet1], network.subnets)
+        self.assertEqual([fake_port1], network.ports)
+        self.assertEqual({'revision': 'r1',
+                          'subnets': {fake_subnet1.id: 's1'},
+                          'ports': {fake_port1.id: 'p1'}},
+                         network.revisions)
+        self.assertNotIn('port_revisions', network)
+        self.assertNotIn('deleted_ports', network)
+
+    def test_apply_delta_merges_cached_resources(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(nc.apply_delta(self._make_delta(
+            subnets=[fake_subnet1], ports=[fake_port1],
+            subnet_revisions={fake_subnet1.id: 's1'},
+            port_revisions={fake_port1.id: 'p1'})))
+        self.assertEqual({'revision': 'r1',
+                          'subnets': {fake_subnet1.id: 's1'},
+                          'ports': {fake_port1.id: 'p1'}},
+                         nc.get_revisions(fake_network.id))
+
+        network = nc.apply_delta(self._make_delta(
+            revision='r2', ports=[fake_port2],
+            port_revisions={fake_port2.id: 'p2'},
+            deleted_ports=[fake_port1.id]))
+        self.assertEqual([fake_subnet1], network.subnets)
+        self.assertEqual([fake_port2], network.ports)
+        self.assertEqual({fake_port2.id: 'p2'}, network.revisions['ports'])
+
+    def test_put_port_forgets_revision(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(nc.apply_delta(self._make_delta(
+            ports=[fake_port1], port_revisions={fake_port1.id: 'p1'})))
+        nc.put_port(fake_port1)
+        self.assertEqual({'subnets': {}, 'ports': {}},
+                         nc.get_revisions(fake_network.id))
+
+    def test_get_revisions(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        self.assertEqual({fake_network.id: {}}, nc.get_revisions())
+        self.assertEqual({}, nc.get_revisions('unknown'))
+
 
 class FakePort1:
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
@@ -130,6 +130,47 @@ class TestDhcpRpcCallback(base.BaseTestCase):
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
 
+    def _get_network_delta(self, revisions):
+        self.plugin.get_network.return_value = dict(id='a')
+        self.plugin.get_subnets.return_value = [dict(id='s1', cidr='c1')]
+        self.plugin.get_ports.return_value = [dict(id='p1', mac='m1'),
+                                              dict(id='p2', mac='m2')]
+        return self.callbacks.get_network_info(mock.Mock(), network_id='a',
+                                               revisions=revisions)
+
+    def test_get_network_info_revisions_full(self):
+        retval = self._get_network_delta({})
+        self.assertEqual(['s1'], [s['id'] for s in retval['subnets']])
+        self.assertEqual(['p1', 'p2'], [p['id'] for p in retval['ports']])
+        self.assertEqual(
+            {'p1': dhcp_rpc.get_revision(dict(id='p1', mac='m1')),
+             'p2': dhcp_rpc.get_revision(dict(id='p2', mac='m2'))},
+            retval['port_revisions'])
+        self.assertEqual([], retval['deleted_ports'])
+        self.assertIn('revision', retval)
+
+    def test_get_network_info_revisions_unchanged(self):
+        full = self._get_network_delta({})
+        revisions = {'revision': full['revision'],
+                     'subnets': full['subnet_revisions'],
+                     'ports': full['port_revisions']}
+        retval = self._get_network_delta(revisions)
+        self.assertEqual(full['revision'], retval['revision'])
+        self.assertEqual([], retval['subnets'])
+        self.assertEqual([], retval['ports'])
+        self.assertEqual([], retval['deleted_ports'])
+
+    def test_get_network_info_revisions_delta(self):
+        full = self._get_network_delta({})
+        port_revisions = dict(full['port_revisions'], p1='old', p3='gone')
+        revisions = {'revision': 'old',
+                     'subnets': full['subnet_revisions'],
+                     'ports': port_revisions}
+        retval = self._get_network_delta(revisions)
+        self.assertEqual([], retval['subnets'])
+        self.assertEqual(['p1'], [p['id'] for p in retval['ports']])
+        self.assertEqual(['p3'], retval['deleted_ports'])
+
     def _test_get_dhcp_port_helper(self, port_retval, other_expectations=[],
                                    update_port=None, create_port=None):
         subnets_retval = [dict(id='a', enable_dhcp=True),
@@ -200,6 +241,30 @@ class TestDhcpRpcCallback(base.BaseTestCase):
         self.plugin.assert_has_calls(
             mock.call.update_port(mock.ANY, 'foo_port_id', expected_port))
 
+    def test_create_dhcp_ports(self):
+        ports = [{'port': {'network_id': 'net1'}},
+                 {'port': {'network_id': 'net2'}}]
+        with mock.patch.object(self.callbacks, 'create_dhcp_port',
+                               side_effect=[
+                                   {'id': 'port1'},
+                                   n_exc.NetworkNotFound(net_id='net2')]):
+            retval = self.callbacks.create_dhcp_ports(mock.Mock(),
+                                                      host='foo_host',
+                                                      ports=ports)
+        self.assertEqual([{'id': 'port1'}, None], retval)
+        self.assertEqual(1, self.log.warn.call_count)
+
+    def test_update_dhcp_ports(self):
+        ports = [{'port_id': 'port1', 'port': {'port': {}}}]
+        with mock.patch.object(self.callbacks, 'update_dhcp_port',
+                               return_value={'id': 'port1'}) as update:
+            retval = self.callbacks.update_dhcp_ports(mock.Mock(),
+                                                      host='foo_host',
+                                                      ports=ports)
+        update.assert_called_once_with(mock.ANY, host='foo_host',
+                                       port_id='port1', port={'port': {}})
+        self.assertEqual([{'id': 'port1'}], retval)
+
     def test_get_dhcp_port_existing(self):
         port_retval = dict(id='port_id', fixed_ips=[dict(subnet_id='a')])
         expectations = [
@@ -72,6 +72,29 @@ def _generate_raw_dump(iptables_args):
 
 RAW_DUMP = _generate_raw_dump(IPTABLES_ARG)
 
+IPTABLES_SAVE_DUMP = ('# Generated by iptables-save\n'
+                      '*raw\n'
+                      ':PREROUTING ACCEPT [0:0]\n'
+                      ':OUTPUT ACCEPT [0:0]\n'
+                      'COMMIT\n'
+                      '# Completed\n'
+                      '# Generated by iptables-save\n'
+                      '*nat\n'
+                      ':PREROUTING ACCEPT [0:0]\n'
+                      ':INPUT ACCEPT [0:0]\n'
+                      ':OUTPUT ACCEPT [0:0]\n'
+                      ':POSTROUTING ACCEPT [0:0]\n'
+                      'COMMIT\n'
+                      '# Completed\n'
+                      '# Generated by iptables-save\n'
+                      '*filter\n'
+                      ':INPUT ACCEPT [0:0]\n'
+                      ':FORWARD ACCEPT [0:0]\n'
+                      ':OUTPUT ACCEPT [0:0]\n'
+                      '%(extra_chains)s'
+                      'COMMIT\n'
+                      '# Completed\n')
+
 
 class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
@@ -932,6 +955,118 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.assertIsNone(ret_str)
 
 
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        self.root_helper = 'sudo'
+        self.config(iptables_incremental_apply=True)
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = IPTABLES_SAVE_DUMP % {'extra_chains': ''}
+        # The first apply has no previous state and does a full resync
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _assert_incremental_restore(self, commands):
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'],
+            process_input='\n'.join(commands) % IPTABLES_ARG,
+            root_helper=self.root_helper)
+
+    def test_first_apply_is_full(self):
+        self.iptables._applied_lines = {}
+        self.iptables.apply()
+        self.execute.assert_has_calls([
+            mock.call(['iptables-save', '-c'], root_helper=self.root_helper),
+            mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                      root_helper=self.root_helper)])
+
+    def test_apply_without_changes_does_nothing(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_add_chain_and_rules(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 0/0 -d 192.168.0.2 -j'
+                                              ' $filter')
+        self.iptables.apply()
+        self._assert_incremental_restore([
+            '*filter',
+            ':%(bn)s-filter - [0:0]',
+            '-I %(bn)s-INPUT 1 -s 0/0 -d 192.168.0.2 -j %(bn)s-filter',
+            '-I %(bn)s-filter 1 -j DROP',
+            'COMMIT'])
+
+    def test_insert_rule_keeps_position(self):
+        table = self.iptables.ipv4['nat']
+        table.add_rule('PREROUTING', '-d 10.0.0.1 -j DNAT --to 1.1.1.1')
+        table.add_rule('PREROUTING', '-d 10.0.0.3 -j DNAT --to 1.1.1.3')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        table.add_rule('PREROUTING', '-d 10.0.0.2 -j DNAT --to 1.1.1.2',
+                       top=True)
+        self.iptables.apply()
+        self._assert_incremental_restore([
+            '*nat',
+            '-I %(bn)s-PREROUTING 1 -d 10.0.0.2 -j DNAT --to 1.1.1.2',
+            'COMMIT'])
+
+    def test_remove_chain(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        table.add_rule('filter', '-j DROP')
+        table.add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        table.remove_chain('filter')
+        self.iptables.apply()
+        self._assert_incremental_restore([
+            '*filter',
+            '-D %(bn)s-INPUT -j %(bn)s-filter',
+            '-F %(bn)s-filter',
+            '-X %(bn)s-filter',
+            'COMMIT'])
+
+    def test_failed_incremental_apply_falls_back_to_full_resync(self):
+        def iptables_restore_failer(*args, **kwargs):
+            if '-n' in args[0]:
+                raise RuntimeError()
+            return IPTABLES_SAVE_DUMP % {'extra_chains': ''}
+        self.execute.side_effect = iptables_restore_failer
+
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+        self.assertEqual(
+            [['iptables-restore', '-n'], ['iptables-save', '-c'],
+             ['iptables-restore', '-c']],
+            [c[0][0] for c in self.execute.call_args_list])
+        self.assertIn('iptables', self.iptables._applied_lines)
+
+    def test_failed_incremental_apply_keeps_pending_removals(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('unwrapped', wrap=False)
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        def iptables_restore_failer(*args, **kwargs):
+            if '-n' in args[0]:
+                raise RuntimeError()
+            return IPTABLES_SAVE_DUMP % {
+                'extra_chains': ':unwrapped - [0:0]\n'}
+        self.execute.side_effect = iptables_restore_failer
+
+        table.remove_chain('unwrapped', wrap=False)
+        self.iptables.apply()
+        restore_input = self.execute.call_args_list[-1][1]['process_input']
+        self.assertNotIn(':unwrapped', restore_input)
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -444,6 +444,33 @@ class TestBasicRouterOperations(base.BaseTestCase):
             agent._sync_routers_task(agent.context)
         self.assertTrue(f.called)
 
+    def test__sync_routers_task_fetches_routers_by_chunks(self):
+        self.conf.set_override('sync_routers_chunk_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_ids = [_uuid() for i in range(3)]
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.side_effect = (
+            lambda context, router_ids: [{'id': router_id}
+                                         for router_id in router_ids])
+        with mock.patch.object(agent, '_queue') as queue:
+            agent._sync_routers_task(agent.context)
+        self.assertEqual(
+            [mock.call(agent.context, router_ids[:2]),
+             mock.call(agent.context, router_ids[2:])],
+            self.plugin_api.get_routers.call_args_list)
+        self.assertEqual(3, queue.add.call_count)
+        self.assertFalse(agent.fullsync)
+
+    def test__sync_routers_task_fetches_all_routers_from_old_server(self):
+        self.conf.set_override('sync_routers_chunk_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.side_effect = (
+            messaging.UnsupportedVersion('1.5'))
+        self.plugin_api.get_routers.return_value = []
+        agent._sync_routers_task(agent.context)
+        self.plugin_api.get_routers.assert_called_once_with(agent.context)
+        self.assertFalse(agent.fullsync)
+
     def test_router_info_create(self):
         id = _uuid()
         ri = l3_agent.RouterInfo(id, self.conf.root_helper,
@@ -484,7 +511,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
             self.send_arp.assert_called_once_with(ri.ns_name, interface_name,
                                                   '99.0.1.9')
         elif action == 'remove':
-            self.device_exists.return_value = True
+            self.mock_ip.get_devices_addresses.return_value = {
+                interface_name: []}
             agent.internal_network_removed(ri, port)
             self.assertEqual(self.mock_driver.unplug.call_count, 1)
         else:
@@ -534,6 +562,60 @@ class TestBasicRouterOperations(base.BaseTestCase):
     def test_agent_remove_internal_network(self):
         self._test_internal_network_action('remove')
 
+    def test_internal_network_devices_from_device_inventory(self):
+        agent, ri, port = self._prepare_internal_network_data()
+        interface_name = agent.get_internal_device_name(port['id'])
+        self.mock_ip.get_devices_addresses.return_value = {
+            interface_name: []}
+        self.device_exists.return_value = True
+        agent.internal_network_added(ri, port)
+        self.assertFalse(self.mock_driver.plug.called)
+        agent.internal_network_removed(ri, port)
+        self.assertEqual(1, self.mock_driver.unplug.call_count)
+        # The unplugged device is forgotten without listing the namespace
+        agent.internal_network_added(ri, port)
+        self.assertEqual(1, self.mock_driver.plug.call_count)
+        self.assertEqual(1, self.mock_ip.get_devices_addresses.call_count)
+        # Only the device found in the inventory is looked up before plugging
+        self.assertEqual(1, self.device_exists.call_count)
+
+    def test_internal_network_deleted_device_plugged_again(self):
+        agent, ri, port = self._prepare_internal_network_data()
+        interface_name = agent.get_internal_device_name(port['id'])
+        self.mock_ip.get_devices_addresses.return_value = {
+            interface_name: []}
+        self.device_exists.return_value = False
+        agent.internal_network_added(ri, port)
+        self.assertEqual(1, self.mock_driver.plug.call_count)
+
+    def test_sync_routers_task_keeps_device_inventory(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        with mock.patch.object(agent, 'device_inventory') as inventory:
+            agent._sync_routers_task(agent.context)
+            self.assertFalse(inventory.invalidate.called)
+            self.assertFalse(inventory.invalidate_all.called)
+
+    def test_sync_routers_task_invalidates_resynced_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ext_net_id = _uuid()
+        routers = [{'id': _uuid()},
+                   {'id': _uuid(), 'distributed': True,
+                    'gw_port': {'network_id': ext_net_id}}]
+        self.plugin_api.get_routers.return_value = routers
+        with contextlib.nested(
+            mock.patch.object(agent, 'device_inventory'),
+            mock.patch.object(agent, '_queue')
+        ) as (inventory, queue):
+            agent._sync_routers_task(agent.context)
+        self.assertEqual(
+            [mock.call(l3_agent.NS_PREFIX + routers[0]['id']),
+             mock.call(l3_agent.NS_PREFIX + routers[1]['id']),
+             mock.call(l3_agent.SNAT_NS_PREFIX + routers[1]['id']),
+             mock.call(l3_agent.FIP_NS_PREFIX + ext_net_id)],
+            inventory.invalidate.call_args_list)
+        self.assertFalse(inventory.invalidate_all.called)
+
     def _test_external_gateway_action(self, action, router):
         ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
                                  self.conf.use_namespaces, router=router)
@@ -600,6 +682,7 @@ class TestBasicRouterOperations(base.BaseTestCase):
         interface_name = agent.get_external_device_name(ex_gw_port['id'])
 
         self.device_exists.return_value = True
+        self.mock_ip.get_devices_addresses.return_value = {interface_name: []}
 
         return interface_name, ex_gw_port
 
@@ -1150,8 +1233,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
         ri.is_ha = False
         addresses = ['15.1.2.2/24', '15.1.2.3/32']
         device = mock.MagicMock()
-        device.addr.list.return_value = [{'cidr': addresses[0]},
-                                         {'cidr': addresses[1]}]
+        self.mock_ip.get_devices_addresses.return_value = {
+            device.name: addresses}
         self.assertEqual(set(addresses), agent._get_router_cidrs(ri, device))
 
     def test_get_router_cidrs_returns_ha_cidrs(self):
@@ -1169,7 +1252,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
     @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
     def test_process_router_floating_ip_addresses_remove(self, IPDevice):
         IPDevice.return_value = device = mock.Mock()
-        device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
+        self.mock_ip.get_devices_addresses.return_value = {
+            device.name: ['15.1.2.3/32']}
 
         ri = mock.MagicMock()
         ri.router.get.return_value = []
@@ -1209,7 +1293,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
         }
 
         IPDevice.return_value = device = mock.Mock()
-        device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
+        self.mock_ip.get_devices_addresses.return_value = {
+            device.name: ['15.1.2.3/32']}
         ri = mock.MagicMock()
         ri.router['distributed'].__nonzero__ = lambda self: False
         type(ri).is_ha = mock.PropertyMock(return_value=False)
@@ -1269,6 +1354,28 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.assertEqual({fip_id: l3_constants.FLOATINGIP_STATUS_ERROR},
                          fip_statuses)
 
+    def test_process_router_reuses_device_inventory(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = prepare_router_data(num_internal_ports=1)
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.external_gateway_added = mock.Mock()
+        agent.internal_network_added = mock.Mock()
+        self.mock_ip.get_devices_addresses.return_value = {}
+        agent.process_router(ri)
+        agent.process_router(ri)
+        self.assertEqual(1, self.mock_ip.get_devices_addresses.call_count)
+
+    def test_process_router_error_invalidates_device_inventory(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = prepare_router_data(num_internal_ports=1)
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.device_inventory = mock.Mock()
+        agent.device_inventory.get_devices.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, agent.process_router, ri)
+        agent.device_inventory.invalidate.assert_called_once_with(ri.ns_name)
+
     def test_process_router_snat_disabled(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         router = prepare_router_data(enable_snat=True)
@@ -1660,9 +1767,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
                          FakeDev('qr-b2c3d4e5-f6')]
         stale_devnames = [dev.name for dev in stale_devlist]
 
-        get_devices_return = []
-        get_devices_return.extend(stale_devlist)
-        self.mock_ip.get_devices.return_value = get_devices_return
+        self.mock_ip.get_devices_addresses.return_value = dict(
+            (devname, []) for devname in stale_devnames)
 
         router = prepare_router_data(enable_snat=True, num_internal_ports=1)
         ri = l3_agent.RouterInfo(router['id'],
@@ -1714,7 +1820,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
                                  self.conf.use_namespaces,
                                  router=router)
 
-        self.mock_ip.get_devices.return_value = stale_devlist
+        self.mock_ip.get_devices_addresses.return_value = dict(
+            (devname, []) for devname in stale_devnames)
 
         agent.process_router(ri)
 
@@ -1748,6 +1855,50 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent.router_added_to_agent(None, [FAKE_ID])
         agent._queue.add.assert_called_once()
 
+    def test_process_router_update_records_latency(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        update = l3_agent.RouterUpdate(router_id, l3_agent.PRIORITY_RPC,
+                                       router={'id': router_id})
+        agent._queue.add(update)
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._process_router_update()
+        process.assert_called_once_with([{'id': router_id}])
+        latency = agent.router_latencies[router_id]
+        self.assertTrue(latency['queued'] >= 0)
+        self.assertTrue(latency['processing'] >= 0)
+
+    def test_report_state_logs_router_latencies(self):
+        agent_config.register_agent_state_opts_helper(cfg.CONF)
+        cfg.CONF.set_override('report_interval', 0, 'AGENT')
+        agent = l3_agent.L3NATAgentWithStateReport(HOSTNAME, self.conf)
+        agent.state_rpc = mock.Mock()
+        agent.router_latencies = {'r1': {'queued': 1, 'processing': 2},
+                                  'r2': {'queued': 0, 'processing': 1}}
+        with mock.patch.object(l3_agent.LOG, 'info') as log:
+            agent._report_state()
+        self.assertEqual({'routers': 2, 'average': 2, 'max': 3},
+                         log.call_args[0][1])
+        self.assertNotIn('router_latency',
+                         agent.agent_state['configurations'])
+        self.assertEqual({}, agent.router_latencies)
+
+    def test_process_routers_loop_uses_configured_workers(self):
+        self.conf.set_override('router_processing_workers', 20)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        pool = mock.Mock()
+        pool.spawn_n.side_effect = [None, RuntimeError()]
+        with mock.patch('eventlet.GreenPool', return_value=pool) as pool_cls:
+            self.assertRaises(RuntimeError, agent._process_routers_loop)
+        pool_cls.assert_called_once_with(size=20)
+
+    def test_max_concurrent_commands(self):
+        self.conf.set_override('max_concurrent_commands', 4)
+        with mock.patch('neutron.agent.linux.utils.'
+                        'set_max_concurrent_commands') as set_max:
+            l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        set_max.assert_called_once_with(4)
+
     def test_destroy_fip_namespace(self):
         namespaces = ['qrouter-foo', 'qrouter-bar']
 
@@ -2310,9 +2461,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
 
         self.mock_ip.get_devices.return_value = [
             FakeDev(agent.get_fip_ext_device_name(_uuid()))]
-        self.mock_ip_dev.addr.list.return_value = [
-            {'cidr': vm_floating_ip + '/32'},
-            {'cidr': '19.4.4.1/24'}]
+        self.mock_ip.get_devices_addresses.return_value = {
+            self.mock_ip_dev.name: [vm_floating_ip + '/32', '19.4.4.1/24']}
         self.device_exists.return_value = True
 
         agent.external_gateway_removed(
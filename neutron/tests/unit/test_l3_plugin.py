@@ -20,6 +20,7 @@ import copy
 import mock
 import netaddr
 from oslo.config import cfg
+import sqlalchemy
 from webob import exc
 
 from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
@@ -28,6 +29,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as n_exc
 from neutron import context
+from neutron.db import api as db_api
 from neutron.db import common_db_mixin
 from neutron.db import db_base_plugin_v2
 from neutron.db import external_net_db
@@ -1882,6 +1884,51 @@ class L3AgentDbTestCaseBase(L3NatTestCaseMixin):
             self.assertIsNotNone(floatingips[0]['fixed_ip_address'])
             self.assertIsNotNone(floatingips[0]['router_id'])
 
+    def _get_sync_data_queries(self):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_api.get_engine()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            routers = self.plugin.get_sync_data(context.get_admin_context())
+        finally:
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', _record)
+        return routers, len(statements)
+
+    def test_l3_agent_routers_query_count_does_not_grow(self):
+        with self.floatingip_with_assoc() as fip:
+            ext_net_id = fip['floatingip']['floating_network_id']
+            routers, expected_queries = self._get_sync_data_queries()
+            self.assertEqual(1, len(routers))
+            with self.router() as r:
+                with self.port() as p:
+                    router_id = r['router']['id']
+                    subnet_id = p['port']['fixed_ips'][0]['subnet_id']
+                    self._add_external_gateway_to_router(router_id,
+                                                         ext_net_id)
+                    self._router_interface_action('add', router_id,
+                                                  subnet_id, None)
+                    fip2 = self._make_floatingip(self.fmt, ext_net_id,
+                                                 port_id=p['port']['id'])
+                    routers, queries = self._get_sync_data_queries()
+                    self.assertEqual(2, len(routers))
+                    for router in routers:
+                        self.assertIn('gw_port', router)
+                        self.assertEqual(
+                            1, len(router[l3_constants.INTERFACE_KEY]))
+                        self.assertEqual(
+                            1, len(router[l3_constants.FLOATINGIP_KEY]))
+                    self.assertEqual(expected_queries, queries)
+                    # clean-up
+                    self._delete('floatingips', fip2['floatingip']['id'])
+                    self._router_interface_action('remove', router_id,
+                                                  subnet_id, None)
+                    self._remove_external_gateway_from_router(router_id,
+                                                              ext_net_id)
+
     def _test_notify_op_agent(self, target_func, *args):
         l3_rpc_agent_api_str = (
             'neutron.api.rpc.agentnotifiers.l3_rpc_agent_api.L3AgentNotifyAPI')
@@ -2074,6 +2121,18 @@ class L3NatDBIntAgentSchedulingTestCase(L3BaseForIntTests,
                 r['router']['id'],
                 s2['subnet']['network_id'])
 
+    def test_get_router_ids_schedules_and_lists_hosted_routers(self):
+        with contextlib.nested(self.router(), self.router()) as (r1, r2):
+            l3_rpc_cb = l3_rpc.L3RpcCallback()
+            self._register_one_l3_agent(host='host1')
+            router_ids = l3_rpc_cb.get_router_ids(self.adminContext,
+                                                  host='host1')
+            self.assertEqual(sorted([r1['router']['id'], r2['router']['id']]),
+                             sorted(router_ids))
+            routers = l3_rpc_cb.sync_routers(self.adminContext, host='host1',
+                                             router_ids=router_ids[:1])
+            self.assertEqual(router_ids[:1], [r['id'] for r in routers])
+
     def test_router_update_gateway_no_eligible_l3_agent(self):
         with self.router() as r:
             with self.subnet() as s1:
@@ -2120,6 +2179,29 @@ class L3RpcCallbackTestCase(base.BaseTestCase):
         actual_message = mock_log.call_args[0][0]
         self.assertEqual(expected_message, actual_message)
 
+    def test_get_router_ids_with_agent_scheduler(self):
+        l3plugin = self.l3_rpc_cb.l3plugin
+        l3plugin.list_router_ids_on_host.return_value = ['foo_router_id']
+        with mock.patch('neutron.common.utils.is_extension_supported',
+                        return_value=True):
+            router_ids = self.l3_rpc_cb.get_router_ids(mock.ANY,
+                                                       host='foo_host')
+        self.assertEqual(['foo_router_id'], router_ids)
+        l3plugin.auto_schedule_routers.assert_called_once_with(
+            mock.ANY, 'foo_host', None)
+        l3plugin.list_router_ids_on_host.assert_called_once_with(
+            mock.ANY, 'foo_host')
+
+    def test_get_router_ids_without_agent_scheduler(self):
+        l3plugin = self.l3_rpc_cb.l3plugin
+        l3plugin.get_routers.return_value = [{'id': 'foo_router_id'}]
+        with mock.patch('neutron.common.utils.is_extension_supported',
+                        return_value=False):
+            router_ids = self.l3_rpc_cb.get_router_ids(mock.ANY,
+                                                       host='foo_host')
+        self.assertEqual(['foo_router_id'], router_ids)
+        l3plugin.get_routers.assert_called_once_with(mock.ANY, fields=['id'])
+
 
 class L3AgentDbIntTestCase(L3BaseForIntTests, L3AgentDbTestCaseBase):
 
@@ -508,6 +508,7 @@ class TestBase(base.BaseTestCase):
         self.execute_p = mock.patch('neutron.agent.linux.utils.execute')
         self.safe = self.replace_p.start()
         self.execute = self.execute_p.start()
+        mock.patch.dict(dhcp.Dnsmasq._config_cache, clear=True).start()
 
 
 class TestDhcpBase(TestBase):
@@ -749,6 +750,62 @@ class TestDhcpLocalProcess(TestBase):
                 replace.assert_called_once_with(mock.ANY, 'tap0')
 
 
+class TestGetDhcpPortRequest(base.BaseTestCase):
+    def _make_network(self, ports):
+        return dhcp.NetModel(True, dict(
+            id='net1', tenant_id='tenant1',
+            subnets=[dict(id='sub1', enable_dhcp=True),
+                     dict(id='sub2', enable_dhcp=True),
+                     dict(id='sub3', enable_dhcp=False)],
+            ports=ports))
+
+    def test_port_up_to_date(self):
+        network = self._make_network([dict(
+            id='port1', device_id='dhcp1',
+            fixed_ips=[dict(subnet_id='sub1', ip_address='10.0.0.2'),
+                       dict(subnet_id='sub2', ip_address='10.0.1.2')])])
+        self.assertIsNone(dhcp.get_dhcp_port_request(network, 'dhcp1'))
+
+    def test_port_missing_subnet(self):
+        network = self._make_network([dict(
+            id='port1', device_id='dhcp1',
+            fixed_ips=[dict(subnet_id='sub1', ip_address='10.0.0.2')])])
+        self.assertEqual(
+            ('port1', {'port': {'network_id': 'net1',
+                                'fixed_ips': [
+                                    {'subnet_id': 'sub1',
+                                     'ip_address': '10.0.0.2'},
+                                    {'subnet_id': 'sub2'}]}}),
+            dhcp.get_dhcp_port_request(network, 'dhcp1'))
+
+    def test_reserved_port(self):
+        network = self._make_network([dict(
+            id='port1', device_id=constants.DEVICE_ID_RESERVED_DHCP_PORT,
+            fixed_ips=[])])
+        self.assertEqual(
+            ('port1', {'port': {'network_id': 'net1',
+                                'device_id': 'dhcp1'}}),
+            dhcp.get_dhcp_port_request(network, 'dhcp1'))
+
+    def test_new_port(self):
+        network = self._make_network([])
+        port_id, port = dhcp.get_dhcp_port_request(network, 'dhcp1')
+        self.assertIsNone(port_id)
+        self.assertEqual('dhcp1', port['port']['device_id'])
+        self.assertEqual([{'subnet_id': 'sub1'}, {'subnet_id': 'sub2'}],
+                         port['port']['fixed_ips'])
+
+    def test_reserved_ports_tried_before_new_port(self):
+        network = self._make_network([
+            dict(id=port_id, device_id=constants.DEVICE_ID_RESERVED_DHCP_PORT,
+                 fixed_ips=[])
+            for port_id in ('port1', 'port2')])
+        port, requests = dhcp._get_dhcp_port_requests(network, 'dhcp1')
+        self.assertIsNone(port)
+        self.assertEqual(['port1', 'port2', None],
+                         [port_id for port_id, _body in requests])
+
+
 class TestDnsmasq(TestBase):
     def _test_spawn(self, extra_options, network=FakeDualNetwork(),
                     max_leases=16777216, lease_duration=86400,
@@ -1249,6 +1306,122 @@ tag:tag0,option:router""".lstrip()
             ])
             mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
 
+    def _reload_allocations(self, dm):
+        with contextlib.nested(
+            mock.patch('os.path.exists', return_value=True),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, 'interface_name'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map'),
+            mock.patch.object(dhcp.Dnsmasq, '_release_unused_leases'),
+            mock.patch.object(dm, 'device_manager')
+        ) as (exists, active, pid, interface_name, ip_map, release, mgr):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            interface_name.__get__ = mock.Mock(return_value='tap12345678-12')
+            ip_map.return_value = {}
+            dm.reload_allocations()
+
+    def test_reload_allocations_unchanged(self):
+        fake_net = FakeDualNetwork()
+        dm = dhcp.Dnsmasq(self.conf, fake_net,
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        self._reload_allocations(dm)
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+
+        self._reload_allocations(dm)
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+
+    def test_reload_allocations_reordered_unchanged(self):
+        fake_net = FakeDualNetwork()
+        dm = dhcp.Dnsmasq(self.conf, fake_net,
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        self._reload_allocations(dm)
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+
+        fake_net.ports = list(reversed(fake_net.ports))
+        fake_net.subnets = list(reversed(fake_net.subnets))
+        self._reload_allocations(dm)
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+
+    def test_reload_allocations_port_added(self):
+        fake_net = FakeDualNetwork()
+        fake_net.ports = fake_net.ports[1:]
+        dm = dhcp.Dnsmasq(self.conf, fake_net,
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        self._reload_allocations(dm)
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+
+        fake_net.ports = FakeDualNetwork().ports
+        self._reload_allocations(dm)
+        written = [c[0][0] for c in self.safe.call_args_list]
+        self.assertEqual([dm.get_conf_file_name('host'),
+                          dm.get_conf_file_name('addn_hosts')], written)
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def test_reload_allocations_subnet_changed(self):
+        fake_net = FakeDualNetwork()
+        dm = dhcp.Dnsmasq(self.conf, fake_net,
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        self._reload_allocations(dm)
+        self.safe.reset_mock()
+
+        fake_net.subnets = [FakeV4Subnet(), FakeV6SubnetDHCPStateful()]
+        fake_net.subnets[0].dns_nameservers = ['8.8.4.4']
+        self._reload_allocations(dm)
+        written = [c[0][0] for c in self.safe.call_args_list]
+        self.assertIn(dm.get_conf_file_name('opts'), written)
+
+    def test_remove_config_files_clears_cache(self):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        self._reload_allocations(dm)
+        self.assertIn(dm.network.id, dhcp.Dnsmasq._config_cache)
+        with mock.patch('shutil.rmtree'):
+            dm._remove_config_files()
+        self.assertNotIn(dm.network.id, dhcp.Dnsmasq._config_cache)
+
+    def _test_enable_active(self, cmdline):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+        dm.device_manager.setup.return_value = 'tap0'
+        with contextlib.nested(
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, 'interface_name'),
+            mock.patch.object(dhcp.Dnsmasq, 'restart'),
+            mock.patch.object(dhcp.Dnsmasq, 'reload_allocations'),
+            mock.patch('__builtin__.open')
+        ) as (active, pid, interface_name, restart, reload_allocations,
+              mock_open):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            interface_name.__get__ = mock.Mock(return_value='tap0')
+            mock_open.return_value.__enter__ = lambda s: s
+            mock_open.return_value.__exit__ = mock.Mock()
+            mock_open.return_value.read.return_value = '\0'.join(
+                cmdline(dm) + [''])
+            dm.enable()
+        mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
+        return restart, reload_allocations
+
+    def test_enable_active_reuses_process(self):
+        restart, reload_allocations = self._test_enable_active(
+            lambda dm: dm._build_cmdline())
+        reload_allocations.assert_called_once_with()
+        self.assertFalse(restart.called)
+
+    def test_enable_active_options_changed(self):
+        restart, reload_allocations = self._test_enable_active(
+            lambda dm: dm._build_cmdline()[:-1])
+        restart.assert_called_once_with()
+        self.assertFalse(reload_allocations.called)
+
     def test_release_unused_leases(self):
         dnsmasq = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
 
@@ -72,6 +72,26 @@ LINK_SAMPLE = [
     '\    link/ether cc:dd:ee:ff:ab:cd brd ff:ff:ff:ff:ff:ff promiscuity 0'
     '\    vlan protocol 802.1Q id 14 <REORDER_HDR>']
 
+ADDR_SHOW_SAMPLE = """1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN
+    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00
+    inet 127.0.0.1/8 scope host lo
+       valid_lft forever preferred_lft forever
+    inet6 ::1/128 scope host
+       valid_lft forever preferred_lft forever
+12: qr-aaaa: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc noqueue state UP
+    link/ether fa:16:3e:6c:13:aa brd ff:ff:ff:ff:ff:ff
+    inet 10.0.0.1/24 brd 10.0.0.255 scope global qr-aaaa
+       valid_lft forever preferred_lft forever
+13: qg-bbbb: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc noqueue state UP
+    link/ether fa:16:3e:6c:13:bb brd ff:ff:ff:ff:ff:ff
+    inet 172.24.4.2/24 brd 172.24.4.255 scope global qg-bbbb
+       valid_lft forever preferred_lft forever
+    inet 172.24.4.3/32 brd 172.24.4.3 scope global qg-bbbb
+       valid_lft forever preferred_lft forever
+14: rfp-cccc@if15: <BROADCAST,MULTICAST> mtu 1500 qdisc noop state DOWN
+    link/ether fa:16:3e:6c:13:cc brd ff:ff:ff:ff:ff:ff
+"""
+
 ADDR_SAMPLE = ("""
 2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP qlen 1000
     link/ether dd:cc:aa:b9:76:ce brd ff:ff:ff:ff:ff:ff
@@ -422,6 +442,98 @@ class TestIpWrapper(base.BaseTestCase):
         ip_lib.IPWrapper('sudo').add_device_to_namespace(dev)
         self.assertEqual(dev.mock_calls, [])
 
+    def test_get_devices_addresses(self):
+        self.execute.return_value = ADDR_SHOW_SAMPLE
+        retval = ip_lib.IPWrapper('sudo', 'ns').get_devices_addresses()
+        self.assertEqual({'lo': ['127.0.0.1/8', '::1/128'],
+                          'qr-aaaa': ['10.0.0.1/24'],
+                          'qg-bbbb': ['172.24.4.2/24', '172.24.4.3/32'],
+                          'rfp-cccc': []},
+                         retval)
+        self.execute.assert_called_once_with([], 'addr', ('show',),
+                                             'sudo', 'ns')
+
+    def test_get_devices_addresses_exclude_loopback(self):
+        self.execute.return_value = ADDR_SHOW_SAMPLE
+        retval = ip_lib.IPWrapper('sudo', 'ns').get_devices_addresses(
+            exclude_loopback=True)
+        self.assertEqual(['qg-bbbb', 'qr-aaaa', 'rfp-cccc'], sorted(retval))
+
+
+class TestDeviceInventory(base.BaseTestCase):
+    def setUp(self):
+        super(TestDeviceInventory, self).setUp()
+        self.get_devices_addresses = mock.patch.object(
+            ip_lib.IPWrapper, 'get_devices_addresses').start()
+        self.get_devices_addresses.return_value = {
+            'qr-aaaa': ['10.0.0.1/24'], 'qg-bbbb': ['172.24.4.2/24']}
+        self.inventory = ip_lib.DeviceInventory('sudo')
+
+    def test_namespace_listed_once(self):
+        self.assertEqual(['qg-bbbb', 'qr-aaaa'],
+                         sorted(self.inventory.get_devices('ns')))
+        self.assertTrue(self.inventory.device_exists('qr-aaaa', 'ns'))
+        self.assertEqual(['172.24.4.2/24'],
+                         self.inventory.get_addresses('qg-bbbb', 'ns'))
+        self.get_devices_addresses.assert_called_once_with(
+            exclude_loopback=True)
+
+    def test_missing_namespace_not_cached(self):
+        self.get_devices_addresses.side_effect = RuntimeError()
+        self.assertEqual([], self.inventory.get_devices('ns'))
+        self.get_devices_addresses.side_effect = None
+        self.assertEqual(['qg-bbbb', 'qr-aaaa'],
+                         sorted(self.inventory.get_devices('ns')))
+
+    def test_address_added_and_removed(self):
+        self.inventory.get_devices('ns')
+        self.inventory.address_added('qg-bbbb', '172.24.4.3/32', 'ns')
+        self.assertEqual(['172.24.4.2/24', '172.24.4.3/32'],
+                         self.inventory.get_addresses('qg-bbbb', 'ns'))
+        self.inventory.address_removed('qg-bbbb', '172.24.4.2/24', 'ns')
+        self.assertEqual(['172.24.4.3/32'],
+                         self.inventory.get_addresses('qg-bbbb', 'ns'))
+        self.assertEqual(1, self.get_devices_addresses.call_count)
+
+    def test_device_removed(self):
+        self.inventory.get_devices('ns')
+        self.inventory.device_removed('qr-aaaa', 'ns')
+        self.assertFalse(self.inventory.device_exists('qr-aaaa', 'ns'))
+        self.assertEqual(1, self.get_devices_addresses.call_count)
+
+    def test_device_exists_verify(self):
+        with mock.patch.object(ip_lib, 'device_exists') as device_exists:
+            device_exists.return_value = True
+            self.assertTrue(
+                self.inventory.device_exists('qr-aaaa', 'ns', verify=True))
+            device_exists.return_value = False
+            self.assertFalse(
+                self.inventory.device_exists('qr-aaaa', 'ns', verify=True))
+            self.assertFalse(self.inventory.device_exists('qr-aaaa', 'ns'))
+            self.assertFalse(
+                self.inventory.device_exists('qr-dddd', 'ns', verify=True))
+            self.assertEqual(2, device_exists.call_count)
+            device_exists.assert_called_with('qr-aaaa', 'sudo', 'ns')
+        self.assertEqual(1, self.get_devices_addresses.call_count)
+
+    def test_changed_device_reloads_addresses(self):
+        self.inventory.get_devices('ns')
+        self.inventory.device_changed('qr-cccc', 'ns')
+        self.assertTrue(self.inventory.device_exists('qr-cccc', 'ns'))
+        self.get_devices_addresses.return_value = {
+            'qr-aaaa': ['10.0.0.1/24'], 'qr-cccc': ['10.0.1.1/24']}
+        self.assertEqual(['10.0.1.1/24'],
+                         self.inventory.get_addresses('qr-cccc', 'ns'))
+        self.assertEqual(2, self.get_devices_addresses.call_count)
+
+    def test_invalidate(self):
+        self.inventory.get_devices('ns')
+        self.inventory.invalidate('ns')
+        self.inventory.get_devices('ns')
+        self.inventory.invalidate_all()
+        self.inventory.get_devices('ns')
+        self.assertEqual(3, self.get_devices_addresses.call_count)
+
 
 class TestIpRule(base.BaseTestCase):
     def setUp(self):
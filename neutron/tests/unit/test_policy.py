@@ -584,3 +584,59 @@ class NeutronPolicyTestCase(base.BaseTestCase):
         rules = policy._process_rules_list([], match_rule)
         self.assertEqual(['create_something', 'create_something:somethings',
                           'create_something:attr:sub_attr_1'], rules)
+
+    def test_read_match_rule_built_once(self):
+        with mock.patch.object(policy, '_build_match_rule',
+                               wraps=policy._build_match_rule) as build:
+            policy.check(self.context, 'get_network', {'tenant_id': 'fake'})
+            policy.check(self.context, 'get_network', {'tenant_id': 'x'})
+        self.assertEqual(1, build.call_count)
+
+    def test_get_target_fields(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner or not user_id:%(user_id)s")
+        policy.init()
+        fields = policy._get_target_fields(
+            common_policy.RuleCheck('rule', 'get_port'))
+        self.assertEqual(set(['network:tenant_id', 'network_id',
+                              'user_id']), fields)
+        fields = policy._get_target_fields(
+            common_policy.RuleCheck('rule', 'get_network'))
+        self.assertEqual(set(['tenant_id', 'shared', 'router:external']),
+                         fields)
+
+    def test_check_items(self):
+        targets = [{'tenant_id': 'fake', 'shared': False},
+                   {'tenant_id': 'other', 'shared': False},
+                   {'tenant_id': 'other', 'shared': True},
+                   {'tenant_id': 'fake', 'shared': False},
+                   {'tenant_id': 'other', 'shared': False}]
+        policy.init()
+        with mock.patch.object(common_policy, 'check',
+                               wraps=common_policy.check) as check:
+            results = policy.check_items(self.context, 'get_network',
+                                         targets)
+        self.assertEqual([True, False, True, True, False], results)
+        self.assertEqual(3, check.call_count)
+
+    def test_check_items_unknown_dependencies(self):
+        self.rules['get_network'] = common_policy.parse_rule(
+            "http:http://www.example.com")
+        policy.init()
+        with mock.patch.object(common_policy.HttpCheck, '__call__',
+                               return_value=True) as http_check:
+            results = policy.check_items(self.context, 'get_network',
+                                         [{'tenant_id': 'fake'}] * 2)
+        self.assertEqual([True, True], results)
+        self.assertEqual(2, http_check.call_count)
+
+    def test_check_attributes(self):
+        self.rules['get_network:shared'] = common_policy.parse_rule(
+            "rule:admin_only")
+        self.rules['get_network:name'] = common_policy.parse_rule(
+            "rule:admin_or_owner")
+        policy.init()
+        target = {'tenant_id': 'fake', 'shared': False, 'name': 'net'}
+        self.assertEqual(['name', 'tenant_id'], policy.check_attributes(
+            self.context, 'get_network', target,
+            ['name', 'shared', 'tenant_id']))
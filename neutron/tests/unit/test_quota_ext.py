@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import subprocess
 import sys
 
 import mock
@@ -422,6 +423,17 @@ class TestQuotaDriverLoad(base.BaseTestCase):
         self._test_quota_driver('neutron.db.quota_db.DbQuotaDriver',
                                 'ConfDriver', False)
 
+    def test_quota_tracked_driver_fallback_conf_driver(self):
+        self._test_quota_driver(quota.QUOTA_DB_TRACKED_DRIVER,
+                                'ConfDriver', False)
+
+    def test_db_plugin_does_not_load_quota_db(self):
+        # Otherwise the plugins without the quotas table, which are based on
+        # the db plugin, never fall back to ConfDriver
+        code = ('import sys; import neutron.db.db_base_plugin_v2; '
+                'sys.exit("neutron.db.quota_db" in sys.modules)')
+        self.assertEqual(0, subprocess.call([sys.executable, '-c', code]))
+
     def test_quota_conf_driver(self):
         self._test_quota_driver('neutron.quota.ConfDriver',
                                 'ConfDriver', True)
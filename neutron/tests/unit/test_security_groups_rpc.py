@@ -16,6 +16,7 @@
 import contextlib
 
 import mock
+import netaddr
 from oslo.config import cfg
 from oslo import messaging
 from testtools import matchers
@@ -31,6 +32,8 @@ from neutron.common import constants as const
 from neutron.common import ipv6_utils as ipv6
 from neutron.common import rpc as n_rpc
 from neutron import context
+from neutron.db import models_v2
+from neutron.db import securitygroups_db as sg_db
 from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
@@ -83,6 +86,8 @@ class SecurityGroupRpcTestPlugin(test_sg.SecurityGroupTestPlugin,
     def get_port_from_device(self, device):
         device = self.devices.get(device)
         if device:
+            # Copy the device, so that it can be fetched more than once
+            device = dict(device)
             device['security_group_rules'] = []
             device['security_group_source_groups'] = []
             device['fixed_ips'] = [ip['ip_address']
@@ -260,6 +265,181 @@ class SGServerRpcCallBackTestCase(test_sg.SecurityGroupDBTestCase):
                     allowed_address_pairs=address_pairs)
                 yield self.deserialize(self.fmt, res1)
 
+    def _add_remote_group_members(self, subnet, security_group_id, count):
+        """Bind count ports of subnet to a security group.
+
+        The rows are inserted directly, so that large memberships stay cheap
+        to build.
+        """
+        ctx = context.get_admin_context()
+        first_ip = netaddr.IPNetwork(subnet['cidr']).first + 10
+        ips = []
+        with ctx.session.begin(subtransactions=True):
+            for i in range(count):
+                port_id = 'member-port-%d' % i
+                ip_address = str(netaddr.IPAddress(
+                    first_ip + i, version=subnet['ip_version']))
+                ctx.session.add(models_v2.Port(
+                    id=port_id, tenant_id=subnet['tenant_id'],
+                    network_id=subnet['network_id'],
+                    mac_address='fa:16:3f:%02x:%02x:%02x' % (
+                        i >> 16, (i >> 8) & 0xff, i & 0xff),
+                    admin_state_up=True, status='ACTIVE',
+                    device_id='', device_owner=''))
+                ctx.session.add(models_v2.IPAllocation(
+                    port_id=port_id, ip_address=ip_address,
+                    subnet_id=subnet['id'],
+                    network_id=subnet['network_id']))
+                ctx.session.add(sg_db.SecurityGroupPortBinding(
+                    port_id=port_id, security_group_id=security_group_id))
+                ips.append(ip_address)
+        return ips
+
+    def _test_security_group_info_for_large_remote_group(self, cidr,
+                                                         ip_version,
+                                                         ethertype):
+        with self.network() as n:
+            with self.subnet(n, cidr=cidr, ip_version=ip_version) as subnet:
+                # The default security group references itself
+                res = self._create_port(self.fmt, n['network']['id'])
+                port = self.deserialize(self.fmt, res)['port']
+                sg_id = port['security_groups'][0]
+                member_ips = self._add_remote_group_members(
+                    subnet['subnet'], sg_id, 1000)
+                member_ips.append(port['fixed_ips'][0]['ip_address'])
+
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port['id']])
+                self.assertEqual(sorted(member_ips),
+                                 sg_info['sg_member_ips'][sg_id][ethertype])
+                rules = sg_info['security_groups'][sg_id]
+                self.assertEqual(4, len(rules))
+                self.assertEqual([sg_id], sg_info['devices'][port['id']][
+                    'security_group_source_groups'])
+
+                # The legacy rules expand the same membership
+                plugin = manager.NeutronManager.get_plugin()
+                ports = plugin.security_group_rules_for_ports(ctx, {
+                    port['id']: {'id': port['id'],
+                                 'network_id': port['network_id'],
+                                 'fixed_ips': [member_ips[-1]],
+                                 'security_group_rules': [],
+                                 'security_group_source_groups': []}})
+                remote_rules = [
+                    rule for rule in ports[port['id']]['security_group_rules']
+                    if rule.get('remote_group_id') == sg_id]
+                self.assertEqual(1000, len(remote_rules))
+                self._delete('ports', port['id'])
+
+    def test_security_group_info_for_devices_large_remote_group_ipv4(self):
+        self._test_security_group_info_for_large_remote_group(
+            '10.0.0.0/20', 4, const.IPv4)
+
+    def test_security_group_info_for_devices_large_remote_group_ipv6(self):
+        self._test_security_group_info_for_large_remote_group(
+            '2001:db8::/64', 6, const.IPv6)
+
+    def test_security_group_info_for_devices_revisions(self):
+        with self.network() as n:
+            with self.subnet(n):
+                res = self._create_port(self.fmt, n['network']['id'])
+                port = self.deserialize(self.fmt, res)['port']
+                sg_id = port['security_groups'][0]
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port['id']], revisions={})
+                self.assertIn(sg_id, sg_info['security_groups'])
+                self.assertIn(sg_id, sg_info['sg_member_ips'])
+                revisions = sg_info['revisions']
+                self.assertEqual({'security_groups': {sg_id: 0},
+                                  'sg_member_ips': {sg_id: 1}}, revisions)
+
+                # Nothing changed
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port['id']], revisions=revisions)
+                self.assertEqual({}, sg_info['security_groups'])
+                self.assertEqual({}, sg_info['sg_member_ips'])
+                self.assertEqual(revisions, sg_info['revisions'])
+                self.assertEqual([sg_id], sg_info['devices'][port['id']][
+                    'security_group_source_groups'])
+
+                # A new member bumps the member revision of the group only
+                res = self._create_port(self.fmt, n['network']['id'])
+                port2 = self.deserialize(self.fmt, res)['port']
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port['id']], revisions=revisions)
+                self.assertEqual({}, sg_info['security_groups'])
+                self.assertEqual(
+                    sorted([port['fixed_ips'][0]['ip_address'],
+                            port2['fixed_ips'][0]['ip_address']]),
+                    sg_info['sg_member_ips'][sg_id][const.IPv4])
+                self.assertEqual(2, sg_info['revisions'][
+                    'sg_member_ips'][sg_id])
+                self._delete('ports', port2['id'])
+                self._delete('ports', port['id'])
+
+    def test_security_group_info_for_devices_cached(self):
+        with self.network() as n:
+            with self.subnet(n):
+                res = self._create_port(self.fmt, n['network']['id'])
+                port = self.deserialize(self.fmt, res)['port']
+                sg_id = port['security_groups'][0]
+                ctx = context.get_admin_context()
+                plugin = manager.NeutronManager.get_plugin()
+                expected = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port['id']])
+                with mock.patch.object(
+                    plugin, '_select_ips_by_ethertype_for_remote_group',
+                    wraps=plugin._select_ips_by_ethertype_for_remote_group
+                ) as select_ips:
+                    sg_info = self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port['id']])
+                    select_ips.assert_called_once_with(ctx, [])
+                    self.assertEqual(expected['security_groups'],
+                                     sg_info['security_groups'])
+                    self.assertEqual(expected['sg_member_ips'],
+                                     sg_info['sg_member_ips'])
+
+                    # A revision bumped by another server process
+                    with ctx.session.begin():
+                        ctx.session.query(sg_db.SecurityGroup).filter_by(
+                            id=sg_id).update({'member_revision': 5})
+                    self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port['id']])
+                    select_ips.assert_called_with(ctx, [sg_id])
+                self._delete('ports', port['id'])
+
+    def test_security_group_rule_create_bumps_revision(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_TCP, '22', '22')
+            self._create_security_group_rule(self.fmt, rule)
+            ctx = context.get_admin_context()
+            plugin = manager.NeutronManager.get_plugin()
+            self.assertEqual(
+                {sg_id: 1},
+                plugin._select_security_group_revisions(ctx, [sg_id]))
+
+    def test_member_revision_bumped_after_commit(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            ctx = context.get_admin_context()
+            plugin = manager.NeutronManager.get_plugin()
+            with ctx.session.begin():
+                plugin._bump_security_group_member_revisions(ctx, [sg_id])
+                plugin._bump_security_group_member_revisions(ctx, [sg_id])
+                self.assertEqual(
+                    {sg_id: 0}, plugin._select_security_group_revisions(
+                        ctx, [sg_id], sg_db.SecurityGroup.member_revision))
+            self.assertEqual(
+                {sg_id: 1}, plugin._select_security_group_revisions(
+                    ctx, [sg_id], sg_db.SecurityGroup.member_revision))
+            self.assertEqual(
+                {sg_id: 0},
+                plugin._select_security_group_revisions(ctx, [sg_id]))
+
     def test_security_group_info_for_devices_ipv4_addr_pair(self):
         with self._port_with_addr_pairs_and_security_group() as port:
             port_id = port['port']['id']
@@ -1305,6 +1485,82 @@ class SecurityGroupAgentEnhancedRpcTestCase(
         self.assertFalse(self.firewall.called)
 
 
+class SecurityGroupAgentRevisionsRpcTestCase(
+    BaseSecurityGroupAgentRpcTestCase):
+
+    def setUp(self):
+        super(SecurityGroupAgentRevisionsRpcTestCase, self).setUp()
+        self.rules1 = [{'remote_group_id': 'fake_sgid2'}]
+        self.members2 = {'IPv4': ['10.0.0.3'], 'IPv6': []}
+        self.revisions = {'security_groups': {'fake_sgid1': 1,
+                                              'fake_sgid2': 1},
+                          'sg_member_ips': {'fake_sgid2': 1}}
+        self.full_sg_info = {
+            'security_groups': {'fake_sgid1': self.rules1,
+                                'fake_sgid2': []},
+            'sg_member_ips': {'fake_sgid2': self.members2},
+            'devices': self.firewall.ports,
+            'revisions': self.revisions}
+        self.rpc = self.agent.plugin_rpc.security_group_info_for_devices
+        self.rpc.return_value = self.full_sg_info
+
+    def test_use_sg_revisions_unsupported(self):
+        self.rpc.side_effect = messaging.UnsupportedVersion('1.3')
+        self.assertFalse(self.agent.use_sg_revisions)
+
+    def test_refresh_firewall_reuses_unchanged_groups(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.rpc.reset_mock()
+        self.firewall.reset_mock()
+        self.rpc.return_value = {
+            'security_groups': {'fake_sgid2': [{'direction': 'egress'}]},
+            'sg_member_ips': {},
+            'devices': self.firewall.ports,
+            'revisions': {'security_groups': {'fake_sgid1': 1,
+                                              'fake_sgid2': 2},
+                          'sg_member_ips': {'fake_sgid2': 1}}}
+        self.agent.refresh_firewall(['fake_device'])
+
+        self.rpc.assert_called_once_with(None, ['fake_device'],
+                                         revisions=self.revisions)
+        self.firewall.update_security_group_rules.assert_has_calls(
+            [mock.call('fake_sgid1', self.rules1),
+             mock.call('fake_sgid2', [{'direction': 'egress'}])],
+            any_order=True)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.members2)
+        self.assertEqual(
+            (2, [{'direction': 'egress'}]),
+            self.agent.sg_info_cache['security_groups']['fake_sgid2'])
+
+    def test_refresh_firewall_refetches_dropped_groups(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        del self.agent.sg_info_cache['sg_member_ips']['fake_sgid2']
+        self.rpc.reset_mock()
+        self.rpc.side_effect = [
+            {'security_groups': {}, 'sg_member_ips': {},
+             'devices': self.firewall.ports,
+             'revisions': self.revisions},
+            self.full_sg_info]
+        self.agent.refresh_firewall(['fake_device'])
+
+        self.assertEqual(2, self.rpc.call_count)
+        self.assertEqual({'security_groups': self.revisions[
+                              'security_groups'],
+                          'sg_member_ips': {}},
+                         self.rpc.call_args[1]['revisions'])
+        self.assertEqual(
+            (1, self.members2),
+            self.agent.sg_info_cache['sg_member_ips']['fake_sgid2'])
+
+    def test_remove_devices_filter_prunes_cache(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.ports = {}
+        self.agent.remove_devices_filter(['fake_device'])
+        self.assertEqual({'security_groups': {}, 'sg_member_ips': {}},
+                         self.agent.sg_info_cache)
+
+
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
 
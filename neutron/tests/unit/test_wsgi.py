@@ -26,6 +26,7 @@ import webob.exc
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as exception
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -606,6 +607,26 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = dict(servers=iter([dict(a=1), dict(b=u'\u7f51')]))
+        expected_json = '{"servers":[{"a":1},{"b":"\\u7f51"}]}'
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(input_dict))
+        result = result.replace('\n', '').replace(' ', '')
+
+        self.assertEqual(result, expected_json)
+
+    def test_serialize_iter_by_blocks(self):
+        servers = [dict(id='%04d' % i) for i in range(100)]
+        serializer = wsgi.JSONDictSerializer()
+        serializer.STREAM_BLOCK_SIZE = 100
+        blocks = list(serializer.serialize_iter(
+            dict(servers=iter(servers))))
+
+        self.assertTrue(len(blocks) > 1)
+        self.assertEqual({'servers': servers},
+                         jsonutils.loads(''.join(blocks)))
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
@@ -18,6 +18,7 @@ Utility methods for working with WSGI servers
 """
 from __future__ import print_function
 
+import collections
 import errno
 import os
 import socket
@@ -405,11 +406,49 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Size in bytes of the blocks of a streamed body
+    STREAM_BLOCK_SIZE = 65536
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
         return jsonutils.dumps(data, default=sanitizer)
 
+    def _iter_fragments(self, data):
+        yield '{'
+        for index, (key, value) in enumerate(data.iteritems()):
+            if index:
+                yield ', '
+            yield '%s: ' % self.default(key)
+            if isinstance(value, collections.Iterator):
+                yield '['
+                for item_index, item in enumerate(value):
+                    if item_index:
+                        yield ', '
+                    yield self.default(item)
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
+    def serialize_iter(self, data):
+        """Serialize a dict whose values may be iterators, block by block.
+
+        The iterators are serialized as JSON lists, consuming one item at a
+        time, so that the whole body never has to be built in memory.
+        """
+        block = []
+        size = 0
+        for fragment in self._iter_fragments(data):
+            block.append(fragment)
+            size += len(fragment)
+            if size >= self.STREAM_BLOCK_SIZE:
+                yield ''.join(block)
+                block = []
+                size = 0
+        if block:
+            yield ''.join(block)
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -0,0 +1,133 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the port creation throughput of the IPAM drivers.
+
+Each driver gets a network with a /16 subnet, on which a number of worker
+processes, standing for API workers, concurrently create ports through the
+database plugin. The database must already be at the head migration, e.g.:
+
+    neutron-db-manage --database-connection $URL upgrade head
+    python tools/ipam_benchmark.py --connection $URL --workers 50
+
+Failed port creations, such as deadlocks, are counted as errors. SQLite
+serializes all the writers and fails most concurrent transactions, so it
+only exercises the code paths.
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import api as db_api
+from neutron.db import db_base_plugin_v2
+from neutron.db import ipam_bitmap_db
+
+
+def _setup(connection, ipam_driver):
+    cfg.CONF.set_override('connection', connection, 'database')
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    cfg.CONF.set_override('ipam_driver', ipam_driver)
+    cfg.CONF.set_override('allow_overlapping_ips', True)
+    # Each process needs its own engine
+    db_api._FACADE = None
+    return db_base_plugin_v2.NeutronDbPluginV2()
+
+
+def _create_subnet(plugin, cidr):
+    ctx = context.get_admin_context()
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'ipam-benchmark', 'admin_state_up': True,
+        'shared': False, 'tenant_id': 'ipam-benchmark'}})
+    plugin.create_subnet(ctx, {'subnet': {
+        'name': '', 'network_id': network['id'], 'tenant_id': 'ipam-benchmark',
+        'cidr': cidr, 'ip_version': 4, 'enable_dhcp': False,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED}})
+    return network['id']
+
+
+def _worker(connection, ipam_driver, network_id, count, start, errors,
+            index):
+    plugin = _setup(connection, ipam_driver)
+    ctx = context.get_admin_context()
+    start.wait()
+    for i in range(count):
+        try:
+            plugin.create_port(ctx, {'port': {
+                'name': '', 'network_id': network_id,
+                'tenant_id': 'ipam-benchmark', 'admin_state_up': True,
+                'device_id': '', 'device_owner': '',
+                'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                'fixed_ips': attributes.ATTR_NOT_SPECIFIED}})
+        except Exception:
+            errors[index] += 1
+
+
+def run(connection, ipam_driver, workers, ports, cidr):
+    plugin = _setup(connection, ipam_driver)
+    network_id = _create_subnet(plugin, cidr)
+    # neutron monkey patches threading, so multiprocessing.Pool and Queue,
+    # which rely on helper threads, are not used.
+    start = multiprocessing.Event()
+    errors = multiprocessing.Array('i', workers)
+    processes = [multiprocessing.Process(
+        target=_worker, args=(connection, ipam_driver, network_id, ports,
+                              start, errors, i)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    # Let the workers connect to the database before starting the clock
+    time.sleep(1)
+    started = time.time()
+    start.set()
+    for process in processes:
+        process.join()
+    elapsed = time.time() - started
+    failed = sum(errors)
+    created = workers * ports - failed
+    print('%-20s %6d ports in %7.2fs: %8.1f ports/s, %d errors' % (
+        ipam_driver, created, elapsed, created / elapsed, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connection', required=True,
+                        help='SQLAlchemy URL of the neutron database')
+    parser.add_argument('--workers', type=int, default=50,
+                        help='Number of concurrent API workers')
+    parser.add_argument('--ports', type=int, default=20,
+                        help='Number of ports created by each worker')
+    parser.add_argument('--cidr', default='10.0.0.0/16',
+                        help='CIDR of the subnet of the ports')
+    parser.add_argument('--driver', action='append',
+                        choices=[ipam_bitmap_db.IPAM_DRIVER_RANGE,
+                                 ipam_bitmap_db.IPAM_DRIVER_BITMAP],
+                        help='IPAM driver to measure, default to all')
+    args = parser.parse_args()
+    for driver in args.driver or [ipam_bitmap_db.IPAM_DRIVER_RANGE,
+                                  ipam_bitmap_db.IPAM_DRIVER_BITMAP]:
+        run(args.connection, driver, args.workers, args.ports, args.cidr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the duration of the port list calls selecting fields.
+
+The ports are written directly in the database, on a single network, then
+listed through a database plugin using the usual port extensions, with and
+without the field aware loading of their relationships. The database must
+already be at the head migration, e.g.:
+
+    neutron-db-manage --database-connection $URL upgrade head
+    python tools/list_benchmark.py --connection $URL --ports 50000
+
+Without --connection, an in-memory SQLite database is used.
+"""
+
+import argparse
+import contextlib
+import time
+
+import netaddr
+from oslo.config import cfg
+
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import allowedaddresspairs_db
+from neutron.db import api as db_api
+from neutron.db import common_db_mixin
+from neutron.db import db_base_plugin_v2
+from neutron.db import extradhcpopt_db
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron.db import portsecurity_db
+from neutron.db import securitygroups_db
+from neutron.openstack.common import uuidutils
+from neutron.plugins.ml2 import plugin as ml2_plugin  # noqa
+
+TENANT_ID = 'list-benchmark'
+
+FIELDS = [None, ['id'], ['id', 'name', 'status'], ['id', 'fixed_ips'],
+          ['id', 'security_groups']]
+
+
+class BenchmarkPlugin(db_base_plugin_v2.NeutronDbPluginV2,
+                      securitygroups_db.SecurityGroupDbMixin,
+                      allowedaddresspairs_db.AllowedAddressPairsMixin,
+                      extradhcpopt_db.ExtraDhcpOptMixin,
+                      portsecurity_db.PortSecurityDbMixin):
+
+    # The port security bindings are joined, but not created by the
+    # benchmark, so their extension is not enabled
+    supported_extension_aliases = ['security-group', 'allowed-address-pairs',
+                                   'extra_dhcp_opt']
+
+
+def _setup(connection):
+    if connection:
+        cfg.CONF.set_override('connection', connection, 'database')
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    plugin = BenchmarkPlugin()
+    if not connection:
+        model_base.BASEV2.metadata.create_all(db_api.get_engine())
+    return plugin
+
+
+def _create_ports(count, cidr):
+    session = db_api.get_session()
+    network_id = uuidutils.generate_uuid()
+    subnet_id = uuidutils.generate_uuid()
+    with session.begin():
+        session.add(models_v2.Network(id=network_id, name='list-benchmark',
+                                      tenant_id=TENANT_ID, status='ACTIVE',
+                                      admin_state_up=True, shared=False))
+        session.add(models_v2.Subnet(id=subnet_id, network_id=network_id,
+                                     tenant_id=TENANT_ID, ip_version=4,
+                                     cidr=cidr, enable_dhcp=False,
+                                     shared=False))
+    addresses = netaddr.IPNetwork(cidr).iter_hosts()
+    for start in range(0, count, 1000):
+        with session.begin():
+            for i in range(start, min(start + 1000, count)):
+                port_id = uuidutils.generate_uuid()
+                session.add(models_v2.Port(
+                    id=port_id, name='port-%d' % i, network_id=network_id,
+                    tenant_id=TENANT_ID, mac_address=str(netaddr.EUI(i)),
+                    admin_state_up=True, status='ACTIVE', device_id='',
+                    device_owner=''))
+                session.add(models_v2.IPAllocation(
+                    port_id=port_id, ip_address=str(next(addresses)),
+                    subnet_id=subnet_id, network_id=network_id))
+
+
+def _measure(plugin, fields, repeat):
+    ctx = context.get_admin_context()
+    durations = []
+    for i in range(repeat):
+        started = time.time()
+        ports = plugin.get_ports(ctx, fields=fields)
+        durations.append(time.time() - started)
+    return len(ports), min(durations)
+
+
+@contextlib.contextmanager
+def _all_joined():
+    """Forget the registered fields, as if they had never been."""
+    registries = (common_db_mixin.CommonDbMixin._dict_extend_fields,
+                  common_db_mixin.CommonDbMixin._model_relationship_fields)
+    saved = [registry.copy() for registry in registries]
+    for registry in registries:
+        registry.clear()
+    try:
+        yield
+    finally:
+        for registry, content in zip(registries, saved):
+            registry.update(content)
+
+
+def run(plugin, repeat):
+    # Warm up the mappers and the database caches
+    _measure(plugin, None, 1)
+    for fields in FIELDS:
+        count, projected = _measure(plugin, fields, repeat)
+        with _all_joined():
+            count, joined = _measure(plugin, fields, repeat)
+        print('%-32s %6d ports: %7.2fs all joined, %7.2fs projected' % (
+            ','.join(fields or ['<all fields>']), count, joined, projected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connection',
+                        help='SQLAlchemy URL of the neutron database')
+    parser.add_argument('--ports', type=int, default=50000,
+                        help='Number of ports to create and list')
+    parser.add_argument('--cidr', default='10.0.0.0/16',
+                        help='CIDR of the subnet of the ports')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of list calls, the fastest is reported')
+    args = parser.parse_args()
+    plugin = _setup(args.connection)
+    _create_ports(args.ports, args.cidr)
+    run(plugin, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the policy checks of the port list responses.
+
+The ports of a list response are checked one by one with policy.check, as
+the API controllers used to, then all together with policy.check_items,
+for an admin and a regular user. e.g.:
+
+    python tools/policy_benchmark.py --policy-file etc/policy.json
+"""
+
+import argparse
+import os
+import time
+
+from oslo.config import cfg
+
+from neutron.common import config  # noqa
+from neutron import context
+from neutron import policy
+
+
+def _make_ports(count, tenants):
+    return [{'id': 'port-%d' % i,
+             'tenant_id': 'tenant-%d' % (i % tenants),
+             'network_id': 'network-%d' % (i % tenants),
+             'device_owner': 'compute:nova',
+             'fixed_ips': [{'subnet_id': 'subnet-%d' % (i % tenants),
+                            'ip_address': '10.0.%d.%d' % (i / 250,
+                                                          i % 250 + 2)}]}
+            for i in range(count)]
+
+
+def _measure(func, *args):
+    started = time.time()
+    func(*args)
+    return time.time() - started
+
+
+def _check_one_by_one(ctx, ports):
+    return [port for port in ports
+            if policy.check(ctx, 'get_port', port)]
+
+
+def _check_items(ctx, ports):
+    results = policy.check_items(ctx, 'get_port', ports)
+    return [port for port, result in zip(ports, results) if result]
+
+
+def run(ports, tenants):
+    items = _make_ports(ports, tenants)
+    for name, ctx in (('admin', context.get_admin_context()),
+                      ('user', context.Context('user', 'tenant-0'))):
+        one_by_one = _measure(_check_one_by_one, ctx, items)
+        together = _measure(_check_items, ctx, items)
+        print('%-6s %6d ports: check %7.3fs, check_items %7.3fs (x%.1f)' % (
+            name, ports, one_by_one, together, one_by_one / together))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--policy-file', default='etc/policy.json',
+                        help='Policy file to load')
+    parser.add_argument('--ports', type=int, default=5000,
+                        help='Number of ports of the list response')
+    parser.add_argument('--tenants', type=int, default=50,
+                        help='Number of tenants owning the ports')
+    args = parser.parse_args()
+    cfg.CONF.set_override('policy_file',
+                          os.path.abspath(args.policy_file))
+    policy.init()
+    run(args.ports, args.tenants)
+
+
+if __name__ == '__main__':
+    main()